@@ -9,6 +9,7 @@ from flask_wtf.csrf import CSRFProtect
 from flask_cors import CORS
 from flask_migrate import Migrate
 import time
+import tempfile
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 from sqlalchemy import text
@@ -49,6 +50,9 @@ if database_url.startswith("postgres://"):
     logging.info(f"✅ Using PostgreSQL database (Railway/Replit)")
 elif database_url.startswith("postgresql://"):
     logging.info(f"✅ Using PostgreSQL database (Railway/Replit)")
+elif database_url.startswith("sqlite:///"):
+    # SQLite explícito (ex.: banco descartável dos benchmarks e do CI)
+    logging.info(f"📝 Using SQLite database: {database_url}")
 else:
     # Fallback to SQLite for development or when PostgreSQL not available
     database_url = "sqlite:///construction_tracker.db"
@@ -72,6 +76,54 @@ app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max file size
 ELP_BACKUP_FOLDER = 'uploads/ELP'
 app.config['ELP_BACKUP_FOLDER'] = ELP_BACKUP_FOLDER
 
+# Cache de imagens em disco compartilhado pelos workers do Gunicorn (image_disk_cache.py)
+app.config['IMAGE_CACHE_FOLDER'] = os.path.abspath(os.environ.get('IMAGE_CACHE_FOLDER', os.path.join(tempfile.gettempdir(), 'elp_image_cache')))
+app.config['IMAGE_CACHE_MAX_BYTES'] = int(os.environ.get('IMAGE_CACHE_MAX_MB', '512')) * 1024 * 1024
+
+# Cache persistente dos PDFs de relatórios, por impressão digital do conteúdo (pdf_cache.py)
+app.config['PDF_CACHE_FOLDER'] = os.path.abspath(os.environ.get('PDF_CACHE_FOLDER', os.path.join(app.instance_path, 'pdf_cache')))
+
+# Renderização de PDFs em segundo plano, com status consultável (pdf_jobs.py)
+app.config['PDF_JOBS_FOLDER'] = os.path.abspath(os.environ.get('PDF_JOBS_FOLDER', os.path.join(app.instance_path, 'pdf_jobs')))
+
+# Pool isolado de renderização de PDFs, com reciclagem e teto de memória por processo (pdf_render_pool.py)
+app.config['PDF_RENDER_WORKERS'] = int(os.environ.get('PDF_RENDER_WORKERS', '2'))
+app.config['PDF_RENDER_ISOLATED'] = os.environ.get('PDF_RENDER_ISOLATED', 'true').lower() != 'false'
+app.config['PDF_RENDER_MAX_TASKS_PER_CHILD'] = int(os.environ.get('PDF_RENDER_MAX_TASKS_PER_CHILD', '20'))
+app.config['PDF_RENDER_MEMORY_LIMIT_MB'] = int(os.environ.get('PDF_RENDER_MEMORY_LIMIT_MB', '2048'))  # 0: sem teto
+app.config['PDF_RENDER_TIMEOUT'] = int(os.environ.get('PDF_RENDER_TIMEOUT', '90'))  # Abaixo do timeout do Gunicorn
+app.config['PDF_RENDER_TMP_FOLDER'] = os.path.abspath(os.environ.get('PDF_RENDER_TMP_FOLDER', os.path.join(tempfile.gettempdir(), 'elp_pdf_render')))
+
+# Backup completo no Google Drive em segundo plano, retomável (drive_backup_jobs.py)
+app.config['DRIVE_BACKUP_FOLDER'] = os.path.abspath(os.environ.get('DRIVE_BACKUP_FOLDER', os.path.join(app.instance_path, 'drive_backup')))
+app.config['DRIVE_BACKUP_UPLOAD_THREADS'] = int(os.environ.get('DRIVE_BACKUP_UPLOAD_THREADS', '4'))
+app.config['DRIVE_BACKUP_LOTES_SIMULTANEOS'] = int(os.environ.get('DRIVE_BACKUP_LOTES_SIMULTANEOS', str(app.config['PDF_RENDER_WORKERS'] + 1)))
+
+# Gerador de PDF compartilhado por processo, preparado no boot de cada processo de renderização
+# (ou do app, com PDF_RENDER_ISOLATED=false) - pdf_generator_weasy.obter_gerador
+app.config['PDF_WARMUP_ENABLED'] = os.environ.get('PDF_WARMUP_ENABLED', 'true').lower() != 'false'
+
+# Resolução das fotos embutidas nos PDFs, reduzidas ao tamanho impresso (pdf_generator_weasy.py)
+app.config['PDF_PHOTO_DPI'] = int(os.environ.get('PDF_PHOTO_DPI', '200'))
+
+# PDF do relatório composto por segmentos de páginas com cache próprio (pdf_segmentos.py, requer pypdf)
+app.config['PDF_SEGMENTS_ENABLED'] = os.environ.get('PDF_SEGMENTS_ENABLED', 'true').lower() != 'false'
+
+# Normalização das fotos após o upload (photo_normalization.py)
+app.config['PHOTO_NORMALIZE_ENABLED'] = os.environ.get('PHOTO_NORMALIZE_ENABLED', 'true').lower() != 'false'
+app.config['PHOTO_NORMALIZE_WORKERS'] = int(os.environ.get('PHOTO_NORMALIZE_WORKERS', '1'))
+app.config['PHOTO_MAX_DIMENSION'] = int(os.environ.get('PHOTO_MAX_DIMENSION', '2560'))
+app.config['PHOTO_JPEG_QUALITY'] = int(os.environ.get('PHOTO_JPEG_QUALITY', '85'))
+app.config['PHOTO_ORIGINALS_FOLDER'] = os.environ.get('PHOTO_ORIGINALS_FOLDER')  # Vazio: originais não são arquivados
+
+# Armazenamento dos bytes das fotos fora do banco (photo_backends.py / migrate_blobs_to_storage.py)
+app.config['PHOTO_STORAGE_BACKEND'] = os.environ.get('PHOTO_STORAGE_BACKEND', 'database')  # database, local, s3
+app.config['PHOTO_STORAGE_LOCAL_FOLDER'] = os.environ.get('PHOTO_STORAGE_LOCAL_FOLDER', os.path.abspath('storage/fotos'))
+app.config['PHOTO_STORAGE_S3_BUCKET'] = os.environ.get('PHOTO_STORAGE_S3_BUCKET')
+app.config['PHOTO_STORAGE_S3_PREFIX'] = os.environ.get('PHOTO_STORAGE_S3_PREFIX', 'fotos')
+app.config['PHOTO_STORAGE_S3_ENDPOINT_URL'] = os.environ.get('PHOTO_STORAGE_S3_ENDPOINT_URL')  # MinIO/R2/Spaces
+app.config['PHOTO_STORAGE_S3_REGION'] = os.environ.get('PHOTO_STORAGE_S3_REGION')
+
 # Ensure upload directory exists
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(ELP_BACKUP_FOLDER, exist_ok=True)
@@ -503,8 +555,15 @@ def init_database():
     except Exception as e:
         logging.error(f"Database initialization error: {e}")
 
+# Processos auxiliares (pool de renderização de PDFs) importam a aplicação só
+# pelo app context: a inicialização do banco e o scheduler rodam apenas no
+# processo web, senão cada processo do pool repetiria as tarefas agendadas
+PROCESSO_AUXILIAR = os.environ.get("APP_PROCESSO_AUXILIAR") == "1"
+
 # Initialize database for Railway deployment - ROBUST VERSION
-if os.environ.get("RAILWAY_ENVIRONMENT") or (os.environ.get("DATABASE_URL") and "railway" in os.environ.get("DATABASE_URL", "")):
+if PROCESSO_AUXILIAR:
+    logging.info("⚙️ Processo auxiliar - inicialização do banco ignorada")
+elif os.environ.get("RAILWAY_ENVIRONMENT") or (os.environ.get("DATABASE_URL") and "railway" in os.environ.get("DATABASE_URL", "")):
     # Railway-specific initialization with enhanced error handling
     logging.info("🚂 Railway environment detected - initializing database")
     try:
@@ -599,13 +658,14 @@ else:
     init_database()
 
 # Initialize Scheduler for background tasks
-logging.info("📅 Initializing Scheduler for background tasks...")
-try:
-    from scheduler_tasks import init_scheduler
-    scheduler = init_scheduler(app)
-    if scheduler:
-        logging.info("✅ Scheduler inicializado - tarefas periódicas ativas")
-    else:
-        logging.warning("⚠️ Scheduler não inicializado - tarefas periódicas desabilitadas")
-except Exception as e:
-    logging.warning(f"⚠️ Scheduler initialization skipped: {e}")
\ No newline at end of file
+if not PROCESSO_AUXILIAR:
+    logging.info("📅 Initializing Scheduler for background tasks...")
+    try:
+        from scheduler_tasks import init_scheduler
+        scheduler = init_scheduler(app)
+        if scheduler:
+            logging.info("✅ Scheduler inicializado - tarefas periódicas ativas")
+        else:
+            logging.warning("⚠️ Scheduler não inicializado - tarefas periódicas desabilitadas")
+    except Exception as e:
+        logging.warning(f"⚠️ Scheduler initialization skipped: {e}")
\ No newline at end of file
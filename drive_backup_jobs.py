@@ -0,0 +1,439 @@
+"""
+Backup completo dos PDFs no Google Drive em segundo plano, com retomada
+
+O backup de todos os relatórios aprovados rodava dentro da requisição de
+/admin/drive/backup-all-pdfs, em série (renderiza, envia, próximo), e um
+timeout do Gunicorn obrigava a começar tudo de novo. Aqui cada backup é uma
+execução com estado persistido:
+
+- O estado fica em DRIVE_BACKUP_FOLDER: <execucao_id>.json (status e
+  contadores, escrita atômica) e <execucao_id>.log (uma linha JSON por PDF
+  enviado, o ponto de retomada).
+- A execução roda em uma thread do worker que recebeu o pedido e segura um
+  lock de arquivo (fcntl) enquanto estiver ativa: outro pedido, em qualquer
+  worker, só recebe o status.
+- Só vão para o Drive os relatórios novos ou alterados desde o último envio:
+  google_drive_backup.planejar_backup_pdfs compara a impressão digital do
+  conteúdo com o manifesto (ManifestoBackupDrive), que é atualizado logo
+  após cada envio. Um relatório alterado atualiza o mesmo arquivo no Drive.
+- Os PDFs são obtidos em lotes de LOTE_PDFS (pdf_cache.pdfs_em_lote, no pool
+  de pdf_render_pool), até DRIVE_BACKUP_LOTES_SIMULTANEOS lotes por vez, e
+  DRIVE_BACKUP_UPLOAD_THREADS threads enviam os PDFs prontos: a renderização
+  de um lote se sobrepõe aos envios dos anteriores.
+- Cada envio tem retentativas com backoff exponencial em erros transitórios
+  (429, 5xx, rede). O que falhar de vez fica para a próxima retomada.
+- Se o worker reiniciar no meio, o status fica "interrompido" e o próximo
+  pedido retoma a mesma execução, pulando os PDFs já registrados no log. O
+  log guarda também a impressão digital e o ID do arquivo: o planejamento da
+  retomada grava no manifesto o que foi enviado sem chegar a ser registrado.
+
+O token do Google não é gravado no estado: cada pedido (início ou retomada)
+entrega o token do usuário à thread da execução.
+"""
+
+import os
+import json
+import time
+import uuid
+import random
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+try:
+    import fcntl
+except ImportError:  # Windows (desenvolvimento): sem lock entre processos
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+STATUS_NA_FILA = 'na_fila'
+STATUS_EXECUTANDO = 'executando'
+STATUS_CONCLUIDO = 'concluido'
+STATUS_INTERROMPIDO = 'interrompido'
+STATUS_ERRO = 'erro'
+
+# Relatórios por lote de PDFs (uma query e uma tarefa de renderização por lote)
+LOTE_PDFS = 10
+
+# Retentativas de cada envio: 2s, 4s, 8s, 16s (teto de 60s), com variação aleatória
+TENTATIVAS_ENVIO = 5
+BACKOFF_INICIAL_SEGUNDOS = 2
+BACKOFF_MAXIMO_SEGUNDOS = 60
+STATUS_HTTP_TRANSITORIOS = (408, 429, 500, 502, 503, 504)
+MOTIVOS_LIMITE_TAXA = ('rateLimitExceeded', 'userRateLimitExceeded')
+
+# Contadores gravados no máximo a cada N segundos (e sempre no fim)
+INTERVALO_GRAVACAO_SEGUNDOS = 2
+MAXIMO_ERROS_NO_ESTADO = 50
+
+# Grupo dos resultados (mesmas chaves da resposta do backup síncrono)
+GRUPOS = {'relatorio': 'relatorios', 'express': 'express'}
+
+_lock = threading.Lock()
+
+
+# =============================================================================
+# ESTADO EM DISCO
+# =============================================================================
+
+def _pasta():
+    from flask import current_app
+    return current_app.config['DRIVE_BACKUP_FOLDER']
+
+
+def execucao_id_valido(execucao_id):
+    return len(execucao_id) == 32 and all(c in '0123456789abcdef' for c in execucao_id)
+
+
+def _caminho(pasta, execucao_id, extensao='.json'):
+    return os.path.join(pasta, f"{execucao_id}{extensao}")
+
+
+def ler_execucao(pasta, execucao_id):
+    """Estado da execução, ou None se não existe (ou id inválido)"""
+    if not execucao_id_valido(execucao_id):
+        return None
+    try:
+        with open(_caminho(pasta, execucao_id)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _gravar_estado(pasta, estado):
+    estado['atualizado_em'] = time.time()
+    os.makedirs(pasta, exist_ok=True)
+    fd, temporario = tempfile.mkstemp(dir=pasta, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(estado, f)
+        os.replace(temporario, _caminho(pasta, estado['execucao_id']))
+    except BaseException:
+        os.unlink(temporario)
+        raise
+
+
+def _ultima_execucao(pasta):
+    """Estado da execução mais recente da pasta"""
+    if not os.path.isdir(pasta):
+        return None
+    ids = [entrada.name[:-5] for entrada in os.scandir(pasta) if entrada.name.endswith('.json')]
+    estados = [estado for estado in (ler_execucao(pasta, i) for i in ids) if estado]
+    return max(estados, key=lambda estado: estado.get('criado_em', 0), default=None)
+
+
+def _enviados(pasta, execucao_id):
+    """PDFs já enviados nesta execução, pelo log: {chave "tipo:id": linha do log}"""
+    enviados = {}
+    try:
+        with open(_caminho(pasta, execucao_id, '.log')) as f:
+            for linha in f:
+                try:
+                    registro = json.loads(linha)
+                    enviados[registro['chave']] = registro
+                except (ValueError, KeyError):
+                    continue  # Última linha incompleta (processo morto no meio da escrita)
+    except FileNotFoundError:
+        pass
+    return enviados
+
+
+def _adquirir_lock(pasta):
+    """Lock exclusivo de execução ativa, ou None se outra execução (de qualquer worker) o segura"""
+    os.makedirs(pasta, exist_ok=True)
+    lock_file = open(os.path.join(pasta, '.execucao.lock'), 'w')
+    if fcntl is not None:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return None
+    return lock_file
+
+
+# =============================================================================
+# EXECUÇÃO
+# =============================================================================
+
+def _erro_transitorio(erro):
+    """Erros em que vale tentar o envio de novo (limite de taxa, falha do servidor, rede)"""
+    from googleapiclient.errors import HttpError
+    import httplib2
+
+    if isinstance(erro, HttpError):
+        status = getattr(erro.resp, 'status', None)
+        if status in STATUS_HTTP_TRANSITORIOS:
+            return True
+        conteudo = erro.content.decode('utf-8', 'replace') if isinstance(erro.content, bytes) else str(erro.content)
+        return status == 403 and any(motivo in conteudo for motivo in MOTIVOS_LIMITE_TAXA)
+    return isinstance(erro, (OSError, httplib2.HttpLib2Error))
+
+
+def com_retentativas(funcao, descricao, tentativas=TENTATIVAS_ENVIO):
+    """Executa `funcao()`, repetindo com backoff exponencial enquanto o erro for transitório"""
+    for tentativa in range(1, tentativas + 1):
+        try:
+            return funcao()
+        except Exception as e:
+            if tentativa == tentativas or not _erro_transitorio(e):
+                raise
+            espera = min(BACKOFF_MAXIMO_SEGUNDOS, BACKOFF_INICIAL_SEGUNDOS * 2 ** (tentativa - 1))
+            espera *= random.uniform(0.5, 1.0)
+            logger.warning(f"🔁 {descricao}: tentativa {tentativa} falhou ({e}); nova tentativa em {espera:.1f}s")
+            time.sleep(espera)
+
+
+class _Execucao:
+    """Execução em andamento: contadores em memória, log de enviados e um cliente do Drive por thread"""
+
+    def __init__(self, app, pasta, estado, token_info):
+        self.app = app
+        self.pasta = pasta
+        self.estado = estado
+        self.token_info = token_info
+        self._lock = threading.Lock()
+        self._clientes = threading.local()
+        self._gravado_em = 0
+        self._log = open(_caminho(pasta, estado['execucao_id'], '.log'), 'a')
+
+    def drive(self):
+        """GoogleDriveBackupOAuth da thread atual (o cliente HTTP do googleapiclient não é thread-safe)"""
+        cliente = getattr(self._clientes, 'drive', None)
+        if cliente is None:
+            from google_drive_backup import GoogleDriveBackupOAuth
+            cliente = GoogleDriveBackupOAuth()
+            cliente.set_credentials_from_token(self.token_info)
+            self._clientes.drive = cliente
+        return cliente
+
+    def grupo(self, tipo):
+        return self.estado['results'][GRUPOS[tipo]]
+
+    def registrar_envio(self, item, filename, arquivo):
+        """Log de retomada primeiro (com o necessário para refazer o manifesto), depois o manifesto"""
+        from google_drive_backup import registrar_manifesto
+
+        with self._lock:
+            self._log.write(json.dumps({'chave': item.chave, 'filename': filename, 'file_id': arquivo.get('id'),
+                                        'digital': item.digital}) + '\n')
+            self._log.flush()
+            self.grupo(item.tipo)['success'] += 1
+            self.gravar()
+        with self.app.app_context():
+            try:
+                registrar_manifesto(item.tipo, [(item, arquivo)])
+            except Exception as e:
+                # A linha do log basta: o planejamento da próxima retomada grava o registro
+                logger.error(f"❌ Backup no Drive: manifesto de {item.descricao} não gravado: {e}")
+
+    def registrar_falha(self, item, erro):
+        with self._lock:
+            self.grupo(item.tipo)['failed'] += 1
+            erros = self.estado['erros']
+            erros.append(f"{item.descricao}: {erro}")
+            del erros[:-MAXIMO_ERROS_NO_ESTADO]
+            self.gravar()
+
+    def gravar(self, forcar=False, **campos):
+        self.estado.update(campos)
+        if forcar or time.monotonic() - self._gravado_em >= INTERVALO_GRAVACAO_SEGUNDOS:
+            resultados = self.estado['results'].values()
+            total = sum(r['total'] for r in resultados)
+            feitos = sum(r['success'] + r['failed'] + r['skipped'] for r in resultados)
+            self.estado['progresso'] = int(100 * feitos / total) if total else 0
+            _gravar_estado(self.pasta, self.estado)
+            self._gravado_em = time.monotonic()
+
+    def fechar(self):
+        self._log.close()
+
+
+def _carregar_relatorios(tipo, ids):
+    from sqlalchemy.orm import joinedload
+    from models import Relatorio, RelatorioExpress
+    import pdf_cache
+
+    if tipo == pdf_cache.TIPO_EXPRESS:
+        return RelatorioExpress.query.filter(RelatorioExpress.id.in_(ids)).all()
+    return Relatorio.query.options(
+        joinedload(Relatorio.projeto), joinedload(Relatorio.autor)
+    ).filter(Relatorio.id.in_(ids)).all()
+
+
+def _enviar_pdf(execucao, item, resultado, pasta_id, data):
+    """Executada nas threads de envio; retorna (item, arquivo no Drive) ou None se falhou"""
+    from google_drive_backup import enviar_pdf_backup
+    import pdf_cache
+
+    filename = f"{item.filename_base}_{data}.pdf"
+    try:
+        pdf_bytes = pdf_cache.ler(resultado)
+        arquivo = com_retentativas(
+            lambda: enviar_pdf_backup(execucao.drive(), item, pdf_bytes, filename, pasta_id),
+            f"Envio de {filename}",
+        )
+    except Exception as e:
+        logger.error(f"❌ Backup no Drive: {item.descricao} falhou: {e}")
+        execucao.registrar_falha(item, e)
+        return None
+    execucao.registrar_envio(item, filename, arquivo)
+    return item, arquivo
+
+
+def _processar_lote(app, execucao, envios, tipo, lote, pasta_id, data):
+    """Executada nas threads de lote: obtém os PDFs do lote e espera os envios (cada um grava seu manifesto)"""
+    import pdf_cache
+
+    with app.app_context():
+        try:
+            relatorios = _carregar_relatorios(tipo, [item.id for item in lote])
+            resultados, erros = pdf_cache.pdfs_em_lote(tipo, relatorios)
+        except Exception as e:
+            resultados, erros = {}, {item.id: str(e) for item in lote}
+
+    futuros = []
+    for item in lote:
+        resultado = resultados.get(item.id)
+        if resultado is None:
+            execucao.registrar_falha(item, erros.get(item.id, 'PDF não gerado'))
+            continue
+        futuros.append(envios.submit(_enviar_pdf, execucao, item, resultado, pasta_id, data))
+    wait(futuros)
+
+
+def _executar(app, execucao, lock_file):
+    """Corpo da execução (thread própria ou a da requisição, no backup síncrono)"""
+    from google_drive_backup import planejar_backup_pdfs
+
+    estado = execucao.estado
+    inicio = time.monotonic()
+    with app.app_context():
+        try:
+            execucao.gravar(forcar=True, status=STATUS_EXECUTANDO, pid=os.getpid())
+            enviados = _enviados(execucao.pasta, estado['execucao_id'])
+            plano = planejar_backup_pdfs(execucao.drive(), enviados)
+
+            for tipo, grupo in plano.items():
+                execucao.grupo(tipo).update(total=grupo['total'], skipped=grupo['skipped'],
+                                            success=grupo['enviados'], failed=0)
+            execucao.gravar(forcar=True)
+
+            data = time.strftime('%Y%m%d')
+            with ThreadPoolExecutor(app.config.get('DRIVE_BACKUP_UPLOAD_THREADS', 4),
+                                    thread_name_prefix='drive-envio') as envios, \
+                    ThreadPoolExecutor(app.config.get('DRIVE_BACKUP_LOTES_SIMULTANEOS', 3),
+                                       thread_name_prefix='drive-lote') as lotes:
+                futuros = []
+                for tipo, grupo in plano.items():
+                    itens = grupo['itens']
+                    for inicio_lote in range(0, len(itens), LOTE_PDFS):
+                        futuros.append(lotes.submit(
+                            _processar_lote, app, execucao, envios, tipo,
+                            itens[inicio_lote:inicio_lote + LOTE_PDFS], grupo['pasta_id'], data,
+                        ))
+                for futuro in futuros:
+                    futuro.result()
+
+            resultados = estado['results']
+            r, e = resultados['relatorios'], resultados['express']
+            execucao.gravar(
+                forcar=True, status=STATUS_CONCLUIDO, duracao=round(time.monotonic() - inicio, 1),
+                message=f"Backup concluído! Relatórios: {r['success']}/{r['total']}, Express: {e['success']}/{e['total']}",
+                detalhes=(f"Relatórios salvos: {r['success']}, pulados: {r['skipped']}, erros: {r['failed']}. "
+                          f"Express salvos: {e['success']}, pulados: {e['skipped']}, erros: {e['failed']}"),
+            )
+            logger.info(f"☁️ Backup no Drive {estado['execucao_id'][:8]} concluído em "
+                        f"{time.monotonic() - inicio:.0f}s: {estado['detalhes']}")
+        except Exception as e:
+            logger.error(f"❌ Backup no Drive {estado['execucao_id'][:8]} falhou: {e}", exc_info=True)
+            execucao.gravar(forcar=True, status=STATUS_ERRO, message=f'Erro ao fazer backup: {e}')
+        finally:
+            execucao.fechar()
+            if lock_file is not None:
+                lock_file.close()
+
+
+def _nova_execucao(usuario_id):
+    grupo = {'total': 0, 'success': 0, 'failed': 0, 'skipped': 0}
+    return {
+        'execucao_id': uuid.uuid4().hex,
+        'status': STATUS_NA_FILA,
+        'criado_em': time.time(),
+        'iniciado_por': usuario_id,
+        'retomadas': 0,
+        'progresso': 0,
+        'results': {nome: dict(grupo) for nome in GRUPOS.values()},
+        'erros': [],
+    }
+
+
+def iniciar(token_info, usuario_id=None, em_segundo_plano=True):
+    """
+    Inicia o backup completo, retoma o último que não terminou ou devolve o que
+    está em andamento.
+
+    Args:
+        token_info: {'token', 'refresh_token'} do usuário no Google Drive
+        usuario_id: Quem pediu o backup (registrado no estado)
+        em_segundo_plano: False executa na thread atual e só retorna no fim
+
+    Returns:
+        dict | None: Estado da execução (None se outro worker acabou de iniciar
+                     uma e ainda não gravou o estado)
+    """
+    from flask import current_app
+
+    app = current_app._get_current_object()
+    pasta = _pasta()
+
+    with _lock:
+        lock_file = _adquirir_lock(pasta)
+        if lock_file is None:
+            return _ultima_execucao(pasta)  # Em andamento em outro worker (ou nesta thread)
+
+        estado = _ultima_execucao(pasta)
+        if estado and estado['status'] != STATUS_CONCLUIDO:
+            # Sem o lock ninguém está executando: o estado parou no meio (worker reiniciado ou erro)
+            estado.update(status=STATUS_NA_FILA, retomadas=estado.get('retomadas', 0) + 1, erros=[])
+            estado.pop('message', None)
+            logger.info(f"⏯️ Retomando backup no Drive {estado['execucao_id'][:8]} "
+                        f"({len(_enviados(pasta, estado['execucao_id']))} PDFs já enviados)")
+        else:
+            estado = _nova_execucao(usuario_id)
+            logger.info(f"☁️ Backup no Drive {estado['execucao_id'][:8]} iniciado")
+        execucao = _Execucao(app, pasta, estado, token_info)
+        execucao.gravar(forcar=True)
+
+    if not em_segundo_plano:
+        _executar(app, execucao, lock_file)
+        return execucao.estado
+
+    threading.Thread(
+        target=_executar, args=(app, execucao, lock_file),
+        name=f"drive-backup-{estado['execucao_id'][:8]}", daemon=True,
+    ).start()
+    return dict(estado)
+
+
+def obter(execucao_id):
+    """
+    Estado da execução (None se não existe). Uma execução "executando" cujo
+    lock está livre parou no meio e é marcada como interrompida.
+    """
+    pasta = _pasta()
+    estado = ler_execucao(pasta, execucao_id)
+    if estado and estado['status'] in (STATUS_NA_FILA, STATUS_EXECUTANDO):
+        with _lock:
+            lock_file = _adquirir_lock(pasta)
+            if lock_file is not None:
+                try:
+                    estado = ler_execucao(pasta, execucao_id)
+                    if fcntl is not None and estado['status'] in (STATUS_NA_FILA, STATUS_EXECUTANDO):
+                        estado['status'] = STATUS_INTERROMPIDO
+                        estado['message'] = 'Backup interrompido; clique em Salvar Backup para retomar'
+                        _gravar_estado(pasta, estado)
+                finally:
+                    lock_file.close()
+    return estado
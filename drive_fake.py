@@ -0,0 +1,498 @@
+"""
+Google Drive local (sem rede) para testes e benchmarks do backup
+
+Implementa, em memória, o subconjunto da API v3 do Drive usado por
+google_drive_backup.py, no nível do transporte HTTP: o cliente continua
+sendo o googleapiclient de verdade (descoberta estática, upload multipart,
+protocolo de upload retomável, requisições em lote), só o httplib2.Http é
+trocado. Assim o que é medido é o mesmo código que fala com o Google.
+
+Operações suportadas:
+- files.list: q com "'<id>' in parents", name, mimeType e trashed (unidos
+  por "and"), pageSize/pageToken
+- files.create: só metadados (pastas), uploadType=multipart e
+  uploadType=resumable (Content-Range, consulta de progresso, 308/Range)
+- files.update (conteúdo e nome), files.copy, files.get, about.get
+- batch (/batch/drive/v3) com qualquer combinação das operações acima
+
+Uso:
+    import drive_fake
+    drive = drive_fake.instalar(latencia=0.05)   # GoogleDriveBackupOAuth passa a usar o Drive local
+    ...backup...
+    print(drive.estatisticas())
+    drive_fake.desinstalar()
+
+Latência por requisição, banda de upload e erros transitórios (503)
+aleatórios podem ser simulados para medir o efeito de paralelismo, lotes e
+novas tentativas.
+"""
+
+import re
+import json
+import time
+import uuid
+import random
+import hashlib
+import threading
+import urllib.parse
+from collections import Counter
+from datetime import datetime, timezone
+from email.parser import FeedParser
+from http.client import responses as RESPOSTAS_HTTP
+
+import httplib2
+
+MIMETYPE_PASTA = 'application/vnd.google-apps.folder'
+
+URL_BASE = 'https://www.googleapis.com'
+
+# Limites da API real
+TAMANHO_PAGINA_PADRAO = 100
+TAMANHO_PAGINA_MAXIMO = 1000
+REQUISICOES_POR_LOTE = 100
+
+_TERMO_CONSULTA = re.compile(r"""
+    \s*(?:
+        '(?P<pai>(?:[^'\\]|\\.)*)'\s+in\s+parents
+      | (?P<campo>name|mimeType)\s*(?P<operador>!?=)\s*'(?P<valor>(?:[^'\\]|\\.)*)'
+      | trashed\s*=\s*(?P<lixeira>true|false)
+    )\s*(?:and\b|$)
+""", re.VERBOSE)
+
+
+class ErroDrive(Exception):
+    """Resposta de erro no formato da API (código HTTP e reason)"""
+
+    def __init__(self, status, mensagem, motivo):
+        super().__init__(mensagem)
+        self.status = status
+        self.motivo = motivo
+
+
+def _agora():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+
+def _desescapar(valor):
+    return re.sub(r"\\(.)", r"\1", valor)
+
+
+def _filtro_consulta(q):
+    """Converte a consulta `q` em um predicado sobre os arquivos"""
+    condicoes = []
+    posicao = 0
+    while posicao < len(q or ''):
+        termo = _TERMO_CONSULTA.match(q, posicao)
+        if not termo or termo.end() == posicao:
+            raise ErroDrive(400, f"Consulta não suportada pelo Drive local: {q[posicao:]!r}", 'invalid')
+        posicao = termo.end()
+        if termo.group('pai') is not None:
+            pai = _desescapar(termo.group('pai'))
+            condicoes.append(lambda f, pai=pai: pai in f['parents'])
+        elif termo.group('campo'):
+            campo, valor = termo.group('campo'), _desescapar(termo.group('valor'))
+            if termo.group('operador') == '=':
+                condicoes.append(lambda f, campo=campo, valor=valor: f[campo] == valor)
+            else:
+                condicoes.append(lambda f, campo=campo, valor=valor: f[campo] != valor)
+        else:
+            lixeira = termo.group('lixeira') == 'true'
+            condicoes.append(lambda f, lixeira=lixeira: f['trashed'] == lixeira)
+    return lambda f: all(condicao(f) for condicao in condicoes)
+
+
+def _partes_multipart(corpo, content_type):
+    """Partes de um corpo multipart/related: [(cabeçalhos em minúsculas, bytes)]"""
+    limite = re.search(r'boundary="?([^";]+)"?', content_type)
+    if not limite:
+        raise ErroDrive(400, "Upload multipart sem boundary", 'badContent')
+    separador = b'--' + limite.group(1).encode()
+    partes = []
+    for bloco in corpo.split(separador)[1:]:
+        if bloco.startswith(b'--'):
+            break
+        bloco = bloco[2:] if bloco.startswith(b'\r\n') else bloco[1:]
+        fim_crlf, fim_lf = bloco.find(b'\r\n\r\n'), bloco.find(b'\n\n')
+        if fim_lf < 0 or (0 <= fim_crlf < fim_lf):
+            cabecalho, dados = bloco[:fim_crlf], bloco[fim_crlf + 4:]
+        else:
+            cabecalho, dados = bloco[:fim_lf], bloco[fim_lf + 2:]
+        # A quebra de linha antes do próximo separador não faz parte dos dados
+        dados = dados[:-2] if dados.endswith(b'\r\n') else dados[:-1] if dados.endswith(b'\n') else dados
+        cabecalhos = {}
+        for linha in cabecalho.decode('latin-1').splitlines():
+            if ':' in linha:
+                nome, valor = linha.split(':', 1)
+                cabecalhos[nome.strip().lower()] = valor.strip()
+        partes.append((cabecalhos, dados))
+    return partes
+
+
+class DriveLocal:
+    """
+    Drive em memória compartilhado por todos os clientes criados a partir dele
+
+    Args:
+        latencia: Segundos de espera por requisição HTTP (um lote conta uma vez)
+        banda: Bytes por segundo de upload (None: ilimitada)
+        taxa_erros: Probabilidade de um envio de mídia responder 503 (erro transitório)
+        guardar_conteudo: Guardar os bytes dos arquivos (conteudo()); senão só tamanho e MD5
+        semente: Semente do sorteio dos erros (medições reprodutíveis)
+    """
+
+    def __init__(self, latencia=0.0, banda=None, taxa_erros=0.0, guardar_conteudo=False, semente=None):
+        self.latencia = latencia
+        self.banda = banda
+        self.taxa_erros = taxa_erros
+        self.guardar_conteudo = guardar_conteudo
+        self._sorteio = random.Random(semente)
+        self._lock = threading.Lock()
+        self._arquivos = {}
+        self._conteudos = {}
+        self._sessoes = {}
+        self._requisicoes = 0
+        self._operacoes = Counter()
+        self._bytes_recebidos = 0
+        self._erros_injetados = 0
+
+    # -------------------------------------------------------------------------
+    # Inspeção (testes e benchmark)
+    # -------------------------------------------------------------------------
+
+    def http(self):
+        """Novo transporte httplib2 para um cliente (um por GoogleDriveBackupOAuth)"""
+        return HttpLocal(self)
+
+    def estatisticas(self):
+        """Requisições HTTP, operações da API, bytes recebidos e totais de arquivos/pastas"""
+        with self._lock:
+            pastas = sum(1 for f in self._arquivos.values() if f['mimeType'] == MIMETYPE_PASTA)
+            return {
+                'requisicoes': self._requisicoes,
+                'operacoes': dict(self._operacoes),
+                'bytes_recebidos': self._bytes_recebidos,
+                'erros_injetados': self._erros_injetados,
+                'pastas': pastas,
+                'arquivos': len(self._arquivos) - pastas,
+                'sessoes_abertas': len(self._sessoes),
+            }
+
+    def zerar_estatisticas(self):
+        with self._lock:
+            self._requisicoes = 0
+            self._operacoes.clear()
+            self._bytes_recebidos = 0
+            self._erros_injetados = 0
+
+    def arquivos(self, pasta_id=None):
+        """Metadados dos arquivos (de uma pasta, se informada), fora da lixeira"""
+        with self._lock:
+            return [dict(f) for f in self._arquivos.values()
+                    if not f['trashed'] and (pasta_id is None or pasta_id in f['parents'])]
+
+    def conteudo(self, file_id):
+        """Bytes de um arquivo (só com guardar_conteudo=True)"""
+        with self._lock:
+            return self._conteudos.get(file_id)
+
+    def apagar(self, file_id):
+        """Remove um arquivo ou pasta (com o conteúdo), como uma exclusão feita pelo usuário no Drive"""
+        with self._lock:
+            pendentes = [file_id]
+            while pendentes:
+                atual = pendentes.pop()
+                pendentes.extend(i for i, f in self._arquivos.items() if atual in f['parents'])
+                self._arquivos.pop(atual, None)
+                self._conteudos.pop(atual, None)
+
+    # -------------------------------------------------------------------------
+    # Operações da API (chamadas com o lock)
+    # -------------------------------------------------------------------------
+
+    def _arquivo(self, file_id):
+        arquivo = self._arquivos.get(file_id)
+        if arquivo is None:
+            raise ErroDrive(404, f"File not found: {file_id}.", 'notFound')
+        return arquivo
+
+    def _novo_arquivo(self, metadados, dados=None, tamanho=0, md5=None):
+        for pai in metadados.get('parents') or []:
+            self._arquivo(pai)
+        file_id = uuid.uuid4().hex
+        agora = _agora()
+        arquivo = {
+            'id': file_id,
+            'name': metadados.get('name') or 'Untitled',
+            'mimeType': metadados.get('mimeType') or 'application/octet-stream',
+            'parents': list(metadados.get('parents') or []),
+            'trashed': False,
+            'createdTime': agora,
+            'modifiedTime': agora,
+            'version': 1,
+            'webViewLink': f"https://drive.local/file/d/{file_id}/view",
+        }
+        if arquivo['mimeType'] != MIMETYPE_PASTA:
+            arquivo.update(size=tamanho, md5Checksum=md5 or hashlib.md5(dados or b'').hexdigest())
+            if self.guardar_conteudo:
+                self._conteudos[file_id] = bytes(dados or b'')
+        self._arquivos[file_id] = arquivo
+        return arquivo
+
+    def _atualizar(self, file_id, metadados, dados=None, tamanho=None, md5=None):
+        arquivo = self._arquivo(file_id)
+        if metadados.get('name'):
+            arquivo['name'] = metadados['name']
+        if tamanho is not None:
+            arquivo.update(size=tamanho, md5Checksum=md5 or hashlib.md5(dados or b'').hexdigest())
+            if self.guardar_conteudo:
+                self._conteudos[file_id] = bytes(dados or b'')
+        arquivo['version'] += 1
+        arquivo['modifiedTime'] = _agora()
+        return arquivo
+
+    def _listar(self, parametros):
+        filtro = _filtro_consulta(parametros.get('q', ''))
+        tamanho = min(int(parametros.get('pageSize') or TAMANHO_PAGINA_PADRAO), TAMANHO_PAGINA_MAXIMO)
+        inicio = int(parametros.get('pageToken') or 0)
+        encontrados = [f for f in self._arquivos.values() if filtro(f)]
+        resposta = {'kind': 'drive#fileList', 'files': [_publico(f) for f in encontrados[inicio:inicio + tamanho]]}
+        if inicio + tamanho < len(encontrados):
+            resposta['nextPageToken'] = str(inicio + tamanho)
+        return resposta
+
+    def _copiar(self, file_id, metadados):
+        origem = self._arquivo(file_id)
+        copia = self._novo_arquivo(
+            {'name': metadados.get('name') or f"Cópia de {origem['name']}", 'mimeType': origem['mimeType'],
+             'parents': metadados.get('parents') or origem['parents']},
+            self._conteudos.get(file_id), origem.get('size', 0), origem.get('md5Checksum'),
+        )
+        return copia
+
+    # -------------------------------------------------------------------------
+    # Roteamento HTTP
+    # -------------------------------------------------------------------------
+
+    def _tratar(self, metodo, uri, cabecalhos, corpo):
+        """Uma requisição da API: (status, cabeçalhos, corpo JSON)"""
+        url = urllib.parse.urlsplit(uri)
+        parametros = dict(urllib.parse.parse_qsl(url.query))
+        caminho = url.path
+        cabecalhos = {k.lower(): v for k, v in (cabecalhos or {}).items()}
+        corpo = corpo.encode() if isinstance(corpo, str) else (corpo or b'')
+
+        if parametros.get('upload_id'):
+            return self._parte_retomavel(parametros['upload_id'], cabecalhos, corpo)
+
+        envio = re.fullmatch(r'/upload/drive/v3/files(?:/([^/]+))?', caminho)
+        if envio:
+            return self._iniciar_envio(metodo, envio.group(1), parametros, cabecalhos, corpo)
+
+        arquivo = re.fullmatch(r'/drive/v3/files(?:/([^/]+))?(/copy)?', caminho)
+        if arquivo:
+            file_id, copia = arquivo.groups()
+            metadados = json.loads(corpo) if corpo else {}
+            if file_id is None and metodo == 'GET':
+                self._operacoes['files.list'] += 1
+                return 200, {}, self._listar(parametros)
+            if file_id is None and metodo == 'POST':
+                self._operacoes['files.create'] += 1
+                return 200, {}, _publico(self._novo_arquivo(metadados))
+            if copia and metodo == 'POST':
+                self._operacoes['files.copy'] += 1
+                return 200, {}, _publico(self._copiar(file_id, metadados))
+            if metodo == 'GET':
+                self._operacoes['files.get'] += 1
+                return 200, {}, _publico(self._arquivo(file_id))
+            if metodo == 'PATCH':
+                self._operacoes['files.update'] += 1
+                return 200, {}, _publico(self._atualizar(file_id, metadados))
+
+        if caminho == '/drive/v3/about' and metodo == 'GET':
+            self._operacoes['about.get'] += 1
+            return 200, {}, {'user': {'displayName': 'Drive local', 'emailAddress': 'drive@local'}}
+
+        raise ErroDrive(400, f"Operação não suportada pelo Drive local: {metodo} {caminho}", 'unsupported')
+
+    def _iniciar_envio(self, metodo, file_id, parametros, cabecalhos, corpo):
+        tipo = parametros.get('uploadType')
+        operacao = 'files.update' if file_id else 'files.create'
+        if tipo == 'multipart':
+            partes = _partes_multipart(corpo, cabecalhos.get('content-type', ''))
+            if len(partes) != 2:
+                raise ErroDrive(400, "Upload multipart deve ter metadados e conteúdo", 'badContent')
+            metadados = json.loads(partes[0][1] or b'{}')
+            metadados.setdefault('mimeType', partes[1][0].get('content-type'))
+            dados = partes[1][1]
+            self._operacoes[f"{operacao} (multipart)"] += 1
+            self._bytes_recebidos += len(dados)
+            if file_id:
+                return 200, {}, _publico(self._atualizar(file_id, metadados, dados, len(dados)))
+            return 200, {}, _publico(self._novo_arquivo(metadados, dados, len(dados)))
+        if tipo == 'resumable':
+            if file_id:
+                self._arquivo(file_id)
+            metadados = json.loads(corpo) if corpo else {}
+            metadados.setdefault('mimeType', cabecalhos.get('x-upload-content-type'))
+            total = cabecalhos.get('x-upload-content-length')
+            upload_id = uuid.uuid4().hex
+            self._sessoes[upload_id] = {
+                'file_id': file_id, 'metadados': metadados, 'total': int(total) if total else None,
+                'recebidos': 0, 'md5': hashlib.md5(), 'dados': bytearray() if self.guardar_conteudo else None,
+            }
+            self._operacoes[f"{operacao} (sessão retomável)"] += 1
+            local = f"{URL_BASE}/upload/drive/v3/files{'/' + file_id if file_id else ''}?uploadType=resumable&upload_id={upload_id}"
+            return 200, {'location': local}, None
+        raise ErroDrive(400, f"uploadType não suportado: {tipo}", 'invalid')
+
+    def _parte_retomavel(self, upload_id, cabecalhos, corpo):
+        sessao = self._sessoes.get(upload_id)
+        if sessao is None:
+            raise ErroDrive(404, "Sessão de upload não encontrada ou expirada", 'notFound')
+        intervalo = re.fullmatch(r'bytes (\*|(\d+)-(\d+))/(\*|\d+)', cabecalhos.get('content-range', 'bytes */*'))
+        if not intervalo:
+            raise ErroDrive(400, "Content-Range inválido", 'badContent')
+        if intervalo.group(4) != '*':
+            sessao['total'] = int(intervalo.group(4))
+
+        if intervalo.group(1) == '*':
+            self._operacoes['upload (consulta de progresso)'] += 1
+        else:
+            inicio = int(intervalo.group(2))
+            self._operacoes['upload (parte)'] += 1
+            if inicio == sessao['recebidos']:
+                sessao['recebidos'] += len(corpo)
+                sessao['md5'].update(corpo)
+                self._bytes_recebidos += len(corpo)
+                if sessao['dados'] is not None:
+                    sessao['dados'].extend(corpo)
+            # Parte fora de ordem: o cliente recomeça do Range informado abaixo
+
+        if sessao['total'] is not None and sessao['recebidos'] >= sessao['total']:
+            del self._sessoes[upload_id]
+            dados, tamanho, md5 = sessao['dados'], sessao['recebidos'], sessao['md5'].hexdigest()
+            if sessao['file_id']:
+                arquivo = self._atualizar(sessao['file_id'], sessao['metadados'], dados, tamanho, md5)
+            else:
+                arquivo = self._novo_arquivo(sessao['metadados'], dados, tamanho, md5)
+            return 200, {}, _publico(arquivo)
+        cabecalhos_resposta = {'range': f"bytes=0-{sessao['recebidos'] - 1}"} if sessao['recebidos'] else {}
+        return 308, cabecalhos_resposta, None
+
+    def _lote(self, cabecalhos, corpo):
+        content_type = {k.lower(): v for k, v in (cabecalhos or {}).items()}.get('content-type', '')
+        parser = FeedParser()
+        parser.feed(f"content-type: {content_type}\r\n\r\n")
+        parser.feed(corpo.decode('utf-8') if isinstance(corpo, bytes) else corpo)
+        mensagem = parser.close()
+        partes = mensagem.get_payload() if mensagem.is_multipart() else []
+        if len(partes) > REQUISICOES_POR_LOTE:
+            raise ErroDrive(400, f"Lote com mais de {REQUISICOES_POR_LOTE} requisições", 'batchSizeTooLarge')
+
+        limite = f"batch_{uuid.uuid4().hex}"
+        saida = []
+        self._operacoes['batch'] += 1
+        for parte in partes:
+            linha, resto = parte.get_payload().split('\n', 1)
+            metodo, caminho, _ = linha.split(' ', 2)
+            sub = FeedParser()
+            sub.feed(resto)
+            requisicao = sub.close()
+            sub_corpo = requisicao.get_payload() or None
+            content_id = re.sub(r'\r?\n(?=[ \t])', '', parte['Content-ID'])  # Cabeçalho longo vem dobrado
+            try:
+                status, _, resposta = self._tratar(metodo, URL_BASE + caminho, dict(requisicao.items()), sub_corpo)
+            except ErroDrive as e:
+                status, resposta = e.status, _erro_json(e)
+            saida.append(
+                f"--{limite}\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id[1:-1]}>\r\n\r\n"
+                f"HTTP/1.1 {status} {RESPOSTAS_HTTP.get(status, '')}\r\n"
+                f"Content-Type: application/json; charset=UTF-8\r\n\r\n{json.dumps(resposta)}\r\n"
+            )
+        saida.append(f"--{limite}--\r\n")
+        return 200, {'content-type': f"multipart/mixed; boundary={limite}"}, ''.join(saida)
+
+    def requisicao(self, uri, metodo, corpo, cabecalhos):
+        """Executa uma requisição HTTP: (httplib2.Response, bytes)"""
+        if hasattr(corpo, 'read'):
+            corpo = corpo.read()  # Partes do upload retomável chegam como objeto de arquivo
+        tamanho_corpo = len(corpo) if corpo else 0
+        espera = self.latencia + (tamanho_corpo / self.banda if self.banda else 0)
+        if espera:
+            time.sleep(espera)  # Fora do lock: requisições de clientes diferentes se sobrepõem
+
+        with self._lock:
+            self._requisicoes += 1
+            envio = urllib.parse.urlsplit(uri).path.startswith('/upload/')
+            if envio and self.taxa_erros and self._sorteio.random() < self.taxa_erros:
+                self._erros_injetados += 1
+                status, extra, resposta = 503, {}, _erro_json(ErroDrive(503, 'Backend Error', 'backendError'))
+            else:
+                try:
+                    if urllib.parse.urlsplit(uri).path == '/batch/drive/v3':
+                        status, extra, resposta = self._lote(cabecalhos, corpo)
+                    else:
+                        status, extra, resposta = self._tratar(metodo, uri, cabecalhos, corpo)
+                except ErroDrive as e:
+                    status, extra, resposta = e.status, {}, _erro_json(e)
+
+        cabecalhos_resposta = {'status': str(status), 'content-type': 'application/json; charset=UTF-8'}
+        cabecalhos_resposta.update(extra)
+        if isinstance(resposta, str):
+            conteudo = resposta.encode('utf-8')
+        else:
+            conteudo = json.dumps(resposta).encode('utf-8') if resposta is not None else b''
+        resposta_http = httplib2.Response(cabecalhos_resposta)
+        resposta_http.reason = RESPOSTAS_HTTP.get(status, '')
+        return resposta_http, conteudo
+
+
+def _publico(arquivo):
+    """Recurso File como a API devolve (size como texto)"""
+    recurso = dict(arquivo, kind='drive#file')
+    if 'size' in recurso:
+        recurso['size'] = str(recurso['size'])
+    return recurso
+
+
+def _erro_json(erro):
+    return {'error': {'code': erro.status, 'message': str(erro),
+                      'errors': [{'reason': erro.motivo, 'message': str(erro)}]}}
+
+
+class HttpLocal:
+    """Substituto do httplib2.Http entregue ao googleapiclient (build(..., http=...))"""
+
+    def __init__(self, drive):
+        self.drive = drive
+        self.timeout = None
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=None, connection_type=None):
+        return self.drive.requisicao(uri, method, body, headers)
+
+    def close(self):
+        pass
+
+
+def instalar(drive=None, **opcoes):
+    """
+    Faz GoogleDriveBackupOAuth usar um DriveLocal em vez da API do Google.
+
+    Args:
+        drive: DriveLocal já criado (senão, um novo com as `opcoes`)
+
+    Returns:
+        O DriveLocal instalado
+    """
+    from google_drive_backup import GoogleDriveBackupOAuth
+
+    drive = drive or DriveLocal(**opcoes)
+    GoogleDriveBackupOAuth.transporte_local = drive.http
+    return drive
+
+
+def desinstalar():
+    from google_drive_backup import GoogleDriveBackupOAuth
+
+    GoogleDriveBackupOAuth.transporte_local = None
@@ -10,22 +10,136 @@ import base64
 import hashlib
 import mimetypes
 import tempfile
-from datetime import datetime
+from collections import namedtuple
 from typing import Optional, List, Dict, Any
 
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import Flow
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload, MediaIoBaseUpload
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaIoBaseUpload
 
 SCOPES = ['https://www.googleapis.com/auth/drive.file']
 
+MIMETYPE_PASTA = 'application/vnd.google-apps.folder'
+
+# Requisições por chamada em lote (limite da API do Drive: 100)
+LOTE_REQUISICOES_DRIVE = 100
+
+# Arquivos até este tamanho vão em uma única requisição (upload multipart,
+# sem abrir sessão); acima dele, upload retomável em partes
+LIMITE_ENVIO_SIMPLES = 5 * 1024 * 1024
+
+# Tamanho de cada parte do upload retomável (a API exige múltiplos de 256 KB)
+TAMANHO_PARTE_ENVIO = 8 * 1024 * 1024
+
+# Novas tentativas (com backoff da própria biblioteca) de cada requisição de upload
+TENTATIVAS_ENVIO_PARTE = 5
+
+
+def _escapar_consulta(valor: str) -> str:
+    """Valor entre aspas simples em uma consulta `q` do Drive"""
+    return valor.replace('\\', '\\\\').replace("'", "\\'")
+
+
+def _erro_404(erro: Exception) -> bool:
+    return isinstance(erro, HttpError) and getattr(erro.resp, 'status', None) == 404
+
+
+def _ler_sessao_envio(caminho: Optional[str]) -> Optional[Dict[str, Any]]:
+    if not caminho:
+        return None
+    try:
+        with open(caminho) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _gravar_sessao_envio(caminho: str, sessao: Dict[str, Any]) -> None:
+    """Gravação atômica: uma sessão cortada no meio não pode ser retomada"""
+    pasta = os.path.dirname(caminho)
+    os.makedirs(pasta, exist_ok=True)
+    fd, temporario = tempfile.mkstemp(dir=pasta, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(sessao, f)
+        os.replace(temporario, caminho)
+    except BaseException:
+        os.unlink(temporario)
+        raise
+
+
+def _remover_sessao_envio(caminho: Optional[str]) -> None:
+    if caminho:
+        try:
+            os.unlink(caminho)
+        except FileNotFoundError:
+            pass
+
+
+def _ler_pastas(caminhos) -> Dict[str, str]:
+    """IDs do cache persistente de pastas (PastaDrive) para os caminhos informados"""
+    from flask import has_app_context
+    
+    caminhos = list(caminhos)
+    if not caminhos or not has_app_context():
+        return {}
+    from models import PastaDrive
+    
+    try:
+        return dict(PastaDrive.query.with_entities(PastaDrive.caminho, PastaDrive.drive_folder_id)
+                    .filter(PastaDrive.caminho.in_(caminhos)))
+    except Exception as e:
+        print(f"⚠️ Cache de pastas do Drive indisponível: {e}")
+        return {}
+
+
+def _gravar_pastas(pastas: Dict[str, str]) -> None:
+    from flask import has_app_context
+    
+    if not pastas or not has_app_context():
+        return
+    from app import db
+    from models import PastaDrive
+    
+    try:
+        for caminho, folder_id in pastas.items():
+            db.session.merge(PastaDrive(caminho=caminho, drive_folder_id=folder_id))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"⚠️ Cache de pastas do Drive não gravado: {e}")
+
+
+def _remover_pastas(caminho: str) -> None:
+    from flask import has_app_context
+    
+    if not has_app_context():
+        return
+    from app import db
+    from models import PastaDrive
+    
+    try:
+        PastaDrive.query.filter(
+            (PastaDrive.caminho == caminho) | PastaDrive.caminho.startswith(f"{caminho}/", autoescape=True)
+        ).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"⚠️ Cache de pastas do Drive não invalidado: {e}")
+
+
 class GoogleDriveBackupOAuth:
     """Sistema de backup para Google Drive usando OAuth 2.0"""
     
+    # Fábrica do transporte HTTP usado no lugar da API do Google (drive_fake.instalar)
+    transporte_local = None
+    
     def __init__(self):
         self.credentials = None
         self.service = None
+        self._pastas = {}  # Caminho -> ID (cache desta instância; o persistente fica em PastaDrive)
         
     def get_oauth_flow(self, redirect_uri: str) -> Flow:
         """
@@ -92,6 +206,12 @@ class GoogleDriveBackupOAuth:
         Args:
             token_info: Dicionário com informações do token
         """
+        if self.transporte_local is not None:
+            # Drive local (testes/benchmark): mesmo cliente googleapiclient, sem OAuth nem rede
+            self.credentials = None
+            self.service = build('drive', 'v3', http=self.transporte_local(), static_discovery=True)
+            return
+        
         client_config = self._get_client_config()
         web_config = client_config.get('web', {})
         
@@ -125,7 +245,7 @@ class GoogleDriveBackupOAuth:
         if not self.service:
             raise Exception("Serviço não inicializado. Faça login primeiro.")
         
-        query = f"name='{folder_name}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
+        query = f"name='{_escapar_consulta(folder_name)}' and mimeType='{MIMETYPE_PASTA}' and trashed=false"
         if parent_id:
             query += f" and '{parent_id}' in parents"
         
@@ -142,7 +262,7 @@ class GoogleDriveBackupOAuth:
         
         file_metadata = {
             'name': folder_name,
-            'mimeType': 'application/vnd.google-apps.folder'
+            'mimeType': MIMETYPE_PASTA
         }
         
         if parent_id:
@@ -155,6 +275,171 @@ class GoogleDriveBackupOAuth:
         
         return folder.get('id')
     
+    def pasta(self, caminho: str, verificar: bool = False) -> str:
+        """
+        ID da pasta pelo caminho ("Backup Fotos/Obra X"), criando as que faltarem
+        
+        Usa o cache desta instância e o persistente (PastaDrive): com o cache
+        quente não há nenhuma chamada à API. Se um ID em cache não existe mais
+        no Drive (404), o caminho é removido do cache e resolvido de novo.
+        
+        Args:
+            caminho: Nomes das pastas separados por "/" (os nomes não podem conter "/")
+            verificar: Confirmar no Drive (uma chamada) que a pasta em cache
+                ainda existe, para quem vai só enviar arquivos para ela
+            
+        Returns:
+            ID da pasta
+        """
+        try:
+            folder_id = self._resolver_pasta(caminho)
+            if verificar:
+                pasta = self.service.files().get(fileId=folder_id, fields='id, trashed').execute()
+                if pasta.get('trashed'):
+                    self.invalidar_pasta(caminho)
+                    folder_id = self._resolver_pasta(caminho)
+            return folder_id
+        except HttpError as e:
+            if not _erro_404(e):
+                raise
+            self.invalidar_pasta(caminho.split('/')[0])
+            return self._resolver_pasta(caminho)
+    
+    def _resolver_pasta(self, caminho: str) -> str:
+        if caminho in self._pastas:
+            return self._pastas[caminho]
+        
+        partes = caminho.split('/')
+        prefixos = ['/'.join(partes[:i]) for i in range(1, len(partes) + 1)]
+        self._pastas.update(_ler_pastas(p for p in prefixos if p not in self._pastas))
+        
+        novas = {}
+        parent_id = None
+        for prefixo, nome in zip(prefixos, partes):
+            if prefixo not in self._pastas:
+                self._pastas[prefixo] = novas[prefixo] = self.find_or_create_folder(nome, parent_id)
+            parent_id = self._pastas[prefixo]
+        _gravar_pastas(novas)
+        return parent_id
+    
+    def subpastas(self, caminho_pai: str, nomes) -> Dict[str, str]:
+        """
+        IDs de várias subpastas de uma pasta, criando as que faltarem
+        
+        As que não estão em cache saem de uma única listagem da pasta pai, e
+        as que não existem são criadas em requisições em lote (até
+        LOTE_REQUISICOES_DRIVE por chamada).
+        
+        Args:
+            caminho_pai: Caminho da pasta pai
+            nomes: Nomes das subpastas
+            
+        Returns:
+            Dicionário nome -> ID
+        """
+        try:
+            return self._resolver_subpastas(caminho_pai, nomes)
+        except HttpError as e:
+            if not _erro_404(e):
+                raise
+            self.invalidar_pasta(caminho_pai.split('/')[0])
+            return self._resolver_subpastas(caminho_pai, nomes)
+    
+    def _resolver_subpastas(self, caminho_pai: str, nomes) -> Dict[str, str]:
+        caminhos = {nome: f"{caminho_pai}/{nome}" for nome in set(nomes)}
+        parent_id = self.pasta(caminho_pai)
+        self._pastas.update(_ler_pastas(c for c in caminhos.values() if c not in self._pastas))
+        
+        sem_cache = [nome for nome, caminho in caminhos.items() if caminho not in self._pastas]
+        if sem_cache:
+            existentes = self.list_files_with_ids(parent_id, only_folders=True)
+            novas = {caminhos[nome]: existentes[nome] for nome in sem_cache if nome in existentes}
+            criadas, erros = self._criar_pastas_em_lote([nome for nome in sem_cache if nome not in existentes], parent_id)
+            novas.update((caminhos[nome], folder_id) for nome, folder_id in criadas.items())
+            self._pastas.update(novas)
+            _gravar_pastas(novas)
+            if erros:
+                raise erros[0]
+        
+        return {nome: self._pastas[caminho] for nome, caminho in caminhos.items()}
+    
+    def _criar_pastas_em_lote(self, nomes: List[str], parent_id: str):
+        """Cria as pastas em requisições em lote; retorna ({nome: ID}, [erros])"""
+        criadas, erros = {}, []
+        
+        def callback(request_id, response, exception):
+            if exception is not None:
+                erros.append(exception)
+            else:
+                criadas[nomes[int(request_id)]] = response['id']
+        
+        for inicio in range(0, len(nomes), LOTE_REQUISICOES_DRIVE):
+            lote = self.service.new_batch_http_request(callback=callback)
+            for indice in range(inicio, min(inicio + LOTE_REQUISICOES_DRIVE, len(nomes))):
+                lote.add(self.service.files().create(
+                    body={'name': nomes[indice], 'mimeType': MIMETYPE_PASTA, 'parents': [parent_id]},
+                    fields='id'
+                ), request_id=str(indice))
+            lote.execute()
+        return criadas, erros
+    
+    def invalidar_pasta(self, caminho: str):
+        """Remove o caminho e as subpastas dele dos caches (ID não existe mais no Drive)"""
+        print(f"⚠️ Pasta '{caminho}' não encontrada no Drive - removendo do cache")
+        for chave in [c for c in self._pastas if c == caminho or c.startswith(f"{caminho}/")]:
+            del self._pastas[chave]
+        _remover_pastas(caminho)
+    
+    def list_files_in_folders(self, folder_ids: List[str]) -> Dict[str, Dict[str, str]]:
+        """
+        Listar os arquivos de várias pastas com requisições em lote
+        
+        Args:
+            folder_ids: IDs das pastas
+            
+        Returns:
+            Dicionário ID da pasta -> {nome do arquivo: ID} (pastas que não
+            existem mais no Drive ficam fora do resultado)
+        """
+        if not self.service:
+            raise Exception("Serviço não inicializado. Faça login primeiro.")
+        
+        arquivos = {folder_id: {} for folder_id in folder_ids}
+        pendentes = {folder_id: None for folder_id in folder_ids}  # ID -> pageToken
+        erros = []
+        
+        while pendentes:
+            proximas = {}
+            
+            def callback(request_id, response, exception):
+                if _erro_404(exception):
+                    arquivos.pop(request_id, None)
+                    return
+                if exception is not None:
+                    erros.append(exception)
+                    return
+                arquivos[request_id].update((f['name'], f['id']) for f in response.get('files', []))
+                if response.get('nextPageToken'):
+                    proximas[request_id] = response['nextPageToken']
+            
+            ids = list(pendentes)
+            for inicio in range(0, len(ids), LOTE_REQUISICOES_DRIVE):
+                lote = self.service.new_batch_http_request(callback=callback)
+                for folder_id in ids[inicio:inicio + LOTE_REQUISICOES_DRIVE]:
+                    lote.add(self.service.files().list(
+                        q=f"'{folder_id}' in parents and trashed=false",
+                        spaces='drive',
+                        fields='nextPageToken, files(id, name)',
+                        pageSize=1000,
+                        pageToken=pendentes[folder_id]
+                    ), request_id=folder_id)
+                lote.execute()
+            if erros:
+                raise erros[0]
+            pendentes = proximas
+        
+        return arquivos
+    
     def list_files_in_folder(self, folder_id: str) -> List[str]:
         """
         Listar nomes de arquivos em uma pasta
@@ -183,6 +468,40 @@ class GoogleDriveBackupOAuth:
             print(f"Erro ao listar arquivos: {e}")
             return []
     
+    def list_files_with_ids(self, folder_id: str, only_folders: bool = False) -> Dict[str, str]:
+        """
+        Listar todos os arquivos de uma pasta, com paginação
+        
+        Args:
+            folder_id: ID da pasta
+            only_folders: Listar só as subpastas
+            
+        Returns:
+            Dicionário nome do arquivo -> ID
+        """
+        if not self.service:
+            raise Exception("Serviço não inicializado. Faça login primeiro.")
+        
+        query = f"'{folder_id}' in parents and trashed=false"
+        if only_folders:
+            query += f" and mimeType='{MIMETYPE_PASTA}'"
+        
+        arquivos = {}
+        page_token = None
+        while True:
+            results = self.service.files().list(
+                q=query,
+                spaces='drive',
+                fields='nextPageToken, files(id, name)',
+                pageSize=1000,
+                pageToken=page_token
+            ).execute()
+            for f in results.get('files', []):
+                arquivos[f['name']] = f['id']
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return arquivos
+    
     def file_exists_in_folder(self, filename: str, folder_id: str) -> bool:
         """
         Verificar se arquivo existe na pasta
@@ -226,22 +545,134 @@ class GoogleDriveBackupOAuth:
         if not self.service:
             raise Exception("Serviço não inicializado. Faça login primeiro.")
         
-        file_metadata = {
-            'name': filename,
-            'parents': [folder_id]
-        }
+        return self.upload_stream(io.BytesIO(pdf_bytes), len(pdf_bytes), filename, folder_id, mimetype)
+    
+    def upload_stream(self, arquivo, tamanho: int, filename: str, folder_id: str, mimetype: str,
+                      sessao: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Upload de um objeto de arquivo (read/seek), lido uma parte por vez
+        
+        Até LIMITE_ENVIO_SIMPLES o arquivo vai em uma única requisição; acima
+        disso, em partes de TAMANHO_PARTE_ENVIO por upload retomável.
+        
+        Args:
+            arquivo: Objeto de arquivo "seekable" (ex.: photo_storage.ArquivoEmPartes)
+            tamanho: Tamanho em bytes
+            filename: Nome do arquivo
+            folder_id: ID da pasta de destino
+            mimetype: Tipo MIME do arquivo
+            sessao: Caminho de um JSON onde guardar a sessão do upload retomável:
+                um upload interrompido continua de onde parou na próxima chamada
+            
+        Returns:
+            Informações do arquivo enviado
+        """
+        if not self.service:
+            raise Exception("Serviço não inicializado. Faça login primeiro.")
         
-        media = MediaIoBaseUpload(
-            io.BytesIO(pdf_bytes),
-            mimetype=mimetype,
-            resumable=True
+        return self._enviar_midia(
+            lambda media: self.service.files().create(
+                body={'name': filename, 'parents': [folder_id]},
+                media_body=media,
+                fields='id, name, webViewLink'
+            ),
+            arquivo, tamanho, mimetype, sessao, destino=(filename, folder_id)
         )
+    
+    def _enviar_midia(self, requisicao, arquivo, tamanho: int, mimetype: str,
+                      sessao: Optional[str] = None, destino=None) -> Dict[str, Any]:
+        """Executa `requisicao(media)` enviando o arquivo em uma requisição ou em partes retomáveis"""
+        if tamanho <= LIMITE_ENVIO_SIMPLES:
+            file = requisicao(
+                MediaIoBaseUpload(arquivo, mimetype=mimetype, resumable=False)
+            ).execute(num_retries=TENTATIVAS_ENVIO_PARTE)
+        else:
+            file = self._enviar_em_partes(requisicao, arquivo, tamanho, mimetype, sessao, destino)
         
-        file = self.service.files().create(
-            body=file_metadata,
-            media_body=media,
+        return {
+            'id': file.get('id'),
+            'name': file.get('name'),
+            'link': file.get('webViewLink')
+        }
+    
+    def _enviar_em_partes(self, requisicao, arquivo, tamanho, mimetype, sessao, destino):
+        identificacao = {'tamanho': tamanho, 'destino': list(destino) if destino else None}
+        anterior = _ler_sessao_envio(sessao)
+        if anterior and {k: anterior.get(k) for k in identificacao} != identificacao:
+            anterior = None  # Sessão de outro arquivo/destino
+        
+        request = requisicao(MediaIoBaseUpload(
+            arquivo, mimetype=mimetype, chunksize=TAMANHO_PARTE_ENVIO, resumable=True
+        ))
+        response = None
+        try:
+            if anterior:
+                print(f"🔁 Retomando upload de {destino[0] if destino else 'arquivo'} ({tamanho} bytes)")
+                response = self._retomar_sessao(request, anterior['uri'], tamanho)
+            while response is None:
+                _, response = request.next_chunk(num_retries=TENTATIVAS_ENVIO_PARTE)
+                if response is None and sessao and request.resumable_uri:
+                    _gravar_sessao_envio(sessao, dict(identificacao, uri=request.resumable_uri,
+                                                      enviados=request.resumable_progress))
+        except HttpError as e:
+            status = getattr(e.resp, 'status', None)
+            if status in (404, 410):
+                # Sessão expirada (validade de uma semana): recomeçar do zero
+                _remover_sessao_envio(sessao)
+                if anterior:
+                    return self._enviar_em_partes(requisicao, arquivo, tamanho, mimetype, sessao, destino)
+            elif status is not None and 400 <= status < 500 and status not in (408, 429):
+                _remover_sessao_envio(sessao)  # Erro permanente: não há o que retomar
+            raise
+        
+        _remover_sessao_envio(sessao)
+        return response
+    
+    @staticmethod
+    def _retomar_sessao(request, uri, tamanho):
+        """
+        Consultar no Drive quantos bytes da sessão já chegaram e continuar dali
+        
+        PUT vazio com "Content-Range: bytes */<tamanho>": 308 traz o Range já
+        recebido; 200/201 indica que o upload já tinha terminado.
+        
+        Returns:
+            Resposta do Drive se o upload já terminou, senão None
+        """
+        resp, content = request.http.request(uri, method='PUT', headers={
+            'Content-Length': '0',
+            'Content-Range': f'bytes */{tamanho}',
+        })
+        if resp.status in (200, 201):
+            return request.postproc(resp, content)
+        if resp.status != 308:
+            raise HttpError(resp, content, uri=uri)
+        
+        intervalo = resp.get('range')
+        request.resumable_uri = uri
+        request.resumable_progress = int(intervalo.split('-')[-1]) + 1 if intervalo else 0
+        return None
+    
+    def copy_file(self, file_id: str, filename: str, folder_id: str) -> Dict[str, Any]:
+        """
+        Copiar um arquivo dentro do próprio Drive (nenhum byte é enviado)
+        
+        Args:
+            file_id: ID do arquivo de origem
+            filename: Nome da cópia
+            folder_id: ID da pasta de destino
+            
+        Returns:
+            Informações da cópia
+        """
+        if not self.service:
+            raise Exception("Serviço não inicializado. Faça login primeiro.")
+        
+        file = self.service.files().copy(
+            fileId=file_id,
+            body={'name': filename, 'parents': [folder_id]},
             fields='id, name, webViewLink'
-        ).execute()
+        ).execute(num_retries=TENTATIVAS_ENVIO_PARTE)
         
         return {
             'id': file.get('id'),
@@ -249,6 +680,32 @@ class GoogleDriveBackupOAuth:
             'link': file.get('webViewLink')
         }
     
+    def update_pdf_bytes(self, file_id: str, pdf_bytes: bytes, filename: str, mimetype: str = 'application/pdf') -> Dict[str, Any]:
+        """
+        Substituir o conteúdo de um arquivo já existente no Drive (nova revisão, mesmo ID)
+        
+        Args:
+            file_id: ID do arquivo no Drive
+            pdf_bytes: Novo conteúdo
+            filename: Novo nome do arquivo
+            mimetype: Tipo MIME do arquivo (default: application/pdf)
+            
+        Returns:
+            Informações do arquivo atualizado
+        """
+        if not self.service:
+            raise Exception("Serviço não inicializado. Faça login primeiro.")
+        
+        return self._enviar_midia(
+            lambda media: self.service.files().update(
+                fileId=file_id,
+                body={'name': filename},
+                media_body=media,
+                fields='id, name, webViewLink'
+            ),
+            io.BytesIO(pdf_bytes), len(pdf_bytes), mimetype
+        )
+    
     def upload_file(self, file_path: str, folder_id: str, filename: str = None) -> Dict[str, Any]:
         """
         Upload de arquivo para o Drive
@@ -270,24 +727,9 @@ class GoogleDriveBackupOAuth:
         if not filename:
             filename = os.path.basename(file_path)
         
-        file_metadata = {
-            'name': filename,
-            'parents': [folder_id]
-        }
-        
-        media = MediaFileUpload(file_path, resumable=True)
-        
-        file = self.service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields='id, name, webViewLink'
-        ).execute()
-        
-        return {
-            'id': file.get('id'),
-            'name': file.get('name'),
-            'link': file.get('webViewLink')
-        }
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        with open(file_path, 'rb') as arquivo:
+            return self.upload_stream(arquivo, os.path.getsize(file_path), filename, folder_id, mimetype)
     
     def test_connection(self) -> Dict[str, Any]:
         """
@@ -362,147 +804,223 @@ def exchange_code_for_token(code: str, redirect_uri: str, code_verifier: str = N
     return drive_backup.authorize_with_code(code, redirect_uri, code_verifier=code_verifier)
 
 
-def backup_all_reports_to_drive(token_info: Dict[str, Any], db_session, Relatorio, FotoRelatorio, RelatorioExpress, FotoRelatorioExpress, WeasyPrintReportGenerator) -> Dict[str, Any]:
+# Status dos relatórios incluídos no backup completo (comparação sem maiúsculas/minúsculas)
+STATUS_BACKUP = ['aprovado', 'finalizado', 'aprovado final']
+
+# Relatório a enviar no backup completo; chave: "tipo:id" (log de retomada de drive_backup_jobs);
+# digital: impressão digital do conteúdo (manifesto); arquivo_id: arquivo já no Drive a atualizar
+ItemBackupPdf = namedtuple('ItemBackupPdf', 'tipo id numero filename_base chave descricao digital arquivo_id')
+
+# Relatórios por consulta no cálculo das impressões digitais do planejamento
+LOTE_PLANEJAMENTO = 500
+
+# Nomes gravados pelo backup: <nome base>_<AAAAMMDD>.pdf
+TAMANHO_SUFIXO_DATA = len('_AAAAMMDD.pdf')
+
+
+def _nome_limpo(nome: str) -> str:
+    return ''.join(c for c in nome if c.isalnum() or c in (' ', '-', '_'))[:50]
+
+
+def _arquivos_por_nome_base(backup_instance: 'GoogleDriveBackupOAuth', pasta_id: str) -> Dict[str, str]:
+    """PDFs já existentes na pasta (backups anteriores ao manifesto): {nome base: ID}"""
+    return {
+        nome[:-TAMANHO_SUFIXO_DATA]: arquivo_id
+        for nome, arquivo_id in backup_instance.list_files_with_ids(pasta_id).items()
+        if nome.endswith('.pdf')
+    }
+
+
+def planejar_backup_pdfs(backup_instance: 'GoogleDriveBackupOAuth', enviados=None) -> Dict[str, Dict[str, Any]]:
     """
-    Fazer backup de todos os relatórios para o Google Drive
+    Relatórios aprovados que precisam ir para o Drive no backup completo
+    
+    Compara a impressão digital do conteúdo de cada relatório (calculada em
+    lotes, só com metadados) com a do manifesto (ManifestoBackupDrive): só os
+    relatórios novos ou alterados desde o último envio entram no plano. No
+    primeiro backup com manifesto, os PDFs já existentes na pasta (mesmo nome
+    base) são adotados no manifesto em vez de enviados de novo.
+    
+    Na retomada, os envios do log que não chegaram ao manifesto (processo
+    morto entre o envio e o registro) são gravados nele antes do plano; sem
+    isso o próximo backup criaria arquivos duplicados no Drive.
     
     Args:
-        token_info: Token de autenticação
-        db_session: Sessão do banco de dados
-        Relatorio: Model de relatório
-        FotoRelatorio: Model de fotos
-        RelatorioExpress: Model de relatório express
-        FotoRelatorioExpress: Model de fotos express
-        WeasyPrintReportGenerator: Gerador de PDF
+        backup_instance: Instância autenticada (cria as pastas)
+        enviados: PDFs já enviados nesta execução (retomada), pelo log de
+            drive_backup_jobs: {chave "tipo:id": {'file_id', 'filename', 'digital'}}
         
     Returns:
-        Resultado do backup
+        {tipo: {'pasta_id', 'total', 'skipped', 'enviados', 'itens': [ItemBackupPdf]}}
     """
-    backup_instance = GoogleDriveBackupOAuth()
-    backup_instance.set_credentials_from_token(token_info)
-    
-    relatorio_folder_id = backup_instance.find_or_create_folder('Relatorio')
-    express_folder_id = backup_instance.find_or_create_folder('Relatorio Express')
-    
-    results = {
-        'relatorios': {'total': 0, 'success': 0, 'failed': 0, 'files': []},
-        'express': {'total': 0, 'success': 0, 'failed': 0, 'files': []}
-    }
-    
-    generator = WeasyPrintReportGenerator()
-    
-    # Usar case-insensitive para capturar todas as variações de status
     from sqlalchemy import func
-    relatorios = Relatorio.query.filter(
-        func.lower(Relatorio.status).in_(['aprovado', 'finalizado', 'aprovado final'])
-    ).all()
-    results['relatorios']['total'] = len(relatorios)
+    from sqlalchemy.orm import joinedload
+    from app import db
+    from models import Relatorio, RelatorioExpress, ManifestoBackupDrive
+    import pdf_cache
     
-    # Obter lista de arquivos existentes na pasta para verificar duplicados
-    existing_files_relatorio = backup_instance.list_files_in_folder(relatorio_folder_id)
+    enviados = enviados or {}
+    consultas = {
+        pdf_cache.TIPO_RELATORIO: (
+            'Relatorio', 'Relatorio', 'Relatório', Relatorio,
+            Relatorio.query.options(joinedload(Relatorio.projeto), joinedload(Relatorio.autor)),
+            lambda relatorio: relatorio.projeto.nome if relatorio.projeto else 'Sem_Projeto',
+        ),
+        pdf_cache.TIPO_EXPRESS: (
+            'Relatorio Express', 'Express', 'Relatório Express', RelatorioExpress,
+            RelatorioExpress.query.options(joinedload(RelatorioExpress.autor)),
+            lambda express: express.obra_nome or 'Express',
+        ),
+    }
     
-    # Adicionar contadores de duplicados
-    results['relatorios']['skipped'] = 0
-    results['express']['skipped'] = 0
+    plano = {}
+    for tipo, (pasta, prefixo, rotulo, modelo, consulta, obra_nome) in consultas.items():
+        pasta_id = backup_instance.pasta(pasta, verificar=True)
+        # {relatorio_id: (impressão digital enviada, ID do arquivo)}
+        manifesto = {
+            relatorio_id: (digital, arquivo_id)
+            for relatorio_id, digital, arquivo_id in db.session.query(
+                ManifestoBackupDrive.relatorio_id, ManifestoBackupDrive.impressao_digital, ManifestoBackupDrive.drive_file_id
+            ).filter(ManifestoBackupDrive.tipo == tipo)
+        }
+        _recuperar_manifesto(tipo, enviados, manifesto)
+        anteriores = {} if manifesto else _arquivos_por_nome_base(backup_instance, pasta_id)
+        
+        ids = [relatorio_id for (relatorio_id,) in db.session.query(modelo.id).filter(
+            func.lower(modelo.status).in_(STATUS_BACKUP)
+        ).order_by(modelo.id)]
+        grupo = {'pasta_id': pasta_id, 'total': len(ids), 'skipped': 0, 'enviados': 0, 'itens': []}
+        
+        for inicio in range(0, len(ids), LOTE_PLANEJAMENTO):
+            relatorios = consulta.filter(modelo.id.in_(ids[inicio:inicio + LOTE_PLANEJAMENTO])).order_by(modelo.id).all()
+            digitais = pdf_cache.impressoes_em_lote(tipo, relatorios, layout=False)
+            for relatorio in relatorios:
+                chave = f"{tipo}:{relatorio.id}"
+                if chave in enviados:
+                    grupo['enviados'] += 1
+                    continue
+                digital = digitais[relatorio.id]
+                digital_enviada, arquivo_id = manifesto.get(relatorio.id, (None, None))
+                if digital_enviada == digital:
+                    grupo['skipped'] += 1
+                    continue
+                
+                filename_base = f"{prefixo}_{relatorio.numero.replace('/', '_')}_{_nome_limpo(obra_nome(relatorio))}"
+                if arquivo_id is None and filename_base in anteriores:
+                    db.session.add(ManifestoBackupDrive(
+                        tipo=tipo, relatorio_id=relatorio.id, impressao_digital=digital,
+                        drive_file_id=anteriores[filename_base],
+                    ))
+                    grupo['skipped'] += 1
+                    continue
+                grupo['itens'].append(ItemBackupPdf(
+                    tipo, relatorio.id, relatorio.numero, filename_base, chave,
+                    f"{rotulo} {relatorio.numero}", digital, arquivo_id,
+                ))
+            db.session.commit()  # Arquivos adotados
+            db.session.expunge_all()
+        plano[tipo] = grupo
+    return plano
+
+
+def _recuperar_manifesto(tipo: str, enviados: Dict[str, Dict[str, Any]], manifesto: Dict[int, tuple]) -> None:
+    """Grava no manifesto os envios do log de retomada que não foram registrados (atualiza `manifesto`)"""
+    prefixo_chave = f"{tipo}:"
+    recuperados = []
+    for chave, registro in enviados.items():
+        if not chave.startswith(prefixo_chave) or not registro.get('file_id'):
+            continue
+        relatorio_id = int(chave[len(prefixo_chave):])
+        # Logs antigos não têm a impressão digital: o próximo backup atualiza o mesmo arquivo
+        digital = registro.get('digital') or ''
+        digital_registrada, arquivo_id = manifesto.get(relatorio_id, (None, None))
+        if arquivo_id == registro['file_id'] and (digital_registrada == digital or not digital):
+            continue
+        item = ItemBackupPdf(tipo, relatorio_id, None, None, chave, None, digital, None)
+        recuperados.append((item, {'id': registro['file_id'], 'name': registro.get('filename')}))
+        manifesto[relatorio_id] = (digital, registro['file_id'])
+    if recuperados:
+        registrar_manifesto(tipo, recuperados)
+        print(f"🧾 Manifesto: {len(recuperados)} envios da execução interrompida registrados ({tipo})")
+
+
+def enviar_pdf_backup(backup_instance: 'GoogleDriveBackupOAuth', item: ItemBackupPdf, pdf_bytes: bytes, filename: str, pasta_id: str) -> Dict[str, Any]:
+    """
+    Enviar o PDF de um item do backup completo: atualiza o arquivo registrado
+    no manifesto (nova revisão, mesmo ID) ou cria um novo
     
-    for relatorio in relatorios:
+    Returns:
+        Informações do arquivo no Drive
+    """
+    if item.arquivo_id:
         try:
-            projeto_nome = relatorio.projeto.nome if relatorio.projeto else 'Sem_Projeto'
-            projeto_nome = ''.join(c for c in projeto_nome if c.isalnum() or c in (' ', '-', '_'))[:50]
-            
-            # Usar nome base para verificar duplicados (sem data)
-            filename_base = f"Relatorio_{relatorio.numero.replace('/', '_')}_{projeto_nome}"
-            
-            # Verificar se já existe um arquivo com este nome base
-            duplicado = any(f.startswith(filename_base) for f in existing_files_relatorio)
-            
-            if duplicado:
-                print(f"⏭️ Relatório {relatorio.numero} já existe no Drive - pulando")
-                results['relatorios']['skipped'] += 1
-                continue
-            
-            fotos = FotoRelatorio.query.filter_by(relatorio_id=relatorio.id).order_by(FotoRelatorio.ordem).all()
-            
-            pdf_bytes = generator.generate_report_pdf(relatorio, fotos)
-            
-            filename = f"{filename_base}_{datetime.now().strftime('%Y%m%d')}.pdf"
-            
-            file_info = backup_instance.upload_pdf_bytes(pdf_bytes, filename, relatorio_folder_id)
-            
-            results['relatorios']['success'] += 1
-            results['relatorios']['files'].append({
-                'numero': relatorio.numero,
-                'filename': filename,
-                'link': file_info.get('link')
-            })
-            
-        except Exception as e:
-            results['relatorios']['failed'] += 1
-            print(f"Erro ao fazer backup do relatório {relatorio.id}: {str(e)}")
+            return backup_instance.update_pdf_bytes(item.arquivo_id, pdf_bytes, filename)
+        except HttpError as e:
+            if getattr(e.resp, 'status', None) != 404:
+                raise
+            print(f"⚠️ {item.descricao}: arquivo removido do Drive - enviando de novo")
+    return backup_instance.upload_pdf_bytes(pdf_bytes, filename, pasta_id)
+
+
+def registrar_manifesto(tipo: str, envios) -> None:
+    """
+    Gravar no manifesto os PDFs enviados (um commit por chamada)
     
-    # Usar case-insensitive para capturar todas as variações de status
-    relatorios_express = RelatorioExpress.query.filter(
-        func.lower(RelatorioExpress.status).in_(['aprovado', 'finalizado', 'aprovado final'])
-    ).all()
-    results['express']['total'] = len(relatorios_express)
+    Args:
+        tipo: pdf_cache.TIPO_RELATORIO ou TIPO_EXPRESS
+        envios: Lista de (ItemBackupPdf, informações do arquivo no Drive)
+    """
+    from app import db
+    from models import ManifestoBackupDrive, brazil_now
     
-    # Obter lista de arquivos existentes na pasta para verificar duplicados
-    existing_files_express = backup_instance.list_files_in_folder(express_folder_id)
+    if not envios:
+        return
+    registros = {
+        registro.relatorio_id: registro
+        for registro in ManifestoBackupDrive.query.filter(
+            ManifestoBackupDrive.tipo == tipo,
+            ManifestoBackupDrive.relatorio_id.in_([item.id for item, _ in envios]),
+        )
+    }
+    for item, arquivo in envios:
+        registro = registros.get(item.id)
+        if registro is None:
+            registro = ManifestoBackupDrive(tipo=tipo, relatorio_id=item.id)
+            db.session.add(registro)
+        registro.impressao_digital = item.digital
+        registro.drive_file_id = arquivo['id']
+        registro.filename = arquivo.get('name')
+        registro.enviado_em = brazil_now()
+    db.session.commit()
+
+
+def backup_all_reports_to_drive(token_info: Dict[str, Any], db_session=None, Relatorio=None, FotoRelatorio=None, RelatorioExpress=None, FotoRelatorioExpress=None, WeasyPrintReportGenerator=None) -> Dict[str, Any]:
+    """
+    Fazer backup de todos os relatórios para o Google Drive, na thread atual
     
-    # Importar função de geração de PDF Express (mesma usada no botão "Baixar PDF")
-    from pdf_generator_express import gerar_pdf_relatorio_express
+    Usa o mesmo motor do backup em segundo plano (drive_backup_jobs): PDFs em
+    lotes, envios em paralelo com retentativas e retomada da última execução
+    que não terminou. A rota /admin/drive/backup-all-pdfs usa
+    drive_backup_jobs.iniciar diretamente, sem prender a requisição.
     
-    for express in relatorios_express:
-        try:
-            obra_nome = express.obra_nome or 'Express'
-            obra_nome = ''.join(c for c in obra_nome if c.isalnum() or c in (' ', '-', '_'))[:50]
-            
-            # Usar nome base para verificar duplicados (sem data)
-            filename_base = f"Express_{express.numero.replace('/', '_')}_{obra_nome}"
-            
-            # Verificar se já existe um arquivo com este nome base
-            duplicado = any(f.startswith(filename_base) for f in existing_files_express)
-            
-            if duplicado:
-                print(f"⏭️ Relatório Express {express.numero} já existe no Drive - pulando")
-                results['express']['skipped'] += 1
-                continue
-            
-            # Usar a mesma função de geração de PDF do botão "Baixar PDF"
-            pdf_result = gerar_pdf_relatorio_express(express.id, salvar_arquivo=False)
-            
-            # Verificar se retornou bytes ou BytesIO
-            if hasattr(pdf_result, 'read'):
-                pdf_bytes = pdf_result.read()
-            elif isinstance(pdf_result, bytes):
-                pdf_bytes = pdf_result
-            else:
-                raise Exception(f"Formato de PDF inesperado: {type(pdf_result)}")
-            
-            filename = f"{filename_base}_{datetime.now().strftime('%Y%m%d')}.pdf"
-            
-            file_info = backup_instance.upload_pdf_bytes(pdf_bytes, filename, express_folder_id)
-            
-            results['express']['success'] += 1
-            results['express']['files'].append({
-                'numero': express.numero,
-                'filename': filename,
-                'link': file_info.get('link')
-            })
-            
-            print(f"✅ Relatório Express {express.numero} salvo no Drive")
-            
-        except Exception as e:
-            results['express']['failed'] += 1
-            import traceback
-            print(f"❌ Erro ao fazer backup do relatório express {express.id} ({express.numero}): {str(e)}")
-            print(f"   Traceback: {traceback.format_exc()}")
+    Args:
+        token_info: Token de autenticação
+        db_session, Relatorio, FotoRelatorio, RelatorioExpress, FotoRelatorioExpress,
+        WeasyPrintReportGenerator: Mantidos por compatibilidade (não usados)
+        
+    Returns:
+        Resultado do backup
+    """
+    import drive_backup_jobs
     
+    estado = drive_backup_jobs.iniciar(token_info, em_segundo_plano=False)
+    if estado is None:
+        return {'success': False, 'message': 'Backup já em andamento'}
     return {
-        'success': True,
-        'message': f"Backup concluído! Relatórios: {results['relatorios']['success']}/{results['relatorios']['total']}, Express: {results['express']['success']}/{results['express']['total']}",
-        'results': results,
-        'detalhes': f"Relatórios salvos: {results['relatorios']['success']}, pulados: {results['relatorios']['skipped']}, erros: {results['relatorios']['failed']}. Express salvos: {results['express']['success']}, pulados: {results['express']['skipped']}, erros: {results['express']['failed']}"
+        'success': estado['status'] == drive_backup_jobs.STATUS_CONCLUIDO,
+        'message': estado.get('message') or 'Backup já em andamento',
+        'results': estado['results'],
+        'detalhes': estado.get('detalhes', ''),
     }
 
 
@@ -533,6 +1051,63 @@ def backup_to_drive(report_data: Dict[str, Any], project_name: str) -> Dict[str,
     }
 
 
+def _origem_foto(foto, upload_folder: str, nome_padrao: str):
+    """
+    Origem dos bytes de uma foto para o backup, sem carregá-los na memória
+    
+    Bytes no banco (BYTEA da própria linha ou blob store) são lidos em partes
+    por photo_storage.ArquivoEmPartes; fotos antigas caem para o disco. O
+    hash é o imagem_hash da foto ou, nas fotos legadas sem hash, o SHA-256
+    calculado lendo os bytes em partes.
+    
+    Returns:
+        (arquivo, tamanho, hash, nome de origem, None) ou (None, None, None, None, mensagem de erro)
+    """
+    from photo_storage import abrir_leitura_em_partes
+    
+    # PRIORIDADE 1: Bytes no banco (linha da foto ou blob store)
+    leitura = abrir_leitura_em_partes(foto)
+    if leitura is not None:
+        imagem_hash = foto.imagem_hash
+        if not imagem_hash:
+            sha = hashlib.sha256()
+            for parte in leitura:
+                sha.update(parte)
+            imagem_hash = sha.hexdigest()
+        nome = foto.filename or foto.filename_original or foto.filename_anotada or nome_padrao
+        return leitura.como_arquivo(), leitura.tamanho, imagem_hash, nome, None
+    
+    # Fallback: Tentar ler do disco (caso fotos antigas)
+    local_filename = foto.filename or foto.filename_original or foto.filename_anotada
+    if not local_filename:
+        return None, None, None, None, f"Foto {foto.id} sem dados"
+    
+    file_path = os.path.join(upload_folder, local_filename)
+    if not os.path.exists(file_path):
+        # Tentar procurar apenas pelo basename
+        file_path = os.path.join(upload_folder, os.path.basename(local_filename))
+    if not os.path.exists(file_path):
+        return None, None, None, None, f"Arquivo não encontrado: {local_filename}"
+    
+    try:
+        arquivo = open(file_path, 'rb')
+        sha = hashlib.sha256()
+        for parte in iter(lambda: arquivo.read(TAMANHO_PARTE_ENVIO), b''):
+            sha.update(parte)
+        return arquivo, os.path.getsize(file_path), sha.hexdigest(), local_filename, None
+    except Exception as e:
+        return None, None, None, None, f"Erro lendo arquivo {local_filename}: {str(e)}"
+
+
+def _sessao_envio_foto(imagem_hash: str) -> Optional[str]:
+    """JSON da sessão de upload retomável de uma foto grande (None fora da aplicação)"""
+    from flask import current_app, has_app_context
+    
+    if not has_app_context() or not current_app.config.get('DRIVE_BACKUP_FOLDER'):
+        return None
+    return os.path.join(current_app.config['DRIVE_BACKUP_FOLDER'], 'envios', f"{imagem_hash}.json")
+
+
 def backup_photos_to_drive(token_info: Dict[str, Any], db_session, Relatorio, FotoRelatorio, RelatorioExpress, FotoRelatorioExpress, upload_folder: str = 'uploads') -> Dict[str, Any]:
     """
     Fazer backup de TODAS as fotos para o Google Drive
@@ -542,6 +1117,13 @@ def backup_photos_to_drive(token_info: Dict[str, Any], db_session, Relatorio, Fo
         - [Data (YYYY-MM-DD)] - [Tipo: Relatorio ou Express] - [Numero]
           - Fotos...
     
+    Fotos já registradas no manifesto (FotoBackupDrive) são contadas como
+    puladas sem ler os bytes nem chamar a API; só os relatórios com fotos
+    pendentes têm as pastas resolvidas (cache de pastas, criação em lote) e
+    listadas (requisições em lote). Uma foto cujo conteúdo (imagem_hash) já
+    foi enviado é copiada no próprio Drive; as demais são enviadas em partes,
+    lidas direto do banco, com retomada dos uploads grandes interrompidos.
+    
     Args:
         token_info: Token de autenticação
         db_session: Sessão do banco de dados
@@ -553,247 +1135,194 @@ def backup_photos_to_drive(token_info: Dict[str, Any], db_session, Relatorio, Fo
     Returns:
         Resultado do backup
     """
+    from sqlalchemy import func, exists, and_
+    from sqlalchemy.orm import joinedload
+    from models import FotoBackupDrive
+    import pdf_cache
+    
     backup_instance = GoogleDriveBackupOAuth()
     backup_instance.set_credentials_from_token(token_info)
     
-    # Pasta Raiz
-    root_folder_id = backup_instance.find_or_create_folder('Backup Fotos')
-    
     results = {
-        'photos': {'total': 0, 'success': 0, 'failed': 0, 'skipped': 0, 'bytes': 0},
+        'photos': {'total': 0, 'success': 0, 'failed': 0, 'skipped': 0, 'deduplicated': 0, 'bytes': 0},
         'errors': []
     }
     
-    # 1. Processar Relatórios Comuns (Aprovados)
-    from sqlalchemy import func
-    relatorios = Relatorio.query.filter(
-        func.lower(Relatorio.status).in_(['aprovado', 'finalizado', 'aprovado final'])
-    ).all()
+    def pendente(tipo, coluna_id):
+        """Foto ainda fora do manifesto"""
+        return ~exists().where(and_(FotoBackupDrive.tipo == tipo, FotoBackupDrive.foto_id == coluna_id))
     
-    # Cache de pastas de obra para evitar chamadas repetidas à API
-    # Chave: Nome da Obra, Valor: ID da Pasta
-    obra_folders_cache = {}
+    def aprovado(modelo):
+        return func.lower(modelo.status).in_(['aprovado', 'finalizado', 'aprovado final'])
     
-    for relatorio in relatorios:
-        fotos = FotoRelatorio.query.filter_by(relatorio_id=relatorio.id).all()
-        if not fotos:
-            continue
-            
+    # 1. Fotos já no manifesto (puladas) e relatórios aprovados com fotos pendentes
+    for tipo, modelo, foto_modelo, coluna in (
+        (pdf_cache.TIPO_RELATORIO, Relatorio, FotoRelatorio, FotoRelatorio.relatorio_id),
+        (pdf_cache.TIPO_EXPRESS, RelatorioExpress, FotoRelatorioExpress, FotoRelatorioExpress.relatorio_express_id),
+    ):
+        ja_enviadas = db_session.query(func.count(foto_modelo.id)).join(
+            modelo, modelo.id == coluna
+        ).filter(aprovado(modelo), ~pendente(tipo, foto_modelo.id)).scalar()
+        results['photos']['total'] += ja_enviadas
+        results['photos']['skipped'] += ja_enviadas
+    
+    relatorios = Relatorio.query.options(
+        joinedload(Relatorio.projeto), joinedload(Relatorio.autor)
+    ).filter(
+        aprovado(Relatorio),
+        Relatorio.id.in_(db_session.query(FotoRelatorio.relatorio_id).filter(
+            pendente(pdf_cache.TIPO_RELATORIO, FotoRelatorio.id)))
+    ).order_by(Relatorio.id).all()
+    relatorios_express = RelatorioExpress.query.filter(
+        aprovado(RelatorioExpress),
+        RelatorioExpress.id.in_(db_session.query(FotoRelatorioExpress.relatorio_express_id).filter(
+            pendente(pdf_cache.TIPO_EXPRESS, FotoRelatorioExpress.id)))
+    ).order_by(RelatorioExpress.id).all()
+    
+    def obra_relatorio(relatorio):
+        if relatorio.projeto:
+            return relatorio.projeto.nome
+        if relatorio.acompanhantes and isinstance(relatorio.acompanhantes, dict) and relatorio.acompanhantes.get('obra_nome'):
+            # Tentar pegar de metadados se houver
+            return relatorio.acompanhantes.get('obra_nome')
+        return "Obras Diversas"
+    
+    fontes = [
+        ('Rel', pdf_cache.TIPO_RELATORIO, 'Relatorio', '', relatorios, obra_relatorio,
+         lambda relatorio: FotoRelatorio.query.filter(
+             FotoRelatorio.relatorio_id == relatorio.id, pendente(pdf_cache.TIPO_RELATORIO, FotoRelatorio.id)
+         ).order_by(FotoRelatorio.id).all(), 'foto'),
+        ('Express', pdf_cache.TIPO_EXPRESS, 'Express', 'EXP_', relatorios_express, lambda express: express.obra_nome or "Express Diversos",
+         lambda express: FotoRelatorioExpress.query.filter(
+             FotoRelatorioExpress.relatorio_express_id == express.id, pendente(pdf_cache.TIPO_EXPRESS, FotoRelatorioExpress.id)
+         ).order_by(FotoRelatorioExpress.id).all(), 'express'),
+    ]
+    
+    entradas = []
+    for rotulo, tipo, tipo_pasta, prefixo, lista, obra_nome, fotos_de, nome_padrao in fontes:
+        for relatorio in lista:
+            try:
+                obra_nome_clean = _nome_limpo(obra_nome(relatorio)).strip() or "Sem_Nome"
+                # Pasta específica do relatório: [Data] - Relatorio|Express - [Numero]
+                data_str = relatorio.created_at.strftime('%Y-%m-%d')
+                numero_clean = relatorio.numero.replace('/', '_')
+                entradas.append((rotulo, tipo, relatorio, fotos_de, prefixo, nome_padrao,
+                                 obra_nome_clean, f"{data_str} - {tipo_pasta} - {numero_clean}"))
+            except Exception as e:
+                print(f"Erro processando {rotulo} {relatorio.numero}: {e}")
+                results['errors'].append(f"Erro {rotulo} {relatorio.numero}: {str(e)}")
+    
+    # 2. Pastas (obra e relatório) e arquivos já existentes, em poucas chamadas
+    nomes_por_obra = {}
+    for entrada in entradas:
+        nomes_por_obra.setdefault(entrada[6], set()).add(entrada[7])
+    try:
+        pastas_relatorio, existentes = {}, {}
+        for tentativa in range(2):
+            if not nomes_por_obra:
+                break  # Nenhuma foto pendente: nenhuma chamada à API
+            pastas_relatorio = {}
+            backup_instance.subpastas('Backup Fotos', nomes_por_obra)
+            for obra_nome_clean, nomes in nomes_por_obra.items():
+                for nome, folder_id in backup_instance.subpastas(f"Backup Fotos/{obra_nome_clean}", nomes).items():
+                    pastas_relatorio[(obra_nome_clean, nome)] = folder_id
+            existentes = backup_instance.list_files_in_folders(list(set(pastas_relatorio.values())))
+            # Pastas em cache apagadas no Drive: invalidar a obra (pode ter sumido junto) e resolver de novo
+            obras_sem_pasta = {obra for (obra, nome), folder_id in pastas_relatorio.items() if folder_id not in existentes}
+            if not obras_sem_pasta:
+                break
+            for obra_nome_clean in obras_sem_pasta:
+                backup_instance.invalidar_pasta(f"Backup Fotos/{obra_nome_clean}")
+        else:
+            raise Exception(f"Pastas não encontradas no Drive: {', '.join(sorted(obras_sem_pasta))}")
+    except Exception as e:
+        print(f"❌ Erro preparando pastas do backup de fotos: {e}")
+        return {
+            'success': False,
+            'message': f"Erro preparando pastas do backup de fotos: {str(e)}",
+            'results': results
+        }
+    
+    # Conteúdos já no Drive: {imagem_hash: ID do arquivo}
+    enviados_por_hash = dict(db_session.query(
+        FotoBackupDrive.imagem_hash, FotoBackupDrive.drive_file_id
+    ).filter(FotoBackupDrive.imagem_hash.isnot(None)))
+    
+    # 3. Envio das fotos pendentes
+    for rotulo, tipo, relatorio, fotos_de, prefixo, nome_padrao, obra_nome_clean, relatorio_folder_name in entradas:
         try:
-            # Determinar Nome da Obra
-            if relatorio.projeto:
-                obra_nome = relatorio.projeto.nome
-            elif relatorio.acompanhantes and isinstance(relatorio.acompanhantes, dict) and relatorio.acompanhantes.get('obra_nome'):
-                 # Tentar pegar de metadados se houver
-                 obra_nome = relatorio.acompanhantes.get('obra_nome')
-            else:
-                obra_nome = "Obras Diversas"
-                
-            obra_nome_clean = ''.join(c for c in obra_nome if c.isalnum() or c in (' ', '-', '_'))[:50].strip() or "Sem_Nome"
-            
-            # Encontrar/Criar pasta da Obra
-            if obra_nome_clean not in obra_folders_cache:
-                obra_folders_cache[obra_nome_clean] = backup_instance.find_or_create_folder(obra_nome_clean, root_folder_id)
-            
-            obra_folder_id = obra_folders_cache[obra_nome_clean]
-            
-            # Criar pasta específica do relatório: [Data] - Relatorio - [Numero]
-            data_str = relatorio.created_at.strftime('%Y-%m-%d')
-            numero_clean = relatorio.numero.replace('/', '_')
-            relatorio_folder_name = f"{data_str} - Relatorio - {numero_clean}"
-            
-            # Verificar se pasta do relatório já existe dentro da pasta da obra
-            # NOTA: Isso pode ser lento se tiver muitas subpastas. Otimização ideal seria cachear também.
-            # Por enquanto, find_or_create_folder faz a verificação.
-            relatorio_folder_id = backup_instance.find_or_create_folder(relatorio_folder_name, obra_folder_id)
+            relatorio_folder_id = pastas_relatorio[(obra_nome_clean, relatorio_folder_name)]
+            existing_files = existentes[relatorio_folder_id]
             
-            # Listar arquivos existentes para skip
-            existing_files = backup_instance.list_files_in_folder(relatorio_folder_id)
-            
-            for foto in fotos:
+            for foto in fotos_de(relatorio):
                 results['photos']['total'] += 1
                 
-                # PRIORIDADE 1: Ler foto do campo BYTEA do PostgreSQL
-                photo_bytes = None
-                photo_filename = None
-                
-                if hasattr(foto, 'imagem') and foto.imagem:
-                    # Foto armazenada no banco como BYTEA
-                    photo_bytes = bytes(foto.imagem)
-                    # Usar filename do banco ou gerar nome
-                    photo_filename = foto.filename or foto.filename_original or foto.filename_anotada or f"foto_{foto.id}.jpg"
-                else:
-                    # Fallback: Tentar ler do disco (caso fotos antigas)
-                    local_filename = foto.filename or foto.filename_original or foto.filename_anotada
-                    
-                    if not local_filename:
-                        # Foto sem arquivo e sem imagem no banco
-                        results['photos']['failed'] += 1
-                        results['errors'].append(f"Foto {foto.id} sem dados (Rel {relatorio.numero})")
-                        continue
-                    
-                    file_path = os.path.join(upload_folder, local_filename)
-                    
-                    if not os.path.exists(file_path):
-                        # Tentar procurar apenas pelo basename
-                        file_path = os.path.join(upload_folder, os.path.basename(local_filename))
-                    
-                    if not os.path.exists(file_path):
-                        # Arquivo físico não encontrado e não tem no banco
-                        results['errors'].append(f"Arquivo não encontrado: {local_filename} (Rel {relatorio.numero})")
-                        results['photos']['failed'] += 1
-                        continue
-                    
-                    # Ler arquivo do disco
-                    try:
-                        with open(file_path, 'rb') as f:
-                            photo_bytes = f.read()
-                        photo_filename = local_filename
-                    except Exception as e:
-                        results['errors'].append(f"Erro lendo arquivo {local_filename}: {str(e)}")
-                        results['photos']['failed'] += 1
-                        continue
-                
                 # Nome para salvar no Drive
-                # Formato: [ID]_[Categoria]_[Legenda].jpg
+                # Formato: [EXP_][ID]_[Categoria]_[Legenda].jpg
+                photo_filename = foto.filename or foto.filename_original or foto.filename_anotada or f"{nome_padrao}_{foto.id}.jpg"
                 categoria_clean = ''.join(c for c in (foto.tipo_servico or 'Geral') if c.isalnum())
                 legenda_clean = ''.join(c for c in (foto.legenda or 'foto') if c.isalnum() or c in (' ', '-', '_'))[:30]
                 ext = os.path.splitext(photo_filename)[1] or '.jpg'
                 
-                drive_filename = f"{foto.id}_{categoria_clean}_{legenda_clean}{ext}"
+                drive_filename = f"{prefixo}{foto.id}_{categoria_clean}_{legenda_clean}{ext}"
                 
-                # Verificar duplicidade
+                # Enviada por um backup anterior ao manifesto: só registrar
                 if drive_filename in existing_files:
+                    db_session.add(FotoBackupDrive(tipo=tipo, foto_id=foto.id, imagem_hash=foto.imagem_hash,
+                                                   drive_file_id=existing_files[drive_filename]))
                     results['photos']['skipped'] += 1
                     continue
-                    
-                # Upload usando bytes em memória
-                try:
-                    file_size = len(photo_bytes)
-                    
-                    # Detectar mimetype
-                    mime_type, _ = mimetypes.guess_type(drive_filename)
-                    if not mime_type:
-                        mime_type = 'image/jpeg' if ext.lower() in ['.jpg', '.jpeg'] else 'application/octet-stream'
-
-                    # Upload de bytes para o Drive (usar upload_pdf_bytes que aceita bytes)
-                    # NOTA: upload_pdf_bytes funciona para qualquer arquivo binário
-                    backup_instance.upload_pdf_bytes(photo_bytes, drive_filename, relatorio_folder_id, mimetype=mime_type)
-                    
-                    results['photos']['success'] += 1
-                    results['photos']['bytes'] += file_size
-                    print(f"✅ Foto {foto.id} enviada: {drive_filename} ({file_size} bytes)")
-                    
-                except Exception as e:
-                    print(f"❌ Erro upload foto {foto.id}: {e}")
-                    results['photos']['failed'] += 1
-                    results['errors'].append(f"Erro upload foto {foto.id}: {str(e)}")
-                    
-        except Exception as e:
-            print(f"Erro processando relatório {relatorio.numero}: {e}")
-            results['errors'].append(f"Erro Rel {relatorio.numero}: {str(e)}")
-
-    # 2. Processar Relatórios Express (Aprovados)
-    relatorios_express = RelatorioExpress.query.filter(
-        func.lower(RelatorioExpress.status).in_(['aprovado', 'finalizado', 'aprovado final'])
-    ).all()
-    
-    for express in relatorios_express:
-        fotos = FotoRelatorioExpress.query.filter_by(relatorio_express_id=express.id).all()
-        if not fotos:
-            continue
-            
-        try:
-            # Determinar Nome da Obra (Express tem campo obra_nome)
-            obra_nome = express.obra_nome or "Express Diversos"
-            obra_nome_clean = ''.join(c for c in obra_nome if c.isalnum() or c in (' ', '-', '_'))[:50].strip() or "Sem_Nome"
-            
-            # Encontrar/Criar pasta da Obra
-            if obra_nome_clean not in obra_folders_cache:
-                obra_folders_cache[obra_nome_clean] = backup_instance.find_or_create_folder(obra_nome_clean, root_folder_id)
-            
-            obra_folder_id = obra_folders_cache[obra_nome_clean]
-            
-            # Criar pasta específica do relatório: [Data] - Express - [Numero]
-            data_str = express.created_at.strftime('%Y-%m-%d')
-            numero_clean = express.numero.replace('/', '_')
-            relatorio_folder_name = f"{data_str} - Express - {numero_clean}"
-            
-            relatorio_folder_id = backup_instance.find_or_create_folder(relatorio_folder_name, obra_folder_id)
-            
-            # Listar arquivos existentes para skip
-            existing_files = backup_instance.list_files_in_folder(relatorio_folder_id)
-            
-            for foto in fotos:
-                results['photos']['total'] += 1
-                
-                # PRIORIDADE 1: Ler foto do campo BYTEA
-                photo_bytes = None
-                photo_filename = None
-                
-                if hasattr(foto, 'imagem') and foto.imagem:
-                    photo_bytes = bytes(foto.imagem)
-                    photo_filename = foto.filename or foto.filename_original or foto.filename_anotada or f"express_{foto.id}.jpg"
-                else:
-                    # Fallback: disco
-                    local_filename = foto.filename or foto.filename_original or foto.filename_anotada
-                    
-                    if not local_filename:
-                        results['photos']['failed'] += 1
-                        continue
-                        
-                    file_path = os.path.join(upload_folder, local_filename)
-                    
-                    if not os.path.exists(file_path):
-                        file_path = os.path.join(upload_folder, os.path.basename(local_filename))
-                        
-                    if not os.path.exists(file_path):
-                        results['errors'].append(f"Arquivo não encontrado: {local_filename} (Express {express.numero})")
-                        results['photos']['failed'] += 1
-                        continue
-                    
-                    try:
-                        with open(file_path, 'rb') as f:
-                            photo_bytes = f.read()
-                        photo_filename = local_filename
-                    except Exception as e:
-                        results['errors'].append(f"Erro lendo arquivo express {local_filename}: {str(e)}")
-                        results['photos']['failed'] += 1
-                        continue
-                
-                # Nome para salvar
-                categoria_clean = ''.join(c for c in (foto.tipo_servico or 'Geral') if c.isalnum())
-                legenda_clean = ''.join(c for c in (foto.legenda or 'foto') if c.isalnum() or c in (' ', '-', '_'))[:30]
-                ext = os.path.splitext(photo_filename)[1] or '.jpg'
-                
-                drive_filename = f"EXP_{foto.id}_{categoria_clean}_{legenda_clean}{ext}"
                 
-                if drive_filename in existing_files:
-                    results['photos']['skipped'] += 1
+                arquivo, tamanho, imagem_hash, _, erro = _origem_foto(foto, upload_folder, f"{nome_padrao}_{foto.id}.jpg")
+                if erro:
+                    results['photos']['failed'] += 1
+                    results['errors'].append(f"{erro} ({rotulo} {relatorio.numero})")
                     continue
-                    
+                
                 try:
-                    file_size = len(photo_bytes)
+                    info = None
+                    if imagem_hash in enviados_por_hash:
+                        # Mesmo conteúdo já está no Drive: cópia no servidor, nenhum byte enviado
+                        try:
+                            info = backup_instance.copy_file(enviados_por_hash[imagem_hash], drive_filename, relatorio_folder_id)
+                            results['photos']['deduplicated'] += 1
+                        except HttpError as e:
+                            if not _erro_404(e):
+                                raise
+                            del enviados_por_hash[imagem_hash]  # Original apagado no Drive: enviar de novo
                     
-                    # Detectar mimetype
-                    mime_type, _ = mimetypes.guess_type(drive_filename)
-                    if not mime_type:
-                        mime_type = 'image/jpeg' if ext.lower() in ['.jpg', '.jpeg'] else 'application/octet-stream'
+                    if info is None:
+                        # Detectar mimetype
+                        mime_type, _ = mimetypes.guess_type(drive_filename)
+                        if not mime_type:
+                            mime_type = 'image/jpeg' if ext.lower() in ['.jpg', '.jpeg'] else 'application/octet-stream'
                         
-                    backup_instance.upload_pdf_bytes(photo_bytes, drive_filename, relatorio_folder_id, mimetype=mime_type)
+                        info = backup_instance.upload_stream(
+                            arquivo, tamanho, drive_filename, relatorio_folder_id, mime_type,
+                            sessao=_sessao_envio_foto(imagem_hash)
+                        )
+                        results['photos']['bytes'] += tamanho
+                        print(f"✅ Foto {foto.id} enviada: {drive_filename} ({tamanho} bytes)")
                     
+                    db_session.add(FotoBackupDrive(tipo=tipo, foto_id=foto.id, imagem_hash=imagem_hash,
+                                                   drive_file_id=info['id'], tamanho=tamanho))
+                    enviados_por_hash.setdefault(imagem_hash, info['id'])
+                    existing_files[drive_filename] = info['id']
                     results['photos']['success'] += 1
-                    results['photos']['bytes'] += file_size
-                    print(f"✅ Foto Express {foto.id} enviada: {drive_filename}")
                     
                 except Exception as e:
-                    print(f"❌ Erro upload foto express {foto.id}: {e}")
+                    print(f"❌ Erro upload foto {foto.id}: {e}")
                     results['photos']['failed'] += 1
-                    results['errors'].append(f"Erro upload express {foto.id}: {str(e)}")
+                    results['errors'].append(f"Erro upload foto {foto.id} ({rotulo} {relatorio.numero}): {str(e)}")
+                finally:
+                    arquivo.close()
+            
+            db_session.commit()  # Manifesto das fotos deste relatório
                     
         except Exception as e:
-            print(f"Erro processando express {express.numero}: {e}")
-            results['errors'].append(f"Erro Express {express.numero}: {str(e)}")
+            db_session.rollback()
+            print(f"Erro processando {rotulo} {relatorio.numero}: {e}")
+            results['errors'].append(f"Erro {rotulo} {relatorio.numero}: {str(e)}")
             
     return {
         'success': True,
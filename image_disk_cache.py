@@ -0,0 +1,245 @@
+"""
+Cache em disco das imagens servidas, compartilhado pelos workers do Gunicorn
+
+Cada imagem servida a partir do banco (original ou variante) é gravada em
+IMAGE_CACHE_FOLDER com o nome igual ao seu ETag (hash do conteúdo + variante),
+então a entrada nunca fica desatualizada: conteúdo novo gera outra chave.
+Os quatro workers leem o mesmo diretório e os acertos são enviados com
+send_file, que usa o file wrapper do Gunicorn (sendfile, sem copiar os bytes
+para o Python) — fotos muito acessadas deixam de consultar o banco.
+
+O tamanho total é limitado por IMAGE_CACHE_MAX_BYTES: a remoção segue LRU pelo
+mtime (atualizado nos acertos) e roda em um único worker por vez (flock).
+"""
+
+import os
+import re
+import time
+import logging
+import tempfile
+import threading
+
+from flask import current_app
+
+try:
+    import fcntl
+except ImportError:  # Windows (desenvolvimento): remoção sem lock entre processos
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Chaves são ETags: hash sha256 opcionalmente seguido de -variante.formato
+CHAVE_VALIDA = re.compile(r'^[0-9a-f]{64}(-[a-z]+\.[a-z]+)?$')
+
+# Acertos só atualizam o mtime se ele tiver mais que isso (evita um utime por request)
+INTERVALO_TOQUE_SEGUNDOS = 60
+
+# Verificação de tamanho a cada N gravações por worker (ou antes, para arquivos grandes)
+GRAVACOES_ENTRE_LIMPEZAS = 25
+
+# Ao exceder o limite, remove até ficar nesta fração do máximo
+FRACAO_APOS_LIMPEZA = 0.9
+
+_estado = {'gravacoes': 0, 'bytes_gravados': 0}
+_lock_estado = threading.Lock()
+
+
+def _diretorio():
+    return current_app.config.get('IMAGE_CACHE_FOLDER')
+
+
+def _tamanho_maximo():
+    return current_app.config.get('IMAGE_CACHE_MAX_BYTES', 0)
+
+
+def _caminho(chave):
+    """Caminho do arquivo da chave (subdiretório pelos 2 primeiros caracteres do hash)"""
+    return os.path.join(_diretorio(), chave[:2], chave)
+
+
+def habilitado():
+    return bool(_diretorio()) and _tamanho_maximo() > 0
+
+
+def obter(chave):
+    """
+    Caminho do arquivo em cache para a chave, ou None.
+
+    Atualiza o mtime (ordem do LRU) no máximo uma vez por INTERVALO_TOQUE_SEGUNDOS.
+    """
+    if not chave or not habilitado() or not CHAVE_VALIDA.match(chave):
+        return None
+    caminho = _caminho(chave)
+    try:
+        mtime = os.stat(caminho).st_mtime
+    except OSError:
+        return None
+    agora = time.time()
+    if agora - mtime > INTERVALO_TOQUE_SEGUNDOS:
+        try:
+            os.utime(caminho, (agora, agora))
+        except OSError:
+            pass
+    return caminho
+
+
+def gravar(chave, dados):
+    """
+    Grava os bytes no cache (escrita atômica: arquivo temporário + rename).
+
+    Returns:
+        str | None: Caminho do arquivo gravado, ou None se o cache está desabilitado/falhou
+    """
+    if not chave or not habilitado() or not CHAVE_VALIDA.match(chave):
+        return None
+    if len(dados) > _tamanho_maximo() // 10:
+        return None  # Um único arquivo não deve expulsar boa parte do cache
+
+    caminho = _caminho(chave)
+    try:
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        fd, temporario = tempfile.mkstemp(dir=os.path.dirname(caminho), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(dados)
+            os.replace(temporario, caminho)
+        except BaseException:
+            os.unlink(temporario)
+            raise
+    except OSError as e:
+        logger.warning(f"⚠️ Cache de imagens: falha ao gravar {chave[:12]}: {e}")
+        return None
+
+    _registrar_gravacao(len(dados))
+    return caminho
+
+
+class GravacaoEmPartes:
+    """
+    Grava no cache uma imagem que está sendo enviada em partes (streaming).
+
+    O arquivo temporário só é criado na primeira parte e só vira entrada do
+    cache em concluir(); qualquer interrupção (cliente desconectou, Range)
+    termina em descartar().
+    """
+
+    def __init__(self, chave):
+        self.chave = chave if chave and habilitado() and CHAVE_VALIDA.match(chave) else None
+        self._arquivo = None
+        self._temporario = None
+        self._bytes = 0
+
+    def escrever(self, dados):
+        if not self.chave:
+            return
+        try:
+            if self._arquivo is None:
+                caminho = _caminho(self.chave)
+                os.makedirs(os.path.dirname(caminho), exist_ok=True)
+                fd, self._temporario = tempfile.mkstemp(dir=os.path.dirname(caminho), prefix='.tmp-')
+                self._arquivo = os.fdopen(fd, 'wb')
+            self._arquivo.write(dados)
+            self._bytes += len(dados)
+        except OSError as e:
+            logger.warning(f"⚠️ Cache de imagens: falha ao gravar {self.chave[:12]}: {e}")
+            self.descartar()
+            self.chave = None
+
+    def concluir(self):
+        if not self.chave or self._arquivo is None:
+            return
+        self._arquivo.close()
+        self._arquivo = None
+        if self._bytes > _tamanho_maximo() // 10:
+            self.descartar()
+            return
+        os.replace(self._temporario, _caminho(self.chave))
+        self._temporario = None
+        _registrar_gravacao(self._bytes)
+
+    def descartar(self):
+        if self._arquivo is not None:
+            self._arquivo.close()
+            self._arquivo = None
+        if self._temporario:
+            try:
+                os.unlink(self._temporario)
+            except OSError:
+                pass
+            self._temporario = None
+
+
+def _registrar_gravacao(tamanho):
+    """Conta gravações do worker e dispara a limpeza periodicamente"""
+    with _lock_estado:
+        _estado['gravacoes'] += 1
+        _estado['bytes_gravados'] += tamanho
+        precisa_limpar = (
+            _estado['gravacoes'] >= GRAVACOES_ENTRE_LIMPEZAS
+            or _estado['bytes_gravados'] >= _tamanho_maximo() // 20
+        )
+        if precisa_limpar:
+            _estado['gravacoes'] = 0
+            _estado['bytes_gravados'] = 0
+    if precisa_limpar:
+        limpar()
+
+
+def _listar_arquivos(diretorio):
+    """(mtime, tamanho, caminho) de todos os arquivos do cache"""
+    arquivos = []
+    for sub in os.scandir(diretorio):
+        if not sub.is_dir():
+            continue
+        for entrada in os.scandir(sub.path):
+            if entrada.name.startswith('.tmp-'):
+                continue
+            try:
+                st = entrada.stat()
+            except OSError:
+                continue
+            arquivos.append((st.st_mtime, st.st_size, entrada.path))
+    return arquivos
+
+
+def limpar():
+    """
+    Remove os arquivos menos usados até o cache caber no limite.
+
+    Só um worker limpa por vez; os demais seguem sem esperar.
+
+    Returns:
+        dict | None: {'arquivos', 'bytes', 'removidos'} após a limpeza,
+                     ou None se outro worker já está limpando
+    """
+    diretorio = _diretorio()
+    if not habilitado() or not os.path.isdir(diretorio):
+        return {'arquivos': 0, 'bytes': 0, 'removidos': 0}
+
+    lock_file = open(os.path.join(diretorio, '.lock'), 'w')
+    try:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None  # Outro worker já está limpando
+
+        arquivos = _listar_arquivos(diretorio)
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        removidos = 0
+        maximo = _tamanho_maximo()
+        if total > maximo:
+            alvo = int(maximo * FRACAO_APOS_LIMPEZA)
+            for _, tamanho, caminho in sorted(arquivos):
+                if total <= alvo:
+                    break
+                try:
+                    os.unlink(caminho)
+                except OSError:
+                    continue
+                total -= tamanho
+                removidos += 1
+            logger.info(f"🧹 Cache de imagens: {removidos} arquivos removidos, {total} bytes em uso")
+        return {'arquivos': len(arquivos) - removidos, 'bytes': total, 'removidos': removidos}
+    finally:
+        lock_file.close()
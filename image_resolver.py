@@ -0,0 +1,166 @@
+"""
+Resolução de /uploads/<filename> para a foto (ou arquivo) correspondente
+
+Uma única query indexada (UNION das duas tabelas de fotos) informa a tabela,
+o id e se os bytes estão no banco; só quando não estão os diretórios de
+upload são consultados. O resultado fica em um LRU em memória por worker,
+então imagens repetidas em uma página (ou revalidações) não voltam ao banco
+nem ao filesystem.
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+
+from flask import current_app
+from sqlalchemy import event, inspect, literal, select, union_all
+
+from app import db
+from models import FotoRelatorio, FotoRelatorioExpress
+
+logger = logging.getLogger(__name__)
+
+# tabela: 'relatorio' | 'express' | None (sem registro no banco)
+# no_banco: bytes no banco (coluna imagem ou blob store)
+# diretorio: (nome, caminho) do arquivo físico, quando não está no banco
+ResolucaoImagem = namedtuple('ResolucaoImagem', 'tabela foto_id no_banco diretorio')
+
+MODELOS = {
+    'relatorio': FotoRelatorio,
+    'express': FotoRelatorioExpress,
+}
+
+CACHE_MAX_ENTRADAS = 4096
+CACHE_TTL_SEGUNDOS = 600
+CACHE_TTL_NAO_ENCONTRADO = 30  # Uploads recém-feitos em outro worker aparecem rápido
+
+
+class _CacheLRU:
+    """LRU com expiração por entrada, seguro para as threads do worker"""
+
+    def __init__(self, max_entradas):
+        self.max_entradas = max_entradas
+        self._dados = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chave):
+        with self._lock:
+            item = self._dados.get(chave)
+            if item is None:
+                return None
+            valor, expira_em = item
+            if expira_em < time.monotonic():
+                del self._dados[chave]
+                return None
+            self._dados.move_to_end(chave)
+            return valor
+
+    def set(self, chave, valor, ttl):
+        with self._lock:
+            self._dados[chave] = (valor, time.monotonic() + ttl)
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.max_entradas:
+                self._dados.popitem(last=False)
+
+    def remover(self, chave=None):
+        with self._lock:
+            if chave is None:
+                self._dados.clear()
+            else:
+                self._dados.pop(chave, None)
+
+
+_cache = _CacheLRU(CACHE_MAX_ENTRADAS)
+
+
+def diretorios_busca():
+    """Diretórios onde arquivos físicos de fotos podem estar (em ordem de prioridade)"""
+    return [
+        ('uploads', current_app.config.get('UPLOAD_FOLDER', 'uploads')),
+        ('attached_assets', 'attached_assets'),
+        ('static_uploads', os.path.join('static', 'uploads')),
+    ]
+
+
+def localizar_arquivo(filename):
+    """Primeiro diretório que contém o arquivo, como (nome, caminho), ou None"""
+    for dir_name, dir_path in diretorios_busca():
+        if os.path.isfile(os.path.join(dir_path, filename)):
+            return dir_name, dir_path
+    return None
+
+
+def _consultar_banco(filename):
+    """Uma query indexada nas duas tabelas; relatórios comuns têm prioridade sobre Express"""
+    consultas = []
+    for prioridade, (tabela, model) in enumerate(MODELOS.items()):
+        consultas.append(
+            select(
+                literal(prioridade).label('prioridade'),
+                literal(tabela).label('tabela'),
+                model.id.label('foto_id'),
+                model.filtro_com_imagem().label('no_banco'),
+            ).where(model.filename == filename)
+        )
+    uniao = union_all(*consultas).subquery()
+    return db.session.execute(
+        select(uniao.c.tabela, uniao.c.foto_id, uniao.c.no_banco)
+        .order_by(uniao.c.prioridade, uniao.c.foto_id)
+        .limit(1)
+    ).first()
+
+
+def resolver_imagem(filename):
+    """
+    Resolve o filename de /uploads/<filename>.
+
+    Returns:
+        ResolucaoImagem: tabela/id da foto (se registrada), se os bytes estão
+        no banco e, caso contrário, o diretório do arquivo físico
+    """
+    resolucao = _cache.get(filename)
+    if resolucao is not None:
+        return resolucao
+
+    row = _consultar_banco(filename)
+    if row and row.no_banco:
+        resolucao = ResolucaoImagem(row.tabela, row.foto_id, True, None)
+    else:
+        resolucao = ResolucaoImagem(
+            row.tabela if row else None,
+            row.foto_id if row else None,
+            False,
+            localizar_arquivo(filename),
+        )
+
+    encontrada = resolucao.no_banco or resolucao.diretorio is not None
+    _cache.set(filename, resolucao, CACHE_TTL_SEGUNDOS if encontrada else CACHE_TTL_NAO_ENCONTRADO)
+    logger.debug(f"🔍 Imagem resolvida: {filename} -> {resolucao}")
+    return resolucao
+
+
+def carregar_foto(resolucao):
+    """Instância da foto resolvida (só metadados; a coluna imagem é adiada)"""
+    if not resolucao.tabela:
+        return None
+    return db.session.get(MODELOS[resolucao.tabela], resolucao.foto_id)
+
+
+def invalidar(filename=None):
+    """Remove uma resolução do cache (ou todas, sem argumento)"""
+    _cache.remover(filename)
+
+
+def _invalidar_foto(mapper, connection, target):
+    invalidar(target.filename)
+    historico = inspect(target).attrs.filename.history
+    for antigo in historico.deleted or ():
+        invalidar(antigo)
+
+
+for _model in MODELOS.values():
+    event.listen(_model, 'after_insert', _invalidar_foto)
+    event.listen(_model, 'after_update', _invalidar_foto)
+    event.listen(_model, 'after_delete', _invalidar_foto)
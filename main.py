@@ -6,6 +6,9 @@ import railway_routes_fix  # noqa: F401
 import routes_relatorios_api  # noqa: F401  # API REST para relatórios com autosave
 import routes_express  # noqa: F401  # Relatório Express
 import routes_offline  # noqa: F401  # Offline PWA API endpoints
+import routes_uploads  # noqa: F401  # Upload de fotos em partes (retomável)
+import routes_pdf_jobs  # noqa: F401  # PDF de relatórios em segundo plano
+import routes_export  # noqa: F401  # Dossiê da obra em ZIP (streaming)
 
 # Auto-run migrations on Railway deploy
 import os
@@ -94,6 +97,17 @@ if os.environ.get("DATABASE_URL"):
     except Exception as e:
         logging.warning(f"⚠️ Erro nas migrações (continuando): {e}")
 
+# Gerador de PDF pronto antes da primeira requisição (com --preload, herdado pelos workers).
+# Com o pool isolado, quem renderiza são os processos de pdf_render_pool, aquecidos ao iniciar.
+if app.config.get('PDF_WARMUP_ENABLED') and not app.config.get('PDF_RENDER_ISOLATED'):
+    try:
+        from pdf_generator_weasy import aquecer_gerador
+        duracao = aquecer_gerador()
+        if duracao is not None:
+            logging.info(f"📄 Gerador de PDF aquecido em {duracao:.2f}s")
+    except Exception as e:
+        logging.warning(f"⚠️ Aquecimento do gerador de PDF falhou (será preparado na primeira geração): {e}")
+
 # Run the Flask development server
 if __name__ == '__main__':
     import os
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Script de migração para mover os bytes das fotos do banco para um backend de
+armazenamento externo (filesystem local ou S3 compatível).
+
+Caminho inverso de migrate_filesystem_to_database.py: o banco deixa de
+guardar os bytes (backup, VACUUM e replicação mais leves) e passa a guardar só
+a localização do objeto em imagem_blobs (storage_backend/storage_key).
+
+Etapas:
+1. Fotos que ainda têm bytes na própria linha (fotos_relatorio e
+   fotos_relatorio_express) são movidas para o blob store;
+2. Cada blob é gravado no backend, relido e conferido pelo SHA-256
+   (imagem_hash) antes de a linha ser atualizada.
+
+As rotas continuam servindo todas as fotos durante a migração: cada blob é
+lido do banco até o commit que registra a localização e do backend depois
+dele. A migração é retomável: blobs já descarregados são ignorados e uma
+interrupção perde no máximo os blobs em andamento. Fotos enviadas depois
+ficam no banco até a próxima execução.
+
+IMPORTANTE:
+- Execute 'flask db upgrade' antes (colunas storage_backend/storage_key)
+- Configure PHOTO_STORAGE_BACKEND e PHOTO_STORAGE_LOCAL_FOLDER ou
+  PHOTO_STORAGE_S3_* (o backend 's3' requer boto3)
+- Sempre faça backup do banco antes de executar
+
+Uso:
+    python migrate_blobs_to_storage.py [--backend local|s3] [--workers N] [--batch N] [--limit N] [--dry-run]
+
+Opções:
+    --backend: Backend de destino (padrão: PHOTO_STORAGE_BACKEND)
+    --workers N: Blobs enviados em paralelo (padrão: 4)
+    --batch N: Blobs consultados por lote (padrão: 200)
+    --limit N: Para após N blobs (padrão: todos)
+    --dry-run: Apenas mostra quantos blobs e bytes seriam movidos
+"""
+
+import os
+import sys
+import time
+import argparse
+from datetime import datetime
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# Configuração para importar os modelos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+
+def print_stats(titulo, stats):
+    print(f"\n📊 {titulo}")
+    print(f"   - Blobs: {stats['blobs']} ({stats['bytes_armazenados']:,} bytes)")
+    print(f"   - Blobs fora do banco: {stats['blobs_externos']} ({stats['bytes_externos']:,} bytes)")
+    print(f"   - Fotos ainda com bytes na própria linha: {stats['fotos_legadas']}")
+
+
+def descarregar(app, imagem_hash, nome_backend):
+    """Executado nas threads: cada blob em sua própria sessão e transação"""
+    from app import db
+    from photo_backends import obter_backend
+    from photo_storage import descarregar_blob
+
+    with app.app_context():
+        try:
+            return descarregar_blob(imagem_hash, obter_backend(nome_backend))
+        except Exception as e:
+            db.session.rollback()
+            print(f"  ❌ {imagem_hash[:12]}: {e}")
+            return 'erro'
+        finally:
+            db.session.remove()
+
+
+def main():
+    """Função principal do script"""
+    parser = argparse.ArgumentParser(
+        description='Move os bytes das fotos do banco para um backend de armazenamento externo'
+    )
+    parser.add_argument('--backend', choices=['local', 's3'],
+                        help='Backend de destino (padrão: PHOTO_STORAGE_BACKEND)')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Blobs enviados em paralelo (padrão: 4)')
+    parser.add_argument('--batch', type=int, default=200,
+                        help='Blobs consultados por lote (padrão: 200)')
+    parser.add_argument('--limit', type=int, default=None,
+                        help='Para após N blobs (padrão: todos)')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Executa em modo simulação (não faz alterações reais)')
+    args = parser.parse_args()
+
+    print("🚀 MIGRAÇÃO DE FOTOS - BANCO → ARMAZENAMENTO EXTERNO")
+    print(f"⏰ Iniciado em: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+    from app import app, db
+    from sqlalchemy import func
+    from models import ImagemBlob
+    from photo_backends import obter_backend, backend_configurado, BACKEND_BANCO
+    from photo_storage import migrar_imagens_legadas, hashes_para_descarregar, estatisticas_blob_store
+
+    with app.app_context():
+        nome_backend = args.backend or backend_configurado()
+        if nome_backend == BACKEND_BANCO:
+            print("❌ Nenhum backend externo: use --backend ou configure PHOTO_STORAGE_BACKEND")
+            sys.exit(1)
+        obter_backend(nome_backend)  # Falha cedo se o backend não está configurado
+        print(f"📦 Backend de destino: {nome_backend}")
+
+        print_stats("ANTES", estatisticas_blob_store())
+
+        if args.dry_run:
+            pendentes, bytes_pendentes = db.session.query(
+                func.count(ImagemBlob.hash), func.coalesce(func.sum(ImagemBlob.tamanho), 0)
+            ).filter(ImagemBlob.storage_key.is_(None), ImagemBlob.dados.isnot(None)).one()
+            print(f"\n🔄 MODO DRY-RUN: {pendentes} blobs ({bytes_pendentes:,} bytes) seriam movidos")
+            return
+
+        # Etapa 1: bytes legados nas tabelas de fotos entram no blob store
+        while sum(migrar_imagens_legadas(limite=args.batch).values()):
+            pass
+
+        # Etapa 2: blobs do banco para o backend, em paralelo
+        resultados = Counter()
+        inicio = time.monotonic()
+        ultimo_hash = None
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            while args.limit is None or sum(resultados.values()) < args.limit:
+                lote = hashes_para_descarregar(apos=ultimo_hash, limite=args.batch)
+                db.session.remove()
+                if not lote:
+                    break
+                if args.limit is not None:
+                    lote = lote[:args.limit - sum(resultados.values())]
+                ultimo_hash = lote[-1]
+                for status in executor.map(lambda h: descarregar(app, h, nome_backend), lote):
+                    resultados[status] += 1
+                print(f"  ✅ {sum(resultados.values())} blobs processados: {dict(resultados)}")
+
+        duracao = time.monotonic() - inicio
+        print_stats("DEPOIS", estatisticas_blob_store())
+        print(f"\n✅ {resultados['descarregado']} blobs movidos para '{nome_backend}' em {duracao:.1f}s")
+        if resultados['erro'] or resultados['divergente']:
+            print(f"⚠️ {resultados['erro']} erros e {resultados['divergente']} divergências: blobs mantidos no banco "
+                  f"(execute novamente para tentar os erros)")
+
+
+if __name__ == '__main__':
+    main()
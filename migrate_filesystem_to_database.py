@@ -61,7 +61,7 @@ def migrate_photos_to_database(dry_run=False, limit=100):
             # Migrar FotoRelatorio
             print("\n📸 PROCESSANDO FOTOS DE RELATÓRIOS NORMAIS...")
             fotos_normais = FotoRelatorio.query.filter(
-                FotoRelatorio.imagem == None,
+                ~FotoRelatorio.filtro_com_imagem(),
                 FotoRelatorio.filename != None
             ).limit(limit).all()
             
@@ -100,7 +100,7 @@ def migrate_photos_to_database(dry_run=False, limit=100):
             # Migrar FotoRelatorioExpress
             print("\n📸 PROCESSANDO FOTOS DE RELATÓRIOS EXPRESS...")
             fotos_express = FotoRelatorioExpress.query.filter(
-                FotoRelatorioExpress.imagem == None,
+                ~FotoRelatorioExpress.filtro_com_imagem(),
                 FotoRelatorioExpress.filename != None
             ).limit(limit).all()
             
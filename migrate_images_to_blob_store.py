@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Script de migração para mover os bytes da coluna legada 'imagem' das fotos
+para o blob store endereçado por conteúdo (tabela imagem_blobs).
+
+Fotos com o mesmo conteúdo passam a compartilhar um único blob. A migração é
+feita em lotes e pode ser interrompida e executada novamente a qualquer momento:
+cada foto é migrada e commitada individualmente.
+
+IMPORTANTE:
+- Execute 'flask db upgrade' antes (cria a tabela imagem_blobs)
+- Sempre faça backup do banco antes de executar
+
+Uso:
+    python migrate_images_to_blob_store.py [--dry-run] [--batch N] [--gc]
+
+Opções:
+    --dry-run: Apenas mostra quantas fotos e bytes seriam migrados
+    --batch N: Fotos por lote e por tabela (padrão: 100)
+    --gc: Ao final, reconcilia ref_count e remove blobs órfãos
+"""
+
+import os
+import sys
+import argparse
+from datetime import datetime
+
+# Configuração para importar os modelos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+
+def print_stats(titulo, stats):
+    print(f"\n📊 {titulo}")
+    print(f"   - Blobs: {stats['blobs']}")
+    print(f"   - Bytes armazenados: {stats['bytes_armazenados']:,}")
+    print(f"   - Bytes referenciados pelas fotos: {stats['bytes_referenciados']:,}")
+    print(f"   - Referências: {stats['referencias']}")
+    print(f"   - Fotos ainda com bytes na própria linha: {stats['fotos_legadas']}")
+
+
+def main():
+    """Função principal do script"""
+    parser = argparse.ArgumentParser(
+        description='Move imagens das fotos para o blob store deduplicado (imagem_blobs)'
+    )
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Executa em modo simulação (não faz alterações reais)')
+    parser.add_argument('--batch', type=int, default=100,
+                        help='Fotos por lote e por tabela (padrão: 100)')
+    parser.add_argument('--gc', action='store_true',
+                        help='Reconcilia ref_count e remove blobs órfãos ao final')
+    args = parser.parse_args()
+
+    print("🚀 MIGRAÇÃO DE FOTOS - COLUNA imagem → BLOB STORE")
+    print(f"⏰ Iniciado em: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+    from app import app
+    from photo_storage import migrar_imagens_legadas, coletar_blobs_orfaos, estatisticas_blob_store
+
+    with app.app_context():
+        print_stats("ANTES", estatisticas_blob_store())
+
+        if args.dry_run:
+            print("\n🔄 MODO DRY-RUN: Nenhuma alteração será feita no banco")
+            return
+
+        total = 0
+        while True:
+            stats = migrar_imagens_legadas(limite=args.batch)
+            lote = sum(stats.values())
+            if not lote:
+                break
+            total += lote
+            print(f"  ✅ Lote migrado: {stats} (total: {total})")
+
+        if args.gc:
+            resultado = coletar_blobs_orfaos()
+            print(f"\n🧹 Coleta de lixo: {resultado}")
+
+        print_stats("DEPOIS", estatisticas_blob_store())
+        print(f"\n✅ {total} fotos migradas para o blob store")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""add external storage location to imagem_blobs
+
+Revision ID: 20261016_blob_storage_location
+Revises: 20261016_photo_storage_external
+Create Date: 2026-10-16 20:00:00
+
+migrate_blobs_to_storage.py moves blob bytes out of the database into a
+storage backend (local filesystem or S3-compatible). The blob row stays,
+with dados set to NULL and the object location recorded in
+storage_backend/storage_key.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261016_blob_storage_location'
+down_revision = '20261016_photo_storage_external'
+branch_labels = None
+depends_on = None
+
+
+NEW_COLUMNS = (
+    ('storage_backend', sa.String(length=20)),
+    ('storage_key', sa.String(length=255)),
+)
+
+
+def _column_exists(inspector, table_name, column_name):
+    return any(col['name'] == column_name for col in inspector.get_columns(table_name))
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    if 'imagem_blobs' not in inspector.get_table_names():
+        return
+
+    for column_name, column_type in NEW_COLUMNS:
+        if not _column_exists(inspector, 'imagem_blobs', column_name):
+            op.add_column('imagem_blobs', sa.Column(column_name, column_type, nullable=True))
+
+
+def downgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    if 'imagem_blobs' not in inspector.get_table_names():
+        return
+
+    for column_name, _ in NEW_COLUMNS:
+        if _column_exists(inspector, 'imagem_blobs', column_name):
+            op.drop_column('imagem_blobs', column_name)
@@ -0,0 +1,50 @@
+"""add fotos_backup_drive photo backup manifest
+
+Revision ID: 20261016_fotos_backup_drive
+Revises: 20261016_pastas_drive
+Create Date: 2026-10-16 23:50:00
+
+One row per report photo already backed up to Google Drive, with the
+content hash and the Drive file id, so photo backups skip known photos
+without reading their bytes and copy duplicated content inside Drive.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261016_fotos_backup_drive'
+down_revision = '20261016_pastas_drive'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+
+    if 'fotos_backup_drive' in inspector.get_table_names():
+        print("⚠️ Table 'fotos_backup_drive' already exists, skipping creation.")
+        return
+
+    op.create_table('fotos_backup_drive',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('tipo', sa.String(length=20), nullable=False),
+        sa.Column('foto_id', sa.Integer(), nullable=False),
+        sa.Column('imagem_hash', sa.String(length=64), nullable=True),
+        sa.Column('drive_file_id', sa.String(length=128), nullable=False),
+        sa.Column('tamanho', sa.Integer(), nullable=True),
+        sa.Column('enviado_em', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('tipo', 'foto_id', name='uq_fotos_backup_drive_foto')
+    )
+    op.create_index('ix_fotos_backup_drive_imagem_hash', 'fotos_backup_drive', ['imagem_hash'])
+
+
+def downgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+
+    if 'fotos_backup_drive' in inspector.get_table_names():
+        op.drop_index('ix_fotos_backup_drive_imagem_hash', table_name='fotos_backup_drive')
+        op.drop_table('fotos_backup_drive')
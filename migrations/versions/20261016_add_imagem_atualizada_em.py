@@ -0,0 +1,46 @@
+"""add imagem_atualizada_em to photo tables
+
+Revision ID: 20261016_imagem_atualizada_em
+Revises: 20261016_imagem_variantes
+Create Date: 2026-10-16 14:00:00
+
+Records when a photo's image content last changed so the image routes can
+answer If-Modified-Since (alongside ETags from imagem_hash) without reading
+the blob. Existing rows fall back to created_at.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261016_imagem_atualizada_em'
+down_revision = '20261016_imagem_variantes'
+branch_labels = None
+depends_on = None
+
+
+PHOTO_TABLES = ('fotos_relatorio', 'fotos_relatorio_express')
+
+
+def _column_exists(inspector, table_name, column_name):
+    return any(col['name'] == column_name for col in inspector.get_columns(table_name))
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    tables = inspector.get_table_names()
+
+    for table_name in PHOTO_TABLES:
+        if table_name in tables and not _column_exists(inspector, table_name, 'imagem_atualizada_em'):
+            op.add_column(table_name, sa.Column('imagem_atualizada_em', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    tables = inspector.get_table_names()
+
+    for table_name in PHOTO_TABLES:
+        if table_name in tables and _column_exists(inspector, table_name, 'imagem_atualizada_em'):
+            op.drop_column(table_name, 'imagem_atualizada_em')
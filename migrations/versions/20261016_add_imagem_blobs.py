@@ -0,0 +1,71 @@
+"""add content-addressed imagem_blobs store
+
+Revision ID: 20261016_imagem_blobs
+Revises: 20260221_checklist_completion
+Create Date: 2026-10-16 09:00:00
+
+Creates imagem_blobs (one row per distinct SHA-256 of photo bytes) and
+indexes imagem_hash on fotos_relatorio / fotos_relatorio_express so photos
+can reference a shared blob instead of storing their own copy.
+Existing inline bytes are moved by migrate_images_to_blob_store.py.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261016_imagem_blobs'
+down_revision = '20260221_checklist_completion'
+branch_labels = None
+depends_on = None
+
+
+PHOTO_TABLES = ('fotos_relatorio', 'fotos_relatorio_express')
+
+
+def _index_exists(inspector, table_name, index_name):
+    return any(ix['name'] == index_name for ix in inspector.get_indexes(table_name))
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    tables = inspector.get_table_names()
+
+    if 'imagem_blobs' not in tables:
+        op.create_table('imagem_blobs',
+            sa.Column('hash', sa.String(length=64), nullable=False),
+            sa.Column('dados', sa.LargeBinary(), nullable=True),
+            sa.Column('content_type', sa.String(length=100), nullable=True),
+            sa.Column('tamanho', sa.Integer(), nullable=True),
+            sa.Column('ref_count', sa.Integer(), server_default='0', nullable=False),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+            sa.Column('liberado_em', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('hash')
+        )
+        # Coleta de lixo filtra blobs sem referência
+        op.create_index('ix_imagem_blobs_ref_count', 'imagem_blobs', ['ref_count'])
+    else:
+        print("⚠️ Table 'imagem_blobs' already exists, skipping creation.")
+
+    for table_name in PHOTO_TABLES:
+        if table_name not in tables:
+            continue
+        index_name = f'ix_{table_name}_imagem_hash'
+        if not _index_exists(inspector, table_name, index_name):
+            op.create_index(index_name, table_name, ['imagem_hash'])
+
+
+def downgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    tables = inspector.get_table_names()
+
+    for table_name in PHOTO_TABLES:
+        index_name = f'ix_{table_name}_imagem_hash'
+        if table_name in tables and _index_exists(inspector, table_name, index_name):
+            op.drop_index(index_name, table_name=table_name)
+
+    if 'imagem_blobs' in tables:
+        op.drop_index('ix_imagem_blobs_ref_count', table_name='imagem_blobs')
+        op.drop_table('imagem_blobs')
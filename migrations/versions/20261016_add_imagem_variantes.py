@@ -0,0 +1,48 @@
+"""add imagem_variantes table for resized photo derivatives
+
+Revision ID: 20261016_imagem_variantes
+Revises: 20261016_imagem_blobs
+Create Date: 2026-10-16 11:00:00
+
+Stores thumb/medium renditions (WebP and JPEG) of each distinct photo,
+keyed by the SHA-256 of the original, so listing pages and the PWA can
+request small images with ?variant= / ?w= instead of the full upload.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261016_imagem_variantes'
+down_revision = '20261016_imagem_blobs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    tables = inspector.get_table_names()
+
+    if 'imagem_variantes' not in tables:
+        op.create_table('imagem_variantes',
+            sa.Column('hash', sa.String(length=64), nullable=False),
+            sa.Column('variante', sa.String(length=20), nullable=False),
+            sa.Column('formato', sa.String(length=10), nullable=False),
+            sa.Column('dados', sa.LargeBinary(), nullable=False),
+            sa.Column('largura', sa.Integer(), nullable=True),
+            sa.Column('altura', sa.Integer(), nullable=True),
+            sa.Column('tamanho', sa.Integer(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+            sa.PrimaryKeyConstraint('hash', 'variante', 'formato')
+        )
+    else:
+        print("⚠️ Table 'imagem_variantes' already exists, skipping creation.")
+
+
+def downgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+
+    if 'imagem_variantes' in inspector.get_table_names():
+        op.drop_table('imagem_variantes')
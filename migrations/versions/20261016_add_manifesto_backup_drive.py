@@ -0,0 +1,49 @@
+"""add manifesto_backup_drive
+
+Revision ID: 20261016_manifesto_backup_drive
+Revises: 20261016_blob_storage_location
+Create Date: 2026-10-16 23:00:00
+
+One row per report (regular or Express) already backed up to Google Drive,
+with the content fingerprint that was uploaded and the Drive file id. The
+full backup only re-uploads reports whose fingerprint changed, instead of
+listing the Drive folder and matching file name prefixes.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261016_manifesto_backup_drive'
+down_revision = '20261016_blob_storage_location'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+
+    if 'manifesto_backup_drive' in inspector.get_table_names():
+        print("⚠️ Table 'manifesto_backup_drive' already exists, skipping creation.")
+        return
+
+    op.create_table('manifesto_backup_drive',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('tipo', sa.String(length=20), nullable=False),
+        sa.Column('relatorio_id', sa.Integer(), nullable=False),
+        sa.Column('impressao_digital', sa.String(length=64), nullable=False),
+        sa.Column('drive_file_id', sa.String(length=128), nullable=False),
+        sa.Column('filename', sa.String(length=255), nullable=True),
+        sa.Column('enviado_em', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('tipo', 'relatorio_id', name='uq_manifesto_backup_drive_relatorio')
+    )
+
+
+def downgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+
+    if 'manifesto_backup_drive' in inspector.get_table_names():
+        op.drop_table('manifesto_backup_drive')
@@ -0,0 +1,43 @@
+"""add pastas_drive folder cache
+
+Revision ID: 20261016_pastas_drive
+Revises: 20261016_manifesto_backup_drive
+Create Date: 2026-10-16 23:30:00
+
+Persistent path -> Drive folder id cache for the Google Drive backups, so
+folders are not searched again on every run. Entries are dropped (with
+their subfolders) when Drive answers 404 for the cached id.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261016_pastas_drive'
+down_revision = '20261016_manifesto_backup_drive'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+
+    if 'pastas_drive' in inspector.get_table_names():
+        print("⚠️ Table 'pastas_drive' already exists, skipping creation.")
+        return
+
+    op.create_table('pastas_drive',
+        sa.Column('caminho', sa.String(length=1024), nullable=False),
+        sa.Column('drive_folder_id', sa.String(length=128), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+        sa.PrimaryKeyConstraint('caminho')
+    )
+
+
+def downgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+
+    if 'pastas_drive' in inspector.get_table_names():
+        op.drop_table('pastas_drive')
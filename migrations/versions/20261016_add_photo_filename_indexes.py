@@ -0,0 +1,48 @@
+"""index photo filenames for /uploads/<filename> resolution
+
+Revision ID: 20261016_photo_filename_idx
+Revises: 20261016_imagem_atualizada_em
+Create Date: 2026-10-16 16:00:00
+
+uploaded_file resolves a filename against fotos_relatorio and
+fotos_relatorio_express in a single UNION query; both sides need an
+index on filename to avoid sequential scans.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261016_photo_filename_idx'
+down_revision = '20261016_imagem_atualizada_em'
+branch_labels = None
+depends_on = None
+
+
+PHOTO_TABLES = ('fotos_relatorio', 'fotos_relatorio_express')
+
+
+def _index_exists(inspector, table_name, index_name):
+    return any(ix['name'] == index_name for ix in inspector.get_indexes(table_name))
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    tables = inspector.get_table_names()
+
+    for table_name in PHOTO_TABLES:
+        index_name = f'ix_{table_name}_filename'
+        if table_name in tables and not _index_exists(inspector, table_name, index_name):
+            op.create_index(index_name, table_name, ['filename'])
+
+
+def downgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    tables = inspector.get_table_names()
+
+    for table_name in PHOTO_TABLES:
+        index_name = f'ix_{table_name}_filename'
+        if table_name in tables and _index_exists(inspector, table_name, index_name):
+            op.drop_index(index_name, table_name=table_name)
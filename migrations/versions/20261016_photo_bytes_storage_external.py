@@ -0,0 +1,47 @@
+"""store photo bytes uncompressed out of line for partial reads
+
+Revision ID: 20261016_photo_storage_external
+Revises: 20261016_photo_filename_idx
+Create Date: 2026-10-16 18:00:00
+
+Photos are streamed with substr() one chunk at a time. With the default
+EXTENDED storage PostgreSQL compresses TOAST values, and slicing a
+compressed value decompresses it entirely; EXTERNAL keeps the bytes
+uncompressed (JPEG/PNG/WebP barely compress anyway) so each substr()
+fetches only the TOAST chunks it needs. Applies to rows written after
+the migration. No-op on other databases.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261016_photo_storage_external'
+down_revision = '20261016_photo_filename_idx'
+branch_labels = None
+depends_on = None
+
+
+BYTES_COLUMNS = (
+    ('imagem_blobs', 'dados'),
+    ('fotos_relatorio', 'imagem'),
+    ('fotos_relatorio_express', 'imagem'),
+)
+
+
+def _set_storage(storage):
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql':
+        return
+    tables = sa.inspect(conn).get_table_names()
+    for table_name, column_name in BYTES_COLUMNS:
+        if table_name in tables:
+            op.execute(f'ALTER TABLE {table_name} ALTER COLUMN {column_name} SET STORAGE {storage}')
+
+
+def upgrade():
+    _set_storage('EXTERNAL')
+
+
+def downgrade():
+    _set_storage('EXTENDED')
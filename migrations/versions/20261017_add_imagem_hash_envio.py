@@ -0,0 +1,53 @@
+"""add imagem_hash_envio to photo tables
+
+Revision ID: 20261017_imagem_hash_envio
+Revises: 20261016_fotos_backup_drive
+Create Date: 2026-10-17 09:00:00
+
+SHA-256 of the bytes the client uploaded. Background normalization
+re-encodes the photo and changes imagem_hash, so duplicate checks on
+autosave retries and offline re-syncs look photos up by this column.
+Existing rows are backfilled from imagem_hash.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261017_imagem_hash_envio'
+down_revision = '20261016_fotos_backup_drive'
+branch_labels = None
+depends_on = None
+
+
+PHOTO_TABLES = ('fotos_relatorio', 'fotos_relatorio_express')
+
+
+def _column_exists(inspector, table_name, column_name):
+    return any(col['name'] == column_name for col in inspector.get_columns(table_name))
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    tables = inspector.get_table_names()
+
+    for table_name in PHOTO_TABLES:
+        if table_name in tables and not _column_exists(inspector, table_name, 'imagem_hash_envio'):
+            op.add_column(table_name, sa.Column('imagem_hash_envio', sa.String(length=64), nullable=True))
+            op.create_index(f'ix_{table_name}_imagem_hash_envio', table_name, ['imagem_hash_envio'])
+            op.execute(
+                f"UPDATE {table_name} SET imagem_hash_envio = imagem_hash "
+                f"WHERE imagem_hash_envio IS NULL AND imagem_hash IS NOT NULL"
+            )
+
+
+def downgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    tables = inspector.get_table_names()
+
+    for table_name in PHOTO_TABLES:
+        if table_name in tables and _column_exists(inspector, table_name, 'imagem_hash_envio'):
+            op.drop_index(f'ix_{table_name}_imagem_hash_envio', table_name=table_name)
+            op.drop_column(table_name, 'imagem_hash_envio')
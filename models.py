@@ -1,4 +1,5 @@
 from datetime import datetime
+import logging
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from app import db
@@ -161,6 +162,77 @@ class GoogleDriveToken(db.Model):
         return f.decrypt(self.encrypted_refresh_token.encode()).decode()
 
 
+class PastaDrive(db.Model):
+    """
+    Cache persistente caminho -> ID das pastas usadas pelos backups no Google Drive
+
+    Caminhos como "Backup Fotos/Obra X/2025-01-10 - Relatorio - 12_2025".
+    Mantido por GoogleDriveBackupOAuth.pasta/subpastas: com o cache quente, um
+    backup não faz nenhuma busca de pasta na API. Uma entrada cujo ID não
+    existe mais (404) é removida junto com as subpastas.
+    """
+    __tablename__ = 'pastas_drive'
+
+    caminho = db.Column(db.String(1024), primary_key=True)
+    drive_folder_id = db.Column(db.String(128), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=brazil_now)
+
+    def __repr__(self):
+        return f'<PastaDrive {self.caminho} {self.drive_folder_id}>'
+
+
+class ManifestoBackupDrive(db.Model):
+    """
+    PDFs de relatórios já enviados ao Google Drive pelo backup completo
+
+    Uma linha por relatório (comum ou Express) com a impressão digital do
+    conteúdo enviado (pdf_cache.impressao_digital sem a versão do layout) e o
+    id do arquivo no Drive. O backup compara as impressões digitais e só
+    reenvia os relatórios alterados, atualizando o mesmo arquivo.
+    """
+    __tablename__ = 'manifesto_backup_drive'
+    __table_args__ = (
+        db.UniqueConstraint('tipo', 'relatorio_id', name='uq_manifesto_backup_drive_relatorio'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(20), nullable=False)  # relatorio, express
+    relatorio_id = db.Column(db.Integer, nullable=False)
+    impressao_digital = db.Column(db.String(64), nullable=False)
+    drive_file_id = db.Column(db.String(128), nullable=False)
+    filename = db.Column(db.String(255), nullable=True)
+    enviado_em = db.Column(db.DateTime, nullable=False, default=brazil_now)
+
+    def __repr__(self):
+        return f'<ManifestoBackupDrive {self.tipo} {self.relatorio_id} {self.impressao_digital[:12]}>'
+
+
+class FotoBackupDrive(db.Model):
+    """
+    Fotos de relatórios já enviadas ao Google Drive pelo backup de fotos
+
+    Uma linha por foto (comum ou Express) com o SHA-256 do conteúdo e o id do
+    arquivo no Drive. Fotos já registradas não são lidas de novo, e uma foto
+    cujo conteúdo já está no Drive (mesmo imagem_hash em outro relatório) é
+    copiada no próprio Drive em vez de enviada outra vez.
+    """
+    __tablename__ = 'fotos_backup_drive'
+    __table_args__ = (
+        db.UniqueConstraint('tipo', 'foto_id', name='uq_fotos_backup_drive_foto'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(20), nullable=False)  # relatorio, express
+    foto_id = db.Column(db.Integer, nullable=False)
+    imagem_hash = db.Column(db.String(64), nullable=True, index=True)  # NULL: adotada de backup antigo
+    drive_file_id = db.Column(db.String(128), nullable=False)
+    tamanho = db.Column(db.Integer, nullable=True)
+    enviado_em = db.Column(db.DateTime, nullable=False, default=brazil_now)
+
+    def __repr__(self):
+        return f'<FotoBackupDrive {self.tipo} {self.foto_id} {(self.imagem_hash or "")[:12]}>'
+
+
 class TipoObra(db.Model):
     __tablename__ = 'tipos_obra'
     
@@ -480,7 +552,147 @@ class ComunicacaoVisita(db.Model):
     def fotos(self):
         return FotoRelatorio.query.filter_by(relatorio_id=self.id).order_by(FotoRelatorio.ordem).all()
 
-class FotoRelatorio(db.Model):
+class ImagemBlob(db.Model):
+    """
+    Armazenamento de imagens endereçado por conteúdo (SHA-256)
+
+    FotoRelatorio e FotoRelatorioExpress referenciam o blob pelo imagem_hash,
+    então a mesma foto enviada várias vezes (re-upload, sincronização offline,
+    relatório duplicado) ocupa espaço uma única vez. ref_count é mantido pelos
+    eventos em photo_storage.py e reconciliado pela coleta de lixo.
+    """
+    __tablename__ = 'imagem_blobs'
+
+    hash = db.Column(db.String(64), primary_key=True)
+    dados = db.deferred(db.Column(db.LargeBinary, nullable=True))
+    content_type = db.Column(db.String(100), nullable=True)
+    tamanho = db.Column(db.Integer, nullable=True)
+    ref_count = db.Column(db.Integer, nullable=False, default=0, index=True)
+    created_at = db.Column(db.DateTime, default=brazil_now)
+    liberado_em = db.Column(db.DateTime, nullable=True)  # Última vez que uma referência foi removida
+    # Bytes descarregados para fora do banco (photo_backends.py): dados fica NULL
+    storage_backend = db.Column(db.String(20), nullable=True)  # local, s3
+    storage_key = db.Column(db.String(255), nullable=True)
+
+    @classmethod
+    def carregar_dados(cls, hashes):
+        """Retorna {hash: bytes} para os hashes informados (uma query; blobs externos lidos do backend)"""
+        hashes = [h for h in set(hashes) if h]
+        if not hashes:
+            return {}
+        rows = db.session.query(
+            cls.hash, cls.dados, cls.storage_backend, cls.storage_key
+        ).filter(cls.hash.in_(hashes)).all()
+
+        resultado = {}
+        for h, dados, backend, chave in rows:
+            if dados:
+                resultado[h] = bytes(dados)
+            elif backend and chave:
+                from photo_backends import obter_backend
+                try:
+                    resultado[h] = obter_backend(backend).ler(chave)
+                except Exception as e:
+                    logging.error(f"❌ Blob {h[:12]} indisponível no backend {backend}: {e}")
+        return resultado
+
+    def __repr__(self):
+        return f'<ImagemBlob {self.hash[:12]} refs={self.ref_count}>'
+
+
+class ImagemVariante(db.Model):
+    """
+    Versões redimensionadas de uma imagem (thumb/medium) em WebP e JPEG
+
+    Chaveadas pelo hash do conteúdo original, então fotos deduplicadas no
+    blob store compartilham as mesmas variantes. Geradas no upload por
+    photo_variants.py (ou sob demanda para fotos legadas).
+    """
+    __tablename__ = 'imagem_variantes'
+
+    hash = db.Column(db.String(64), primary_key=True)
+    variante = db.Column(db.String(20), primary_key=True)  # thumb, medium
+    formato = db.Column(db.String(10), primary_key=True)  # webp, jpeg
+    dados = db.deferred(db.Column(db.LargeBinary, nullable=False))
+    largura = db.Column(db.Integer, nullable=True)
+    altura = db.Column(db.Integer, nullable=True)
+    tamanho = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=brazil_now)
+
+    def __repr__(self):
+        return f'<ImagemVariante {self.hash[:12]} {self.variante}.{self.formato}>'
+
+
+class FotoImagemMixin:
+    """
+    Acesso explícito aos bytes das fotos.
+
+    A coluna `imagem` é adiada (deferred): consultas de metadados não trazem o
+    BYTEA. Somente as rotas que servem a imagem e os geradores de PDF devem
+    carregar os bytes, via get_image_bytes() ou com_imagem().
+
+    Fotos novas guardam os bytes em ImagemBlob (imagem fica NULL e imagem_hash
+    aponta para o blob); fotos legadas ainda têm os bytes na própria linha.
+
+    imagem_hash muda quando a foto é normalizada; imagem_hash_envio guarda o
+    hash dos bytes enviados pelo cliente e é a identidade usada para detectar
+    reenvios da mesma foto (retry do autosave, sincronização offline).
+    """
+
+    @classmethod
+    def buscar_enviada(cls, imagem_hash, **filtros):
+        """Foto já gravada a partir do mesmo arquivo enviado (hash dos bytes do cliente), ou None"""
+        return cls.query.filter_by(imagem_hash_envio=imagem_hash, **filtros).first()
+
+    @classmethod
+    def com_imagem(cls):
+        """Opção de query que carrega a coluna imagem junto com a linha (evita N+1 em lotes)"""
+        return db.undefer(cls.imagem)
+
+    @classmethod
+    def filtro_com_imagem(cls):
+        """Expressão SQL: foto tem bytes, na própria linha ou no blob store"""
+        no_store = db.exists().where(ImagemBlob.hash == cls.imagem_hash)
+        return db.or_(cls.imagem.isnot(None), no_store)
+
+    @classmethod
+    def tamanho_armazenado(cls, foto_id):
+        """Tamanho em bytes efetivamente gravado no banco, calculado via SQL (sem trazer o BYTEA)"""
+        inline = db.session.query(db.func.length(cls.imagem)).filter(cls.id == foto_id).scalar()
+        if inline:
+            return inline
+        return db.session.query(
+            db.func.coalesce(db.func.length(ImagemBlob.dados), ImagemBlob.tamanho)
+        ).join(
+            cls, cls.imagem_hash == ImagemBlob.hash
+        ).filter(cls.id == foto_id).scalar() or 0
+
+    @staticmethod
+    def precarregar_imagens(fotos):
+        """Carrega em uma única query os blobs de uma lista de fotos (usado pelos geradores de PDF)"""
+        pendentes = [f for f in fotos if isinstance(f, FotoImagemMixin) and f.imagem_hash
+                     and not f.__dict__.get('imagem') and '_blob_dados' not in f.__dict__]
+        if not pendentes:
+            return
+        dados = ImagemBlob.carregar_dados(f.imagem_hash for f in pendentes)
+        for foto in pendentes:
+            foto._blob_dados = dados.get(foto.imagem_hash)
+
+    def get_image_bytes(self):
+        """Retorna os bytes da imagem (ou None), carregando a coluna adiada ou o blob se necessário"""
+        data = self.imagem
+        if isinstance(data, memoryview):
+            data = bytes(data)
+        if data:
+            return data
+        if not self.imagem_hash:
+            return None
+        if '_blob_dados' not in self.__dict__:
+            self._blob_dados = ImagemBlob.carregar_dados([self.imagem_hash]).get(self.imagem_hash)
+        return self._blob_dados
+
+
+class FotoRelatorio(FotoImagemMixin, db.Model):
     __tablename__ = 'fotos_relatorio'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -488,7 +700,7 @@ class FotoRelatorio(db.Model):
     
     # Campos de URL e filesystem (nova estrutura)
     url = db.Column(db.Text, nullable=True)  # URL da imagem (path relativo ou absoluto)
-    filename = db.Column(db.String(255), nullable=True)  # Nome do arquivo
+    filename = db.Column(db.String(255), nullable=True, index=True)  # Nome do arquivo (resolução de /uploads)
     filename_original = db.Column(db.String(255))
     filename_anotada = db.Column(db.String(255))
     
@@ -503,8 +715,11 @@ class FotoRelatorio(db.Model):
     coordenadas_anotacao = db.Column(db.JSON)
     
     # Armazenamento binário (legacy - manter compatibilidade)
-    imagem = db.Column(db.LargeBinary, nullable=True)
-    imagem_hash = db.Column(db.String(64), nullable=True)
+    # Coluna adiada: só é lida do banco via get_image_bytes() (rotas de servir imagem e PDF)
+    imagem = db.deferred(db.Column(db.LargeBinary, nullable=True))
+    imagem_hash = db.Column(db.String(64), nullable=True, index=True)  # Chave do ImagemBlob
+    imagem_hash_envio = db.Column(db.String(64), nullable=True, index=True)  # SHA-256 do arquivo enviado (duplicatas)
+    imagem_atualizada_em = db.Column(db.DateTime, nullable=True)  # Last-Modified das rotas de imagem
     content_type = db.Column(db.String(100), nullable=True)
     imagem_size = db.Column(db.Integer, nullable=True)
     
@@ -828,7 +1043,7 @@ class RelatorioExpress(db.Model):
         return f'<RelatorioExpress {self.numero}>'
 
 
-class FotoRelatorioExpress(db.Model):
+class FotoRelatorioExpress(FotoImagemMixin, db.Model):
     """
     Fotos do Relatório Express - Idêntico ao FotoRelatorio
     """
@@ -839,7 +1054,7 @@ class FotoRelatorioExpress(db.Model):
     
     # Campos de URL e filesystem
     url = db.Column(db.Text, nullable=True)
-    filename = db.Column(db.String(255), nullable=True)
+    filename = db.Column(db.String(255), nullable=True, index=True)  # Resolução de /uploads
     filename_original = db.Column(db.String(255))
     filename_anotada = db.Column(db.String(255))
     
@@ -854,8 +1069,11 @@ class FotoRelatorioExpress(db.Model):
     coordenadas_anotacao = db.Column(db.JSON)
     
     # Armazenamento binário (legacy)
-    imagem = db.Column(db.LargeBinary, nullable=True)
-    imagem_hash = db.Column(db.String(64), nullable=True)
+    # Coluna adiada: só é lida do banco via get_image_bytes() (rotas de servir imagem e PDF)
+    imagem = db.deferred(db.Column(db.LargeBinary, nullable=True))
+    imagem_hash = db.Column(db.String(64), nullable=True, index=True)  # Chave do ImagemBlob
+    imagem_hash_envio = db.Column(db.String(64), nullable=True, index=True)  # SHA-256 do arquivo enviado (duplicatas)
+    imagem_atualizada_em = db.Column(db.DateTime, nullable=True)  # Last-Modified das rotas de imagem
     content_type = db.Column(db.String(100), nullable=True)
     imagem_size = db.Column(db.Integer, nullable=True)
     
@@ -909,4 +1127,8 @@ class Lembrete(db.Model):
             'fechado_por': self.fechado_por.username if self.fechado_por else None,
             'criado_em': self.criado_em.isoformat() if self.criado_em else None,
             'criado_por': self.criado_por.username if self.criado_por else None
-        }
\ No newline at end of file
+        }
+
+
+# Registra os eventos do blob store endereçado por conteúdo (precisa dos modelos acima)
+import photo_storage  # noqa: E402,F401
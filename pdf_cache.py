@@ -0,0 +1,394 @@
+"""
+Cache persistente dos PDFs de relatórios
+
+Cada PDF gerado pelo WeasyPrint é gravado em PDF_CACHE_FOLDER com o nome
+<tipo>_<id>_<impressão digital>.pdf. A impressão digital é um SHA-256 de tudo
+o que o PDF mostra: colunas do relatório (inclusive updated_at e status),
+obra, autor, metadados e imagem_hash de cada foto, e o código do gerador.
+Qualquer edição (texto, fotos, legendas, aprovação) ou deploy de um novo
+layout gera outra impressão digital, então uma entrada nunca fica
+desatualizada; a versão anterior do mesmo relatório é removida ao gravar a nova.
+
+A renderização em si roda isolada no pool de pdf_render_pool.py. Os segmentos
+de página da composição por partes (pdf_segmentos.py) também ficam aqui, como
+segmento_<impressão digital>.pdf, e saem pela mesma limpeza por último acesso.
+
+Visualizações e downloads repetidos de relatórios sem alteração (o caso comum
+dos aprovados) são servidos do disco com send_file, com a impressão digital
+como ETag. A data impressa no PDF é a da geração que entrou no cache.
+"""
+
+import os
+import json
+import time
+import glob
+import hashlib
+import logging
+import tempfile
+
+from flask import current_app
+from sqlalchemy import inspect
+
+logger = logging.getLogger(__name__)
+
+TIPO_RELATORIO = 'relatorio'
+TIPO_EXPRESS = 'express'
+TIPO_SEGMENTO = 'segmento'
+
+_versao_gerador = {}
+
+
+def _diretorio():
+    return current_app.config.get('PDF_CACHE_FOLDER')
+
+
+def habilitado():
+    return bool(_diretorio())
+
+
+def _versao_layout():
+    """Hash do código dos geradores: um novo layout invalida todo o cache"""
+    if 'hash' not in _versao_gerador:
+        digest = hashlib.sha256()
+        base = os.path.dirname(os.path.abspath(__file__))
+        for modulo in ('pdf_generator_weasy.py', 'pdf_generator_express.py', 'pdf_segmentos.py'):
+            try:
+                with open(os.path.join(base, modulo), 'rb') as f:
+                    digest.update(f.read())
+            except OSError:
+                digest.update(modulo.encode())
+        _versao_gerador['hash'] = digest.hexdigest()
+    return _versao_gerador['hash']
+
+
+def _colunas(obj):
+    """Valores das colunas mapeadas, sem as adiadas (bytes da imagem nunca são lidos)"""
+    if obj is None:
+        return None
+    return {
+        attr.key: getattr(obj, attr.key)
+        for attr in inspect(obj).mapper.column_attrs
+        if not attr.deferred
+    }
+
+
+def impressao_digital(relatorio, fotos, projeto=None, layout=True):
+    """
+    SHA-256 do conteúdo que determina o PDF.
+
+    Usa apenas metadados: as fotos entram pelo imagem_hash (ou, nas legadas
+    sem hash, por tamanho e data da última troca de imagem). Com layout=False
+    a versão dos geradores não entra (manifesto do backup no Drive: um deploy
+    de layout não reenvia todos os relatórios).
+    """
+    autor = getattr(relatorio, 'autor', None)
+    conteudo = {
+        'layout': _versao_layout() if layout else None,
+        'relatorio': _colunas(relatorio),
+        'projeto': _colunas(projeto),
+        'autor': getattr(autor, 'nome_completo', None),
+        'fotos': [_colunas(foto) for foto in fotos],
+    }
+    serializado = json.dumps(conteudo, sort_keys=True, default=str)
+    return hashlib.sha256(serializado.encode('utf-8')).hexdigest()
+
+
+def _prefixo(tipo, relatorio_id):
+    return f"{tipo}_{int(relatorio_id)}_"
+
+
+def _caminho(tipo, relatorio_id, digital):
+    return os.path.join(_diretorio(), f"{_prefixo(tipo, relatorio_id)}{digital}.pdf")
+
+
+def obter(tipo, relatorio_id, digital):
+    """Caminho do PDF em cache para a impressão digital, ou None"""
+    if not habilitado():
+        return None
+    caminho = _caminho(tipo, relatorio_id, digital)
+    try:
+        agora = time.time()
+        os.utime(caminho, (agora, agora))  # Último acesso, usado pela limpeza
+    except OSError:
+        return None
+    return caminho
+
+
+def _gravar_arquivo(caminho, pdf_bytes):
+    """Escrita atômica no diretório do cache (False se falhou)"""
+    try:
+        os.makedirs(_diretorio(), exist_ok=True)
+        fd, temporario = tempfile.mkstemp(dir=_diretorio(), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(pdf_bytes)
+            os.replace(temporario, caminho)
+        except BaseException:
+            os.unlink(temporario)
+            raise
+    except OSError as e:
+        logger.warning(f"⚠️ Cache de PDF: falha ao gravar {os.path.basename(caminho)}: {e}")
+        return False
+    return True
+
+
+def gravar(tipo, relatorio_id, digital, pdf_bytes):
+    """
+    Grava o PDF (escrita atômica) e remove versões anteriores do mesmo relatório.
+
+    Returns:
+        str | None: Caminho gravado, ou None se o cache está desabilitado/falhou
+    """
+    if not habilitado():
+        return None
+    caminho = _caminho(tipo, relatorio_id, digital)
+    if not _gravar_arquivo(caminho, pdf_bytes):
+        return None
+
+    invalidar(tipo, relatorio_id, manter=caminho)
+    logger.info(f"💾 Cache de PDF: {os.path.basename(caminho)} gravado ({len(pdf_bytes) / 1024:.0f}KB)")
+    return caminho
+
+
+def invalidar(tipo, relatorio_id, manter=None):
+    """Remove os PDFs em cache de um relatório (exceto `manter`)"""
+    if not habilitado():
+        return 0
+    removidos = 0
+    for caminho in glob.glob(os.path.join(_diretorio(), f"{_prefixo(tipo, relatorio_id)}*.pdf")):
+        if caminho == manter:
+            continue
+        try:
+            os.unlink(caminho)
+            removidos += 1
+        except OSError:
+            pass
+    return removidos
+
+
+# =============================================================================
+# SEGMENTOS (composição do PDF por páginas, pdf_segmentos.py)
+# =============================================================================
+
+def impressao_segmento(conteudo, fotos):
+    """
+    SHA-256 de um segmento do PDF: o que ele mostra (`conteudo`, já serializável)
+    e os metadados das fotos, como em impressao_digital.
+    """
+    serializado = json.dumps({
+        'layout': _versao_layout(),
+        'segmento': conteudo,
+        'fotos': [_colunas(foto) for foto in fotos],
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(serializado.encode('utf-8')).hexdigest()
+
+
+def _caminho_segmento(digital):
+    return os.path.join(_diretorio(), f"{TIPO_SEGMENTO}_{digital}.pdf")
+
+
+def obter_segmento(digital):
+    """Bytes do segmento em cache, ou None"""
+    if not habilitado():
+        return None
+    caminho = _caminho_segmento(digital)
+    try:
+        agora = time.time()
+        os.utime(caminho, (agora, agora))  # Último acesso, usado pela limpeza
+        with open(caminho, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def gravar_segmento(digital, pdf_bytes):
+    """
+    Grava um segmento. Segmentos são endereçados pelo conteúdo e compartilhados
+    entre versões do relatório: os que deixam de ser usados saem pela limpeza.
+    """
+    if habilitado():
+        _gravar_arquivo(_caminho_segmento(digital), pdf_bytes)
+
+
+def limpar(dias_sem_acesso=30):
+    """
+    Remove PDFs não acessados há mais de `dias_sem_acesso` (relatórios excluídos
+    ou antigos) e temporários abandonados.
+
+    Returns:
+        int: Quantidade de arquivos removidos
+    """
+    diretorio = _diretorio()
+    if not diretorio or not os.path.isdir(diretorio):
+        return 0
+    limite = time.time() - dias_sem_acesso * 86400
+    limite_temporarios = time.time() - 3600
+    removidos = 0
+    for entrada in os.scandir(diretorio):
+        try:
+            mtime = entrada.stat().st_mtime
+            temporario = entrada.name.startswith('.tmp-')
+            if (temporario and mtime < limite_temporarios) or (not temporario and mtime < limite):
+                os.unlink(entrada.path)
+                removidos += 1
+        except OSError:
+            continue
+    return removidos
+
+
+def fotos_e_impressao(tipo, relatorio):
+    """Fotos do relatório (só metadados; a coluna imagem continua adiada) e a impressão digital"""
+    from models import FotoRelatorio, FotoRelatorioExpress
+
+    if tipo == TIPO_EXPRESS:
+        fotos = FotoRelatorioExpress.query.filter_by(
+            relatorio_express_id=relatorio.id
+        ).order_by(FotoRelatorioExpress.ordem).all()
+        return fotos, impressao_digital(relatorio, fotos)
+
+    fotos = FotoRelatorio.query.filter_by(relatorio_id=relatorio.id).order_by(FotoRelatorio.ordem).all()
+    return fotos, impressao_digital(relatorio, fotos, relatorio.projeto)
+
+
+def pdf_relatorio(relatorio):
+    """
+    PDF de um relatório comum, do cache ou gerado (e gravado no cache).
+
+    Returns:
+        tuple(str | None, bytes | None, str): (caminho em cache, bytes gerados, impressão digital).
+        Em um acerto só o caminho é preenchido; os bytes só quando o cache
+        está desabilitado ou a gravação falhou.
+    """
+    _, digital = fotos_e_impressao(TIPO_RELATORIO, relatorio)
+
+    caminho = obter(TIPO_RELATORIO, relatorio.id, digital)
+    if caminho:
+        logger.debug(f"📄 Cache de PDF: acerto para relatório {relatorio.id}")
+        return caminho, None, digital
+
+    import pdf_render_pool
+    pdf_bytes = pdf_render_pool.renderizar(pdf_render_pool.RELATORIO, relatorio.id)
+    caminho = gravar(TIPO_RELATORIO, relatorio.id, digital, pdf_bytes)
+    return caminho, None if caminho else pdf_bytes, digital
+
+
+def pdf_relatorio_express(relatorio_express):
+    """Mesmo que pdf_relatorio, para Relatórios Express"""
+    import pdf_render_pool
+
+    _, digital = fotos_e_impressao(TIPO_EXPRESS, relatorio_express)
+
+    caminho = obter(TIPO_EXPRESS, relatorio_express.id, digital)
+    if caminho:
+        logger.debug(f"📄 Cache de PDF: acerto para Relatório Express {relatorio_express.id}")
+        return caminho, None, digital
+
+    pdf_bytes = pdf_render_pool.renderizar(pdf_render_pool.EXPRESS, relatorio_express.id)
+    caminho = gravar(TIPO_EXPRESS, relatorio_express.id, digital, pdf_bytes)
+    return caminho, None if caminho else pdf_bytes, digital
+
+
+def impressoes_em_lote(tipo, relatorios, layout=True):
+    """
+    Impressões digitais de vários relatórios do mesmo tipo, com uma única
+    query de fotos. Para relatórios comuns, carregue `relatorios` com a obra
+    e o autor (joinedload) para evitar N+1.
+
+    Returns:
+        dict: {id do relatório: impressão digital}
+    """
+    from models import FotoRelatorio, FotoRelatorioExpress
+    from pdf_modelos import fotos_por_relatorio
+
+    ids = [relatorio.id for relatorio in relatorios]
+    if tipo == TIPO_EXPRESS:
+        fotos = fotos_por_relatorio(FotoRelatorioExpress, FotoRelatorioExpress.relatorio_express_id, ids)
+    else:
+        fotos = fotos_por_relatorio(FotoRelatorio, FotoRelatorio.relatorio_id, ids)
+
+    return {
+        relatorio.id: impressao_digital(
+            relatorio, fotos[relatorio.id], relatorio.projeto if tipo == TIPO_RELATORIO else None, layout=layout
+        )
+        for relatorio in relatorios
+    }
+
+
+def pdfs_em_lote(tipo, relatorios):
+    """
+    PDFs de vários relatórios do mesmo tipo (backup em lote).
+
+    As impressões digitais do lote usam uma única query de fotos, e os PDFs
+    que não estão em cache são renderizados juntos, em uma tarefa do pool
+    (pdf_render_pool.renderizar_lote). Para relatórios comuns, carregue
+    `relatorios` com a obra e o autor (joinedload) para evitar N+1.
+
+    Returns:
+        tuple(dict, dict): ({id: resultado como o de pdf_relatorio}, {id: mensagem de erro})
+    """
+    import pdf_render_pool
+
+    tipo_renderizacao = pdf_render_pool.EXPRESS if tipo == TIPO_EXPRESS else pdf_render_pool.RELATORIO
+
+    resultados, digitais = {}, {}
+    for relatorio_id, digital in impressoes_em_lote(tipo, relatorios).items():
+        caminho = obter(tipo, relatorio_id, digital)
+        if caminho:
+            resultados[relatorio_id] = (caminho, None, digital)
+        else:
+            digitais[relatorio_id] = digital
+
+    if not digitais:
+        return resultados, {}
+    try:
+        pdfs, erros = pdf_render_pool.renderizar_lote(tipo_renderizacao, list(digitais))
+    except pdf_render_pool.RenderizacaoFalhou as e:
+        return resultados, {relatorio_id: str(e) for relatorio_id in digitais}
+    for relatorio_id, pdf_bytes in pdfs.items():
+        caminho = gravar(tipo, relatorio_id, digitais[relatorio_id], pdf_bytes)
+        resultados[relatorio_id] = (caminho, None if caminho else pdf_bytes, digitais[relatorio_id])
+    return resultados, erros
+
+
+def resposta_pdf(resultado, download_name, as_attachment=False):
+    """
+    Resposta HTTP do PDF: arquivo em cache via send_file (sendfile, 304 pelo
+    ETag da impressão digital) ou os bytes recém-gerados.
+    """
+    import io
+    from flask import send_file
+
+    caminho, pdf_bytes, digital = resultado
+    response = send_file(
+        caminho if pdf_bytes is None else io.BytesIO(pdf_bytes),
+        mimetype='application/pdf',
+        as_attachment=as_attachment,
+        download_name=download_name,
+        etag=digital,
+        conditional=True,
+    )
+    # Revalida a cada acesso: uma edição troca a impressão digital
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def ler(resultado):
+    """Bytes de um resultado de pdf_relatorio/pdf_relatorio_express"""
+    caminho, pdf_bytes, _ = resultado
+    if pdf_bytes is not None:
+        return pdf_bytes
+    with open(caminho, 'rb') as f:
+        return f.read()
+
+
+def salvar_copia(resultado, destino):
+    """Copia o PDF para um caminho fixo (anexo de e-mail da aprovação)"""
+    import shutil
+    caminho, pdf_bytes, _ = resultado
+    os.makedirs(os.path.dirname(destino) or '.', exist_ok=True)
+    if pdf_bytes is not None:
+        with open(destino, 'wb') as f:
+            f.write(pdf_bytes)
+    else:
+        shutil.copyfile(caminho, destino)
+    return destino
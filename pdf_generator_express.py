@@ -1,11 +1,10 @@
 """
 Gerador de PDF para Relatórios Express usando WeasyPrint
-Este módulo fornece funções para gerar PDFs de Relatórios Express,
-adaptando-os para funcionar com o mesmo gerador dos relatórios comuns.
+Este módulo fornece funções para gerar PDFs de Relatórios Express com o
+mesmo gerador dos relatórios comuns, a partir dos modelos de pdf_modelos.py.
 """
 
 import os
-import json
 import logging
 from datetime import datetime
 from io import BytesIO
@@ -42,7 +41,7 @@ def gerar_pdf_relatorio_express(relatorio_ou_id, output_path=None, salvar_arquiv
     Gera PDF do Relatório Express usando WeasyPrint.
     
     Args:
-        relatorio_ou_id: Objeto RelatorioExpress ou ID do relatório
+        relatorio_ou_id: Objeto RelatorioExpress, RelatorioPDF (pdf_modelos) ou ID do relatório
         output_path: Caminho para salvar o arquivo (opcional)
         salvar_arquivo: Se True, salva em arquivo; se False, retorna BytesIO
         
@@ -50,118 +49,24 @@ def gerar_pdf_relatorio_express(relatorio_ou_id, output_path=None, salvar_arquiv
         dict com 'success' e 'path'/'data' ou 'error'
         ou BytesIO se salvar_arquivo=False
     """
-    from app import db
-    from models import RelatorioExpress, FotoRelatorioExpress
+    from pdf_modelos import RelatorioPDF, carregar_express
     
     try:
-        if isinstance(relatorio_ou_id, int):
-            relatorio_express = RelatorioExpress.query.get(relatorio_ou_id)
-            if not relatorio_express:
-                if salvar_arquivo:
-                    return {'success': False, 'error': f'Relatório Express {relatorio_ou_id} não encontrado'}
-                else:
-                    raise Exception(f'Relatório Express {relatorio_ou_id} não encontrado')
+        # O gerador recebe o modelo de renderização (obra dos campos obra_*, fotos já carregadas)
+        if isinstance(relatorio_ou_id, RelatorioPDF):
+            relatorio_pdf = relatorio_ou_id
         else:
-            relatorio_express = relatorio_ou_id
-        
-        fotos = FotoRelatorioExpress.query.filter_by(
-            relatorio_express_id=relatorio_express.id
-        ).order_by(FotoRelatorioExpress.ordem).all()
-        
-        class VirtualProject:
-            """Projeto virtual com dados da obra express"""
-            def __init__(self, obra_nome, obra_endereco, obra_construtora, obra_responsavel, info_tecnica=None):
-                self.nome = obra_nome or 'Obra Express'
-                self.endereco = obra_endereco or ''
-                self.construtora = obra_construtora or ''
-                self.cliente = obra_construtora or ''
-                self.responsavel = obra_responsavel or ''
-                
-                # Campos técnicos
-                info = info_tecnica or {}
-                self.elementos_construtivos_base = info.get('elementos_construtivos_base')
-                self.especificacao_chapisco_colante = info.get('especificacao_chapisco_colante')
-                self.especificacao_chapisco_alvenaria = info.get('especificacao_chapisco_alvenaria')
-                self.especificacao_argamassa_emboco = info.get('especificacao_argamassa_emboco')
-                self.forma_aplicacao_argamassa = info.get('forma_aplicacao_argamassa')
-                self.acabamentos_revestimento = info.get('acabamentos_revestimento')
-                self.acabamento_peitoris = info.get('acabamento_peitoris')
-                self.acabamento_muretas = info.get('acabamento_muretas')
-                self.definicao_frisos_cor = info.get('definicao_frisos_cor')
-                self.definicao_face_inferior_abas = info.get('definicao_face_inferior_abas')
-                self.observacoes_projeto_fachada = info.get('observacoes_projeto_fachada')
-                self.outras_observacoes = info.get('outras_observacoes')
-        
-        class VirtualAuthor:
-            """Autor virtual quando não há autor real"""
-            def __init__(self, nome='Não informado'):
-                self.nome_completo = nome
-        
-        class ExpressReportAdapter:
-            """Adaptador para fazer RelatorioExpress funcionar com WeasyPrintReportGenerator"""
-            def __init__(self, express_report):
-                self.id = express_report.id
-                self.numero = express_report.numero
-                self.titulo = express_report.titulo
-                self.conteudo = express_report.conteudo or ''
-                self.data_relatorio = express_report.data_relatorio
-                self.data_aprovacao = express_report.data_aprovacao
-                self.status = express_report.status
-                
-                obs_finais_clean = express_report.observacoes_finais or ''
-                if ' [offline_id:' in obs_finais_clean:
-                    obs_finais_clean = obs_finais_clean.split(' [offline_id:')[0].strip()
-                self.observacoes_finais = obs_finais_clean
-                
-                acomp = express_report.acompanhantes
-                if isinstance(acomp, str):
-                    try:
-                        self.acompanhantes = json.loads(acomp)
-                    except:
-                        self.acompanhantes = []
-                else:
-                    self.acompanhantes = acomp or []
-                
-                self.checklist_data = express_report.checklist_data
-                
-                if express_report.autor:
-                    self.autor = express_report.autor
+            relatorio_id = relatorio_ou_id if isinstance(relatorio_ou_id, int) else relatorio_ou_id.id
+            modelos = carregar_express([relatorio_id])
+            if not modelos:
+                if salvar_arquivo:
+                    return {'success': False, 'error': f'Relatório Express {relatorio_id} não encontrado'}
                 else:
-                    self.autor = VirtualAuthor('Não informado')
-                
-                self.aprovador = express_report.aprovador
-                
-                # Parse technical info
-                info_tecnica = {}
-                if express_report.informacoes_tecnicas:
-                    try:
-                        if isinstance(express_report.informacoes_tecnicas, str):
-                            info_tecnica = json.loads(express_report.informacoes_tecnicas)
-                        else:
-                            info_tecnica = express_report.informacoes_tecnicas
-                    except:
-                        pass
-
-                # Ensure created_at is set, fallback to current time
-                try:
-                    from models import brazil_now
-                    self.created_at = express_report.created_at or brazil_now()
-                except ImportError:
-                     # Fallback if import fails (unlikely)
-                     self.created_at = express_report.created_at or datetime.now()
-
-                self.projeto = VirtualProject(
-                    express_report.obra_nome,
-                    express_report.obra_endereco,
-                    express_report.obra_construtora,
-                    express_report.obra_responsavel,
-                    info_tecnica
-                )
+                    raise Exception(f'Relatório Express {relatorio_id} não encontrado')
+            relatorio_pdf = modelos[0]
         
-        relatorio_adaptado = ExpressReportAdapter(relatorio_express)
-        
-        from pdf_generator_weasy import WeasyPrintReportGenerator
-        generator = WeasyPrintReportGenerator()
+        from pdf_generator_weasy import obter_gerador
+        generator = obter_gerador()
         
         if salvar_arquivo:
             if output_path:
@@ -169,15 +74,15 @@ def gerar_pdf_relatorio_express(relatorio_ou_id, output_path=None, salvar_arquiv
             else:
                 upload_folder = 'uploads'
                 os.makedirs(upload_folder, exist_ok=True)
-                pdf_filename = f"relatorio_express_{relatorio_express.numero.replace('/', '_')}.pdf"
+                pdf_filename = f"relatorio_express_{relatorio_pdf.numero.replace('/', '_')}.pdf"
                 pdf_path = os.path.join(upload_folder, pdf_filename)
             
-            generator.generate_report_pdf(relatorio_adaptado, fotos, pdf_path)
+            generator.generate_report_pdf(relatorio_pdf, relatorio_pdf.fotos, pdf_path)
             
             logger.info(f"✅ PDF Express gerado: {pdf_path}")
             return {'success': True, 'path': pdf_path}
         else:
-            pdf_bytes = generator.generate_report_pdf(relatorio_adaptado, fotos)
+            pdf_bytes = generator.generate_report_pdf(relatorio_pdf, relatorio_pdf.fotos)
             pdf_io = BytesIO(pdf_bytes)
             pdf_io.seek(0)
             return pdf_io
@@ -201,20 +106,16 @@ def gerar_pdf_relatorio_comum(relatorio_id, output_path=None):
     Returns:
         dict com 'success' e 'path' ou 'error'
     """
-    from app import db
-    from models import Relatorio, FotoRelatorio
+    from pdf_modelos import carregar_relatorios
     
     try:
-        relatorio = Relatorio.query.get(relatorio_id)
-        if not relatorio:
+        modelos = carregar_relatorios([relatorio_id])
+        if not modelos:
             return {'success': False, 'error': f'Relatório {relatorio_id} não encontrado'}
+        relatorio = modelos[0]
         
-        fotos = FotoRelatorio.query.filter_by(
-            relatorio_id=relatorio_id
-        ).order_by(FotoRelatorio.ordem).all()
-        
-        from pdf_generator_weasy import WeasyPrintReportGenerator
-        generator = WeasyPrintReportGenerator()
+        from pdf_generator_weasy import obter_gerador
+        generator = obter_gerador()
         
         if output_path:
             pdf_path = output_path
@@ -224,7 +125,7 @@ def gerar_pdf_relatorio_comum(relatorio_id, output_path=None):
             pdf_filename = f"relatorio_{relatorio.numero.replace('/', '_')}.pdf"
             pdf_path = os.path.join(upload_folder, pdf_filename)
         
-        generator.generate_report_pdf(relatorio, fotos, pdf_path)
+        generator.generate_report_pdf(relatorio, relatorio.fotos, pdf_path)
         
         logger.info(f"✅ PDF gerado: {pdf_path}")
         return {'success': True, 'path': pdf_path}
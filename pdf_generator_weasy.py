@@ -4,6 +4,8 @@ Gerador de PDF usando WeasyPrint para replicar exatamente o modelo Artesano
 
 import os
 import json
+import time
+import threading
 from datetime import datetime
 import pytz
 from jinja2 import Template
@@ -11,7 +13,7 @@ from flask import current_app
 
 # Try to import WeasyPrint with graceful fallback
 try:
-    from weasyprint import HTML, CSS
+    from weasyprint import HTML, CSS, default_url_fetcher
     WEASYPRINT_AVAILABLE = True
 except ImportError as e:
     print(f"⚠️  WeasyPrint não disponível: {e}")
@@ -19,11 +21,131 @@ except ImportError as e:
     WEASYPRINT_AVAILABLE = False
     HTML = None
     CSS = None
+    default_url_fetcher = None
+
+# Célula de foto no PDF: A4 com margens laterais de 15mm, 2 colunas com 6mm de espaço
+# (largura 87mm) e altura máxima de 60mm no CSS (.first-photo-img / .grid-photo-img)
+FOTO_LARGURA_MM = 87
+FOTO_ALTURA_MM = 60
+FOTO_QUALIDADE_JPEG = 85
+
+# Fotos preparadas são entregues ao WeasyPrint pelo url_fetcher com URLs foto-pdf:<n>
+ESQUEMA_FOTO = 'foto-pdf:'
+
+# Fotos carregadas por vez: limita quantos originais ficam em memória juntos
+LOTE_FOTOS = 8
+
+# Distribuição das fotos no template: 2 na 1ª página (abaixo das observações), 4 nas demais (grid 2x2)
+FOTOS_PRIMEIRA_PAGINA = 2
+FOTOS_POR_PAGINA = 4
+
+
+def tamanho_foto_pdf(dpi):
+    """Caixa (largura, altura) em pixels de uma célula de foto na resolução informada"""
+    return (round(FOTO_LARGURA_MM / 25.4 * dpi), round(FOTO_ALTURA_MM / 25.4 * dpi))
+
+
+def preparar_foto_pdf(image_bytes, dpi):
+    """
+    Reduz a foto ao tamanho impresso e recodifica em JPEG.
+
+    Returns:
+        bytes: JPEG pronto para o PDF (os bytes originais se o Pillow não conseguir ler a imagem)
+    """
+    import io
+    from PIL import Image, ImageOps
+
+    try:
+        img = Image.open(io.BytesIO(image_bytes))
+        caixa = tamanho_foto_pdf(dpi)
+        if img.format == 'JPEG' and img.width <= caixa[0] and img.height <= caixa[1] \
+                and img.getexif().get(0x0112, 1) == 1:
+            return image_bytes
+        # JPEGs grandes já são decodificados reduzidos (DCT scaling); caixa quadrada
+        # porque a orientação EXIF ainda não foi aplicada
+        img.draft('RGB', (max(caixa), max(caixa)))
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail(caixa, Image.LANCZOS)
+        if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+            fundo = Image.new('RGB', img.size, (255, 255, 255))
+            fundo.paste(img.convert('RGBA'), mask=img.convert('RGBA').split()[-1])
+            img = fundo
+        buffer = io.BytesIO()
+        img.convert('RGB').save(buffer, 'JPEG', quality=FOTO_QUALIDADE_JPEG, optimize=True)
+        return buffer.getvalue()
+    except Exception as e:
+        print(f"⚠️ Foto não reduzida para o PDF (usando original): {e}")
+        return image_bytes
+
+
+def url_fetcher_fotos(imagens):
+    """url_fetcher do WeasyPrint que serve as fotos preparadas (foto-pdf:<n>) da memória"""
+    def fetcher(url, *args, **kwargs):
+        if url.startswith(ESQUEMA_FOTO):
+            dados = imagens.get(url[len(ESQUEMA_FOTO):])
+            if dados is None:
+                raise ValueError(f"Foto preparada não encontrada: {url}")
+            return {'string': dados, 'mime_type': 'image/jpeg'}
+        return default_url_fetcher(url, *args, **kwargs)
+    return fetcher
+
+
+def _carregar_logo():
+    """Logo da ELP em base64 (string vazia se o arquivo não existir)"""
+    try:
+        logo_path = os.path.join('static', 'logo_elp_new.jpg')
+        if os.path.exists(logo_path):
+            import base64
+            with open(logo_path, 'rb') as f:
+                return base64.b64encode(f.read()).decode('utf-8')
+    except Exception as e:
+        print(f"Erro ao carregar logo: {e}")
+    return ""
+
+
+_gerador = {}
+_gerador_lock = threading.Lock()
+
+
+def obter_gerador():
+    """
+    Gerador compartilhado pelo processo: template Jinja compilado, CSS já
+    interpretado e logo em memória são preparados uma única vez.
+    """
+    if 'instancia' not in _gerador:
+        with _gerador_lock:
+            if 'instancia' not in _gerador:
+                _gerador['instancia'] = WeasyPrintReportGenerator()
+    return _gerador['instancia']
+
+
+def aquecer_gerador():
+    """
+    Prepara o gerador e renderiza um documento mínimo para carregar fontes
+    (fontconfig/Pango) antes da primeira requisição. Chamado no boot da
+    aplicação: com o Gunicorn --preload, os workers herdam o gerador pronto.
+
+    Returns:
+        float | None: Duração do aquecimento em segundos (None se o WeasyPrint não está disponível)
+    """
+    if not WEASYPRINT_AVAILABLE:
+        return None
+    inicio = time.monotonic()
+    gerador = obter_gerador()
+    HTML(string='<p>ELP Consultoria</p>').write_pdf(stylesheets=[gerador.css])
+    return time.monotonic() - inicio
+
 
 class WeasyPrintReportGenerator:
     def __init__(self):
         self.template_html = self._create_html_template()
         self.template_css = self._create_css_styles()
+        # Preparados uma vez por instância (use obter_gerador() para compartilhar entre requisições)
+        self.template = Template(self.template_html)
+        self.css = CSS(string=self.template_css) if WEASYPRINT_AVAILABLE else None
+        # Segmentos (pdf_segmentos.py) saem sem "Página X / Y": a numeração é carimbada na composição
+        self.css_segmento = CSS(string='@page { @bottom-right { content: none; } }') if WEASYPRINT_AVAILABLE else None
+        self.logo_base64 = _carregar_logo()
     
     def generate_report_pdf(self, relatorio, fotos=None, output_path=None):
         """
@@ -46,17 +168,24 @@ class WeasyPrintReportGenerator:
             except Exception as e:
                 raise Exception(f"Erro: WeasyPrint não disponível e falha no fallback ReportLab: {str(e)}")
         
+        # Fotos já reduzidas ao tamanho impresso, servidas ao WeasyPrint pelo url_fetcher
+        imagens = {}
         try:
+            # Relatório montado por segmentos com cache próprio (só o que mudou é renderizado)
+            import pdf_segmentos
+            if not output_path and pdf_segmentos.disponivel():
+                texto = self._prepare_report_data(relatorio, None)
+                return pdf_segmentos.compor_relatorio(self, relatorio, fotos, texto)
+            
             # Preparar dados para o template
-            data = self._prepare_report_data(relatorio, fotos)
+            data = self._prepare_report_data(relatorio, fotos, imagens)
             
             # Renderizar HTML com os dados
-            template = Template(self.template_html)
-            html_content = template.render(data=data)
+            html_content = self.template.render(data=data)
             
             # Gerar PDF
-            html_doc = HTML(string=html_content)
-            css_doc = CSS(string=self.template_css)
+            html_doc = HTML(string=html_content, url_fetcher=url_fetcher_fotos(imagens))
+            css_doc = self.css
             
             if output_path:
                 html_doc.write_pdf(output_path, stylesheets=[css_doc])
@@ -75,21 +204,41 @@ class WeasyPrintReportGenerator:
                 return reportlab_generator.generate_report_pdf(relatorio, fotos, output_path)
             except Exception as fallback_error:
                 raise Exception(f"Erro ao gerar PDF - WeasyPrint: {str(e)} | ReportLab: {str(fallback_error)}")
+        finally:
+            imagens.clear()
     
-    def _prepare_report_data(self, relatorio, fotos):
-        """Preparar dados do relatório para o template"""
-        projeto = relatorio.projeto
-        
-        # Carregar logo em base64
-        logo_base64 = ""
+    def renderizar_segmento(self, relatorio, fotos, segmento):
+        """
+        Renderiza um segmento do relatório (pdf_segmentos.Segmento), sem a numeração de páginas.
+
+        Args:
+            relatorio: Relatório
+            fotos: Fotos do segmento (fatia segmento.inicio:segmento.fim)
+            segmento: Segmento de texto (1ª página) ou de páginas de fotos
+
+        Returns:
+            bytes: PDF do segmento
+        """
+        imagens = {}
         try:
-            logo_path = os.path.join('static', 'logo_elp_new.jpg')
-            if os.path.exists(logo_path):
-                import base64
-                with open(logo_path, 'rb') as f:
-                    logo_base64 = base64.b64encode(f.read()).decode('utf-8')
-        except Exception as e:
-            print(f"Erro ao carregar logo: {e}")
+            data = self._prepare_report_data(relatorio, fotos, imagens)
+            self._paginar_fotos(data, secao_texto=segmento.texto, numero_inicial=segmento.inicio + 1,
+                                fim_do_documento=segmento.ultimo)
+            html_doc = HTML(string=self.template.render(data=data), url_fetcher=url_fetcher_fotos(imagens))
+            return html_doc.write_pdf(stylesheets=[self.css, self.css_segmento])
+        finally:
+            imagens.clear()
+    
+    def _prepare_report_data(self, relatorio, fotos, imagens=None):
+        """
+        Preparar dados do relatório para o template
+
+        As fotos são reduzidas ao tamanho impresso e gravadas em `imagens`
+        (chave <n> da URL foto-pdf:<n>); o template só referencia as URLs.
+        """
+        if imagens is None:
+            imagens = {}
+        projeto = relatorio.projeto
         
         # Dados básicos - CHECKLIST REMOVIDO
         observacoes_filtradas = None
@@ -170,39 +319,91 @@ class WeasyPrintReportGenerator:
             'liberado_por': "Eng. José Leopoldo Pugliese",
             'responsavel': responsavel_acompanhamento,
             'data_relatorio': date_str, # Usar a mesma data (Criação)
-            'logo_base64': logo_base64,
-            'fotos': []
+            'logo_base64': self.logo_base64,
+            'fotos': self._dados_fotos(fotos, imagens)
         }
+        self._paginar_fotos(data)
+        
+        return data
+    
+    def _paginar_fotos(self, data, secao_texto=True, numero_inicial=FOTOS_PRIMEIRA_PAGINA + 1, fim_do_documento=True):
+        """
+        Distribui data['fotos'] nas páginas do template: 2 fotos na 1ª página
+        (quando há seção de texto) e lotes de 4 nas demais.
+
+        Os segmentos de pdf_segmentos.py usam secao_texto=False com as fotos de
+        um trecho das páginas 2x2, numeradas a partir de `numero_inicial`; só o
+        último segmento (`fim_do_documento`) leva as assinaturas.
+        """
+        fotos = data['fotos']
+        if secao_texto:
+            data['fotos_primeira_pagina'] = fotos[:FOTOS_PRIMEIRA_PAGINA]
+            fotos = fotos[FOTOS_PRIMEIRA_PAGINA:]
+            data['assinaturas_primeira_pagina'] = fim_do_documento and not fotos
+        data['secao_texto'] = secao_texto
+        data['fim_do_documento'] = fim_do_documento
+        data['lotes'] = [
+            {
+                'fotos': fotos[inicio:inicio + FOTOS_POR_PAGINA],
+                'numero_inicial': numero_inicial + inicio,
+                'ultimo': fim_do_documento and inicio + FOTOS_POR_PAGINA >= len(fotos),
+            }
+            for inicio in range(0, len(fotos), FOTOS_POR_PAGINA)
+        ]
+        return data
+    
+    def _dados_fotos(self, fotos, imagens):
+        """Dados das fotos para o template, com as imagens reduzidas gravadas em `imagens`"""
+        dados_fotos = []
         
-        # Processar fotos - PRIORIDADE: PostgreSQL (campo imagem)
+        # Processar fotos - PRIORIDADE: variante 'medium' já reduzida, PostgreSQL (campo imagem), filesystem
         if fotos:
-            import base64
+            from models import FotoImagemMixin
+
+            try:
+                dpi = current_app.config.get('PDF_PHOTO_DPI', 200)
+            except RuntimeError:
+                dpi = 200
+            fotos = list(fotos)
             
-            for foto in fotos:
-                foto_base64 = None
+            for indice, foto in enumerate(fotos):
+                if indice % LOTE_FOTOS == 0:
+                    # Próximo lote: variantes e blobs deduplicados em duas queries (evita N+1),
+                    # com no máximo LOTE_FOTOS originais em memória
+                    lote = fotos[indice:indice + LOTE_FOTOS]
+                    variantes = self._variantes_para_pdf(lote, dpi)
+                    FotoImagemMixin.precarregar_imagens(
+                        [f for f in lote if getattr(f, 'imagem_hash', None) not in variantes]
+                    )
+                
+                foto_src = None
                 
                 print(f"🔍 Processando foto {foto.ordem}: filename={foto.filename if hasattr(foto, 'filename') else 'N/A'}")
                 
-                # PRIORIDADE 1: Buscar imagem do campo BYTEA do PostgreSQL
-                if hasattr(foto, 'imagem') and foto.imagem:
-                    try:
-                        # Verificar se é memoryview (PostgreSQL retorna assim)
-                        if isinstance(foto.imagem, memoryview):
-                            image_bytes = bytes(foto.imagem)
-                            foto_base64 = base64.b64encode(image_bytes).decode('utf-8')
-                            print(f"✅ Foto {foto.ordem} carregada do PostgreSQL (memoryview): {len(image_bytes)} bytes")
-                        elif isinstance(foto.imagem, bytes):
-                            foto_base64 = base64.b64encode(foto.imagem).decode('utf-8')
-                            print(f"✅ Foto {foto.ordem} carregada do PostgreSQL (bytes): {len(foto.imagem)} bytes")
-                        else:
-                            print(f"⚠️ Foto {foto.ordem}: campo imagem tem tipo inesperado: {type(foto.imagem)}")
-                    except Exception as e:
-                        print(f"⚠️ Erro ao processar imagem do PostgreSQL para foto {foto.ordem}: {e}")
+                # PRIORIDADE 1: variante JPEG já reduzida no upload (dispensa decodificar o original)
+                image_bytes = variantes.get(getattr(foto, 'imagem_hash', None))
+                
+                # PRIORIDADE 2: Buscar imagem do campo BYTEA do PostgreSQL
+                # (get_image_bytes carrega a coluna adiada e normaliza memoryview -> bytes)
+                try:
+                    if not image_bytes and hasattr(foto, 'get_image_bytes'):
+                        image_bytes = foto.get_image_bytes()
+                    elif not image_bytes and getattr(foto, 'imagem', None):
+                        image_bytes = bytes(foto.imagem)
+                except Exception as e:
+                    print(f"⚠️ Erro ao processar imagem do PostgreSQL para foto {foto.ordem}: {e}")
+
+                if image_bytes:
+                    foto_src = self._registrar_foto(imagens, image_bytes, dpi)
+                    print(f"✅ Foto {foto.ordem} carregada do PostgreSQL: {len(image_bytes)} bytes")
                 else:
                     print(f"⚠️ Foto {foto.ordem}: campo imagem não existe ou está vazio")
+                # O original não é mais necessário: libera a memória antes da próxima foto
+                image_bytes = None
+                foto.__dict__.pop('_blob_dados', None)
                 
                 # FALLBACK: Tentar carregar do filesystem
-                if not foto_base64 and hasattr(foto, 'filename') and foto.filename:
+                if not foto_src and hasattr(foto, 'filename') and foto.filename:
                     try:
                         upload_folder = current_app.config.get('UPLOAD_FOLDER', 'uploads')
                     except RuntimeError:
@@ -215,14 +416,14 @@ class WeasyPrintReportGenerator:
                         try:
                             with open(foto_path, 'rb') as f:
                                 file_bytes = f.read()
-                                foto_base64 = base64.b64encode(file_bytes).decode('utf-8')
+                                foto_src = self._registrar_foto(imagens, file_bytes, dpi)
                             print(f"✅ Foto {foto.ordem} carregada do filesystem: {foto_path} ({len(file_bytes)} bytes)")
                         except Exception as e:
                             print(f"⚠️ Erro ao ler arquivo {foto_path}: {e}")
                     else:
                         print(f"❌ Arquivo não encontrado: {foto_path}")
                 
-                if not foto_base64:
+                if not foto_src:
                     print(f"❌ ERRO: Foto {foto.ordem} NÃO CARREGADA - não encontrada no PostgreSQL nem no filesystem")
                 
                 # Criar legenda completa - incluir categoria e local
@@ -256,16 +457,49 @@ class WeasyPrintReportGenerator:
                 print(f"📝 Foto {foto.ordem} - Legenda: {legenda_completa}")
                 
                 # Adicionar foto aos dados
-                data['fotos'].append({
-                    'base64': foto_base64,
+                dados_fotos.append({
+                    'src': foto_src,
                     'legenda': legenda_completa,
                     'categoria': categoria,
                     'local': local,
                     'ordem': foto.ordem,
-                    'not_found': not foto_base64
+                    'not_found': not foto_src
                 })
         
-        return data
+        return dados_fotos
+    
+    def _variantes_para_pdf(self, fotos, dpi):
+        """
+        Variantes JPEG 'medium' das fotos (por imagem_hash), quando cobrem o tamanho impresso.
+
+        Só lê variantes já gravadas: fotos sem variante usam o original.
+        """
+        from models import ImagemVariante
+        from photo_variants import VARIANTES
+        from app import db
+
+        if max(tamanho_foto_pdf(dpi)) > VARIANTES['medium']:
+            return {}
+        hashes = {getattr(f, 'imagem_hash', None) for f in fotos} - {None}
+        if not hashes:
+            return {}
+        try:
+            linhas = db.session.query(ImagemVariante.hash, ImagemVariante.dados).filter(
+                ImagemVariante.hash.in_(hashes),
+                ImagemVariante.variante == 'medium',
+                ImagemVariante.formato == 'jpeg',
+            ).all()
+        except Exception as e:
+            print(f"⚠️ Variantes indisponíveis para o PDF (usando originais): {e}")
+            return {}
+        return {h: bytes(dados) for h, dados in linhas if dados}
+    
+    def _registrar_foto(self, imagens, image_bytes, dpi):
+        """Reduz a foto ao tamanho impresso, guarda em `imagens` e devolve a URL foto-pdf:<n>"""
+        chave = str(len(imagens))
+        imagens[chave] = preparar_foto_pdf(image_bytes, dpi)
+        print(f"🖼️ Foto reduzida para o PDF: {len(image_bytes)} → {len(imagens[chave])} bytes")
+        return f"{ESQUEMA_FOTO}{chave}"
     
     def _create_html_template(self):
         """Template HTML replicando EXATAMENTE o modelo: 2 fotos na 1ª página, 4 nas demais"""
@@ -277,6 +511,8 @@ class WeasyPrintReportGenerator:
     <title>{{ data.titulo }}</title>
 </head>
 <body>
+    <!-- SEÇÃO DE TEXTO (cabeçalho, dados, observações e 1ª página): omitida nos segmentos só de fotos -->
+    {% if data.secao_texto %}
     <!-- Cabeçalho com logo ELP e título -->
     <div class="header-section">
         <div class="logo-container">
@@ -327,17 +563,12 @@ class WeasyPrintReportGenerator:
     </div>
 
     <!-- PRIMEIRA PÁGINA: 2 IMAGENS LADO A LADO ABAIXO DE "ITENS OBSERVADOS" -->
-    {% if data.fotos %}
-    {% set first_page_photos = data.fotos[:2] %}
-    {% set remaining_photos = data.fotos[2:] %}
-    {% set has_remaining = remaining_photos|length > 0 %}
-    
-    {% if first_page_photos %}
+    {% if data.fotos_primeira_pagina %}
     <div class="first-page-photos-grid">
-        {% for foto in first_page_photos %}
+        {% for foto in data.fotos_primeira_pagina %}
         <div class="first-photo-item">
-            {% if foto.base64 and not foto.not_found %}
-                <img src="data:image/jpeg;base64,{{ foto.base64 }}" alt="Foto {{ foto.ordem }}" class="first-photo-img">
+            {% if foto.src and not foto.not_found %}
+                <img src="{{ foto.src }}" alt="Foto {{ foto.ordem }}" class="first-photo-img">
             {% else %}
                 <div class="photo-placeholder-first">Foto não disponível</div>
             {% endif %}
@@ -347,8 +578,8 @@ class WeasyPrintReportGenerator:
     </div>
     {% endif %}
     
-    <!-- ASSINATURAS NA PRIMEIRA PÁGINA: Se só tem até 2 fotos, mostrar assinaturas aqui -->
-    {% if not has_remaining %}
+    <!-- ASSINATURAS NA PRIMEIRA PÁGINA: sem fotos ou com até 2 fotos -->
+    {% if data.assinaturas_primeira_pagina %}
     <div class="assinaturas-section first-page-signatures">
         <div class="section-header">Assinaturas</div>
         <div class="assinaturas-table">
@@ -365,31 +596,26 @@ class WeasyPrintReportGenerator:
         </div>
     </div>
     {% endif %}
+    {% endif %}
     
     <!-- DEMAIS PÁGINAS: 4 IMAGENS POR PÁGINA EM GRID 2x2 -->
-    {% set total_batches = ((remaining_photos|length - 1) // 4) + 1 if remaining_photos|length > 0 else 0 %}
-    {% for batch_index in range(total_batches) %}
-    {% set batch_start = batch_index * 4 %}
-    {% set is_last_batch = batch_index == total_batches - 1 %}
-    
-    <div class="page-break-before grid-photos-page {% if is_last_batch %}last-batch{% endif %}">
+    {% for lote in data.lotes %}
+    <div class="page-break-before grid-photos-page {% if lote.ultimo %}last-batch{% endif %} {% if loop.last %}fim-segmento{% endif %}">
         <div class="photos-grid-2x2">
-            {% for foto in remaining_photos[batch_start:batch_start+4] %}
-            {% if foto %}
+            {% for foto in lote.fotos %}
             <div class="grid-photo-item">
-                {% if foto.base64 and not foto.not_found %}
-                    <img src="data:image/jpeg;base64,{{ foto.base64 }}" alt="Foto {{ foto.ordem }}" class="grid-photo-img">
+                {% if foto.src and not foto.not_found %}
+                    <img src="{{ foto.src }}" alt="Foto {{ foto.ordem }}" class="grid-photo-img">
                 {% else %}
                     <div class="photo-placeholder-grid">Foto não disponível</div>
                 {% endif %}
-                <div class="grid-photo-caption">Foto {{ loop.index + 2 + batch_start }} - {{ foto.legenda }}</div>
+                <div class="grid-photo-caption">Foto {{ lote.numero_inicial + loop.index0 }} - {{ foto.legenda }}</div>
             </div>
-            {% endif %}
             {% endfor %}
         </div>
         
         <!-- ASSINATURAS: Aparecem APÓS as últimas fotos, na mesma página -->
-        {% if is_last_batch %}
+        {% if lote.ultimo %}
         <div class="assinaturas-inline">
             <div class="assinaturas-section">
                 <div class="section-header">Assinaturas</div>
@@ -410,27 +636,9 @@ class WeasyPrintReportGenerator:
         {% endif %}
     </div>
     {% endfor %}
-    
-    {% else %}
-    <!-- SEM FOTOS: Mostrar assinaturas na primeira página -->
-    <div class="assinaturas-section first-page-signatures">
-        <div class="section-header">Assinaturas</div>
-        <div class="assinaturas-table">
-            <div class="assin-row header-row">
-                <div class="assin-cell">Preenchido por:</div>
-                <div class="assin-cell">Liberado por:</div>
-                <div class="assin-cell">Responsável pelo acompanhamento</div>
-            </div>
-            <div class="assin-row value-row">
-                <div class="assin-cell">{{ data.preenchido_por }}</div>
-                <div class="assin-cell">{{ data.liberado_por }}</div>
-                <div class="assin-cell">{{ data.responsavel }}</div>
-            </div>
-        </div>
-    </div>
-    {% endif %}
 
-    <!-- Rodapé ELP -->
+    <!-- Rodapé ELP: elemento running, aparece a partir da página em que é emitido (só no fim do documento) -->
+    {% if data.fim_do_documento %}
     <div class="footer-section">
         <div class="footer-left">
             <img src="data:image/jpeg;base64,{{ data.logo_base64 }}" alt="ELP Consultoria" class="footer-logo">
@@ -446,6 +654,7 @@ class WeasyPrintReportGenerator:
             <!-- Texto removido conforme solicitação -->
         </div>
     </div>
+    {% endif %}
 </body>
 </html>
         """
@@ -703,6 +912,12 @@ figure {
     /* page-break-after: avoid; Removido para evitar corte das assinaturas */
 }
 
+/* Última página de um segmento (pdf_segmentos.py): a quebra fica para o próximo segmento */
+.grid-photos-page.fim-segmento {
+    page-break-after: auto;
+    break-after: auto;
+}
+
 .photos-grid-2x2 {
     display: grid;
     grid-template-columns: 1fr 1fr;
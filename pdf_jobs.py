@@ -0,0 +1,233 @@
+"""
+Renderização de PDFs de relatórios em segundo plano (jobs com status)
+
+A geração com WeasyPrint de relatórios com muitas fotos pode passar do
+timeout do Gunicorn (120s) e derrubar o worker no meio da renderização.
+Com os jobs, a requisição só enfileira: o PDF é renderizado em um processo
+separado (pool de pdf_render_pool.py) e o navegador consulta o status até receber
+a URL de download.
+
+- O job é identificado pelo relatório e pela impressão digital do conteúdo
+  (pdf_cache): pedidos repetidos do mesmo conteúdo, em qualquer worker,
+  reaproveitam o mesmo job, e um PDF já em cache conclui o job na hora.
+- O estado fica em PDF_JOBS_FOLDER (um JSON por job, escrita atômica),
+  compartilhado pelos workers do Gunicorn e pelo processo de renderização.
+- O resultado é o arquivo do pdf_cache; o download não renderiza de novo.
+
+Este módulo só importa a biblioteca padrão no topo: os processos do pool o
+importam sem carregar a aplicação até o primeiro job, e então a carregam via
+pdf_render_pool.carregar_aplicacao() (sem scheduler nem inicialização do banco).
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+
+import pdf_render_pool
+
+logger = logging.getLogger(__name__)
+
+STATUS_NA_FILA = 'na_fila'
+STATUS_RENDERIZANDO = 'renderizando'
+STATUS_CONCLUIDO = 'concluido'
+STATUS_ERRO = 'erro'
+
+ETAPAS_PROGRESSO = {
+    STATUS_NA_FILA: 0,
+    STATUS_RENDERIZANDO: 30,
+    STATUS_CONCLUIDO: 100,
+}
+
+# Jobs na fila/renderizando sem atualização há mais que isso são considerados perdidos
+# (worker reiniciado, processo de renderização morto)
+JOB_EXPIRACAO_SEGUNDOS = 15 * 60
+JOB_TTL_SEGUNDOS = 24 * 3600
+
+_lock = threading.Lock()
+
+
+def job_id_valido(job_id):
+    return len(job_id) == 32 and all(c in '0123456789abcdef' for c in job_id)
+
+
+def gerar_job_id(tipo, relatorio_id, digital):
+    return hashlib.sha256(f"{tipo}:{relatorio_id}:{digital}".encode()).hexdigest()[:32]
+
+
+def _caminho_job(pasta, job_id):
+    return os.path.join(pasta, f"{job_id}.json")
+
+
+def ler_job(pasta, job_id):
+    """Estado do job, ou None se não existe (ou id inválido)"""
+    if not job_id_valido(job_id):
+        return None
+    try:
+        with open(_caminho_job(pasta, job_id)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _gravar_job(pasta, job):
+    job['atualizado_em'] = time.time()
+    job['progresso'] = ETAPAS_PROGRESSO.get(job['status'], job.get('progresso', 0))
+    os.makedirs(pasta, exist_ok=True)
+    fd, temporario = tempfile.mkstemp(dir=pasta, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(job, f)
+        os.replace(temporario, _caminho_job(pasta, job['job_id']))
+    except BaseException:
+        os.unlink(temporario)
+        raise
+
+
+def _atualizar_job(pasta, job_id, **campos):
+    job = ler_job(pasta, job_id) or {'job_id': job_id}
+    job.update(campos)
+    _gravar_job(pasta, job)
+    return job
+
+
+def job_expirado(job):
+    ativo = job['status'] in (STATUS_NA_FILA, STATUS_RENDERIZANDO)
+    return ativo and time.time() - job.get('atualizado_em', 0) > JOB_EXPIRACAO_SEGUNDOS
+
+
+# =============================================================================
+# PROCESSO DE RENDERIZAÇÃO
+# =============================================================================
+
+def _renderizar_no_processo(pasta, job_id, tipo, relatorio_id):
+    """Executada no processo do pool: carrega a aplicação (processo auxiliar) e renderiza via pdf_cache"""
+    app, db = pdf_render_pool.carregar_aplicacao()
+    import pdf_cache
+    from models import Relatorio, RelatorioExpress
+
+    inicio = time.monotonic()
+    with app.app_context():
+        try:
+            _atualizar_job(pasta, job_id, status=STATUS_RENDERIZANDO, pid=os.getpid())
+            if tipo == pdf_cache.TIPO_EXPRESS:
+                relatorio = db.session.get(RelatorioExpress, relatorio_id)
+                gerar = pdf_cache.pdf_relatorio_express
+            else:
+                relatorio = db.session.get(Relatorio, relatorio_id)
+                gerar = pdf_cache.pdf_relatorio
+            if relatorio is None:
+                raise LookupError(f"Relatório {relatorio_id} não encontrado")
+
+            caminho, pdf_bytes, digital = gerar(relatorio)
+            if caminho is None:
+                raise IOError("Cache de PDF indisponível: o resultado do job não pôde ser gravado")
+
+            duracao = time.monotonic() - inicio
+            _atualizar_job(
+                pasta, job_id,
+                status=STATUS_CONCLUIDO, caminho=caminho, digital=digital,
+                tamanho=os.path.getsize(caminho), duracao=round(duracao, 2),
+            )
+            logger.info(f"📄 Job de PDF {job_id[:8]} concluído em {duracao:.1f}s ({tipo} {relatorio_id})")
+        except Exception as e:
+            logger.error(f"❌ Job de PDF {job_id[:8]} falhou ({tipo} {relatorio_id}): {e}", exc_info=True)
+            _atualizar_job(pasta, job_id, status=STATUS_ERRO, erro=str(e))
+        finally:
+            db.session.remove()
+
+
+def _ao_terminar(pasta, job_id):
+    def callback(future):
+        erro = future.exception()
+        if erro is not None:
+            # Processo de renderização morreu (ex.: falta de memória): o pool não grava o status
+            logger.error(f"❌ Job de PDF {job_id[:8]}: processo de renderização falhou: {erro}")
+            _atualizar_job(pasta, job_id, status=STATUS_ERRO, erro=f"Falha no processo de renderização: {erro}")
+            pdf_render_pool.descartar_pool_quebrado()
+    return callback
+
+
+# =============================================================================
+# API USADA PELAS ROTAS
+# =============================================================================
+
+def enfileirar(tipo, relatorio):
+    """
+    Cria (ou reaproveita) o job de PDF do relatório.
+
+    Returns:
+        dict: Estado do job (status na_fila, renderizando, concluido ou erro)
+    """
+    from flask import current_app
+    import pdf_cache
+
+    app = current_app._get_current_object()
+    pasta = app.config['PDF_JOBS_FOLDER']
+
+    # Impressão digital só com metadados (sem bytes de imagem)
+    fotos, digital = pdf_cache.fotos_e_impressao(tipo, relatorio)
+
+    job_id = gerar_job_id(tipo, relatorio.id, digital)
+    base = {'job_id': job_id, 'tipo': tipo, 'relatorio_id': relatorio.id, 'criado_em': time.time()}
+
+    caminho = pdf_cache.obter(tipo, relatorio.id, digital)
+    if caminho:
+        job = dict(base, status=STATUS_CONCLUIDO, caminho=caminho, digital=digital, tamanho=os.path.getsize(caminho))
+        _gravar_job(pasta, job)
+        return job
+
+    with _lock:
+        existente = ler_job(pasta, job_id)
+        if existente and existente['status'] in (STATUS_NA_FILA, STATUS_RENDERIZANDO) and not job_expirado(existente):
+            return existente
+        job = dict(base, status=STATUS_NA_FILA, digital=digital)
+        _gravar_job(pasta, job)
+
+    future = pdf_render_pool.obter_pool(app).submit(_renderizar_no_processo, pasta, job_id, tipo, relatorio.id)
+    future.add_done_callback(_ao_terminar(pasta, job_id))
+    logger.info(f"📥 Job de PDF {job_id[:8]} enfileirado ({tipo} {relatorio.id}, {len(fotos)} fotos)")
+    return job
+
+
+def obter_job(job_id, tipo, relatorio_id):
+    """Estado do job do relatório informado (None se não existe ou é de outro relatório)"""
+    from flask import current_app
+
+    pasta = current_app.config['PDF_JOBS_FOLDER']
+    job = ler_job(pasta, job_id)
+    if not job or job.get('tipo') != tipo or job.get('relatorio_id') != relatorio_id:
+        return None
+    if job_expirado(job):
+        job = _atualizar_job(pasta, job_id, status=STATUS_ERRO, erro='Renderização interrompida; solicite novamente')
+    if job['status'] == STATUS_CONCLUIDO and not os.path.exists(job.get('caminho') or ''):
+        # Relatório editado desde a renderização (o cache trocou o arquivo)
+        job = _atualizar_job(pasta, job_id, status=STATUS_ERRO, erro='PDF desatualizado; solicite novamente')
+    return job
+
+
+def limpar_jobs(max_idade_segundos=JOB_TTL_SEGUNDOS):
+    """
+    Remove estados de jobs antigos.
+
+    Returns:
+        int: Quantidade de jobs removidos
+    """
+    from flask import current_app
+
+    pasta = current_app.config.get('PDF_JOBS_FOLDER')
+    if not pasta or not os.path.isdir(pasta):
+        return 0
+    limite = time.time() - max_idade_segundos
+    removidos = 0
+    for entrada in os.scandir(pasta):
+        try:
+            if entrada.stat().st_mtime < limite:
+                os.unlink(entrada.path)
+                removidos += 1
+        except OSError:
+            continue
+    return removidos
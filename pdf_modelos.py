@@ -0,0 +1,141 @@
+"""
+Modelos de renderização dos PDFs de relatório (comum e Express)
+
+O gerador WeasyPrint lê poucos campos do relatório: número, observações,
+acompanhantes, autor e obra. Em vez de entregar objetos do ORM (um lazy load
+a cada relacionamento) ou montar classes adaptadoras a cada chamada, os dois
+tipos de relatório são projetados nos objetos com __slots__ abaixo, já com as
+fotos, e carregados em lote:
+
+    carregar_relatorios(ids) / carregar_express(ids)
+
+Cada carga faz uma query para os relatórios (autor e obra no mesmo SELECT) e
+uma para os metadados das fotos de todo o lote; os bytes das imagens
+continuam sendo lidos pelo gerador, em lotes (FotoImagemMixin).
+"""
+
+import json
+
+from sqlalchemy.orm import joinedload
+
+
+class ObraPDF:
+    """Obra impressa no cabeçalho (projeto do relatório comum ou campos obra_* do Express)"""
+    __slots__ = ('nome', 'endereco', 'construtora')
+
+    def __init__(self, nome, endereco, construtora):
+        self.nome = nome
+        self.endereco = endereco
+        self.construtora = construtora
+
+
+class AutorPDF:
+    """Autor do relatório ("Preenchido por")"""
+    __slots__ = ('nome_completo',)
+
+    def __init__(self, nome_completo):
+        self.nome_completo = nome_completo
+
+
+class RelatorioPDF:
+    """Dados de um relatório para o gerador de PDF, sem acesso ao banco"""
+    __slots__ = ('tipo', 'id', 'numero', 'conteudo', 'acompanhantes', 'autor', 'projeto', 'fotos')
+
+    def __init__(self, tipo, id, numero, conteudo, acompanhantes, autor, projeto, fotos):
+        self.tipo = tipo
+        self.id = id
+        self.numero = numero
+        self.conteudo = conteudo
+        self.acompanhantes = acompanhantes
+        self.autor = autor
+        self.projeto = projeto
+        self.fotos = fotos
+
+    def __repr__(self):
+        return f"<RelatorioPDF {self.tipo} {self.numero} ({len(self.fotos)} fotos)>"
+
+
+def _acompanhantes(valor):
+    """Lista de acompanhantes (a coluna pode vir como JSON em texto nos registros antigos)"""
+    if isinstance(valor, str):
+        try:
+            valor = json.loads(valor)
+        except ValueError:
+            return []
+    return valor or []
+
+
+def _autor(usuario):
+    return AutorPDF(usuario.nome_completo) if usuario else None
+
+
+def fotos_por_relatorio(modelo_foto, coluna, ids):
+    """Metadados das fotos de todos os relatórios do lote, em uma query, agrupados e ordenados"""
+    fotos = {relatorio_id: [] for relatorio_id in ids}
+    for foto in modelo_foto.query.filter(coluna.in_(ids)).order_by(coluna, modelo_foto.ordem, modelo_foto.id):
+        fotos[getattr(foto, coluna.key)].append(foto)
+    return fotos
+
+
+def carregar_relatorios(ids):
+    """
+    Relatórios comuns prontos para o gerador.
+
+    Args:
+        ids: Ids dos relatórios
+
+    Returns:
+        list[RelatorioPDF]: Na ordem de `ids` (ids inexistentes são omitidos)
+    """
+    from models import Relatorio, FotoRelatorio
+
+    ids = list(ids)
+    if not ids:
+        return []
+    relatorios = Relatorio.query.options(
+        joinedload(Relatorio.autor), joinedload(Relatorio.projeto)
+    ).filter(Relatorio.id.in_(ids)).all()
+    fotos = fotos_por_relatorio(FotoRelatorio, FotoRelatorio.relatorio_id, ids)
+
+    modelos = {}
+    for relatorio in relatorios:
+        projeto = relatorio.projeto
+        modelos[relatorio.id] = RelatorioPDF(
+            'relatorio', relatorio.id, relatorio.numero, relatorio.conteudo,
+            _acompanhantes(relatorio.acompanhantes), _autor(relatorio.autor),
+            ObraPDF(projeto.nome, projeto.endereco, projeto.construtora) if projeto else None,
+            fotos[relatorio.id],
+        )
+    return [modelos[i] for i in ids if i in modelos]
+
+
+def carregar_express(ids):
+    """
+    Relatórios Express prontos para o gerador (a obra vem dos campos obra_* do próprio relatório).
+
+    Args:
+        ids: Ids dos Relatórios Express
+
+    Returns:
+        list[RelatorioPDF]: Na ordem de `ids` (ids inexistentes são omitidos)
+    """
+    from models import RelatorioExpress, FotoRelatorioExpress
+
+    ids = list(ids)
+    if not ids:
+        return []
+    relatorios = RelatorioExpress.query.options(
+        joinedload(RelatorioExpress.autor)
+    ).filter(RelatorioExpress.id.in_(ids)).all()
+    fotos = fotos_por_relatorio(FotoRelatorioExpress, FotoRelatorioExpress.relatorio_express_id, ids)
+
+    modelos = {}
+    for express in relatorios:
+        modelos[express.id] = RelatorioPDF(
+            'express', express.id, express.numero, express.conteudo or '',
+            _acompanhantes(express.acompanhantes),
+            _autor(express.autor) or AutorPDF('Não informado'),
+            ObraPDF(express.obra_nome or 'Obra Express', express.obra_endereco or '', express.obra_construtora or ''),
+            fotos[express.id],
+        )
+    return [modelos[i] for i in ids if i in modelos]
@@ -0,0 +1,388 @@
+"""
+Renderização de PDFs isolada em um pool de processos, com teto de memória
+
+WeasyPrint (e ReportLab) alocam centenas de MB em relatórios com muitas
+fotos. Renderizando no próprio worker do Gunicorn, essa memória fica presa no
+heap fragmentado do worker depois da requisição. Aqui toda renderização roda em
+um pool limitado de processos:
+
+- PDF_RENDER_WORKERS processos por worker web, criados sob demanda;
+- cada processo é reciclado após PDF_RENDER_MAX_TASKS_PER_CHILD renderizações
+  (max_tasks_per_child), devolvendo a memória ao sistema;
+- cada processo tem teto de memória (RLIMIT_AS = PDF_RENDER_MEMORY_LIMIT_MB):
+  um relatório grande demais falha com MemoryError só naquele job;
+- o PDF volta por um arquivo temporário (PDF_RENDER_TMP_FOLDER), sem passar
+  os bytes pelo pipe do pool.
+
+Relatórios comuns e Express são renderizados a partir dos modelos de
+pdf_modelos.py; renderizar_lote gera vários do mesmo tipo em uma única tarefa,
+com uma query para o lote inteiro (backup completo no Drive).
+
+O mesmo pool executa os jobs em segundo plano de pdf_jobs.py. Dentro de um
+processo do pool a renderização é feita diretamente (sem pool aninhado).
+Com PDF_RENDER_ISOLATED=false tudo é renderizado no próprio processo.
+
+Este módulo só importa a biblioteca padrão no topo: os processos do pool o
+importam sem carregar a aplicação até a primeira renderização. A aplicação é
+carregada como processo auxiliar (APP_PROCESSO_AUXILIAR): sem scheduler e sem
+a inicialização do banco, que rodam só no processo web.
+"""
+
+import os
+import time
+import logging
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Tipos de renderização (o argumento é sempre o id do registro)
+RELATORIO = 'relatorio'          # pdf_generator_weasy (relatório comum)
+EXPRESS = 'express'              # pdf_generator_express
+ARTESANO = 'artesano'            # pdf_generator_artesano (rota /pdf/legacy)
+VISITA = 'visita'                # pdf_generator.ReportPDFGenerator (relatório de visita)
+
+# Marca o processo do pool para o app.py pular scheduler e inicialização do banco
+PROCESSO_AUXILIAR_ENV = 'APP_PROCESSO_AUXILIAR'
+
+_lock = threading.Lock()
+_pools = {}
+_estado = {'no_pool': False}
+
+
+class RenderizacaoFalhou(RuntimeError):
+    """O processo de renderização morreu, estourou a memória ou o tempo limite"""
+
+
+# =============================================================================
+# RENDERIZADORES (executados no processo do pool, dentro do app context)
+# =============================================================================
+
+def _modelos(tipo, ids):
+    """Modelos de renderização (pdf_modelos): uma query para os relatórios e uma para as fotos do lote"""
+    from pdf_modelos import carregar_relatorios, carregar_express
+
+    return (carregar_express if tipo == EXPRESS else carregar_relatorios)(ids)
+
+
+def _gerar(modelo):
+    from pdf_generator_weasy import obter_gerador
+
+    return obter_gerador().generate_report_pdf(modelo, modelo.fotos)
+
+
+def _relatorio(relatorio_id):
+    modelos = _modelos(RELATORIO, [relatorio_id])
+    if not modelos:
+        raise LookupError(f"Relatório {relatorio_id} não encontrado")
+    return _gerar(modelos[0])
+
+
+def _express(relatorio_express_id):
+    modelos = _modelos(EXPRESS, [relatorio_express_id])
+    if not modelos:
+        raise LookupError(f"Relatório Express {relatorio_express_id} não encontrado")
+    return _gerar(modelos[0])
+
+
+def _artesano(relatorio_id):
+    from app import db
+    from models import Relatorio, FotoRelatorio
+    from pdf_generator_artesano import ArtesanoPDFGenerator
+
+    relatorio = db.session.get(Relatorio, relatorio_id)
+    if relatorio is None:
+        raise LookupError(f"Relatório {relatorio_id} não encontrado")
+    fotos = FotoRelatorio.query.filter_by(relatorio_id=relatorio_id).options(
+        FotoRelatorio.com_imagem()
+    ).order_by(FotoRelatorio.ordem).all()
+    return ArtesanoPDFGenerator().generate_report_pdf(relatorio, fotos)
+
+
+def _visita(relatorio_id):
+    from app import db
+    from models import Relatorio
+    from pdf_generator import ReportPDFGenerator
+
+    relatorio = db.session.get(Relatorio, relatorio_id)
+    if relatorio is None:
+        raise LookupError(f"Relatório {relatorio_id} não encontrado")
+    fd, caminho = tempfile.mkstemp(suffix='.pdf')
+    os.close(fd)
+    try:
+        ReportPDFGenerator().generate_visit_report_pdf(relatorio, caminho)
+        with open(caminho, 'rb') as f:
+            return f.read()
+    finally:
+        os.unlink(caminho)
+
+
+RENDERIZADORES = {
+    RELATORIO: _relatorio,
+    EXPRESS: _express,
+    ARTESANO: _artesano,
+    VISITA: _visita,
+}
+
+# Tipos renderizáveis em lote (renderizar_lote)
+TIPOS_LOTE = (RELATORIO, EXPRESS)
+
+
+def _renderizar_aqui(tipo, objeto_id):
+    pdf = RENDERIZADORES[tipo](objeto_id)
+    if hasattr(pdf, 'getvalue'):
+        pdf = pdf.getvalue()
+    return pdf
+
+
+def _renderizar_lote_aqui(tipo, ids, destino=None):
+    """
+    Renderiza um lote de relatórios do mesmo tipo carregado de uma vez.
+
+    Returns:
+        tuple(dict, dict): ({id: PDF (ou o que `destino` devolver)}, {id: mensagem de erro})
+    """
+    resultados, erros = {}, {}
+    for modelo in _modelos(tipo, ids):
+        try:
+            pdf_bytes = _gerar(modelo)
+            resultados[modelo.id] = destino(pdf_bytes) if destino else pdf_bytes
+        except MemoryError:
+            erros[modelo.id] = f"PDF {tipo} {modelo.id} excedeu o limite de memória da renderização"
+        except Exception as e:
+            erros[modelo.id] = str(e)
+    for objeto_id in ids:
+        if objeto_id not in resultados and objeto_id not in erros:
+            erros[objeto_id] = f"PDF {tipo} {objeto_id}: registro não encontrado"
+    return resultados, erros
+
+
+# =============================================================================
+# PROCESSO DO POOL
+# =============================================================================
+
+def carregar_aplicacao():
+    """
+    Importa a aplicação dentro de um processo do pool.
+
+    O import de `app` executa o código de módulo do app.py; com a marca de
+    processo auxiliar ele não inicia o scheduler (alertas de visitas, coleta
+    de blobs...) nem cria tabelas e dados padrão, que já rodam no processo web.
+
+    Returns:
+        tuple: (app, db)
+    """
+    os.environ[PROCESSO_AUXILIAR_ENV] = '1'
+    from app import app, db
+
+    return app, db
+
+
+def _inicializar_processo(limite_memoria_mb, aquecer):
+    """Initializer de cada processo do pool: marca o processo, aplica o teto de memória e aquece o gerador"""
+    _estado['no_pool'] = True
+    os.environ[PROCESSO_AUXILIAR_ENV] = '1'  # Antes de qualquer import da aplicação (inclusive no aquecimento)
+    if limite_memoria_mb and resource is not None:
+        limite = limite_memoria_mb * 1024 * 1024
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (limite, limite))
+        except (ValueError, OSError) as e:
+            logger.warning(f"⚠️ Teto de memória da renderização não aplicado: {e}")
+    if aquecer:
+        try:
+            from pdf_generator_weasy import aquecer_gerador
+            aquecer_gerador()
+        except Exception as e:
+            logger.warning(f"⚠️ Aquecimento do gerador de PDF falhou (será preparado na primeira geração): {e}")
+
+
+def _executar(tipo, objeto_id, pasta):
+    """Executada no processo do pool: renderiza e grava o PDF em um arquivo temporário"""
+    app, db = carregar_aplicacao()
+
+    inicio = time.monotonic()
+    with app.app_context():
+        try:
+            pdf_bytes = _renderizar_aqui(tipo, objeto_id)
+        except MemoryError:
+            raise RenderizacaoFalhou(f"PDF {tipo} {objeto_id} excedeu o limite de memória da renderização")
+        finally:
+            db.session.remove()
+
+    caminho = _gravar_temporario(pasta, pdf_bytes)
+    _registrar_pico(f"PDF {tipo} {objeto_id}", inicio)
+    return caminho
+
+
+def _executar_lote(tipo, ids, pasta):
+    """Executada no processo do pool: renderiza o lote e grava cada PDF em um arquivo temporário"""
+    from functools import partial
+
+    app, db = carregar_aplicacao()
+
+    inicio = time.monotonic()
+    with app.app_context():
+        try:
+            caminhos, erros = _renderizar_lote_aqui(tipo, ids, partial(_gravar_temporario, pasta))
+        finally:
+            db.session.remove()
+    _registrar_pico(f"Lote de {len(caminhos)} PDFs {tipo}", inicio)
+    return caminhos, erros
+
+
+def _gravar_temporario(pasta, pdf_bytes):
+    os.makedirs(pasta, exist_ok=True)
+    fd, caminho = tempfile.mkstemp(dir=pasta, prefix='render-', suffix='.pdf')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(pdf_bytes)
+    return caminho
+
+
+def _registrar_pico(descricao, inicio):
+    if resource is not None:
+        pico_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        logger.info(f"📄 {descricao} renderizado em {time.monotonic() - inicio:.1f}s "
+                    f"(pid {os.getpid()}, pico {pico_mb:.0f}MB)")
+
+
+def no_processo_de_renderizacao():
+    return _estado['no_pool']
+
+
+def _contexto_processos():
+    """forkserver/spawn: o processo de renderização não herda conexões do banco nem threads"""
+    metodos = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in metodos else 'spawn')
+
+
+def obter_pool(app):
+    """Pool criado sob demanda em cada worker (depois do fork do Gunicorn --preload)"""
+    with _lock:
+        if 'processos' not in _pools:
+            _pools['processos'] = ProcessPoolExecutor(
+                max_workers=app.config.get('PDF_RENDER_WORKERS', 2),
+                mp_context=_contexto_processos(),
+                max_tasks_per_child=app.config.get('PDF_RENDER_MAX_TASKS_PER_CHILD') or None,
+                initializer=_inicializar_processo,
+                initargs=(app.config.get('PDF_RENDER_MEMORY_LIMIT_MB', 0), app.config.get('PDF_WARMUP_ENABLED', False)),
+            )
+        return _pools['processos']
+
+
+def descartar_pool_quebrado():
+    """Remove o pool se um processo morreu (ex.: OOM killer): o próximo pedido cria outro"""
+    with _lock:
+        pool = _pools.get('processos')
+        if pool is not None and getattr(pool, '_broken', False):
+            _pools.pop('processos', None)
+
+
+def _remover_ao_terminar(future):
+    """Renderização abandonada pelo tempo limite: apaga o(s) arquivo(s) quando ela terminar"""
+    try:
+        resultado = future.result()
+        caminhos = resultado[0].values() if isinstance(resultado, tuple) else [resultado]
+        for caminho in caminhos:
+            os.unlink(caminho)
+    except Exception:
+        pass
+
+
+# =============================================================================
+# API
+# =============================================================================
+
+def renderizar(tipo, objeto_id):
+    """
+    Renderiza um PDF isolado no pool de processos.
+
+    Args:
+        tipo: RELATORIO, EXPRESS, ARTESANO ou VISITA
+        objeto_id: Id do registro (o processo lê o estado já gravado no banco)
+
+    Returns:
+        bytes: Conteúdo do PDF
+
+    Raises:
+        RenderizacaoFalhou: processo morto, limite de memória ou de tempo excedido
+    """
+    from flask import current_app
+
+    if tipo not in RENDERIZADORES:
+        raise ValueError(f"Tipo de PDF desconhecido: {tipo}")
+
+    app = current_app._get_current_object()
+    if no_processo_de_renderizacao() or not app.config.get('PDF_RENDER_ISOLATED', True):
+        return _renderizar_aqui(tipo, objeto_id)
+
+    future = obter_pool(app).submit(_executar, tipo, objeto_id, app.config['PDF_RENDER_TMP_FOLDER'])
+    try:
+        caminho = future.result(timeout=app.config.get('PDF_RENDER_TIMEOUT', 90))
+    except FuturesTimeoutError:
+        future.add_done_callback(_remover_ao_terminar)
+        raise RenderizacaoFalhou(f"PDF {tipo} {objeto_id} não ficou pronto no tempo limite")
+    except BrokenProcessPool as e:
+        descartar_pool_quebrado()
+        raise RenderizacaoFalhou(f"Processo de renderização do PDF {tipo} {objeto_id} morreu: {e}") from e
+
+    try:
+        with open(caminho, 'rb') as f:
+            return f.read()
+    finally:
+        os.unlink(caminho)
+
+
+def renderizar_lote(tipo, ids):
+    """
+    Renderiza vários relatórios do mesmo tipo em uma única tarefa do pool: os
+    modelos do lote são carregados juntos (uma query para os relatórios e uma
+    para as fotos) em vez de várias queries por relatório.
+
+    Args:
+        tipo: RELATORIO ou EXPRESS
+        ids: Ids dos registros
+
+    Returns:
+        tuple(dict, dict): ({id: bytes do PDF}, {id: mensagem de erro})
+
+    Raises:
+        RenderizacaoFalhou: processo morto ou tempo limite do lote excedido
+    """
+    from flask import current_app
+
+    if tipo not in TIPOS_LOTE:
+        raise ValueError(f"Tipo de PDF sem renderização em lote: {tipo}")
+    ids = list(ids)
+    if not ids:
+        return {}, {}
+
+    app = current_app._get_current_object()
+    if no_processo_de_renderizacao() or not app.config.get('PDF_RENDER_ISOLATED', True):
+        return _renderizar_lote_aqui(tipo, ids)
+
+    future = obter_pool(app).submit(_executar_lote, tipo, ids, app.config['PDF_RENDER_TMP_FOLDER'])
+    try:
+        caminhos, erros = future.result(timeout=app.config.get('PDF_RENDER_TIMEOUT', 90) * len(ids))
+    except FuturesTimeoutError:
+        future.add_done_callback(_remover_ao_terminar)
+        raise RenderizacaoFalhou(f"Lote de {len(ids)} PDFs {tipo} não ficou pronto no tempo limite")
+    except BrokenProcessPool as e:
+        descartar_pool_quebrado()
+        raise RenderizacaoFalhou(f"Processo de renderização do lote de PDFs {tipo} morreu: {e}") from e
+
+    pdfs = {}
+    for objeto_id, caminho in caminhos.items():
+        try:
+            with open(caminho, 'rb') as f:
+                pdfs[objeto_id] = f.read()
+        finally:
+            os.unlink(caminho)
+    return pdfs, erros
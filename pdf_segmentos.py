@@ -0,0 +1,175 @@
+"""
+Composição do PDF do relatório por segmentos de páginas
+
+Em relatórios longos as páginas de fotos dominam o tempo de renderização, e
+qualquer edição de texto fazia o WeasyPrint montar o documento inteiro de
+novo. Aqui o relatório é dividido em segmentos renderizados separadamente:
+
+- texto: cabeçalho, dados gerais, itens observados e as 2 fotos da 1ª página;
+- fotos: trechos de FOTOS_POR_SEGMENTO fotos das páginas 2x2 (o último leva
+  as assinaturas).
+
+Cada segmento tem cache próprio em PDF_CACHE_FOLDER, pela impressão digital
+do que ele mostra (pdf_cache.impressao_segmento): editar as observações de um
+relatório de 100 fotos renderiza só o segmento de texto, e as páginas de fotos
+vêm do disco sem nem carregar as imagens. Os segmentos são juntados com pypdf
+e a numeração "Página X / Y" é carimbada no fim, já que cada segmento é
+renderizado sem ela.
+
+A data "Em:" do cabeçalho é a da geração do segmento de texto em cache.
+Sem pypdf (instalações anteriores ao requirements.txt atual), sem cache de PDF ou com
+PDF_SEGMENTS_ENABLED=false o relatório é renderizado inteiro, como antes.
+"""
+
+import io
+import time
+import logging
+from collections import namedtuple
+
+from flask import current_app
+
+from pdf_generator_weasy import FOTOS_PRIMEIRA_PAGINA, FOTOS_POR_PAGINA
+
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:  # Ambiente sem pypdf: renderiza o relatório inteiro
+    PdfReader = None
+    PdfWriter = None
+
+logger = logging.getLogger(__name__)
+
+# Fotos por segmento das páginas 2x2 (5 páginas); múltiplo de FOTOS_POR_PAGINA
+FOTOS_POR_SEGMENTO = 5 * FOTOS_POR_PAGINA
+
+# Posição do "Página X / Y" (caixa @bottom-right do CSS: margem direita de 15mm
+# + padding de 5mm; centro vertical da margem inferior de 45mm, menos 5mm)
+NUMERACAO_DIREITA_MM = 20
+NUMERACAO_BASE_MM = 24
+NUMERACAO_FONTE = ('Helvetica', 9)
+NUMERACAO_COR = '#666666'
+
+# Fatia [inicio, fim) das fotos do relatório; texto: segmento da 1ª página; ultimo: leva as assinaturas
+Segmento = namedtuple('Segmento', 'inicio fim texto ultimo')
+
+
+def disponivel():
+    """Composição por segmentos habilitada (pypdf instalado e cache de PDF ativo)"""
+    import pdf_cache
+
+    if PdfWriter is None or not pdf_cache.habilitado():
+        return False
+    return current_app.config.get('PDF_SEGMENTS_ENABLED', True)
+
+
+def planejar(total_fotos):
+    """Segmentos de um relatório com `total_fotos` fotos, na ordem do documento"""
+    primeira = min(total_fotos, FOTOS_PRIMEIRA_PAGINA)
+    segmentos = [Segmento(0, primeira, True, primeira == total_fotos)]
+    for inicio in range(primeira, total_fotos, FOTOS_POR_SEGMENTO):
+        fim = min(inicio + FOTOS_POR_SEGMENTO, total_fotos)
+        segmentos.append(Segmento(inicio, fim, False, fim == total_fotos))
+    return segmentos
+
+
+def _conteudo(segmento, texto):
+    """O que o segmento mostra além das fotos (entra na impressão digital)"""
+    if segmento.texto:
+        # A data de geração não entra: o segmento em cache mantém a sua
+        conteudo = {k: v for k, v in texto.items() if k not in ('data_atual', 'data_relatorio', 'logo_base64', 'fotos')}
+    elif segmento.ultimo:
+        conteudo = {k: texto[k] for k in ('preenchido_por', 'liberado_por', 'responsavel')}
+    else:
+        conteudo = {}
+    conteudo['segmento'] = segmento._asdict()
+    try:
+        conteudo['dpi'] = current_app.config.get('PDF_PHOTO_DPI', 200)
+    except RuntimeError:
+        conteudo['dpi'] = 200
+    return conteudo
+
+
+def compor_relatorio(gerador, relatorio, fotos, texto):
+    """
+    PDF do relatório montado a partir dos segmentos (do cache ou renderizados).
+
+    Args:
+        gerador: WeasyPrintReportGenerator (renderiza os segmentos que faltam)
+        relatorio: Relatório
+        fotos: Fotos do relatório, na ordem
+        texto: Dados do relatório sem fotos (decidem quais segmentos mudaram)
+
+    Returns:
+        bytes: PDF completo, com a numeração de páginas
+    """
+    import pdf_cache
+
+    inicio_composicao = time.monotonic()
+    fotos = list(fotos or [])
+    partes = []
+    renderizados = 0
+    for segmento in planejar(len(fotos)):
+        fotos_segmento = fotos[segmento.inicio:segmento.fim]
+        digital = pdf_cache.impressao_segmento(_conteudo(segmento, texto), fotos_segmento)
+        pdf_bytes = pdf_cache.obter_segmento(digital)
+        if pdf_bytes is None:
+            pdf_bytes = gerador.renderizar_segmento(relatorio, fotos_segmento, segmento)
+            pdf_cache.gravar_segmento(digital, pdf_bytes)
+            renderizados += 1
+        partes.append(pdf_bytes)
+
+    pdf_bytes = juntar(partes)
+    logger.info(f"🧩 PDF do relatório {relatorio.numero}: {renderizados} de {len(partes)} segmentos "
+                f"renderizados, composto em {time.monotonic() - inicio_composicao:.1f}s")
+    return pdf_bytes
+
+
+def _numeracao(paginas):
+    """PDF com uma página transparente por página do documento, só com o "Página X / Y" """
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.colors import HexColor
+    from reportlab.lib.units import mm
+
+    buffer = io.BytesIO()
+    folha = canvas.Canvas(buffer)
+    total = len(paginas)
+    for numero, pagina in enumerate(paginas, 1):
+        largura, altura = float(pagina.mediabox.width), float(pagina.mediabox.height)
+        folha.setPageSize((largura, altura))
+        folha.setFont(*NUMERACAO_FONTE)
+        folha.setFillColor(HexColor(NUMERACAO_COR))
+        folha.drawRightString(largura - NUMERACAO_DIREITA_MM * mm, NUMERACAO_BASE_MM * mm,
+                              f"Página {numero} / {total}")
+        folha.showPage()
+    folha.save()
+    buffer.seek(0)
+    return PdfReader(buffer)
+
+
+def juntar(partes):
+    """
+    Concatena os PDFs dos segmentos e carimba a numeração das páginas.
+
+    Args:
+        partes: Lista de bytes (PDFs), na ordem do documento
+
+    Returns:
+        bytes: PDF único
+    """
+    escritor = PdfWriter()
+    for parte in partes:
+        escritor.append(PdfReader(io.BytesIO(parte)))
+
+    metadados = PdfReader(io.BytesIO(partes[0])).metadata
+    if metadados:
+        escritor.add_metadata(metadados)
+
+    numeracao = _numeracao(escritor.pages)
+    for pagina, carimbo in zip(escritor.pages, numeracao.pages):
+        pagina.merge_page(carimbo)
+
+    if hasattr(escritor, 'compress_identical_objects'):
+        escritor.compress_identical_objects()  # Logo e imagens repetidos entre segmentos
+
+    saida = io.BytesIO()
+    escritor.write(saida)
+    return saida.getvalue()
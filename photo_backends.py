@@ -0,0 +1,165 @@
+"""
+Backends de armazenamento dos bytes das fotos fora do banco
+
+Os blobs de imagem_blobs podem ser descarregados (migrate_blobs_to_storage.py)
+para um backend externo; a linha do blob continua existindo, com `dados` NULL
+e a localização em `storage_backend`/`storage_key`. A leitura usa sempre o
+backend registrado na linha, então a configuração atual pode mudar sem afetar
+blobs já descarregados.
+
+Backends:
+- 'local': diretório no filesystem (PHOTO_STORAGE_LOCAL_FOLDER), útil também
+  como substituto do S3 em desenvolvimento;
+- 's3': bucket S3 ou compatível (MinIO, R2, Spaces via PHOTO_STORAGE_S3_ENDPOINT_URL).
+  Requer boto3, que é opcional.
+
+Todos os backends usam a mesma chave: <hash[:2]>/<hash>.
+"""
+
+import os
+import logging
+import tempfile
+import threading
+
+from flask import current_app
+
+try:
+    import boto3
+except ImportError:  # boto3 só é necessário com PHOTO_STORAGE_BACKEND=s3
+    boto3 = None
+
+logger = logging.getLogger(__name__)
+
+# Blobs sem backend externo: bytes na coluna imagem_blobs.dados
+BACKEND_BANCO = 'database'
+
+_instancias = {}
+_lock = threading.Lock()
+
+
+class BackendIndisponivel(RuntimeError):
+    """Backend não configurado ou dependência ausente"""
+
+
+def chave_para_hash(imagem_hash):
+    """Chave do objeto no backend (subdiretório/prefixo pelos 2 primeiros caracteres)"""
+    return f"{imagem_hash[:2]}/{imagem_hash}"
+
+
+class BackendLocal:
+    """Bytes em arquivos de um diretório local (gravação atômica)"""
+
+    nome = 'local'
+
+    def __init__(self, raiz):
+        self.raiz = os.path.abspath(raiz)
+
+    def _caminho(self, chave):
+        caminho = os.path.normpath(os.path.join(self.raiz, chave))
+        if not caminho.startswith(self.raiz + os.sep):
+            raise ValueError(f"Chave inválida: {chave}")
+        return caminho
+
+    def gravar(self, chave, dados, content_type=None):
+        caminho = self._caminho(chave)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        fd, temporario = tempfile.mkstemp(dir=os.path.dirname(caminho), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(dados)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporario, caminho)
+        except BaseException:
+            os.unlink(temporario)
+            raise
+
+    def ler(self, chave):
+        with open(self._caminho(chave), 'rb') as f:
+            return f.read()
+
+    def ler_intervalo(self, chave, inicio, tamanho):
+        with open(self._caminho(chave), 'rb') as f:
+            f.seek(inicio)
+            return f.read(tamanho)
+
+    def remover(self, chave):
+        try:
+            os.unlink(self._caminho(chave))
+        except FileNotFoundError:
+            pass
+
+
+class BackendS3:
+    """Bytes em um bucket S3 ou compatível (endpoint configurável)"""
+
+    nome = 's3'
+
+    def __init__(self, bucket, prefixo='', endpoint_url=None, region_name=None):
+        if boto3 is None:
+            raise BackendIndisponivel("boto3 não instalado: pip install boto3")
+        if not bucket:
+            raise BackendIndisponivel("PHOTO_STORAGE_S3_BUCKET não configurado")
+        self.bucket = bucket
+        self.prefixo = prefixo.strip('/')
+        # Credenciais pelo ambiente (AWS_ACCESS_KEY_ID/AWS_SECRET_ACCESS_KEY) ou IAM
+        self.cliente = boto3.client('s3', endpoint_url=endpoint_url or None, region_name=region_name or None)
+
+    def _objeto(self, chave):
+        return f"{self.prefixo}/{chave}" if self.prefixo else chave
+
+    def gravar(self, chave, dados, content_type=None):
+        extras = {'ContentType': content_type} if content_type else {}
+        self.cliente.put_object(Bucket=self.bucket, Key=self._objeto(chave), Body=dados, **extras)
+
+    def ler(self, chave):
+        resposta = self.cliente.get_object(Bucket=self.bucket, Key=self._objeto(chave))
+        return resposta['Body'].read()
+
+    def ler_intervalo(self, chave, inicio, tamanho):
+        resposta = self.cliente.get_object(
+            Bucket=self.bucket,
+            Key=self._objeto(chave),
+            Range=f"bytes={inicio}-{inicio + tamanho - 1}",
+        )
+        return resposta['Body'].read()
+
+    def remover(self, chave):
+        self.cliente.delete_object(Bucket=self.bucket, Key=self._objeto(chave))
+
+
+def _criar(nome):
+    config = current_app.config
+    if nome == 'local':
+        pasta = config.get('PHOTO_STORAGE_LOCAL_FOLDER')
+        if not pasta:
+            raise BackendIndisponivel("PHOTO_STORAGE_LOCAL_FOLDER não configurado")
+        return BackendLocal(pasta)
+    if nome == 's3':
+        return BackendS3(
+            config.get('PHOTO_STORAGE_S3_BUCKET'),
+            config.get('PHOTO_STORAGE_S3_PREFIX') or '',
+            config.get('PHOTO_STORAGE_S3_ENDPOINT_URL'),
+            config.get('PHOTO_STORAGE_S3_REGION'),
+        )
+    raise BackendIndisponivel(f"Backend de armazenamento desconhecido: {nome}")
+
+
+def obter_backend(nome=None):
+    """
+    Instância (reutilizada no worker) do backend `nome`, ou do configurado em
+    PHOTO_STORAGE_BACKEND.
+
+    Raises:
+        BackendIndisponivel: backend desconhecido, sem configuração ou sem boto3
+    """
+    nome = nome or backend_configurado()
+    with _lock:
+        if nome not in _instancias:
+            _instancias[nome] = _criar(nome)
+        return _instancias[nome]
+
+
+def backend_configurado():
+    """Nome do backend de destino configurado ('database' = manter no banco)"""
+    return current_app.config.get('PHOTO_STORAGE_BACKEND') or BACKEND_BANCO
@@ -0,0 +1,243 @@
+"""
+Normalização das fotos enviadas, fora da thread da requisição
+
+Fotos de celular chegam com 4–12 MB, rotação só no EXIF e metadados (GPS,
+modelo do aparelho). Após o commit de uma foto nova, esta etapa:
+- aplica a orientação do EXIF nos pixels;
+- limita o maior lado a PHOTO_MAX_DIMENSION;
+- remove os metadados e recodifica (JPEG com PHOTO_JPEG_QUALITY);
+- opcionalmente arquiva o original em PHOTO_ORIGINALS_FOLDER.
+
+O processamento de imagem roda em um ProcessPoolExecutor (sem disputar o GIL
+com o worker do Gunicorn); uma thread despachante carrega e grava os bytes.
+A gravação passa pelo blob store, então blob, variantes e imagem_size são
+atualizados normalmente e o blob original é liberado. O imagem_hash_envio
+(hash do arquivo enviado) não muda: é por ele que as rotas detectam o reenvio
+da mesma foto. Enquanto a normalização está ativa, as variantes de uma foto
+nova só são geradas aqui, a partir da versão final.
+
+Este módulo só importa Pillow no topo: os processos do pool o importam sem
+carregar a aplicação.
+"""
+
+import io
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+FORMATOS_SUPORTADOS = {'JPEG', 'PNG', 'WEBP'}
+
+_lock = threading.Lock()
+_pools = {}
+
+
+def normalizar_imagem(data, max_lado=2560, qualidade=85):
+    """
+    Orientação, limite de resolução, remoção de metadados e recodificação.
+
+    Função pura (executada nos processos do pool). Mantém o formato de origem
+    para não mudar a extensão/Content-Type das URLs existentes.
+
+    Returns:
+        tuple(bytes, int, int) | None: (dados, largura, altura), ou None se a
+        imagem não é suportada ou se a versão normalizada não traz ganho
+    """
+    try:
+        img = Image.open(io.BytesIO(data))
+        formato = img.format
+        if formato not in FORMATOS_SUPORTADOS:
+            return None
+        orientacao = img.getexif().get(0x0112, 1)
+        img = ImageOps.exif_transpose(img)
+    except Exception:
+        return None
+
+    redimensionar = max(img.size) > max_lado
+    if redimensionar:
+        img.thumbnail((max_lado, max_lado), Image.LANCZOS)
+
+    buffer = io.BytesIO()
+    if formato == 'JPEG':
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        img.save(buffer, 'JPEG', quality=qualidade, optimize=True, progressive=True)
+    elif formato == 'WEBP':
+        img.save(buffer, 'WEBP', quality=qualidade)
+    else:
+        img.save(buffer, 'PNG', optimize=True)
+    normalizado = buffer.getvalue()
+
+    # Sem rotação nem redimensionamento, só vale a pena se ficou menor
+    if not redimensionar and orientacao == 1 and len(normalizado) >= len(data):
+        return None
+    return normalizado, img.width, img.height
+
+
+def normalizacao_ativa():
+    """True se fotos novas gravadas no contexto atual serão normalizadas após o commit"""
+    from flask import current_app, has_app_context
+
+    return has_app_context() and current_app.config.get('PHOTO_NORMALIZE_ENABLED', True)
+
+
+def _contexto_processos():
+    """forkserver/spawn: os processos do pool não herdam conexões do banco nem threads"""
+    metodos = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in metodos else 'spawn')
+
+
+def _obter_pools(app):
+    """Pools criados sob demanda em cada worker (depois do fork do Gunicorn --preload)"""
+    with _lock:
+        if not _pools:
+            workers = app.config.get('PHOTO_NORMALIZE_WORKERS', 1)
+            _pools['processos'] = ProcessPoolExecutor(max_workers=workers, mp_context=_contexto_processos())
+            _pools['despacho'] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='normalizacao-fotos')
+        return _pools['processos'], _pools['despacho']
+
+
+def _arquivar_original(app, imagem_hash, data, content_type):
+    pasta = app.config.get('PHOTO_ORIGINALS_FOLDER')
+    if not pasta:
+        return
+    extensao = (content_type or 'image/jpeg').split('/')[-1].replace('jpeg', 'jpg')
+    caminho = os.path.join(pasta, imagem_hash[:2], f"{imagem_hash}.{extensao}")
+    if os.path.exists(caminho):
+        return
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    with open(caminho, 'wb') as f:
+        f.write(data)
+
+
+def _versao_normalizada_existente(db, foto):
+    """Hash da versão já normalizada de outra foto enviada com o mesmo arquivo (ou None)"""
+    from models import FotoRelatorio, FotoRelatorioExpress, ImagemBlob
+
+    for model in (FotoRelatorio, FotoRelatorioExpress):
+        imagem_hash = db.session.query(model.imagem_hash).join(
+            ImagemBlob, ImagemBlob.hash == model.imagem_hash
+        ).filter(
+            model.imagem_hash_envio == foto.imagem_hash_envio,
+            model.imagem_hash != model.imagem_hash_envio,
+        ).limit(1).scalar()
+        if imagem_hash:
+            return imagem_hash
+    return None
+
+
+def _gravar_variantes_originais(db, imagem_hash, data):
+    """Foto mantida como enviada: gera as variantes adiadas no upload"""
+    from models import ImagemVariante
+    from photo_variants import gravar_variantes
+
+    if db.session.query(ImagemVariante.hash).filter_by(hash=imagem_hash).first():
+        return
+    gravar_variantes(db.session.connection(), imagem_hash, data)
+    db.session.commit()
+
+
+def _normalizar_foto(app, model, foto_id):
+    """Executada na thread despachante: carrega, normaliza no pool de processos e grava"""
+    from app import db
+
+    with app.app_context():
+        try:
+            foto = db.session.get(model, foto_id)
+            if foto is None:
+                return
+            hash_original = foto.imagem_hash
+
+            # Mesmo arquivo já normalizado em outra foto: reaproveita o blob sem recodificar
+            if foto.imagem_hash_envio == hash_original:
+                existente = _versao_normalizada_existente(db, foto)
+                if existente:
+                    foto._manter_hash_envio = True
+                    foto.imagem_hash = existente
+                    db.session.commit()
+                    logger.info(f"♻️ Foto {model.__name__}#{foto_id} reaproveitou a versão normalizada {existente[:12]}")
+                    return
+
+            data = foto.get_image_bytes()
+            if not data:
+                return
+
+            processos, _ = _obter_pools(app)
+            resultado = processos.submit(
+                normalizar_imagem, data,
+                app.config.get('PHOTO_MAX_DIMENSION', 2560),
+                app.config.get('PHOTO_JPEG_QUALITY', 85),
+            ).result()
+            if resultado is None:
+                _gravar_variantes_originais(db, hash_original, data)
+                return
+            normalizado, largura, altura = resultado
+
+            # A foto pode ter sido editada enquanto era processada
+            db.session.refresh(foto)
+            if foto.imagem_hash != hash_original:
+                return
+
+            _arquivar_original(app, hash_original, data, foto.content_type)
+            foto._manter_hash_envio = True
+            foto.imagem = normalizado
+            db.session.commit()
+            logger.info(
+                f"🗜️ Foto {model.__name__}#{foto_id} normalizada: "
+                f"{len(data)} -> {len(normalizado)} bytes ({largura}x{altura})"
+            )
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"❌ Erro ao normalizar foto {model.__name__}#{foto_id}: {e}")
+        finally:
+            db.session.remove()
+
+
+def agendar_normalizacao(model, foto_id):
+    """Enfileira a normalização de uma foto já commitada"""
+    from flask import current_app
+
+    app = current_app._get_current_object()
+    if not app.config.get('PHOTO_NORMALIZE_ENABLED', True):
+        return
+    _, despacho = _obter_pools(app)
+    despacho.submit(_normalizar_foto, app, model, foto_id)
+
+
+def registrar_eventos(session):
+    """
+    Agenda a normalização de toda foto nova com imagem, após o commit.
+
+    Cobre todas as rotas de upload (formulário, autosave, Express, offline)
+    sem alterá-las; a foto já está salva quando o processamento começa.
+    """
+    from sqlalchemy import event
+    from models import FotoRelatorio, FotoRelatorioExpress
+
+    modelos = (FotoRelatorio, FotoRelatorioExpress)
+
+    @event.listens_for(session, 'after_flush')
+    def _coletar_fotos_novas(sess, flush_context):
+        novas = [
+            (type(obj), obj.id) for obj in sess.new
+            if isinstance(obj, modelos) and obj.imagem_hash
+        ]
+        if novas:
+            sess.info.setdefault('fotos_para_normalizar', []).extend(novas)
+
+    @event.listens_for(session, 'after_commit')
+    def _agendar_apos_commit(sess):
+        for model, foto_id in sess.info.pop('fotos_para_normalizar', []):
+            try:
+                agendar_normalizacao(model, foto_id)
+            except Exception as e:
+                logger.error(f"❌ Erro ao agendar normalização da foto {foto_id}: {e}")
+
+    @event.listens_for(session, 'after_rollback')
+    def _descartar_apos_rollback(sess):
+        sess.info.pop('fotos_para_normalizar', None)
@@ -0,0 +1,601 @@
+"""
+Blob store de fotos endereçado por conteúdo (SHA-256)
+
+Os bytes das fotos de relatórios comuns e Express ficam em `imagem_blobs`,
+uma linha por conteúdo distinto. As tabelas de fotos guardam apenas o
+`imagem_hash`. Re-uploads, relatórios Express duplicados e sincronizações
+offline da mesma foto passam a ocupar espaço (e backup) uma única vez.
+
+Funcionamento:
+- Eventos de mapper interceptam qualquer escrita de `foto.imagem = bytes`
+  (em todas as rotas existentes), gravam o blob, ajustam `imagem_hash` e
+  `imagem_size` e deixam a coluna `imagem` da foto vazia.
+- `ref_count` é incrementado/decrementado nos mesmos eventos, dentro da
+  transação da própria foto.
+- `imagem_hash_envio` guarda o hash dos bytes enviados pelo cliente; a
+  normalização troca o `imagem_hash`, mas não essa identidade.
+- Deleções em massa (query.delete()) e CASCADE do banco não disparam eventos;
+  `coletar_blobs_orfaos` reconcilia as contagens antes de apagar qualquer blob.
+- Blobs podem ser descarregados para um backend externo (photo_backends.py):
+  `dados` fica NULL e a leitura segue `storage_backend`/`storage_key`.
+"""
+
+import hashlib
+import io
+import logging
+from datetime import timedelta
+
+from sqlalchemy import event, inspect, select, func, and_, exists
+
+from app import db
+from models import ImagemBlob, ImagemVariante, FotoRelatorio, FotoRelatorioExpress, brazil_now
+
+logger = logging.getLogger(__name__)
+
+FOTO_MODELS = (FotoRelatorio, FotoRelatorioExpress)
+
+# Tempo mínimo entre a última referência removida e a exclusão do blob
+GC_CARENCIA_MINUTOS = 60
+
+
+def calcular_hash(data):
+    """SHA-256 hexadecimal dos bytes da imagem"""
+    if isinstance(data, memoryview):
+        data = bytes(data)
+    return hashlib.sha256(data).hexdigest()
+
+
+def _dialect_insert(connection):
+    """INSERT com suporte a ON CONFLICT para o dialeto atual (PostgreSQL/SQLite)"""
+    if connection.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    if connection.dialect.name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    return None
+
+
+def armazenar_blob(connection, data, content_type=None, gerar_variantes=True):
+    """
+    Grava os bytes no blob store (ou reaproveita o blob existente) e conta uma referência.
+
+    Args:
+        connection: Conexão da transação corrente (eventos de mapper ou sessão)
+        data: Bytes da imagem
+        content_type: MIME type informado no upload
+        gerar_variantes: False quando a foto ainda será normalizada (as
+            variantes são geradas a partir da versão final)
+
+    Returns:
+        str: hash SHA-256 do conteúdo
+    """
+    data = bytes(data)
+    imagem_hash = calcular_hash(data)
+    blobs = ImagemBlob.__table__
+
+    # Caminho comum em re-uploads: blob já existe, só incrementa (não reenvia os bytes)
+    result = connection.execute(
+        blobs.update()
+        .where(blobs.c.hash == imagem_hash)
+        .values(ref_count=blobs.c.ref_count + 1)
+    )
+    if result.rowcount:
+        logger.info(f"♻️ Blob {imagem_hash[:12]} reaproveitado ({len(data)} bytes não duplicados)")
+        return imagem_hash
+
+    values = dict(
+        hash=imagem_hash,
+        dados=data,
+        content_type=content_type,
+        tamanho=len(data),
+        ref_count=1,
+        created_at=brazil_now(),
+    )
+    insert = _dialect_insert(connection)
+    if insert is not None:
+        # Outro worker pode ter inserido o mesmo conteúdo entre o UPDATE e o INSERT
+        stmt = insert(blobs).values(**values).on_conflict_do_update(
+            index_elements=[blobs.c.hash],
+            set_={'ref_count': blobs.c.ref_count + 1},
+        )
+    else:
+        stmt = blobs.insert().values(**values)
+    connection.execute(stmt)
+    logger.info(f"💾 Blob {imagem_hash[:12]} gravado ({len(data)} bytes)")
+
+    # Conteúdo novo: gera thumb/medium (WebP e JPEG) já no upload
+    if gerar_variantes:
+        from photo_variants import gravar_variantes
+        gravar_variantes(connection, imagem_hash, data)
+    return imagem_hash
+
+
+def referenciar_blob(connection, imagem_hash):
+    """Conta mais uma referência a um blob existente. Retorna False se o blob não existe."""
+    blobs = ImagemBlob.__table__
+    result = connection.execute(
+        blobs.update()
+        .where(blobs.c.hash == imagem_hash)
+        .values(ref_count=blobs.c.ref_count + 1)
+    )
+    return bool(result.rowcount)
+
+
+def liberar_blob(connection, imagem_hash):
+    """Remove uma referência; o blob só é apagado pela coleta de lixo"""
+    blobs = ImagemBlob.__table__
+    connection.execute(
+        blobs.update()
+        .where(and_(blobs.c.hash == imagem_hash, blobs.c.ref_count > 0))
+        .values(ref_count=blobs.c.ref_count - 1, liberado_em=brazil_now())
+    )
+
+
+def _bytes_na_linha(connection, model, foto_id):
+    """True se a linha ainda guarda os bytes na coluna legada `imagem` (não referencia o store)"""
+    table = model.__table__
+    return bool(connection.execute(
+        select(table.c.imagem.isnot(None)).where(table.c.id == foto_id)
+    ).scalar())
+
+
+# =============================================================================
+# EVENTOS DE MAPPER
+# =============================================================================
+
+def _antes_de_inserir(mapper, connection, target):
+    data = target.__dict__.get('imagem')
+    target.imagem_atualizada_em = brazil_now()
+    if data:
+        from photo_normalization import normalizacao_ativa
+        target.imagem_hash = armazenar_blob(connection, data, target.content_type,
+                                            gerar_variantes=not normalizacao_ativa())
+        target.imagem_size = len(data)
+        target.imagem = None
+    elif target.imagem_hash:
+        # Foto nova apontando para conteúdo já armazenado (ex.: cópia de metadados)
+        referenciar_blob(connection, target.imagem_hash)
+    if target.imagem_hash and not target.imagem_hash_envio:
+        target.imagem_hash_envio = target.imagem_hash
+
+
+def _antes_de_atualizar(mapper, connection, target):
+    state = inspect(target)
+    hist_imagem = state.attrs.imagem.history
+    hist_hash = state.attrs.imagem_hash.history
+
+    novos_bytes = hist_imagem.added[0] if hist_imagem.added else None
+    if not novos_bytes and not hist_hash.has_changes():
+        return
+
+    hash_anterior = (hist_hash.deleted or hist_hash.unchanged or [None])[0]
+    anterior_no_store = bool(hash_anterior) and not _bytes_na_linha(connection, type(target), target.id)
+
+    if novos_bytes:
+        target.imagem_hash = armazenar_blob(connection, novos_bytes, target.content_type)
+        target.imagem_size = len(novos_bytes)
+        target.imagem = None
+    elif target.imagem_hash:
+        referenciar_blob(connection, target.imagem_hash)
+
+    # Imagem substituída pelo usuário: nova identidade. A normalização mantém a do envio.
+    if not target.__dict__.pop('_manter_hash_envio', False):
+        target.imagem_hash_envio = target.imagem_hash
+
+    if anterior_no_store:
+        liberar_blob(connection, hash_anterior)
+
+    target.imagem_atualizada_em = brazil_now()
+    target.__dict__.pop('_blob_dados', None)
+
+
+def _antes_de_excluir(mapper, connection, target):
+    if target.imagem_hash and not _bytes_na_linha(connection, type(target), target.id):
+        liberar_blob(connection, target.imagem_hash)
+
+
+for _model in FOTO_MODELS:
+    event.listen(_model, 'before_insert', _antes_de_inserir)
+    event.listen(_model, 'before_update', _antes_de_atualizar)
+    event.listen(_model, 'before_delete', _antes_de_excluir)
+
+# Fotos novas são normalizadas (orientação, resolução, metadados) após o commit
+from photo_normalization import registrar_eventos as _registrar_normalizacao  # noqa: E402
+_registrar_normalizacao(db.session)
+
+
+# =============================================================================
+# LEITURA EM PARTES (STREAMING)
+# =============================================================================
+
+# Tamanho de cada leitura no banco: um SELECT substr(...) por parte
+TAMANHO_PARTE_LEITURA = 256 * 1024
+
+
+class LeituraEmPartes:
+    """
+    Iterável com os bytes de uma foto, lidos uma parte por vez.
+
+    `ler_parte(posicao, tamanho)` busca cada parte: no banco, um SELECT
+    substr(...) em uma conexão emprestada do pool só durante a leitura; em
+    backends externos, uma leitura de intervalo. A resposta pode ser consumida
+    depois do fim do contexto da requisição e o worker nunca mantém mais de
+    uma parte em memória. É "seekable", então o Range do werkzeug pula direto
+    para o byte pedido sem ler o início da imagem.
+
+    `destino` (opcional) recebe uma cópia das partes de uma leitura completa
+    a partir do byte 0 — ex.: image_disk_cache.GravacaoEmPartes.
+    """
+
+    def __init__(self, ler_parte, tamanho, tamanho_parte=TAMANHO_PARTE_LEITURA, destino=None):
+        self.tamanho = tamanho
+        self._ler_parte = ler_parte
+        self._tamanho_parte = tamanho_parte
+        self._destino = destino
+        self._posicao = 0
+
+    def seekable(self):
+        return True
+
+    def seek(self, posicao):
+        if posicao != self._posicao:
+            self._descartar_destino()  # Leitura parcial não vai para o cache
+        self._posicao = posicao
+        return posicao
+
+    def tell(self):
+        return self._posicao
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._posicao >= self.tamanho:
+            if self._destino is not None:
+                self._destino.concluir()
+                self._destino = None
+            raise StopIteration
+
+        parte = self._ler_parte(self._posicao, self._tamanho_parte)
+        if not parte:
+            # Imagem trocada/removida/descarregada durante o envio: encerra sem completar o cache
+            self._descartar_destino()
+            self._posicao = self.tamanho
+            raise StopIteration
+
+        parte = bytes(parte)
+        self._posicao += len(parte)
+        if self._destino is not None:
+            self._destino.escrever(parte)
+        return parte
+
+    def _descartar_destino(self):
+        if self._destino is not None:
+            self._destino.descartar()
+            self._destino = None
+
+    def close(self):
+        """Chamado pelo servidor ao fim da resposta (ou se o cliente desconectar)"""
+        self._descartar_destino()
+
+    def como_arquivo(self):
+        """Objeto de arquivo (read/seek) sobre os mesmos bytes, para APIs que leem por intervalo"""
+        return ArquivoEmPartes(self._ler_parte, self.tamanho)
+
+
+class ArquivoEmPartes(io.RawIOBase):
+    """
+    Arquivo somente leitura sobre `ler_parte(posicao, tamanho)`.
+
+    Cada read() é uma leitura de intervalo (um SELECT substr(...) no banco),
+    do tamanho pedido — ex.: as partes de um upload retomável do Google Drive
+    (MediaIoBaseUpload), sem materializar a imagem inteira.
+    """
+
+    def __init__(self, ler_parte, tamanho):
+        super().__init__()
+        self.tamanho = tamanho
+        self._ler_parte = ler_parte
+        self._posicao = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, posicao, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            posicao += self._posicao
+        elif whence == io.SEEK_END:
+            posicao += self.tamanho
+        self._posicao = max(posicao, 0)
+        return self._posicao
+
+    def tell(self):
+        return self._posicao
+
+    def readinto(self, destino):
+        quantidade = min(len(destino), self.tamanho - self._posicao)
+        if quantidade <= 0:
+            return 0
+        parte = self._ler_parte(self._posicao, quantidade)
+        if not parte:
+            raise IOError("Imagem alterada ou removida durante a leitura")
+        parte = bytes(parte)
+        destino[:len(parte)] = parte
+        self._posicao += len(parte)
+        return len(parte)
+
+
+def _leitor_banco(coluna, filtro):
+    engine = db.engine
+
+    def ler_parte(posicao, tamanho):
+        consulta = select(func.substr(coluna, posicao + 1, tamanho)).where(filtro)
+        with engine.connect() as connection:
+            return connection.execute(consulta).scalar()
+    return ler_parte
+
+
+def _leitor_backend(nome_backend, chave):
+    from photo_backends import obter_backend
+    backend = obter_backend(nome_backend)
+
+    def ler_parte(posicao, tamanho):
+        return backend.ler_intervalo(chave, posicao, tamanho)
+    return ler_parte
+
+
+def abrir_leitura_em_partes(foto, tamanho_parte=TAMANHO_PARTE_LEITURA, destino=None):
+    """
+    Prepara a leitura em partes dos bytes de uma foto, sem materializá-los.
+
+    Os bytes podem estar na própria linha (legado), no blob store ou em um
+    backend externo; aqui só o tamanho e a localização são consultados.
+
+    Returns:
+        LeituraEmPartes | None: None se a foto não tem bytes armazenados
+    """
+    model = type(foto)
+    filtro = model.id == foto.id
+    tamanho = db.session.query(func.length(model.imagem)).filter(filtro).scalar()
+    if tamanho:
+        return LeituraEmPartes(_leitor_banco(model.imagem, filtro), tamanho, tamanho_parte, destino)
+    if not foto.imagem_hash:
+        return None
+
+    filtro = ImagemBlob.hash == foto.imagem_hash
+    row = db.session.query(
+        func.length(ImagemBlob.dados), ImagemBlob.tamanho, ImagemBlob.storage_backend, ImagemBlob.storage_key
+    ).filter(filtro).first()
+    if row is None:
+        return None
+    tamanho_banco, tamanho_blob, nome_backend, chave = row
+    if tamanho_banco:
+        return LeituraEmPartes(_leitor_banco(ImagemBlob.dados, filtro), tamanho_banco, tamanho_parte, destino)
+    if nome_backend and chave and tamanho_blob:
+        return LeituraEmPartes(_leitor_backend(nome_backend, chave), tamanho_blob, tamanho_parte, destino)
+    return None
+
+
+# =============================================================================
+# MANUTENÇÃO: RECONTAGEM, COLETA DE LIXO E MIGRAÇÃO DE LEGADOS
+# =============================================================================
+
+def _referencias_subquery(model):
+    """COUNT de fotos de um modelo que referenciam o blob (linha correlacionada de imagem_blobs)"""
+    return (
+        select(func.count())
+        .select_from(model)
+        .where(and_(model.imagem_hash == ImagemBlob.hash, model.imagem.is_(None)))
+        .correlate(ImagemBlob)
+        .scalar_subquery()
+    )
+
+
+def recontar_referencias():
+    """
+    Recalcula ref_count de todos os blobs a partir das tabelas de fotos.
+
+    Necessário porque deleções em massa e CASCADE do banco não passam pelos eventos.
+
+    Returns:
+        int: Quantidade de blobs cuja contagem foi corrigida
+    """
+    total = _referencias_subquery(FotoRelatorio) + _referencias_subquery(FotoRelatorioExpress)
+    result = db.session.execute(
+        ImagemBlob.__table__.update()
+        .where(ImagemBlob.ref_count != total)
+        .values(ref_count=total)
+    )
+    db.session.commit()
+    return result.rowcount or 0
+
+
+def coletar_blobs_orfaos(carencia_minutos=GC_CARENCIA_MINUTOS):
+    """
+    Apaga blobs sem nenhuma foto referenciando.
+
+    Um blob só é removido se ref_count <= 0 após a recontagem, a última
+    referência saiu há mais de `carencia_minutos` e nenhuma linha (nem legada)
+    usa o hash no momento do DELETE.
+
+    Returns:
+        dict: {'corrigidos': int, 'removidos': int, 'bytes_liberados': int}
+    """
+    corrigidos = recontar_referencias()
+
+    limite = brazil_now() - timedelta(minutes=carencia_minutos)
+    sem_referencia = [
+        ~exists().where(model.imagem_hash == ImagemBlob.hash)
+        for model in FOTO_MODELS
+    ]
+    condicao = and_(
+        ImagemBlob.ref_count <= 0,
+        func.coalesce(ImagemBlob.liberado_em, ImagemBlob.created_at) < limite,
+        *sem_referencia
+    )
+
+    # DELETE ... RETURNING: só os blobs efetivamente apagados têm o objeto externo
+    # removido. Um blob referenciado de novo durante a coleta (upload, outra
+    # coleta concorrente) não satisfaz mais a condição e mantém linha e bytes.
+    blobs = ImagemBlob.__table__
+    apagados = db.session.execute(
+        blobs.delete().where(condicao).returning(
+            blobs.c.tamanho, blobs.c.storage_backend, blobs.c.storage_key
+        )
+    ).all()
+    db.session.commit()
+
+    removidos = len(apagados)
+    bytes_liberados = sum(row.tamanho or 0 for row in apagados)
+    if removidos:
+        logger.info(f"🧹 Blob store: {removidos} blobs órfãos removidos ({bytes_liberados} bytes)")
+
+    # Objetos nos backends externos só são apagados depois do commit das linhas,
+    # e não se o mesmo conteúdo já foi gravado e descarregado de novo nesse meio tempo
+    externos = {(row.storage_backend, row.storage_key) for row in apagados if row.storage_key}
+    if externos:
+        from photo_backends import obter_backend
+        em_uso = {
+            row[0] for row in db.session.query(ImagemBlob.storage_key).filter(
+                ImagemBlob.storage_key.in_([chave for _, chave in externos])
+            )
+        }
+        for nome_backend, chave in externos:
+            if chave in em_uso:
+                continue
+            try:
+                obter_backend(nome_backend).remover(chave)
+            except Exception as e:
+                logger.warning(f"⚠️ Blob store: falha ao remover {chave} do backend {nome_backend}: {e}")
+
+    # Variantes sem blob e sem nenhuma foto (inclusive legada) com o mesmo hash
+    variantes_orfas = and_(
+        ~exists().where(ImagemBlob.hash == ImagemVariante.hash),
+        *[~exists().where(model.imagem_hash == ImagemVariante.hash) for model in FOTO_MODELS]
+    )
+    db.session.execute(ImagemVariante.__table__.delete().where(variantes_orfas))
+    db.session.commit()
+    return {'corrigidos': corrigidos, 'removidos': removidos, 'bytes_liberados': bytes_liberados}
+
+
+def migrar_imagens_legadas(limite=100):
+    """
+    Move para o blob store os bytes que ainda estão na coluna legada `imagem`.
+
+    Processa até `limite` fotos de cada tabela por chamada (pode ser repetido
+    até retornar zero). Atualiza as linhas via Core para não disparar os
+    eventos de mapper, que tratariam a mudança como troca de imagem.
+
+    Returns:
+        dict: Fotos migradas por tabela
+    """
+    stats = {}
+    for model in FOTO_MODELS:
+        table = model.__table__
+        ids = [row[0] for row in db.session.query(model.id).filter(model.imagem.isnot(None)).limit(limite).all()]
+        migradas = 0
+        for foto_id in ids:
+            row = db.session.execute(
+                select(table.c.imagem, table.c.content_type).where(table.c.id == foto_id)
+            ).first()
+            if not row or not row.imagem:
+                continue
+            connection = db.session.connection()
+            imagem_hash = armazenar_blob(connection, row.imagem, row.content_type)
+            connection.execute(
+                table.update().where(table.c.id == foto_id).values(
+                    imagem=None, imagem_hash=imagem_hash, imagem_size=len(row.imagem),
+                    imagem_hash_envio=func.coalesce(table.c.imagem_hash_envio, imagem_hash)
+                )
+            )
+            db.session.commit()
+            migradas += 1
+        stats[table.name] = migradas
+    return stats
+
+
+def descarregar_blob(imagem_hash, backend):
+    """
+    Move os bytes de um blob do banco para o backend externo.
+
+    Ordem segura para as rotas que servem imagens durante a migração:
+    grava no backend, relê e confere o SHA-256 com o hash do blob e só então
+    registra a localização e esvazia `dados`, na mesma transação. Uma falha
+    em qualquer etapa deixa o blob intacto no banco.
+
+    Returns:
+        str: 'descarregado', 'ignorado' (já fora do banco ou removido) ou
+             'divergente' (bytes do banco não conferem com o hash)
+    """
+    blobs = ImagemBlob.__table__
+    row = db.session.execute(
+        select(blobs.c.dados, blobs.c.content_type)
+        .where(and_(blobs.c.hash == imagem_hash, blobs.c.storage_key.is_(None)))
+    ).first()
+    if not row or not row.dados:
+        return 'ignorado'
+
+    dados = bytes(row.dados)
+    if calcular_hash(dados) != imagem_hash:
+        logger.error(f"❌ Blob {imagem_hash[:12]}: bytes no banco não conferem com o hash; mantido no banco")
+        return 'divergente'
+
+    from photo_backends import chave_para_hash
+    chave = chave_para_hash(imagem_hash)
+    backend.gravar(chave, dados, row.content_type)
+    if calcular_hash(backend.ler(chave)) != imagem_hash:
+        raise IOError(f"Verificação falhou após gravar {chave} no backend {backend.nome}")
+
+    result = db.session.execute(
+        blobs.update()
+        .where(and_(blobs.c.hash == imagem_hash, blobs.c.storage_key.is_(None)))
+        .values(dados=None, storage_backend=backend.nome, storage_key=chave)
+    )
+    db.session.commit()
+    return 'descarregado' if result.rowcount else 'ignorado'
+
+
+def hashes_para_descarregar(apos=None, limite=500):
+    """Próximo lote (ordem de hash) de blobs com bytes ainda no banco — permite retomar a migração"""
+    consulta = db.session.query(ImagemBlob.hash).filter(
+        ImagemBlob.storage_key.is_(None), ImagemBlob.dados.isnot(None)
+    )
+    if apos:
+        consulta = consulta.filter(ImagemBlob.hash > apos)
+    return [row[0] for row in consulta.order_by(ImagemBlob.hash).limit(limite).all()]
+
+
+def estatisticas_blob_store():
+    """Resumo do blob store para diagnóstico (quantidade, bytes armazenados e referências)"""
+    blobs, armazenado, referencias = db.session.query(
+        func.count(ImagemBlob.hash),
+        func.coalesce(func.sum(ImagemBlob.tamanho), 0),
+        func.coalesce(func.sum(ImagemBlob.ref_count), 0),
+    ).one()
+    logico = sum(
+        db.session.query(func.coalesce(func.sum(ImagemBlob.tamanho), 0))
+        .join(model, model.imagem_hash == ImagemBlob.hash)
+        .filter(model.imagem.is_(None))
+        .scalar() or 0
+        for model in FOTO_MODELS
+    )
+    legadas = sum(
+        db.session.query(func.count(model.id)).filter(model.imagem.isnot(None)).scalar() or 0
+        for model in FOTO_MODELS
+    )
+    externos, bytes_externos = db.session.query(
+        func.count(ImagemBlob.hash), func.coalesce(func.sum(ImagemBlob.tamanho), 0)
+    ).filter(ImagemBlob.storage_key.isnot(None)).one()
+    return {
+        'blobs': blobs,
+        'blobs_externos': externos,
+        'bytes_externos': int(bytes_externos),
+        'bytes_armazenados': int(armazenado),
+        'bytes_referenciados': int(logico),
+        'referencias': int(referencias),
+        'fotos_legadas': legadas,
+    }
@@ -0,0 +1,199 @@
+"""
+Variantes redimensionadas das fotos de relatórios (thumb/medium em WebP e JPEG)
+
+As rotas de imagem servem o original completo por padrão. Com `?variant=thumb`,
+`?variant=medium` ou `?w=<largura>` servem uma versão reduzida, em WebP quando
+o navegador aceita (JPEG caso contrário).
+
+As variantes são geradas quando um conteúdo novo entra no blob store (upload)
+e gravadas em `imagem_variantes`, chaveadas pelo hash do original. Fotos
+legadas ganham suas variantes na primeira vez que forem pedidas.
+"""
+
+import io
+import hashlib
+import logging
+
+from PIL import Image, ImageOps
+from sqlalchemy import select
+
+from app import db
+from models import ImagemVariante, brazil_now
+
+logger = logging.getLogger(__name__)
+
+# Largura máxima (px) de cada variante; 'full' / 'original' serve o upload original
+VARIANTES = {
+    'thumb': 400,    # Grades de fotos em listas, revisão e PWA
+    'medium': 1280,  # Visualização em tela cheia no celular
+}
+
+FORMATOS = {
+    'webp': 'image/webp',
+    'jpeg': 'image/jpeg',
+}
+
+QUALIDADE = {
+    'webp': 80,
+    'jpeg': 82,
+}
+
+
+def variante_solicitada(args):
+    """
+    Nome da variante pedida na query string (ou None para o original).
+
+    Args:
+        args: request.args (`variant=thumb|medium|full` ou `w=<largura em px>`)
+    """
+    nome = (args.get('variant') or '').strip().lower()
+    if nome in VARIANTES:
+        return nome
+    if nome in ('full', 'original'):
+        return None
+
+    largura = args.get('w', type=int)
+    if largura and largura > 0:
+        # Menor variante que cobre a largura pedida; acima da maior, o original
+        for nome, maxima in sorted(VARIANTES.items(), key=lambda item: item[1]):
+            if largura <= maxima:
+                return nome
+    return None
+
+
+def formato_aceito(accept_header):
+    """WebP se o cabeçalho Accept do navegador o anuncia, senão JPEG"""
+    return 'webp' if 'image/webp' in (accept_header or '') else 'jpeg'
+
+
+def _preparar_modo(img, formato):
+    """Converte o modo de cor para o formato de saída (JPEG não tem transparência)"""
+    tem_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+    if formato == 'webp':
+        return img.convert('RGBA' if tem_alpha else 'RGB')
+    if tem_alpha:
+        fundo = Image.new('RGB', img.size, (255, 255, 255))
+        fundo.paste(img.convert('RGBA'), mask=img.convert('RGBA').split()[-1])
+        return fundo
+    return img.convert('RGB')
+
+
+def gerar_variantes(data):
+    """
+    Gera todas as variantes de uma imagem.
+
+    Returns:
+        list[dict]: variante, formato, dados, largura e altura de cada variante
+                    (lista vazia se os bytes não forem uma imagem legível)
+    """
+    try:
+        original = Image.open(io.BytesIO(data))
+        original = ImageOps.exif_transpose(original)
+        original.load()
+    except Exception as e:
+        logger.warning(f"⚠️ Variantes não geradas (imagem ilegível): {e}")
+        return []
+
+    variantes = []
+    for nome, largura_max in VARIANTES.items():
+        img = original
+        if img.width > largura_max:
+            altura = max(1, round(img.height * largura_max / img.width))
+            img = img.resize((largura_max, altura), Image.LANCZOS)
+
+        for formato in FORMATOS:
+            buffer = io.BytesIO()
+            _preparar_modo(img, formato).save(
+                buffer, formato.upper(), quality=QUALIDADE[formato], optimize=True
+            )
+            variantes.append({
+                'variante': nome,
+                'formato': formato,
+                'dados': buffer.getvalue(),
+                'largura': img.width,
+                'altura': img.height,
+            })
+    return variantes
+
+
+def gravar_variantes(connection, imagem_hash, data):
+    """
+    Gera e grava as variantes de um conteúdo (ignora as que já existem).
+
+    Args:
+        connection: Conexão da transação corrente
+        imagem_hash: SHA-256 do original
+        data: Bytes do original
+
+    Returns:
+        list[dict]: Variantes geradas
+    """
+    variantes = gerar_variantes(data)
+    if not variantes:
+        return []
+
+    from photo_storage import _dialect_insert
+
+    table = ImagemVariante.__table__
+    agora = brazil_now()
+    rows = [
+        dict(hash=imagem_hash, tamanho=len(v['dados']), created_at=agora, **v)
+        for v in variantes
+    ]
+    insert = _dialect_insert(connection)
+    if insert is not None:
+        connection.execute(insert(table).values(rows).on_conflict_do_nothing())
+    else:
+        existentes = {
+            tuple(r) for r in connection.execute(
+                select(table.c.variante, table.c.formato).where(table.c.hash == imagem_hash)
+            )
+        }
+        rows = [r for r in rows if (r['variante'], r['formato']) not in existentes]
+        if rows:
+            connection.execute(table.insert(), rows)
+
+    total = sum(len(v['dados']) for v in variantes)
+    logger.info(f"🖼️ Variantes de {imagem_hash[:12]} gravadas: {len(variantes)} arquivos, {total} bytes")
+    return variantes
+
+
+def obter_variante(foto, variante, formato):
+    """
+    Bytes de uma variante da foto, gerando e gravando sob demanda se ainda não existir.
+
+    Returns:
+        tuple(bytes, str) | None: (dados, mimetype) ou None se a foto não tem imagem
+    """
+    imagem_hash = foto.imagem_hash
+    data = None
+    if not imagem_hash:
+        # Foto legada sem hash: calcula a partir dos bytes (sem alterar a linha)
+        data = foto.get_image_bytes()
+        if not data:
+            return None
+        imagem_hash = hashlib.sha256(data).hexdigest()
+
+    dados = db.session.query(ImagemVariante.dados).filter_by(
+        hash=imagem_hash, variante=variante, formato=formato
+    ).scalar()
+    if dados:
+        return bytes(dados), FORMATOS[formato]
+
+    data = data or foto.get_image_bytes()
+    if not data:
+        return None
+
+    try:
+        variantes = gravar_variantes(db.session.connection(), imagem_hash, data)
+        db.session.commit()
+    except Exception as e:
+        # Outro worker pode ter gravado as mesmas variantes; a imagem ainda é servida
+        db.session.rollback()
+        logger.warning(f"⚠️ Erro ao gravar variantes de {imagem_hash[:12]}: {e}")
+        variantes = gerar_variantes(data)
+
+    for v in variantes:
+        if v['variante'] == variante and v['formato'] == formato:
+            return v['dados'], FORMATOS[formato]
+    return None
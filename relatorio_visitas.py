@@ -0,0 +1,391 @@
+"""
+Relatório de visitas por usuário (PDF ou Excel), de um ou vários meses e usuários
+
+Usado por /reports/visits-monthly. Uma visita conta para o usuário quando ele
+é o responsável ou um dos participantes.
+
+- As contagens (total, por status, por projeto e por mês) são agregadas no
+  banco com GROUP BY sobre os pares (usuário, visita) do período;
+- o detalhamento é lido em streaming (yield_per), só com as colunas impressas;
+- o Excel usa o modo write-only do openpyxl: as linhas vão direto para o
+  arquivo temporário da planilha, sem montar as células em memória;
+- o PDF monta o detalhamento em tabelas de LINHAS_POR_TABELA_PDF linhas
+  (dividir uma tabela enorme entre páginas é quadrático no ReportLab).
+
+Os dois formatos são gravados em arquivo temporário, não em BytesIO.
+"""
+
+import tempfile
+from datetime import datetime
+
+from sqlalchemy import select, union, and_, case, cast, func, literal, String
+
+from app import db
+from models import Visita, VisitaParticipante, Projeto
+
+MESES_PT = ['', 'Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 'Junho',
+            'Julho', 'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro']
+
+# Limite do período de um relatório (relatórios anuais da equipe cabem com folga)
+MAXIMO_MESES = 36
+
+LINHAS_POR_TABELA_PDF = 250
+LINHAS_POR_LEITURA = 1000
+
+MIMETYPE_EXCEL = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+class Periodo:
+    """Meses de (ano, mes) inicial a (ano, mes) final, inclusive"""
+    __slots__ = ('ano_inicio', 'mes_inicio', 'ano_fim', 'mes_fim')
+
+    def __init__(self, ano_inicio, mes_inicio, ano_fim=None, mes_fim=None):
+        self.ano_inicio, self.mes_inicio = ano_inicio, mes_inicio
+        self.ano_fim, self.mes_fim = ano_fim or ano_inicio, mes_fim or mes_inicio
+        if not (1 <= self.mes_inicio <= 12 and 1 <= self.mes_fim <= 12):
+            raise ValueError('Mês inválido')
+        if self.meses < 1:
+            raise ValueError('O mês final deve ser igual ou posterior ao inicial')
+        if self.meses > MAXIMO_MESES:
+            raise ValueError(f'Período máximo de {MAXIMO_MESES} meses')
+
+    @property
+    def meses(self):
+        return (self.ano_fim - self.ano_inicio) * 12 + self.mes_fim - self.mes_inicio + 1
+
+    @property
+    def inicio(self):
+        return datetime(self.ano_inicio, self.mes_inicio, 1)
+
+    @property
+    def fim(self):
+        """Primeiro instante depois do período (limite exclusivo)"""
+        if self.mes_fim == 12:
+            return datetime(self.ano_fim + 1, 1, 1)
+        return datetime(self.ano_fim, self.mes_fim + 1, 1)
+
+    def descricao(self):
+        inicio = f"{MESES_PT[self.mes_inicio]} de {self.ano_inicio}"
+        if self.meses == 1:
+            return inicio
+        return f"{inicio} a {MESES_PT[self.mes_fim]} de {self.ano_fim}"
+
+    def sufixo_arquivo(self):
+        inicio = f"{MESES_PT[self.mes_inicio]}_{self.ano_inicio}"
+        if self.meses == 1:
+            return inicio
+        return f"{inicio}_a_{MESES_PT[self.mes_fim]}_{self.ano_fim}"
+
+
+# =============================================================================
+# CONSULTAS
+# =============================================================================
+
+def _pares_usuario_visita(user_ids, periodo):
+    """Subquery (user_id, visita_id): visitas do período em que o usuário é responsável ou participante"""
+    no_periodo = and_(Visita.data_inicio >= periodo.inicio, Visita.data_inicio < periodo.fim)
+    responsavel = select(
+        Visita.responsavel_id.label('user_id'), Visita.id.label('visita_id')
+    ).where(Visita.responsavel_id.in_(user_ids), no_periodo)
+    participante = select(
+        VisitaParticipante.user_id.label('user_id'), VisitaParticipante.visita_id.label('visita_id')
+    ).join(Visita, Visita.id == VisitaParticipante.visita_id).where(
+        VisitaParticipante.user_id.in_(user_ids), no_periodo
+    )
+    # UNION (sem ALL): quem é responsável e participante conta a visita uma vez
+    return union(responsavel, participante).subquery()
+
+
+def _colunas_visita():
+    """Expressões SQL equivalentes a Visita.projeto_nome e ao status exibido"""
+    projeto_nome = case(
+        (Visita.is_pessoal.is_(True), literal('Compromisso Pessoal')),
+        (Projeto.id.isnot(None), Projeto.numero + ' - ' + Projeto.nome),
+        (func.coalesce(Visita.projeto_outros, '') != '', Visita.projeto_outros),
+        else_=literal('Outros'),
+    )
+    status = func.coalesce(func.nullif(Visita.status, ''), 'Sem status')
+    return projeto_nome, status
+
+
+def _base(colunas, pares):
+    return db.session.query(*colunas).select_from(pares).join(
+        Visita, Visita.id == pares.c.visita_id
+    ).outerjoin(Projeto, Projeto.id == Visita.projeto_id)
+
+
+def resumo(user_ids, periodo):
+    """
+    Contagens por usuário, agregadas no banco.
+
+    Returns:
+        dict: {user_id: {'total': int, 'status': [(status, n)], 'projetos': [(projeto, n)],
+               'meses': [((ano, mes), n)]}} (todos os usuários de `user_ids`, mesmo sem visitas)
+    """
+    pares = _pares_usuario_visita(user_ids, periodo)
+    projeto_nome, status = _colunas_visita()
+    quantidade = func.count().label('quantidade')
+
+    resultado = {user_id: {'total': 0, 'status': [], 'projetos': [], 'meses': []} for user_id in user_ids}
+
+    por_status = _base((pares.c.user_id, status, quantidade), pares).group_by(pares.c.user_id, status)
+    for user_id, nome, n in por_status.order_by(pares.c.user_id, quantidade.desc(), status):
+        resultado[user_id]['status'].append((nome, n))
+        resultado[user_id]['total'] += n
+
+    por_projeto = _base((pares.c.user_id, projeto_nome, quantidade), pares).group_by(pares.c.user_id, projeto_nome)
+    for user_id, nome, n in por_projeto.order_by(pares.c.user_id, quantidade.desc(), projeto_nome):
+        resultado[user_id]['projetos'].append((nome, n))
+
+    if periodo.meses > 1:
+        ano = func.extract('year', Visita.data_inicio)
+        mes = func.extract('month', Visita.data_inicio)
+        por_mes = _base((pares.c.user_id, ano, mes, quantidade), pares).group_by(pares.c.user_id, ano, mes)
+        for user_id, a, m, n in por_mes.order_by(pares.c.user_id, ano, mes):
+            resultado[user_id]['meses'].append(((int(a), int(m)), n))
+
+    return resultado
+
+
+def detalhes(user_ids, periodo):
+    """
+    Visitas do período, por usuário (na ordem de `user_ids`) e data, lidas em streaming.
+
+    Yields:
+        tuple: (user_id, data_inicio, numero, projeto, status)
+    """
+    pares = _pares_usuario_visita(user_ids, periodo)
+    projeto_nome, status = _colunas_visita()
+    numero = func.coalesce(Visita.numero, literal('V') + cast(Visita.id, String))
+    # Usuários na ordem de `user_ids` (a mesma das seções do relatório)
+    posicao = case({user_id: i for i, user_id in enumerate(user_ids)}, value=pares.c.user_id)
+    consulta = _base((pares.c.user_id, Visita.data_inicio, numero, projeto_nome, status), pares).order_by(
+        posicao, Visita.data_inicio, Visita.id
+    )
+    yield from consulta.yield_per(LINHAS_POR_LEITURA)
+
+
+def _agrupar_por_usuario(usuarios, linhas):
+    """
+    (usuario, linhas dele) para cada usuário, consumindo uma vez as `linhas` de
+    detalhes() (na mesma ordem de `usuarios`). As linhas de cada usuário devem
+    ser lidas antes de passar ao próximo.
+    """
+    linhas = iter(linhas)
+    pendente = next(linhas, None)
+
+    def do_usuario(user_id):
+        nonlocal pendente
+        while pendente is not None and pendente[0] == user_id:
+            yield pendente
+            pendente = next(linhas, None)
+
+    for usuario in usuarios:
+        yield usuario, do_usuario(usuario.id)
+
+
+# =============================================================================
+# EXCEL (openpyxl write-only)
+# =============================================================================
+
+def _titulo_aba(nome, usados):
+    """Nome de aba válido (31 caracteres, sem []:*?/\\) e único na planilha"""
+    base = ''.join(c for c in nome if c not in '[]:*?/\\')[:31].strip() or 'Usuário'
+    titulo, n = base, 2
+    while titulo.lower() in usados:
+        sufixo = f" ({n})"
+        titulo, n = base[:31 - len(sufixo)] + sufixo, n + 1
+    usados.add(titulo.lower())
+    return titulo
+
+
+def gerar_excel(usuarios, periodo):
+    """
+    Planilha com uma aba por usuário: resumo, visitas por mês (período de
+    vários meses), por projeto e o detalhamento.
+
+    Returns:
+        file: Arquivo temporário com o XLSX, posicionado no início
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+
+    wb = Workbook(write_only=True)
+    contagens = resumo([u.id for u in usuarios], periodo)
+
+    header_font = Font(bold=True, color="FFFFFF", size=12)
+    title_font = Font(bold=True, size=16)
+    section_font = Font(bold=True, size=14)
+    border = Border(left=Side(style='thin'), right=Side(style='thin'),
+                    top=Side(style='thin'), bottom=Side(style='thin'))
+
+    def celula(ws, valor, font=None, fill=None, borda=False, alinhamento=None):
+        cell = WriteOnlyCell(ws, value=valor)
+        if font:
+            cell.font = font
+        if fill:
+            cell.fill = PatternFill(start_color=fill, end_color=fill, fill_type="solid")
+        if borda:
+            cell.border = border
+        if alinhamento:
+            cell.alignment = Alignment(horizontal=alinhamento)
+        return cell
+
+    def secao(ws, titulo, cabecalho, cor, linhas):
+        ws.append([])
+        ws.append([])
+        ws.append([celula(ws, titulo, section_font)])
+        ws.append([celula(ws, h, header_font, cor) for h in cabecalho])
+        for linha in linhas:
+            ws.append(linha)
+
+    abas = set()
+    for usuario, linhas in _agrupar_por_usuario(usuarios, detalhes([u.id for u in usuarios], periodo)):
+        dados = contagens[usuario.id]
+        ws = wb.create_sheet(_titulo_aba(usuario.nome_completo, abas))
+        for coluna, largura in zip('ABCD', (20, 15, 40, 15)):
+            ws.column_dimensions[coluna].width = largura
+
+        ws.append([celula(ws, "Relatório de Visitas" if periodo.meses > 1 else "Relatório Mensal de Visitas",
+                          title_font, alinhamento='center')])
+        ws.append([celula(ws, f"{periodo.descricao()} - {usuario.nome_completo}", alinhamento='center')])
+        ws.append([])
+        ws.append([celula(ws, "Resumo do Período", section_font)])
+        ws.append([celula(ws, "Métrica", header_font, "3B82F6"), celula(ws, "Valor", header_font, "3B82F6")])
+        ws.append(["Total de Visitas", dados['total']])
+        for status, n in dados['status']:
+            ws.append([f"Visitas {status}", n])
+
+        if dados['meses']:
+            secao(ws, "Visitas por Mês", ["Mês", "Quantidade"], "F59E0B",
+                  ([f"{MESES_PT[m]}/{a}", n] for (a, m), n in dados['meses']))
+
+        secao(ws, "Visitas por Projeto", ["Projeto", "Quantidade"], "10B981",
+              ([projeto, n] for projeto, n in dados['projetos']))
+
+        ws.append([])
+        ws.append([])
+        ws.append([celula(ws, "Detalhamento das Visitas", section_font)])
+        ws.append([celula(ws, h, header_font, "6366F1", borda=True) for h in ('Data', 'Nº Visita', 'Projeto', 'Status')])
+        for _, data_inicio, numero, projeto, status in linhas:
+            ws.append([celula(ws, v, borda=True) for v in (data_inicio.strftime('%d/%m/%Y %H:%M'), numero, projeto, status)])
+
+    if not abas:
+        wb.create_sheet("Relatório Visitas")
+
+    arquivo = tempfile.TemporaryFile()
+    wb.save(arquivo)
+    arquivo.seek(0)
+    return arquivo
+
+
+# =============================================================================
+# PDF (ReportLab)
+# =============================================================================
+
+def gerar_pdf(usuarios, periodo):
+    """
+    PDF com uma seção por usuário (nova página a cada usuário).
+
+    Returns:
+        file: Arquivo temporário com o PDF, posicionado no início
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib import colors
+    from reportlab.lib.units import cm
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.enums import TA_CENTER
+
+    arquivo = tempfile.TemporaryFile()
+    doc = SimpleDocTemplate(arquivo, pagesize=A4, topMargin=2*cm, bottomMargin=2*cm)
+    elements = []
+    styles = getSampleStyleSheet()
+
+    title_style = ParagraphStyle('CustomTitle', parent=styles['Heading1'], fontSize=18,
+                                 textColor=colors.HexColor('#1f2937'), spaceAfter=0.5*cm, alignment=TA_CENTER)
+    subtitle_style = ParagraphStyle('CustomSubtitle', parent=styles['Normal'], fontSize=12,
+                                    textColor=colors.HexColor('#4b5563'), spaceAfter=1*cm, alignment=TA_CENTER)
+    section_style = ParagraphStyle('SectionHeader', parent=styles['Heading2'], fontSize=14,
+                                   textColor=colors.HexColor('#1f2937'), spaceAfter=0.3*cm, spaceBefore=0.5*cm)
+
+    def tabela_contagem(linhas, cor_cabecalho, cor_fundo):
+        tabela = Table(linhas, colWidths=[12*cm, 4*cm])
+        tabela.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor(cor_cabecalho)),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 12),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), cor_fundo),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ]))
+        return tabela
+
+    estilo_detalhes = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#6366f1')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('FONTSIZE', (0, 1), (-1, -1), 9),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f5f5f5')),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f5f5f5')]),
+    ])
+    cabecalho_detalhes = ['Data', 'Nº Visita', 'Projeto', 'Status']
+
+    def tabela_detalhes(linhas):
+        tabela = Table([cabecalho_detalhes] + linhas, colWidths=[4*cm, 3*cm, 6*cm, 3*cm], repeatRows=1)
+        tabela.setStyle(estilo_detalhes)
+        return tabela
+
+    contagens = resumo([u.id for u in usuarios], periodo)
+    for indice, (usuario, linhas) in enumerate(
+            _agrupar_por_usuario(usuarios, detalhes([u.id for u in usuarios], periodo))):
+        dados = contagens[usuario.id]
+        if indice:
+            elements.append(PageBreak())
+
+        elements.append(Paragraph("Relatório de Visitas" if periodo.meses > 1 else "Relatório Mensal de Visitas",
+                                  title_style))
+        elements.append(Paragraph(f"{periodo.descricao()} - {usuario.nome_completo}", subtitle_style))
+
+        elements.append(Paragraph("Resumo do Período", section_style))
+        resumo_data = [['Métrica', 'Valor'], ['Total de Visitas', str(dados['total'])]]
+        resumo_data += [[f'Visitas {status}', str(n)] for status, n in dados['status']]
+        elements.append(tabela_contagem(resumo_data, '#3b82f6', colors.beige))
+        elements.append(Spacer(1, 0.5*cm))
+
+        if dados['meses']:
+            elements.append(Paragraph("Visitas por Mês", section_style))
+            meses_data = [['Mês', 'Quantidade']] + [[f"{MESES_PT[m]}/{a}", str(n)] for (a, m), n in dados['meses']]
+            elements.append(tabela_contagem(meses_data, '#f59e0b', colors.HexColor('#fffbeb')))
+            elements.append(Spacer(1, 0.5*cm))
+
+        if dados['projetos']:
+            elements.append(Paragraph("Visitas por Projeto", section_style))
+            projeto_data = [['Projeto', 'Quantidade']] + [[projeto, str(n)] for projeto, n in dados['projetos']]
+            elements.append(tabela_contagem(projeto_data, '#10b981', colors.HexColor('#f0fdf4')))
+            elements.append(Spacer(1, 0.5*cm))
+
+        if dados['total']:
+            elements.append(Paragraph("Detalhamento das Visitas", section_style))
+            bloco = []
+            for _, data_inicio, numero, projeto, status in linhas:
+                bloco.append([data_inicio.strftime('%d/%m/%Y %H:%M'), numero, projeto, status])
+                if len(bloco) == LINHAS_POR_TABELA_PDF:
+                    elements.append(tabela_detalhes(bloco))
+                    bloco = []
+            if bloco:
+                elements.append(tabela_detalhes(bloco))
+        else:
+            elements.append(Paragraph("Nenhuma visita encontrada no período selecionado.", styles['Normal']))
+
+    doc.build(elements)
+    arquivo.seek(0)
+    return arquivo
@@ -127,25 +127,26 @@ def debug_images_data():
         # Informações do banco de dados
         db_url = app.config.get('SQLALCHEMY_DATABASE_URI', 'not set')[:100]
         
-        # Buscar fotos
+        # Buscar fotos (apenas metadados; o tamanho vem do SQL, na linha ou no blob store)
         fotos = FotoRelatorio.query.order_by(FotoRelatorio.created_at.desc()).limit(20).all()
         
         debug_data = {
             'database_url': db_url,
             'total_fotos': FotoRelatorio.query.count(),
-            'fotos_com_imagem': FotoRelatorio.query.filter(FotoRelatorio.imagem.isnot(None)).count(),
-            'fotos_sem_imagem': FotoRelatorio.query.filter(FotoRelatorio.imagem.is_(None)).count(),
+            'fotos_com_imagem': FotoRelatorio.query.filter(FotoRelatorio.filtro_com_imagem()).count(),
+            'fotos_sem_imagem': FotoRelatorio.query.filter(~FotoRelatorio.filtro_com_imagem()).count(),
             'fotos_recentes': []
         }
         
         for foto in fotos:
+            imagem_bytes = FotoRelatorio.tamanho_armazenado(foto.id)
             debug_data['fotos_recentes'].append({
                 'id': foto.id,
                 'relatorio_id': foto.relatorio_id,
                 'filename': foto.filename,
                 'legenda': foto.legenda,
-                'imagem_presente': foto.imagem is not None,
-                'imagem_size': len(foto.imagem) if foto.imagem else 0,
+                'imagem_presente': imagem_bytes > 0,
+                'imagem_size': imagem_bytes,
                 'created_at': foto.created_at.isoformat() if foto.created_at else None
             })
         
@@ -587,8 +588,8 @@ from models import User, Projeto, Contato, ContatoProjeto, Visita, Relatorio, Fo
 from forms import LoginForm, RegisterForm, UserForm, ProjetoForm, VisitaForm, VisitaRealizadaForm, EmailClienteForm, RelatorioForm, FotoRelatorioForm, ReembolsoForm, ContatoForm, ContatoProjetoForm, LegendaPredefinidaForm, FirstLoginForm
 from forms_email import ConfiguracaoEmailForm, EnvioEmailForm
 from utils import generate_project_number, generate_report_number, generate_visit_number, send_report_email, calculate_reimbursement_total, get_coordinates_from_address
-from pdf_generator import generate_visit_report_pdf
 from google_drive_backup import backup_to_drive, test_drive_connection, backup_photos_to_drive
+from routes_relatorios_api import ler_upload_temporario, remover_uploads_temporarios
 import math
 import json
 
@@ -2583,10 +2584,7 @@ def api_upload_photo():
             }), 403
         
         # Checar se já existe uma foto com o mesmo hash para este relatório (evitar duplicatas)
-        foto_existente = FotoRelatorio.query.filter_by(
-            relatorio_id=relatorio_id,
-            imagem_hash=imagem_hash
-        ).first()
+        foto_existente = FotoRelatorio.buscar_enviada(imagem_hash, relatorio_id=relatorio_id)
         
         if foto_existente:
             current_app.logger.warning(f"⚠️ Imagem duplicada detectada! Retornando foto existente ID={foto_existente.id}")
@@ -2596,7 +2594,7 @@ def api_upload_photo():
                 'foto_id': foto_existente.id,
                 'filename': foto_existente.filename,
                 'file_size': foto_existente.imagem_size,
-                'hash': foto_existente.imagem_hash,
+                'hash': foto_existente.imagem_hash_envio,
                 'is_duplicate': True,
                 'url': url_for('api_get_photo', foto_id=foto_existente.id)
             }), 200
@@ -2679,16 +2677,8 @@ def api_upload_photo():
                 'error': 'Foto não foi salva no banco de dados'
             }), 500
         
-        # Verificar dados binários no PostgreSQL
-        if foto_verificada.imagem:
-            if isinstance(foto_verificada.imagem, (bytes, bytearray)):
-                imagem_size_db = len(foto_verificada.imagem)
-            elif isinstance(foto_verificada.imagem, memoryview):
-                imagem_size_db = len(bytes(foto_verificada.imagem))
-            else:
-                imagem_size_db = 0
-        else:
-            imagem_size_db = 0
+        # Verificar dados binários no PostgreSQL (tamanho calculado no banco, sem trazer o BYTEA)
+        imagem_size_db = FotoRelatorio.tamanho_armazenado(foto.id)
         
         current_app.logger.info(f"✅ VERIFICAÇÃO POSTGRESQL: foto.id={foto.id}, imagem_size_db={imagem_size_db}, imagem_size_original={file_size}")
         
@@ -2707,12 +2697,16 @@ def api_upload_photo():
         # DIAGNÓSTICO FINAL: Query SQL direta no PostgreSQL
         try:
             from sqlalchemy import text
-            sql_check = text("SELECT id, LENGTH(imagem) as img_size FROM fotos_relatorio WHERE id = :foto_id")
+            sql_check = text(
+                "SELECT f.id, COALESCE(LENGTH(f.imagem), LENGTH(b.dados), b.tamanho) as img_size "
+                "FROM fotos_relatorio f LEFT JOIN imagem_blobs b ON b.hash = f.imagem_hash "
+                "WHERE f.id = :foto_id"
+            )
             resultado = db.session.execute(sql_check, {'foto_id': foto.id}).fetchone()
             
             if resultado:
                 sql_img_size = resultado.img_size if resultado.img_size else 0
-                current_app.logger.info(f"🔍 SQL DIRETO: foto.id={foto.id}, LENGTH(imagem)={sql_img_size}")
+                current_app.logger.info(f"🔍 SQL DIRETO: foto.id={foto.id}, LENGTH(imagem/blob)={sql_img_size}")
                 
                 if sql_img_size == 0:
                     current_app.logger.error(f"❌ POSTGRESQL VAZIO! foto.id={foto.id} tem imagem NULL ou vazia")
@@ -2753,21 +2747,18 @@ def api_get_photo(foto_id):
     """
     try:
         foto = FotoRelatorio.query.get_or_404(foto_id)
-        
-        # Verificar se tem dados binários
-        if not foto.imagem:
-            current_app.logger.warning(f"⚠️ Foto {foto_id} sem dados binários no campo imagem")
-            
-            # Retornar imagem placeholder
-            from flask import send_file
-            import io
-            placeholder = generate_placeholder_image(foto.filename)
-            return send_file(
-                io.BytesIO(placeholder),
-                mimetype='image/png',
-                as_attachment=False
-            )
-        
+
+        cache_control = 'public, max-age=31536000'
+        variant_response = serve_photo_variant(foto, cache_control)
+        if variant_response:
+            return variant_response
+
+        # Revalidação (If-None-Match/If-Modified-Since) respondida sem ler os bytes
+        etag = photo_etag(foto)
+        not_modified = photo_not_modified(foto, etag, cache_control)
+        if not_modified:
+            return not_modified
+
         # Usar content_type do banco de dados (prioridade)
         mimetype = foto.content_type or 'image/jpeg'
         
@@ -2781,21 +2772,35 @@ def api_get_photo(foto_id):
                 mimetype = 'image/webp'
             else:
                 mimetype = 'image/jpeg'
+
+        # Foto quente: servida do cache em disco compartilhado, sem tocar no banco
+        cached = send_cached_photo(foto, etag, mimetype, cache_control, download_name=foto.filename)
+        if cached:
+            return cached
+
+        # Bytes lidos do banco em partes, direto para a resposta
+        response = send_photo_stream(
+            foto, mimetype,
+            etag=etag, cache_control=cache_control, download_name=foto.filename
+        )
         
-        current_app.logger.info(f"📤 Servindo foto {foto_id}: size={len(foto.imagem)} bytes, type={mimetype}")
-        
-        # CRÍTICO: Garantir que foto.imagem seja bytes
-        image_data = foto.imagem
-        if isinstance(image_data, memoryview):
-            image_data = bytes(image_data)
+        # Verificar se tem dados binários
+        if response is None:
+            current_app.logger.warning(f"⚠️ Foto {foto_id} sem dados binários no campo imagem")
+            
+            # Retornar imagem placeholder
+            from flask import send_file
+            import io
+            placeholder = generate_placeholder_image(foto.filename)
+            return send_file(
+                io.BytesIO(placeholder),
+                mimetype='image/png',
+                as_attachment=False
+            )
         
-        # Retornar a imagem com cabeçalhos corretos
-        response = make_response(image_data)
-        response.headers['Content-Type'] = mimetype
-        response.headers['Content-Disposition'] = f'inline; filename="{foto.filename}"'
-        response.headers['Cache-Control'] = 'public, max-age=31536000'
-        response.headers['Content-Length'] = str(len(image_data))
+        current_app.logger.info(f"📤 Servindo foto {foto_id}: size={response.content_length} bytes, type={mimetype}")
         
+        # Imagem com cabeçalhos corretos (ETag, Last-Modified, Range)
         return response
         
     except Exception as e:
@@ -3708,6 +3713,7 @@ def create_report():
                         pass  # Ignore session storage errors
 
             # Process mobile photos with mandatory caption validation - APENAS se não houver fotos do autosave
+            temp_ids_gravados = []  # Uploads em partes já gravados: temporários removidos após o commit
             if not skip_photo_processing:
                 mobile_photos_data = request.form.get('mobile_photos_data')
                 current_app.logger.info(f"🔍 MOBILE_PHOTOS_DATA PRESENTE? {mobile_photos_data is not None}")
@@ -3752,10 +3758,17 @@ def create_report():
                             foto.ordem = photo_count + i + 1
 
                             # CRÍTICO: Salvar dados binários da imagem
+                            # Preferência: temp_id de /api/uploads/sessions (binário em partes, lido do disco).
+                            # 'data' em base64 é o formato legado: o JSON inteiro (todas as fotos) fica
+                            # na memória do worker durante a requisição.
                             has_data_field = photo_data.get('data') is not None
                             current_app.logger.info(f"🔍 DEBUG Foto {i+1}: Campo 'data' existe? {has_data_field}")
-                            
-                            if has_data_field:
+
+                            imagem_temp = ler_upload_temporario(photo_data['temp_id']) if photo_data.get('temp_id') else None
+                            if imagem_temp:
+                                foto.imagem = imagem_temp[0]
+                                current_app.logger.info(f"✅ IMAGEM DO UPLOAD EM PARTES: {len(foto.imagem)} bytes para foto {i+1}")
+                            elif has_data_field:
                                 try:
                                     import base64
                                     image_data_b64 = photo_data['data']
@@ -3775,7 +3788,7 @@ def create_report():
                                     current_app.logger.error(f"❌ Traceback: {traceback.format_exc()}")
                                     # Continuar sem a imagem binária
                             else:
-                                current_app.logger.warning(f"⚠️ Foto mobile {i+1} sem dados binários - 'data' field não encontrado")
+                                current_app.logger.warning(f"⚠️ Foto mobile {i+1} sem dados binários - 'temp_id'/'data' não encontrados")
 
                             # Salvar anotações se disponível (JSONB aceita dict diretamente)
                             if photo_data.get('annotations'):
@@ -3785,8 +3798,15 @@ def create_report():
                             if photo_data.get('coordinates'):
                                 foto.coordenadas_anotacao = photo_data['coordinates']
 
+                            tamanho_imagem = len(foto.imagem) if foto.imagem else 0
                             db.session.add(foto)
-                            current_app.logger.info(f"✅ Foto mobile {i+1} completa: legenda='{foto.legenda}', tipo='{foto.tipo_servico}', imagem={len(foto.imagem) if foto.imagem else 0} bytes")
+                            # Flush por foto: os bytes vão para o blob store (photo_storage) e saem da
+                            # sessão, em vez de todas as fotos ficarem na memória até o commit
+                            db.session.flush()
+                            if imagem_temp:
+                                temp_ids_gravados.append(photo_data['temp_id'])
+                            imagem_temp = image_binary = None
+                            current_app.logger.info(f"✅ Foto mobile {i+1} completa: legenda='{foto.legenda}', tipo='{foto.tipo_servico}', imagem={tamanho_imagem} bytes")
 
                         except Exception as foto_error:
                             current_app.logger.error(f"❌ Erro ao processar foto mobile {i+1}: {foto_error}")
@@ -3972,11 +3992,12 @@ def create_report():
             # Debug: Verificar fotos antes do commit
             fotos_debug = FotoRelatorio.query.filter_by(relatorio_id=relatorio.id).all()
             for foto_debug in fotos_debug:
-                current_app.logger.info(f"🔍 FOTO PRÉ-COMMIT: ID={foto_debug.id}, filename='{foto_debug.filename}', legenda='{foto_debug.legenda}', descricao='{foto_debug.descricao}', tipo='{foto_debug.tipo_servico}', imagem_size={len(foto_debug.imagem) if foto_debug.imagem else 0}")
+                current_app.logger.info(f"🔍 FOTO PRÉ-COMMIT: ID={foto_debug.id}, filename='{foto_debug.filename}', legenda='{foto_debug.legenda}', descricao='{foto_debug.descricao}', tipo='{foto_debug.tipo_servico}', imagem_size={foto_debug.imagem_size or 0}")
 
             current_app.logger.info(f"🔧 Fazendo COMMIT de {photo_count} fotos para relatório {relatorio.id}")
             
             db.session.commit()
+            remover_uploads_temporarios(temp_ids_gravados)
             
             current_app.logger.info(f"✅ COMMIT REALIZADO COM SUCESSO")
             
@@ -4005,7 +4026,7 @@ def create_report():
             # VERIFICAÇÃO PÓS-COMMIT: Contar imagens salvas com dados binários
             fotos_com_imagem = db.session.query(FotoRelatorio).filter(
                 FotoRelatorio.relatorio_id == relatorio.id,
-                FotoRelatorio.imagem != None
+                FotoRelatorio.filtro_com_imagem()
             ).count()
             current_app.logger.info(f"📊 VERIFICAÇÃO: {fotos_com_imagem} de {photo_count} fotos têm dados binários salvos")
 
@@ -4014,8 +4035,8 @@ def create_report():
             current_app.logger.info(f"✅ PÓS-COMMIT: {len(fotos_post)} fotos encontradas no banco para relatório {relatorio.id}")
             
             for foto_post in fotos_post:
-                imagem_size = len(foto_post.imagem) if foto_post.imagem else 0
-                current_app.logger.info(f"💾 FOTO ID={foto_post.id}: legenda='{foto_post.legenda}', filename='{foto_post.filename}', imagem_bytes={imagem_size}, imagem_presente={foto_post.imagem is not None}")
+                imagem_size = foto_post.imagem_size or 0
+                current_app.logger.info(f"💾 FOTO ID={foto_post.id}: legenda='{foto_post.legenda}', filename='{foto_post.filename}', imagem_bytes={imagem_size}")
                 
                 # Verificar dados JSON
                 if foto_post.anotacoes_dados:
@@ -4697,20 +4718,13 @@ def approve_report(id):
         except Exception as notif_error:
             current_app.logger.error(f"⚠️ Erro ao criar notificação de aprovação: {notif_error}")
 
-        # Gerar PDF usando WeasyPrint
-        from pdf_generator_weasy import WeasyPrintReportGenerator
-        generator = WeasyPrintReportGenerator()
-        
-        # Buscar fotos do relatório
-        fotos = FotoRelatorio.query.filter_by(relatorio_id=relatorio.id).order_by(FotoRelatorio.ordem).all()
-        
-        # Gerar PDF
+        # Gerar PDF usando WeasyPrint (fica no cache: visualizações do aprovado não renderizam de novo)
+        import pdf_cache
         obra_nome = sanitize_filename(relatorio.projeto.nome)
         pdf_filename = f"relatorio_{relatorio.numero.replace('/', '_')}_{obra_nome}_{now_brt().strftime('%Y%m%d')}.pdf"
         pdf_path = os.path.join('static', 'reports', pdf_filename)
-        os.makedirs(os.path.dirname(pdf_path), exist_ok=True)
         
-        generator.generate_report_pdf(relatorio, fotos, output_path=pdf_path)
+        pdf_cache.salvar_copia(pdf_cache.pdf_relatorio(relatorio), pdf_path)
         current_app.logger.info(f"📄 PDF gerado: {pdf_path}")
 
         # Enviar e-mail de aprovação
@@ -4992,29 +5006,16 @@ def generate_pdf_report(report_id):
     """Gerar PDF do relatório usando WeasyPrint (modelo Artesano) para visualização"""
     try:
         relatorio = Relatorio.query.get_or_404(report_id)
-        fotos = FotoRelatorio.query.filter_by(relatorio_id=report_id).order_by(FotoRelatorio.ordem).all()
-
-        from pdf_generator_weasy import WeasyPrintReportGenerator
-        generator = WeasyPrintReportGenerator()
 
-        # Generate PDF
-        pdf_data = generator.generate_report_pdf(relatorio, fotos)
+        # PDF do cache em disco se o relatório não mudou desde a última geração
+        import pdf_cache
+        resultado = pdf_cache.pdf_relatorio(relatorio)
 
         # Create response for inline viewing
-        from flask import Response
         obra_nome = sanitize_filename(relatorio.projeto.nome)
         filename = f"relatorio_{relatorio.numero.replace('/', '_')}_{obra_nome}_{now_brt().strftime('%Y%m%d')}.pdf"
 
-        response = Response(
-            pdf_data,
-            mimetype='application/pdf',
-            headers={
-                'Content-Disposition': f'inline; filename="{filename}"',
-                'Content-Type': 'application/pdf'
-            }
-        )
-
-        return response
+        return pdf_cache.resposta_pdf(resultado, filename)
 
     except Exception as e:
         flash(f'Erro ao gerar PDF: {str(e)}', 'error')
@@ -5026,29 +5027,16 @@ def generate_report_pdf_download(id):
     """Baixar PDF do relatório usando WeasyPrint (mesmo formato da visualização)"""
     try:
         relatorio = Relatorio.query.get_or_404(id)
-        fotos = FotoRelatorio.query.filter_by(relatorio_id=id).order_by(FotoRelatorio.ordem).all()
 
-        from pdf_generator_weasy import WeasyPrintReportGenerator
-        generator = WeasyPrintReportGenerator()
-
-        # Generate PDF (mesmo conteúdo da visualização)
-        pdf_data = generator.generate_report_pdf(relatorio, fotos)
+        # Mesmo PDF em cache da visualização
+        import pdf_cache
+        resultado = pdf_cache.pdf_relatorio(relatorio)
 
         # Create response for download
-        from flask import Response
         obra_nome = sanitize_filename(relatorio.projeto.nome)
         filename = f"relatorio_{relatorio.numero.replace('/', '_')}_{obra_nome}_{now_brt().strftime('%Y%m%d')}.pdf"
 
-        response = Response(
-            pdf_data,
-            mimetype='application/pdf',
-            headers={
-                'Content-Disposition': f'attachment; filename="{filename}"',
-                'Content-Type': 'application/pdf'
-            }
-        )
-
-        return response
+        return pdf_cache.resposta_pdf(resultado, filename, as_attachment=True)
 
     except Exception as e:
         flash(f'Erro ao gerar PDF: {str(e)}', 'error')
@@ -5060,13 +5048,10 @@ def generate_pdf_report_legacy(id):
     """Gerar PDF do relatório usando ReportLab (versão legacy)"""
     try:
         relatorio = Relatorio.query.get_or_404(id)
-        fotos = FotoRelatorio.query.filter_by(relatorio_id=id).order_by(FotoRelatorio.ordem).all()
-
-        from pdf_generator_artesano import ArtesanoPDFGenerator
-        generator = ArtesanoPDFGenerator()
 
-        # Generate PDF
-        pdf_data = generator.generate_report_pdf(relatorio, fotos)
+        # Generate PDF (processo isolado do pool de renderização)
+        import pdf_render_pool
+        pdf_data = pdf_render_pool.renderizar(pdf_render_pool.ARTESANO, relatorio.id)
 
         # Create response
         from flask import Response
@@ -5465,10 +5450,7 @@ def upload_report_photos(report_id):
                 imagem_hash = hashlib.sha256(file_data).hexdigest()
                 
                 # Verificar se imagem JÁ EXISTE no banco (prevenir duplicação)
-                foto_existente = FotoRelatorio.query.filter_by(
-                    relatorio_id=relatorio.id,
-                    imagem_hash=imagem_hash
-                ).first()
+                foto_existente = FotoRelatorio.buscar_enviada(imagem_hash, relatorio_id=relatorio.id)
                 
                 if foto_existente:
                     # Imagem já existe - não duplicar
@@ -7778,10 +7760,7 @@ def update_report(report_id):
                         import hashlib
                         imagem_hash = hashlib.sha256(file_data).hexdigest()
                         
-                        foto_existente = FotoRelatorio.query.filter_by(
-                            relatorio_id=report_id,
-                            imagem_hash=imagem_hash
-                        ).first()
+                        foto_existente = FotoRelatorio.buscar_enviada(imagem_hash, relatorio_id=report_id)
                         
                         if foto_existente:
                             # Imagem já existe (por hash) - apenas atualizar metadados se necessário
@@ -8230,11 +8209,9 @@ def uploaded_file(filename):
     try:
         # Verificação manual de autenticação (sem decorator para evitar 302)
         from flask_login import current_user
-        import logging
+        import image_resolver
 
-        # Log detalhado para debugging
-        current_app.logger.info(f"🔍 SOLICITAÇÃO IMAGEM: {filename}")
-        current_app.logger.info(f"🔐 STATUS AUTH: authenticated={current_user.is_authenticated if current_user else False}")
+        current_app.logger.debug(f"🔍 SOLICITAÇÃO IMAGEM: {filename}")
 
         # Se não autenticado, servir placeholder sem redirecionar
         if not current_user or not current_user.is_authenticated:
@@ -8246,91 +8223,57 @@ def uploaded_file(filename):
             current_app.logger.error(f"❌ FILENAME INVÁLIDO: {repr(filename)}")
             return serve_placeholder_image('arquivo_invalido', "Nome de arquivo inválido")
 
-        current_app.logger.info(f"🔍 INICIANDO BUSCA: {filename}")
-
-        # Buscar no banco PostgreSQL primeiro
-        from models import FotoRelatorio, FotoRelatorioExpress
-
-        # Definir diretórios de busca (priorizar uploads)
-        search_directories = [
-            ('uploads', app.config.get('UPLOAD_FOLDER', 'uploads')),
-            ('attached_assets', 'attached_assets'),
-            ('static_uploads', os.path.join('static', 'uploads'))
-        ]
-
-        # Tentar encontrar nos relatórios normais
-        try:
-            foto_normal = FotoRelatorio.query.filter_by(filename=filename).first()
-            
-            # Se não encontrou em FotoRelatorio, tentar em FotoRelatorioExpress
-            if not foto_normal:
-                foto_normal = FotoRelatorioExpress.query.filter_by(filename=filename).first()
-                if foto_normal:
-                    current_app.logger.info(f"✅ ENCONTRADA NO BANCO (Relatório Express {foto_normal.relatorio_express_id}): {filename}")
-            
-            if foto_normal:
-                # Log info - determina se é relatório normal ou express
-                if hasattr(foto_normal, 'relatorio_id') and foto_normal.relatorio_id:
-                    current_app.logger.info(f"✅ ENCONTRADA NO BANCO (Relatório {foto_normal.relatorio_id}): {filename}")
-                elif hasattr(foto_normal, 'relatorio_express_id') and foto_normal.relatorio_express_id:
-                    current_app.logger.info(f"✅ ENCONTRADA NO BANCO (Relatório Express {foto_normal.relatorio_express_id}): {filename}")
-
-                # Verificar se tem dados binários salvos no banco
-                if hasattr(foto_normal, 'imagem') and foto_normal.imagem:
-                    current_app.logger.info(f"📱 SERVINDO IMAGEM DIRETAMENTE DO BANCO: {filename}")
-                    try:
-                        content_type = get_content_type(filename)
-                        response = Response(foto_normal.imagem, mimetype=content_type)
-                        response.headers['Content-Type'] = content_type
-                        response.headers['Cache-Control'] = 'public, max-age=3600'
-                        response.headers['X-Image-Source'] = 'database_binary'
-                        return response
-                    except Exception as binary_error:
-                        current_app.logger.error(f"❌ Erro ao servir imagem do banco: {binary_error}")
-
-                # Buscar arquivo físico
-                for dir_name, dir_path in search_directories:
-                    filepath = os.path.join(dir_path, filename)
-                    if os.path.exists(filepath):
-                        current_app.logger.info(f"✅ ARQUIVO FÍSICO ENCONTRADO EM {dir_name}: {filepath}")
-                        try:
-                            content_type = get_content_type(filename)
-                            response = send_from_directory(dir_path, filename)
-                            response.headers['Content-Type'] = content_type
-                            response.headers['Cache-Control'] = 'public, max-age=3600'
-                            response.headers['X-Image-Source'] = f'normal_report_{dir_name}'
-                            return response
-                        except Exception as send_error:
-                            current_app.logger.error(f"❌ Erro ao enviar arquivo de {dir_path}: {send_error}")
-                            continue
-
-                # Se chegou aqui, arquivo existe no banco mas não no filesystem
-                current_app.logger.warning(f"⚠️ ARQUIVO NO BANCO MAS NÃO ENCONTRADO FISICAMENTE: {filename}")
-                return serve_placeholder_image(filename, "Imagem registrada no banco mas arquivo físico perdido")
-        except Exception as db_error:
-            current_app.logger.error(f"❌ Erro ao buscar foto no banco: {db_error}")
+        # Uma consulta indexada (ou acerto no cache do worker) define onde está a imagem
+        resolucao = image_resolver.resolver_imagem(filename)
+        foto = image_resolver.carregar_foto(resolucao)
+        if resolucao.tabela and foto is None:
+            # Foto removida por outro worker desde que a resolução entrou no cache
+            image_resolver.invalidar(filename)
+            resolucao = image_resolver.resolver_imagem(filename)
+            foto = image_resolver.carregar_foto(resolucao)
+
+        if foto is not None and resolucao.no_banco:
+            variant_response = serve_photo_variant(foto)
+            if variant_response:
+                return variant_response
+
+            etag = photo_etag(foto)
+            not_modified = photo_not_modified(foto, etag, 'public, max-age=3600')
+            if not_modified:
+                return not_modified
+
+            cached = send_cached_photo(foto, etag, get_content_type(filename))
+            if cached:
+                cached.headers['X-Image-Source'] = 'disk_cache'
+                return cached
+
+            response = send_photo_stream(foto, get_content_type(filename), etag=etag)
+            if response is not None:
+                response.headers['X-Image-Source'] = 'database_binary'
+                return response
+
+        # Bytes fora do banco: arquivo físico em um dos diretórios de upload
+        diretorio = resolucao.diretorio
+        if diretorio is None and resolucao.no_banco:
+            diretorio = image_resolver.localizar_arquivo(filename)
+
+        if diretorio:
+            dir_name, dir_path = diretorio
+            response = send_from_directory(dir_path, filename)
+            response.headers['Content-Type'] = get_content_type(filename)
+            if foto is not None:
+                response.headers['Cache-Control'] = 'public, max-age=3600'
+                response.headers['X-Image-Source'] = f'normal_report_{dir_name}'
+            else:
+                response.headers['Cache-Control'] = 'public, max-age=1800'  # Cache menor para arquivos órfãos
+                response.headers['X-Image-Source'] = f'orphan_{dir_name}'
+            return response
 
-        # Não encontrado no banco - tentar busca física direta
-        current_app.logger.warning(f"❌ IMAGEM NÃO ENCONTRADA NO BANCO: {filename}")
+        if foto is not None:
+            current_app.logger.warning(f"⚠️ ARQUIVO NO BANCO MAS NÃO ENCONTRADO FISICAMENTE: {filename}")
+            return serve_placeholder_image(filename, "Imagem registrada no banco mas arquivo físico perdido")
 
-        # Busca física direta como fallback
-        for dir_name, dir_path in search_directories:
-            if os.path.exists(dir_path):
-                filepath = os.path.join(dir_path, filename)
-                if os.path.exists(filepath):
-                    current_app.logger.info(f"🔄 ARQUIVO ENCONTRADO SEM REGISTRO NO BANCO em {dir_name}: {filepath}")
-                    try:
-                        content_type = get_content_type(filename)
-                        response = send_from_directory(dir_path, filename)
-                        response.headers['Content-Type'] = content_type
-                        response.headers['Cache-Control'] = 'public, max-age=1800'  # Cache menor para arquivos órfãos
-                        response.headers['X-Image-Source'] = f'orphan_{dir_name}'
-                        return response
-                    except Exception as send_error:
-                        current_app.logger.error(f"❌ Erro ao enviar arquivo órfão: {send_error}")
-
-        # Arquivo completamente não encontrado
-        current_app.logger.error(f"❌ ARQUIVO COMPLETAMENTE NÃO ENCONTRADO: {filename}")
+        current_app.logger.warning(f"❌ ARQUIVO COMPLETAMENTE NÃO ENCONTRADO: {filename}")
         return serve_placeholder_image(filename, "Imagem não encontrada em nenhum local")
 
     except Exception as e:
@@ -8350,6 +8293,160 @@ def get_content_type(filename):
     else:
         return 'image/jpeg'  # default
 
+def photo_etag(foto, variante=None, formato=None):
+    """ETag forte derivado do imagem_hash (None para fotos legadas sem hash)"""
+    if not foto.imagem_hash:
+        return None
+    if variante:
+        return f"{foto.imagem_hash}-{variante}.{formato}"
+    return foto.imagem_hash
+
+
+def photo_last_modified(foto):
+    """Data da última troca de imagem da foto, em horário de Brasília (aware)"""
+    from models import BRAZIL_TZ
+    momento = foto.imagem_atualizada_em or foto.created_at
+    return BRAZIL_TZ.localize(momento) if momento else None
+
+
+def photo_not_modified(foto, etag, cache_control, vary=None):
+    """
+    Responde 304 se o navegador/service worker já tem a versão atual.
+
+    Usa só os metadados da foto (imagem_hash e datas): a coluna com os bytes
+    não é lida. Retorna None quando a imagem precisa ser enviada.
+    """
+    from werkzeug.http import is_resource_modified
+
+    if not etag:
+        return None
+    if is_resource_modified(request.environ, etag=etag, last_modified=photo_last_modified(foto)):
+        return None
+
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    if vary:
+        response.headers['Vary'] = vary
+    return response
+
+
+def send_cached_photo(foto, etag, mimetype, cache_control='public, max-age=3600', download_name=None):
+    """
+    Serve a imagem do cache em disco compartilhado pelos workers, sem consultar o blob.
+
+    O arquivo vai por send_file (sendfile no Gunicorn). Retorna None em caso de
+    falta no cache, para a rota carregar os bytes do banco.
+    """
+    import image_disk_cache
+
+    caminho = image_disk_cache.obter(etag)
+    if not caminho:
+        return None
+    try:
+        response = send_file(
+            caminho,
+            mimetype=mimetype,
+            as_attachment=False,
+            download_name=download_name,
+            etag=etag,
+            last_modified=photo_last_modified(foto),
+            conditional=True,
+        )
+    except OSError:
+        # Removido pela limpeza de outro worker entre o stat e o envio
+        return None
+    response.headers['Cache-Control'] = cache_control
+    response.headers['X-Image-Cache'] = 'hit'
+    return response
+
+
+def send_photo_bytes(foto, image_data, mimetype, etag=None, cache_control='public, max-age=3600', download_name=None):
+    """
+    Envia os bytes de uma imagem com ETag, Last-Modified e suporte a Range (206).
+
+    send_file(conditional=True) trata If-None-Match/If-Modified-Since e Range;
+    fotos legadas sem hash recebem ETag calculado a partir dos bytes. Imagens com
+    ETag de conteúdo são gravadas no cache em disco para os próximos acessos.
+    """
+    if etag:
+        import image_disk_cache
+        image_disk_cache.gravar(etag, image_data)
+
+    response = send_file(
+        io.BytesIO(image_data),
+        mimetype=mimetype,
+        as_attachment=False,
+        download_name=download_name,
+        etag=etag or hashlib.sha256(image_data).hexdigest(),
+        last_modified=photo_last_modified(foto),
+        conditional=True,
+    )
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def send_photo_stream(foto, mimetype, etag=None, cache_control='public, max-age=3600', download_name=None):
+    """
+    Envia o original da foto lendo o banco em partes, sem carregar a imagem inteira.
+
+    Mesmos cabeçalhos de send_photo_bytes (ETag, Last-Modified, Range/206); uma
+    leitura completa também é gravada, parte a parte, no cache em disco.
+    Retorna None quando a foto não tem bytes no banco.
+    """
+    import image_disk_cache
+    from photo_storage import abrir_leitura_em_partes
+
+    leitura = abrir_leitura_em_partes(foto, destino=image_disk_cache.GravacaoEmPartes(etag))
+    if leitura is None:
+        return None
+
+    response = Response(leitura, mimetype=mimetype, direct_passthrough=True)
+    response.content_length = leitura.tamanho
+    if etag:
+        response.set_etag(etag)
+    response.last_modified = photo_last_modified(foto)
+    response.headers['Cache-Control'] = cache_control
+    if download_name:
+        response.headers.set('Content-Disposition', 'inline', filename=download_name)
+    return response.make_conditional(request, accept_ranges=True, complete_length=leitura.tamanho)
+
+
+def serve_photo_variant(foto, cache_control='public, max-age=3600'):
+    """
+    Serve a variante redimensionada pedida via ?variant=thumb|medium ou ?w=<largura>.
+
+    Retorna None quando o original deve ser servido (sem parâmetro, variant=full
+    ou foto sem imagem), para a rota seguir o fluxo normal.
+    """
+    from photo_variants import variante_solicitada, formato_aceito, obter_variante, FORMATOS
+
+    variante = variante_solicitada(request.args)
+    if not variante:
+        return None
+
+    formato = formato_aceito(request.headers.get('Accept'))
+    etag = photo_etag(foto, variante, formato)
+    not_modified = photo_not_modified(foto, etag, cache_control, vary='Accept')
+    if not_modified:
+        return not_modified
+
+    cached = send_cached_photo(foto, etag, FORMATOS[formato], cache_control)
+    if cached:
+        cached.headers['Vary'] = 'Accept'
+        cached.headers['X-Image-Variant'] = variante
+        return cached
+
+    resultado = obter_variante(foto, variante, formato)
+    if not resultado:
+        return None
+
+    image_data, mimetype = resultado
+    response = send_photo_bytes(foto, image_data, mimetype, etag=etag, cache_control=cache_control)
+    response.headers['Vary'] = 'Accept'
+    response.headers['X-Image-Variant'] = variante
+    return response
+
 # Rotas de compatibilidade removidas - sistema simplificado
 
 # Funções de busca complexa removidas - sistema simplificado
@@ -8425,11 +8522,23 @@ def get_imagem(id):
         from models import FotoRelatorio
         foto = FotoRelatorio.query.get_or_404(id)
 
-        # Se tem imagem no banco, usar ela
-        if foto.imagem:
-            # Determinar mimetype baseado no filename
-            mimetype = get_content_type(foto.filename)
-            return Response(foto.imagem, mimetype=mimetype)
+        variant_response = serve_photo_variant(foto, 'private, no-cache')
+        if variant_response:
+            return variant_response
+
+        etag = photo_etag(foto)
+        not_modified = photo_not_modified(foto, etag, 'private, no-cache')
+        if not_modified:
+            return not_modified
+
+        cached = send_cached_photo(foto, etag, get_content_type(foto.filename or ''), 'private, no-cache')
+        if cached:
+            return cached
+
+        # Se tem imagem no banco, usar ela (lida em partes)
+        response = send_photo_stream(foto, get_content_type(foto.filename or ''), etag=etag, cache_control='private, no-cache')
+        if response is not None:
+            return response
 
         # Fallback: tentar carregar do arquivo se não tem no banco (compatibilidade)
         if foto.filename:
@@ -8589,17 +8698,13 @@ def report_approve(report_id):
     # Enviar e-mail de aprovação para todos os envolvidos (após commit)
     if action == 'approve':
         try:
-            # Gerar PDF
-            from pdf_generator_weasy import WeasyPrintReportGenerator
-            generator = WeasyPrintReportGenerator()
-            fotos = FotoRelatorio.query.filter_by(relatorio_id=report_id).order_by(FotoRelatorio.ordem).all()
-            
+            # Gerar PDF (fica no cache para as visualizações do relatório aprovado)
+            import pdf_cache
             obra_nome = sanitize_filename(relatorio.projeto.nome if relatorio.projeto else "Obra")
             pdf_filename = f"relatorio_{relatorio.numero.replace('/', '_')}_{obra_nome}_{datetime.now().strftime('%Y%m%d')}.pdf"
             pdf_path = os.path.join('static', 'reports', pdf_filename)
-            os.makedirs(os.path.dirname(pdf_path), exist_ok=True)
             
-            generator.generate_report_pdf(relatorio, fotos, output_path=pdf_path)
+            pdf_cache.salvar_copia(pdf_cache.pdf_relatorio(relatorio), pdf_path)
             current_app.logger.info(f"📄 PDF gerado para aprovação: {pdf_path}")
             
             # Enviar e-mail
@@ -8633,10 +8738,12 @@ def report_generate_pdf(report_id):
         return redirect(url_for('reports'))
 
     try:
-        pdf_path, filename = generate_visit_report_pdf(relatorio)
-        return send_from_directory(
-            app.config['UPLOAD_FOLDER'],
-            filename,
+        # Processo isolado do pool de renderização
+        import pdf_render_pool
+        pdf_bytes = pdf_render_pool.renderizar(pdf_render_pool.VISITA, relatorio.id)
+        return send_file(
+            io.BytesIO(pdf_bytes),
+            mimetype='application/pdf',
             as_attachment=True,
             download_name=f"relatorio_{relatorio.numero}.pdf"
         )
@@ -10442,7 +10549,7 @@ def drive_oauth_logout():
 @login_required
 @csrf.exempt
 def drive_backup_all_pdfs():
-    """Fazer backup de todos os PDFs dos relatórios aprovados"""
+    """Iniciar (ou retomar) o backup de todos os PDFs dos relatórios aprovados, em segundo plano"""
     if not current_user.is_master:
         return jsonify({'success': False, 'message': 'Acesso negado'}), 403
     
@@ -10451,25 +10558,17 @@ def drive_backup_all_pdfs():
         return jsonify({'success': False, 'message': 'Não autenticado. Faça login no Google Drive primeiro.'}), 401
     
     try:
-        from google_drive_backup import backup_all_reports_to_drive
-        from pdf_generator_weasy import WeasyPrintReportGenerator
+        import drive_backup_jobs
         
         token_info = {
             'token': stored_token.get_access_token(),
             'refresh_token': stored_token.get_refresh_token()
         }
         
-        result = backup_all_reports_to_drive(
-            token_info=token_info,
-            db_session=db.session,
-            Relatorio=Relatorio,
-            FotoRelatorio=FotoRelatorio,
-            RelatorioExpress=RelatorioExpress,
-            FotoRelatorioExpress=FotoRelatorioExpress,
-            WeasyPrintReportGenerator=WeasyPrintReportGenerator
-        )
-        
-        return jsonify(result)
+        estado = drive_backup_jobs.iniciar(token_info, current_user.id)
+        if estado is None:
+            return jsonify({'success': False, 'message': 'Backup em andamento em outro processo; tente novamente em instantes'}), 409
+        return jsonify(_drive_backup_json(estado)), 202
         
     except Exception as e:
         logging.error(f"Erro no backup de PDFs: {e}", exc_info=True)
@@ -10478,6 +10577,28 @@ def drive_backup_all_pdfs():
             'message': f'Erro ao fazer backup: {str(e)}'
         }), 500
 
+@app.route('/admin/drive/backup-all-pdfs/<execucao_id>')
+@login_required
+def drive_backup_all_pdfs_status(execucao_id):
+    """Status e contadores de uma execução do backup de PDFs"""
+    if not current_user.is_master:
+        return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+    
+    import drive_backup_jobs
+    
+    estado = drive_backup_jobs.obter(execucao_id)
+    if not estado:
+        return jsonify({'success': False, 'message': 'Execução de backup não encontrada'}), 404
+    return jsonify(_drive_backup_json(estado))
+
+def _drive_backup_json(estado):
+    import drive_backup_jobs
+    
+    dados = dict(estado)
+    dados['success'] = estado['status'] not in (drive_backup_jobs.STATUS_ERRO, drive_backup_jobs.STATUS_INTERROMPIDO)
+    dados['status_url'] = url_for('drive_backup_all_pdfs_status', execucao_id=estado['execucao_id'])
+    return dados
+
 @app.route('/admin/drive/backup-photos', methods=['POST'])
 @login_required
 @csrf.exempt
@@ -11777,21 +11898,10 @@ def project_checklist_list_items(project_id):
 def reports_visits_monthly():
     """
     PARTE 5: Relatório Mensal de Visitas por Usuário
-    - Permite filtrar por mês, ano e usuário
-    - Gera PDF ou Excel conforme selecionado
+    - Permite filtrar por mês (ou intervalo de meses), ano e um ou mais usuários
+    - Gera PDF ou Excel conforme selecionado (relatorio_visitas.py)
     """
-    from calendar import monthrange
-    import io
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-    from openpyxl.utils import get_column_letter
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib import colors
-    from reportlab.lib.units import cm
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.enums import TA_CENTER, TA_LEFT
-    from flask import make_response, send_file
+    import relatorio_visitas
     
     # Get all active users for filter dropdown
     usuarios = User.query.filter_by(ativo=True).order_by(User.nome_completo).all()
@@ -11801,66 +11911,42 @@ def reports_visits_monthly():
         try:
             mes = int(request.form.get('mes', now_brt().month))
             ano = int(request.form.get('ano', now_brt().year))
-            user_id = request.form.get('user_id')
+            # Intervalo opcional: sem mês/ano final, o relatório é do mês inicial
+            mes_fim = int(request.form.get('mes_fim') or mes)
+            ano_fim = int(request.form.get('ano_fim') or ano)
+            user_ids = [int(user_id) for user_id in request.form.getlist('user_id') if user_id]
             formato = request.form.get('formato', 'pdf')  # pdf ou excel
             
             # Validar filtros
-            if not user_id:
+            if not user_ids:
                 flash('Selecione um usuário para gerar o relatório', 'warning')
                 return redirect(url_for('reports_visits_monthly'))
             
-            user = User.query.get_or_404(user_id)
-            
-            # Calcular período (primeiro e último dia do mês)
-            primeiro_dia = datetime(ano, mes, 1)
-            ultimo_dia_num = monthrange(ano, mes)[1]
-            ultimo_dia = datetime(ano, mes, ultimo_dia_num, 23, 59, 59)
-            
-            # Buscar visitas do usuário no período (como participante OU responsável)
-            visitas_participante = db.session.query(Visita).join(
-                VisitaParticipante, Visita.id == VisitaParticipante.visita_id
-            ).filter(
-                VisitaParticipante.user_id == user_id,
-                Visita.data_inicio >= primeiro_dia,
-                Visita.data_inicio <= ultimo_dia
-            ).all()
-            
-            visitas_responsavel = Visita.query.filter(
-                Visita.responsavel_id == user_id,
-                Visita.data_inicio >= primeiro_dia,
-                Visita.data_inicio <= ultimo_dia
-            ).all()
-            
-            # Combinar e remover duplicatas
-            visitas_ids = set([v.id for v in visitas_participante] + [v.id for v in visitas_responsavel])
-            visitas = Visita.query.filter(Visita.id.in_(visitas_ids)).order_by(Visita.data_inicio).all()
-            
-            # Calcular métricas
-            total_visitas = len(visitas)
-            visitas_por_status = {}
-            visitas_por_projeto = {}
+            try:
+                periodo = relatorio_visitas.Periodo(ano, mes, ano_fim, mes_fim)
+            except ValueError as e:
+                flash(str(e), 'warning')
+                return redirect(url_for('reports_visits_monthly'))
             
-            for visita in visitas:
-                # Contar por status
-                status = visita.status or 'Sem status'
-                visitas_por_status[status] = visitas_por_status.get(status, 0) + 1
-                
-                # Contar por projeto
-                projeto_nome = visita.projeto_nome or 'Sem projeto'
-                visitas_por_projeto[projeto_nome] = visitas_por_projeto.get(projeto_nome, 0) + 1
+            selecionados = User.query.filter(User.id.in_(user_ids)).order_by(User.nome_completo).all()
+            if not selecionados:
+                flash('Usuário não encontrado', 'warning')
+                return redirect(url_for('reports_visits_monthly'))
             
-            # Nome do mês em português
-            meses_pt = ['', 'Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 'Junho',
-                       'Julho', 'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro']
-            mes_nome = meses_pt[mes]
+            if len(selecionados) == 1:
+                nome_arquivo = f"relatorio_visitas_{selecionados[0].nome_completo.replace(' ', '_')}_{periodo.sufixo_arquivo()}"
+            else:
+                nome_arquivo = f"relatorio_visitas_{len(selecionados)}_usuarios_{periodo.sufixo_arquivo()}"
             
-            # Gerar relatório conforme formato
+            # Gerar relatório conforme formato (arquivo temporário, fechado pelo send_file)
             if formato == 'excel':
-                return _gerar_relatorio_excel(visitas, user, mes_nome, ano, 
-                                             visitas_por_status, visitas_por_projeto, total_visitas)
+                arquivo = relatorio_visitas.gerar_excel(selecionados, periodo)
+                return send_file(arquivo, as_attachment=True, download_name=f"{nome_arquivo}.xlsx",
+                                 mimetype=relatorio_visitas.MIMETYPE_EXCEL)
             else:  # pdf
-                return _gerar_relatorio_pdf(visitas, user, mes_nome, ano,
-                                           visitas_por_status, visitas_por_projeto, total_visitas)
+                arquivo = relatorio_visitas.gerar_pdf(selecionados, periodo)
+                return send_file(arquivo, as_attachment=True, download_name=f"{nome_arquivo}.pdf",
+                                 mimetype='application/pdf')
                                            
         except Exception as e:
             current_app.logger.exception(f"❌ Erro ao gerar relatório mensal: {str(e)}")
@@ -11870,255 +11956,6 @@ def reports_visits_monthly():
     # GET: Show filter form
     return render_template('reports/visits_monthly.html', usuarios=usuarios)
 
-
-def _gerar_relatorio_pdf(visitas, user, mes_nome, ano, visitas_por_status, visitas_por_projeto, total_visitas):
-    """Gera relatório PDF de visitas mensais"""
-    from io import BytesIO
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib import colors
-    from reportlab.lib.units import cm
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.enums import TA_CENTER, TA_LEFT
-    from flask import send_file
-    
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=2*cm, bottomMargin=2*cm)
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    # Custom styles
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        textColor=colors.HexColor('#1f2937'),
-        spaceAfter=0.5*cm,
-        alignment=TA_CENTER
-    )
-    
-    subtitle_style = ParagraphStyle(
-        'CustomSubtitle',
-        parent=styles['Normal'],
-        fontSize=12,
-        textColor=colors.HexColor('#4b5563'),
-        spaceAfter=1*cm,
-        alignment=TA_CENTER
-    )
-    
-    section_style = ParagraphStyle(
-        'SectionHeader',
-        parent=styles['Heading2'],
-        fontSize=14,
-        textColor=colors.HexColor('#1f2937'),
-        spaceAfter=0.3*cm,
-        spaceBefore=0.5*cm
-    )
-    
-    # Título
-    elements.append(Paragraph(f"Relatório Mensal de Visitas", title_style))
-    elements.append(Paragraph(f"{mes_nome} de {ano} - {user.nome_completo}", subtitle_style))
-    
-    # Resumo
-    elements.append(Paragraph("Resumo do Período", section_style))
-    resumo_data = [
-        ['Métrica', 'Valor'],
-        ['Total de Visitas', str(total_visitas)],
-    ]
-    
-    # Adicionar contagens por status
-    for status, count in visitas_por_status.items():
-        resumo_data.append([f'Visitas {status}', str(count)])
-    
-    resumo_table = Table(resumo_data, colWidths=[12*cm, 4*cm])
-    resumo_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3b82f6')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]))
-    elements.append(resumo_table)
-    elements.append(Spacer(1, 0.5*cm))
-    
-    # Visitas por Projeto
-    if visitas_por_projeto:
-        elements.append(Paragraph("Visitas por Projeto", section_style))
-        projeto_data = [['Projeto', 'Quantidade']]
-        for projeto, count in sorted(visitas_por_projeto.items(), key=lambda x: x[1], reverse=True):
-            projeto_data.append([projeto, str(count)])
-        
-        projeto_table = Table(projeto_data, colWidths=[12*cm, 4*cm])
-        projeto_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f0fdf4')),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ]))
-        elements.append(projeto_table)
-        elements.append(Spacer(1, 0.5*cm))
-    
-    # Detalhamento das Visitas
-    if visitas:
-        elements.append(Paragraph("Detalhamento das Visitas", section_style))
-        visitas_data = [['Data', 'Nº Visita', 'Projeto', 'Status']]
-        
-        for visita in visitas:
-            data_str = visita.data_inicio.strftime('%d/%m/%Y %H:%M')
-            numero = visita.numero or f'V{visita.id}'
-            projeto = visita.projeto_nome or 'Sem projeto'
-            status = visita.status or 'Sem status'
-            visitas_data.append([data_str, numero, projeto, status])
-        
-        visitas_table = Table(visitas_data, colWidths=[4*cm, 3*cm, 6*cm, 3*cm])
-        visitas_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#6366f1')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f5f5f5')),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f5f5f5')]),
-        ]))
-        elements.append(visitas_table)
-    else:
-        elements.append(Paragraph("Nenhuma visita encontrada no período selecionado.", styles['Normal']))
-    
-    # Build PDF
-    doc.build(elements)
-    buffer.seek(0)
-    
-    filename = f"relatorio_visitas_{user.nome_completo.replace(' ', '_')}_{mes_nome}_{ano}.pdf"
-    return send_file(buffer, as_attachment=True, download_name=filename, mimetype='application/pdf')
-
-
-def _gerar_relatorio_excel(visitas, user, mes_nome, ano, visitas_por_status, visitas_por_projeto, total_visitas):
-    """Gera relatório Excel de visitas mensais"""
-    from io import BytesIO
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-    from openpyxl.utils import get_column_letter
-    from flask import send_file
-    
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Relatório Visitas"
-    
-    # Estilos
-    header_fill = PatternFill(start_color="3B82F6", end_color="3B82F6", fill_type="solid")
-    header_font = Font(bold=True, color="FFFFFF", size=12)
-    title_font = Font(bold=True, size=16)
-    section_font = Font(bold=True, size=14)
-    border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-    
-    # Título
-    ws['A1'] = "Relatório Mensal de Visitas"
-    ws['A1'].font = title_font
-    ws['A1'].alignment = Alignment(horizontal='center')
-    ws.merge_cells('A1:D1')
-    
-    ws['A2'] = f"{mes_nome} de {ano} - {user.nome_completo}"
-    ws['A2'].alignment = Alignment(horizontal='center')
-    ws.merge_cells('A2:D2')
-    
-    # Resumo
-    row = 4
-    ws[f'A{row}'] = "Resumo do Período"
-    ws[f'A{row}'].font = section_font
-    row += 1
-    
-    ws[f'A{row}'] = "Métrica"
-    ws[f'B{row}'] = "Valor"
-    ws[f'A{row}'].font = header_font
-    ws[f'B{row}'].font = header_font
-    ws[f'A{row}'].fill = header_fill
-    ws[f'B{row}'].fill = header_fill
-    row += 1
-    
-    ws[f'A{row}'] = "Total de Visitas"
-    ws[f'B{row}'] = total_visitas
-    row += 1
-    
-    for status, count in visitas_por_status.items():
-        ws[f'A{row}'] = f"Visitas {status}"
-        ws[f'B{row}'] = count
-        row += 1
-    
-    # Visitas por Projeto
-    row += 2
-    ws[f'A{row}'] = "Visitas por Projeto"
-    ws[f'A{row}'].font = section_font
-    row += 1
-    
-    ws[f'A{row}'] = "Projeto"
-    ws[f'B{row}'] = "Quantidade"
-    ws[f'A{row}'].font = header_font
-    ws[f'B{row}'].font = header_font
-    ws[f'A{row}'].fill = PatternFill(start_color="10B981", end_color="10B981", fill_type="solid")
-    ws[f'B{row}'].fill = PatternFill(start_color="10B981", end_color="10B981", fill_type="solid")
-    row += 1
-    
-    for projeto, count in sorted(visitas_por_projeto.items(), key=lambda x: x[1], reverse=True):
-        ws[f'A{row}'] = projeto
-        ws[f'B{row}'] = count
-        row += 1
-    
-    # Detalhamento das Visitas
-    row += 2
-    ws[f'A{row}'] = "Detalhamento das Visitas"
-    ws[f'A{row}'].font = section_font
-    row += 1
-    
-    headers = ['Data', 'Nº Visita', 'Projeto', 'Status']
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=row, column=col, value=header)
-        cell.font = header_font
-        cell.fill = PatternFill(start_color="6366F1", end_color="6366F1", fill_type="solid")
-        cell.border = border
-    row += 1
-    
-    for visita in visitas:
-        ws[f'A{row}'] = visita.data_inicio.strftime('%d/%m/%Y %H:%M')
-        ws[f'B{row}'] = visita.numero or f'V{visita.id}'
-        ws[f'C{row}'] = visita.projeto_nome or 'Sem projeto'
-        ws[f'D{row}'] = visita.status or 'Sem status'
-        
-        for col in range(1, 5):
-            ws.cell(row=row, column=col).border = border
-        row += 1
-    
-    # Ajustar largura das colunas
-    ws.column_dimensions['A'].width = 20
-    ws.column_dimensions['B'].width = 15
-    ws.column_dimensions['C'].width = 40
-    ws.column_dimensions['D'].width = 15
-    
-    # Salvar em buffer
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-    
-    filename = f"relatorio_visitas_{user.nome_completo.replace(' ', '_')}_{mes_nome}_{ano}.xlsx"
-    return send_file(buffer, as_attachment=True, download_name=filename, 
-                    mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-
 @app.route('/api/projeto/<int:projeto_id>/update_technical_info', methods=['POST'])
 @csrf.exempt
 @login_required
@@ -0,0 +1,245 @@
+"""
+Dossiê da obra em ZIP: PDFs dos relatórios aprovados e fotos originais
+
+    POST /projects/<id>/export/preparar    enfileira os PDFs que faltam no cache (jobs de pdf_jobs.py)
+    GET  /projects/<id>/export/preparar    progresso da preparação; download_url quando pronto
+    GET  /projects/<id>/export.zip         ZIP em streaming
+
+Inclui cada Relatório aprovado da obra e cada Relatório Express aprovado
+com o mesmo nome de obra, cada um com o PDF (do pdf_cache) e as fotos
+originais:
+
+    relatorios/<numero>.pdf
+    relatorios/<numero>/fotos/<ordem>_<arquivo>
+    express/<numero>.pdf
+    express/<numero>/fotos/<ordem>_<arquivo>
+
+O ZIP é gerado em streaming (zip_stream.py): um relatório por vez é lido do
+banco, o PDF é copiado do disco em partes e as fotos são lidas em partes do
+blob store/backend. A memória do worker não depende do tamanho do dossiê.
+
+Nenhum PDF é renderizado durante o streaming: o worker síncrono do Gunicorn
+não avisa o arbiter enquanto itera a resposta e seria morto pelo timeout
+(120s) no meio do ZIP. O link do dossiê (static/js/pdf-jobs.js) chama a
+preparação, que renderiza os PDFs faltantes no pool de processos, e só baixa
+o ZIP quando todos estão em cache. Um PDF que ainda não estiver pronto (ou
+cuja renderização falhou) fica listado em ERROS.txt no fim do arquivo.
+Com o cache de PDFs desabilitado não há como preparar: os PDFs são
+renderizados durante o streaming, como antes.
+"""
+import os
+import logging
+
+from flask import Response, current_app, jsonify, request, stream_with_context, url_for
+from flask_login import login_required
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from werkzeug.utils import secure_filename
+
+from app import app, csrf, db, now_brt
+from models import Projeto, Relatorio, FotoRelatorio, RelatorioExpress, FotoRelatorioExpress
+from routes import sanitize_filename
+from zip_stream import EntradaZip, zip_em_partes
+import pdf_cache
+import pdf_jobs
+
+logger = logging.getLogger(__name__)
+
+STATUS_EXPORTADOS = ('aprovado', 'finalizado', 'aprovado final')
+TAMANHO_PARTE = 256 * 1024
+
+# Relatórios por consulta no cálculo das impressões digitais da preparação
+LOTE_PREPARACAO = 200
+
+
+def _partes_arquivo(caminho):
+    with open(caminho, 'rb') as f:
+        while True:
+            parte = f.read(TAMANHO_PARTE)
+            if not parte:
+                return
+            yield parte
+
+
+def _entrada_pdf(nome, resultado, data):
+    caminho, pdf_bytes, _ = resultado
+    if pdf_bytes is not None:
+        return EntradaZip(nome, [pdf_bytes], len(pdf_bytes), data)
+    return EntradaZip(nome, _partes_arquivo(caminho), os.path.getsize(caminho), data)
+
+
+def _entradas_fotos(pasta, fotos):
+    from photo_storage import abrir_leitura_em_partes
+
+    for foto in fotos:
+        leitura = abrir_leitura_em_partes(foto, TAMANHO_PARTE)
+        if leitura is None:
+            continue
+        arquivo = secure_filename(foto.filename or '') or f"foto_{foto.id}.jpg"
+        yield EntradaZip(f"{pasta}/fotos/{foto.ordem or 0:03d}_{arquivo}", leitura, leitura.tamanho, foto.created_at)
+
+
+def _pdf_do_cache(tipo, relatorio):
+    """PDF do relatório sem renderizar: resultado como o de pdf_cache.pdf_relatorio, ou LookupError"""
+    if not pdf_cache.habilitado():
+        gerar = pdf_cache.pdf_relatorio_express if tipo == pdf_cache.TIPO_EXPRESS else pdf_cache.pdf_relatorio
+        return gerar(relatorio)
+    _, digital = pdf_cache.fotos_e_impressao(tipo, relatorio)
+    caminho = pdf_cache.obter(tipo, relatorio.id, digital)
+    if caminho is None:
+        raise LookupError("PDF ainda não gerado; prepare o dossiê e baixe de novo")
+    return caminho, None, digital
+
+
+def _entradas_dossie(projeto_id, relatorio_ids, express_ids):
+    """Entradas do ZIP, carregando um relatório por vez (a sessão é limpa entre eles)"""
+    erros = []
+
+    for relatorio_id in relatorio_ids:
+        relatorio = db.session.get(Relatorio, relatorio_id)
+        pasta = f"relatorios/{sanitize_filename(relatorio.numero.replace('/', '_'))}"
+        try:
+            resultado = _pdf_do_cache(pdf_cache.TIPO_RELATORIO, relatorio)
+        except Exception as e:
+            logger.error(f"❌ Dossiê da obra {projeto_id}: PDF do relatório {relatorio.numero} falhou: {e}")
+            erros.append(f"Relatório {relatorio.numero}: {e}")
+        else:
+            yield _entrada_pdf(f"{pasta}.pdf", resultado, relatorio.data_aprovacao)
+        fotos = FotoRelatorio.query.filter_by(relatorio_id=relatorio_id).order_by(FotoRelatorio.ordem).all()
+        yield from _entradas_fotos(pasta, fotos)
+        db.session.expunge_all()
+
+    for express_id in express_ids:
+        relatorio_express = db.session.get(RelatorioExpress, express_id)
+        pasta = f"express/{sanitize_filename(relatorio_express.numero.replace('/', '_'))}"
+        try:
+            resultado = _pdf_do_cache(pdf_cache.TIPO_EXPRESS, relatorio_express)
+        except Exception as e:
+            logger.error(f"❌ Dossiê da obra {projeto_id}: PDF do Relatório Express {relatorio_express.numero} falhou: {e}")
+            erros.append(f"Relatório Express {relatorio_express.numero}: {e}")
+        else:
+            yield _entrada_pdf(f"{pasta}.pdf", resultado, relatorio_express.data_aprovacao)
+        fotos = FotoRelatorioExpress.query.filter_by(
+            relatorio_express_id=express_id
+        ).order_by(FotoRelatorioExpress.ordem).all()
+        yield from _entradas_fotos(pasta, fotos)
+        db.session.expunge_all()
+
+    if erros:
+        texto = ("PDFs não incluídos neste dossiê:\n\n" + "\n".join(erros) + "\n").encode('utf-8')
+        yield EntradaZip('ERROS.txt', [texto], len(texto))
+
+
+def _ids_exportados(projeto):
+    """(ids dos relatórios, ids dos Relatórios Express) incluídos no dossiê, na ordem do ZIP"""
+    relatorio_ids = [r for (r,) in db.session.query(Relatorio.id).filter(
+        Relatorio.projeto_id == projeto.id,
+        func.lower(Relatorio.status).in_(STATUS_EXPORTADOS),
+    ).order_by(Relatorio.created_at, Relatorio.id)]
+    express_ids = [r for (r,) in db.session.query(RelatorioExpress.id).filter(
+        func.lower(func.trim(RelatorioExpress.obra_nome)) == projeto.nome.strip().lower(),
+        func.lower(RelatorioExpress.status).in_(STATUS_EXPORTADOS),
+    ).order_by(RelatorioExpress.created_at, RelatorioExpress.id)]
+    return relatorio_ids, express_ids
+
+
+def _preparar_pdfs(relatorio_ids, express_ids, enfileirar):
+    """
+    Situação dos PDFs do dossiê no cache, enfileirando os que faltam.
+
+    As impressões digitais são calculadas em lotes (só metadados). Os PDFs
+    ausentes são renderizados por jobs de pdf_jobs (pool de processos); um
+    job já na fila é reaproveitado. Com `enfileirar` False (consulta de
+    progresso), jobs que falharam não são repetidos.
+
+    Returns:
+        dict: {'total', 'prontos', 'pendentes', 'erros': [mensagens]}
+    """
+    pasta_jobs = current_app.config['PDF_JOBS_FOLDER']
+    situacao = {'total': len(relatorio_ids) + len(express_ids), 'prontos': 0, 'pendentes': 0, 'erros': []}
+    grupos = (
+        (pdf_cache.TIPO_RELATORIO, 'Relatório', relatorio_ids,
+         lambda ids: Relatorio.query.options(joinedload(Relatorio.projeto), joinedload(Relatorio.autor))
+         .filter(Relatorio.id.in_(ids)).all()),
+        (pdf_cache.TIPO_EXPRESS, 'Relatório Express', express_ids,
+         lambda ids: RelatorioExpress.query.filter(RelatorioExpress.id.in_(ids)).all()),
+    )
+    for tipo, rotulo, ids, carregar in grupos:
+        for inicio in range(0, len(ids), LOTE_PREPARACAO):
+            relatorios = carregar(ids[inicio:inicio + LOTE_PREPARACAO])
+            digitais = pdf_cache.impressoes_em_lote(tipo, relatorios)
+            for relatorio in relatorios:
+                if pdf_cache.obter(tipo, relatorio.id, digitais[relatorio.id]):
+                    situacao['prontos'] += 1
+                    continue
+                job = pdf_jobs.ler_job(pasta_jobs, pdf_jobs.gerar_job_id(tipo, relatorio.id, digitais[relatorio.id]))
+                if job and job['status'] == pdf_jobs.STATUS_ERRO and not enfileirar:
+                    situacao['erros'].append(f"{rotulo} {relatorio.numero}: {job.get('erro') or 'erro ao gerar PDF'}")
+                    continue
+                if not job or job['status'] == pdf_jobs.STATUS_ERRO or pdf_jobs.job_expirado(job):
+                    job = pdf_jobs.enfileirar(tipo, relatorio)
+                if job['status'] == pdf_jobs.STATUS_CONCLUIDO:
+                    situacao['prontos'] += 1
+                else:
+                    situacao['pendentes'] += 1
+            db.session.expunge_all()
+    return situacao
+
+
+@app.route('/projects/<int:project_id>/export/preparar', methods=['GET', 'POST'])
+@csrf.exempt
+@login_required
+def project_export_prepare(project_id):
+    """
+    POST enfileira a renderização dos PDFs que faltam no cache; GET consulta o
+    progresso. 200 com download_url quando todos os PDFs estão prontos (ou
+    falharam), 202 enquanto houver PDFs sendo renderizados.
+    """
+    projeto = Projeto.query.get_or_404(project_id)
+    relatorio_ids, express_ids = _ids_exportados(projeto)
+
+    if not pdf_cache.habilitado():
+        situacao = {'total': len(relatorio_ids) + len(express_ids), 'prontos': 0, 'pendentes': 0, 'erros': []}
+    else:
+        situacao = _preparar_pdfs(relatorio_ids, express_ids, enfileirar=request.method == 'POST')
+    pronto = situacao['pendentes'] == 0
+
+    dados = dict(
+        situacao,
+        success=True,
+        status='pronto' if pronto else 'preparando',
+        progresso=int(100 * (situacao['total'] - situacao['pendentes']) / situacao['total']) if situacao['total'] else 100,
+        status_url=url_for('project_export_prepare', project_id=project_id),
+    )
+    if pronto:
+        dados['download_url'] = url_for('project_export_zip', project_id=project_id)
+    return jsonify(dados), 200 if pronto else 202
+
+
+@app.route('/projects/<int:project_id>/export.zip')
+@login_required
+def project_export_zip(project_id):
+    """GET /projects/<id>/export.zip - dossiê da obra (PDFs aprovados + fotos), em streaming"""
+    projeto = Projeto.query.get_or_404(project_id)
+    relatorio_ids, express_ids = _ids_exportados(projeto)
+
+    # Download direto (sem a preparação): os PDFs faltantes entram em ERROS.txt,
+    # mas já ficam na fila para o próximo download
+    if pdf_cache.habilitado():
+        try:
+            _preparar_pdfs(relatorio_ids, express_ids, enfileirar=True)
+        except Exception as e:
+            logger.warning(f"⚠️ Dossiê da obra {projeto.numero}: PDFs faltantes não enfileirados: {e}")
+        db.session.expunge_all()
+        projeto = db.session.get(Projeto, project_id)
+
+    logger.info(f"📦 Dossiê da obra {projeto.numero}: {len(relatorio_ids)} relatórios e "
+                f"{len(express_ids)} Relatórios Express")
+
+    filename = f"dossie_{sanitize_filename(projeto.numero)}_{sanitize_filename(projeto.nome)}_{now_brt().strftime('%Y%m%d')}.zip"
+    partes = zip_em_partes(_entradas_dossie(project_id, relatorio_ids, express_ids))
+    response = Response(stream_with_context(partes), mimetype='application/zip')
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Cache-Control'] = 'private, no-store'
+    response.headers['X-Accel-Buffering'] = 'no'  # Proxy repassa as partes sem acumular
+    return response
@@ -497,7 +497,7 @@ def approve_express_report(report_id):
             logger.error(f"⚠️ Erro ao criar notificação de aprovação: {notif_error}")
         
         # ========== GERAR PDF E ENVIAR EMAIL SÍNCRONO (MESMO SISTEMA DO NORMAL) ==========
-        from pdf_generator_express import gerar_pdf_relatorio_express
+        import pdf_cache
         from email_service_unified import get_email_service
         
         pdf_path = None
@@ -507,14 +507,12 @@ def approve_express_report(report_id):
         # Gerar PDF
         try:
             logger.info(f"📄 Gerando PDF para {relatorio.numero}...")
-            resultado_pdf = gerar_pdf_relatorio_express(relatorio.id, salvar_arquivo=True)
-            
-            if resultado_pdf.get('success'):
-                pdf_path = resultado_pdf.get('path')
-                logger.info(f"✅ PDF gerado: {pdf_path}")
-            else:
-                mensagem_erro = f"Erro ao gerar PDF: {resultado_pdf.get('error', 'Desconhecido')}"
-                logger.warning(mensagem_erro)
+            # Fica no cache: as visualizações do relatório aprovado não renderizam de novo
+            pdf_path = pdf_cache.salvar_copia(
+                pdf_cache.pdf_relatorio_express(relatorio),
+                os.path.join('uploads', f"relatorio_express_{relatorio.numero.replace('/', '_')}.pdf")
+            )
+            logger.info(f"✅ PDF gerado: {pdf_path}")
         except Exception as pdf_err:
             mensagem_erro = f"Erro ao gerar PDF: {str(pdf_err)}"
             logger.error(mensagem_erro, exc_info=True)
@@ -958,13 +956,12 @@ def duplicate_express_report(report_id):
 def generate_express_pdf(report_id):
     """Gera PDF do Relatório Express - Visualização Inline"""
     try:
-        from flask import Response
-        from pdf_generator_express import gerar_pdf_relatorio_express
+        import pdf_cache
         
         relatorio_express = RelatorioExpress.query.get_or_404(report_id)
         
-        # Gerar PDF em memória usando o gerador centralizado (que contém as correções de data)
-        pdf_io = gerar_pdf_relatorio_express(relatorio_express, salvar_arquivo=False)
+        # PDF do cache em disco se o relatório não mudou desde a última geração
+        resultado = pdf_cache.pdf_relatorio_express(relatorio_express)
         
         # Sanitizar nome
         import re
@@ -975,14 +972,7 @@ def generate_express_pdf(report_id):
         obra_nome = sanitize(relatorio_express.obra_nome)
         filename = f"relatorio_express_{relatorio_express.numero.replace('/', '_')}_{obra_nome}_{datetime.now().strftime('%Y%m%d')}.pdf"
         
-        return Response(
-            pdf_io.getvalue(),
-            mimetype='application/pdf',
-            headers={
-                'Content-Disposition': f'inline; filename="{filename}"',
-                'Content-Type': 'application/pdf'
-            }
-        )
+        return pdf_cache.resposta_pdf(resultado, filename)
         
     except Exception as e:
         logger.error(f"Erro ao gerar PDF do Relatório Express: {e}", exc_info=True)
@@ -995,13 +985,12 @@ def generate_express_pdf(report_id):
 def download_express_pdf(report_id):
     """Baixa PDF do Relatório Express - Visualização Download"""
     try:
-        from flask import Response
-        from pdf_generator_express import gerar_pdf_relatorio_express
+        import pdf_cache
         
         relatorio_express = RelatorioExpress.query.get_or_404(report_id)
         
-        # Gerar PDF em memória
-        pdf_io = gerar_pdf_relatorio_express(relatorio_express, salvar_arquivo=False)
+        # PDF do cache em disco se o relatório não mudou desde a última geração
+        resultado = pdf_cache.pdf_relatorio_express(relatorio_express)
         
         # Sanitizar nome
         import re
@@ -1012,14 +1001,7 @@ def download_express_pdf(report_id):
         obra_nome = sanitize(relatorio_express.obra_nome)
         filename = f"relatorio_express_{relatorio_express.numero.replace('/', '_')}_{obra_nome}_{datetime.now().strftime('%Y%m%d')}.pdf"
         
-        return Response(
-            pdf_io.getvalue(),
-            mimetype='application/pdf',
-            headers={
-                'Content-Disposition': f'attachment; filename="{filename}"',
-                'Content-Type': 'application/pdf'
-            }
-        )
+        return pdf_cache.resposta_pdf(resultado, filename, as_attachment=True)
         
     except Exception as e:
         logger.error(f"Erro ao baixar PDF do Relatório Express: {e}", exc_info=True)
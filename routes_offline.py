@@ -2,6 +2,12 @@
 OFFLINE PWA API ROUTES
 Endpoints dedicados para suporte offline do módulo Obras e Relatórios.
 O Service Worker usa estes endpoints para popular o cache e sincronizar dados.
+
+Fotos na sincronização: o offline-manager.js envia cada foto antes pelas
+sessões de upload em partes (routes_uploads.py) e manda só o `temp_id` no
+JSON, então o worker lê uma foto por vez do disco. O campo `base64` continua
+aceito para clientes antigos e para quando o envio em partes falha; nesse
+caso o lote inteiro chega decodificado na memória do worker.
 """
 import hashlib
 import json
@@ -10,6 +16,29 @@ from flask import jsonify, request, render_template, redirect, url_for
 from flask_login import login_required, current_user
 from app import app, db, csrf
 from models import Projeto, Relatorio, LegendaPredefinida, ChecklistPadrao, FotoRelatorio
+from routes_relatorios_api import ler_upload_temporario, remover_uploads_temporarios
+
+
+def _imagem_da_foto_offline(foto):
+    """(bytes, extensão) de uma foto da sincronização: temp_id (envio em partes) ou base64 legado; None se ausente"""
+    import base64
+
+    if foto.get('temp_id'):
+        imagem = ler_upload_temporario(foto['temp_id'])
+        if imagem:
+            return imagem
+        app.logger.warning(f"⚠️ Foto offline: temp_id {foto['temp_id']} não encontrado")
+
+    b64_data = foto.get('base64')
+    if not b64_data:
+        return None
+    # Parse Base64 string ex: "data:image/jpeg;base64,...""
+    ext = 'jpg'
+    if ',' in b64_data:
+        header, b64_data = b64_data.split(',', 1)
+        if 'image/png' in header: ext = 'png'
+        elif 'image/webp' in header: ext = 'webp'
+    return base64.b64decode(b64_data), ext
 
 
 # ============================================================
@@ -347,31 +376,21 @@ def offline_save_report():
                 app.logger.info(
                     f"✏️ Atualizando relatório existente (edição offline): id={relatorio_id_existente}"
                 )
-                # Salvar apenas as fotos novas (com base64)
+                # Salvar apenas as fotos novas (com temp_id ou base64)
+                temp_ids_gravados = []
                 if fotos:
-                    import os, base64, hashlib
+                    import os, hashlib
                     upload_folder = app.config.get('UPLOAD_FOLDER', 'uploads')
                     if not os.path.exists(upload_folder):
                         os.makedirs(upload_folder)
                     for idx, foto in enumerate(fotos):
-                        b64_data = foto.get('base64')
-                        if not b64_data:
-                            continue
                         try:
-                            if ',' in b64_data:
-                                header, base64_str = b64_data.split(',', 1)
-                                ext = 'jpg'
-                                if 'image/png' in header: ext = 'png'
-                                elif 'image/webp' in header: ext = 'webp'
-                            else:
-                                base64_str = b64_data
-                                ext = 'jpg'
-                            image_bytes = base64.b64decode(base64_str)
+                            imagem = _imagem_da_foto_offline(foto)
+                            if not imagem:
+                                continue
+                            image_bytes, ext = imagem
                             imagem_hash = hashlib.sha256(image_bytes).hexdigest()
-                            foto_existente = FotoRelatorio.query.filter_by(
-                                relatorio_id=relatorio_id_existente,
-                                imagem_hash=imagem_hash
-                            ).first()
+                            foto_existente = FotoRelatorio.buscar_enviada(imagem_hash, relatorio_id=relatorio_id_existente)
                             if not foto_existente:
                                 timestamp = now_brt().strftime('%Y%m%d_%H%M%S%f')
                                 final_filename = f"relatorio_{relatorio_id_existente}_{timestamp}_offline_{idx}.{ext}"
@@ -392,10 +411,15 @@ def offline_save_report():
                                     ordem=foto.get('ordem', idx)
                                 )
                                 db.session.add(nova_foto)
+                                db.session.flush()  # Bytes para o blob store agora, não no commit do lote
+                            if foto.get('temp_id'):
+                                temp_ids_gravados.append(foto['temp_id'])
                         except Exception as e:
                             app.logger.warning(f"Failed to process offline photo (edit mode): {e}")
+                        image_bytes = imagem = None  # Não segurar a foto anterior ao ler a próxima
                 relatorio_existente.updated_at = now_brt()
                 db.session.commit()
+                remover_uploads_temporarios(temp_ids_gravados)
                 app.logger.info(f"✅ Relatório {relatorio_id_existente} atualizado (edição offline)")
                 return jsonify({
                     'success': True,
@@ -626,9 +650,10 @@ def offline_save_report():
             except Exception as e:
                 app.logger.warning(f"Offline ChecklistObra failed: {e}")
 
-        # Salvar as Fotos com Base64
+        # Salvar as Fotos (temp_id do envio em partes ou base64 legado)
+        temp_ids_gravados = []
         if fotos:
-            import os, base64, hashlib
+            import os, hashlib
             upload_folder = app.config.get('UPLOAD_FOLDER', 'uploads')
             if not os.path.exists(upload_folder):
                 os.makedirs(upload_folder)
@@ -637,30 +662,15 @@ def offline_save_report():
             max_ordem = -1
             
             for idx, foto in enumerate(fotos):
-                b64_data = foto.get('base64')
-                if not b64_data:
-                    continue
-                
                 try:
-                    # Parse Base64 string ex: "data:image/jpeg;base64,...""
-                    if ',' in b64_data:
-                        header, base64_str = b64_data.split(',', 1)
-                        # Extract extension
-                        ext = 'jpg'
-                        if 'image/png' in header: ext = 'png'
-                        elif 'image/webp' in header: ext = 'webp'
-                    else:
-                        base64_str = b64_data
-                        ext = 'jpg'
-                        
-                    image_bytes = base64.b64decode(base64_str)
+                    imagem = _imagem_da_foto_offline(foto)
+                    if not imagem:
+                        continue
+                    image_bytes, ext = imagem
                     imagem_hash = hashlib.sha256(image_bytes).hexdigest()
                     
                     # Prevent duplicates
-                    foto_existente = FotoRelatorio.query.filter_by(
-                        relatorio_id=relatorio_id,
-                        imagem_hash=imagem_hash
-                    ).first()
+                    foto_existente = FotoRelatorio.buscar_enviada(imagem_hash, relatorio_id=relatorio_id)
                     
                     if not foto_existente:
                         timestamp = now_brt().strftime('%Y%m%d_%H%M%S%f')
@@ -684,10 +694,15 @@ def offline_save_report():
                             ordem=foto.get('ordem', max_ordem + idx + 1)
                         )
                         db.session.add(nova_foto)
+                        db.session.flush()  # Bytes para o blob store agora, não no commit do lote
+                    if foto.get('temp_id'):
+                        temp_ids_gravados.append(foto['temp_id'])
                 except Exception as e:
                     app.logger.warning(f"Failed to process offline photo: {e}")
+                image_bytes = imagem = None  # Não segurar a foto anterior ao ler a próxima
 
         db.session.commit()
+        remover_uploads_temporarios(temp_ids_gravados)
 
         app.logger.info(
             f"✅ Relatório offline salvo completamente: id={relatorio_id}, "
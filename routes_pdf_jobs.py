@@ -0,0 +1,124 @@
+"""
+Geração de PDF de relatórios em segundo plano, com consulta de status
+
+Protocolo:
+    POST /reports/<id>/pdf/jobs                        enfileira (ou reaproveita) o job do conteúdo atual
+    GET  /reports/<id>/pdf/jobs/<job_id>               status e progresso; download_url quando concluído
+    GET  /reports/<id>/pdf/jobs/<job_id>/download      PDF renderizado (?inline=1 para visualizar)
+
+O mesmo para Relatórios Express em /relatorio-express/<id>/pdf/jobs.
+A renderização roda em um processo separado (pdf_jobs.py), então nenhum
+worker do Gunicorn fica preso (nem é morto pelo timeout) durante o WeasyPrint.
+"""
+import logging
+
+from flask import jsonify, request, url_for
+from flask_login import login_required
+
+from app import app, csrf, now_brt
+from models import Relatorio, RelatorioExpress
+from routes import sanitize_filename
+import pdf_cache
+import pdf_jobs
+
+logger = logging.getLogger(__name__)
+
+
+def _job_json(job, endpoint_status, endpoint_download, relatorio_id):
+    dados = {
+        'success': job['status'] != pdf_jobs.STATUS_ERRO,
+        'job_id': job['job_id'],
+        'status': job['status'],
+        'progresso': job.get('progresso', 0),
+        'status_url': url_for(endpoint_status, report_id=relatorio_id, job_id=job['job_id']),
+    }
+    if job['status'] == pdf_jobs.STATUS_CONCLUIDO:
+        dados['download_url'] = url_for(endpoint_download, report_id=relatorio_id, job_id=job['job_id'])
+        dados['tamanho'] = job.get('tamanho')
+    if job['status'] == pdf_jobs.STATUS_ERRO:
+        dados['error'] = job.get('erro') or 'Erro ao gerar PDF'
+    return dados
+
+
+def _resposta_download(job, download_name):
+    resultado = (job['caminho'], None, job['digital'])
+    as_attachment = request.args.get('inline') != '1'
+    return pdf_cache.resposta_pdf(resultado, download_name, as_attachment=as_attachment)
+
+
+def _nome_relatorio(relatorio):
+    obra_nome = sanitize_filename(relatorio.projeto.nome)
+    return f"relatorio_{relatorio.numero.replace('/', '_')}_{obra_nome}_{now_brt().strftime('%Y%m%d')}.pdf"
+
+
+def _nome_express(relatorio_express):
+    obra_nome = sanitize_filename(relatorio_express.obra_nome or 'express')
+    return f"relatorio_express_{relatorio_express.numero.replace('/', '_')}_{obra_nome}_{now_brt().strftime('%Y%m%d')}.pdf"
+
+
+# ==================== RELATÓRIOS COMUNS ====================
+
+@app.route('/reports/<int:report_id>/pdf/jobs', methods=['POST'])
+@csrf.exempt
+@login_required
+def report_pdf_job_create(report_id):
+    """POST /reports/<id>/pdf/jobs - 202 com o job (200 se o PDF já está em cache)"""
+    relatorio = Relatorio.query.get_or_404(report_id)
+    job = pdf_jobs.enfileirar(pdf_cache.TIPO_RELATORIO, relatorio)
+    dados = _job_json(job, 'report_pdf_job_status', 'report_pdf_job_download', report_id)
+    return jsonify(dados), 200 if job['status'] == pdf_jobs.STATUS_CONCLUIDO else 202
+
+
+@app.route('/reports/<int:report_id>/pdf/jobs/<job_id>', methods=['GET'])
+@login_required
+def report_pdf_job_status(report_id, job_id):
+    """GET /reports/<id>/pdf/jobs/<job_id> - status do job"""
+    job = pdf_jobs.obter_job(job_id, pdf_cache.TIPO_RELATORIO, report_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job de PDF não encontrado'}), 404
+    return jsonify(_job_json(job, 'report_pdf_job_status', 'report_pdf_job_download', report_id))
+
+
+@app.route('/reports/<int:report_id>/pdf/jobs/<job_id>/download', methods=['GET'])
+@login_required
+def report_pdf_job_download(report_id, job_id):
+    """GET /reports/<id>/pdf/jobs/<job_id>/download - PDF do job concluído"""
+    job = pdf_jobs.obter_job(job_id, pdf_cache.TIPO_RELATORIO, report_id)
+    if not job or job['status'] != pdf_jobs.STATUS_CONCLUIDO:
+        return jsonify({'success': False, 'error': 'PDF não disponível para este job'}), 404
+    relatorio = Relatorio.query.get_or_404(report_id)
+    return _resposta_download(job, _nome_relatorio(relatorio))
+
+
+# ==================== RELATÓRIOS EXPRESS ====================
+
+@app.route('/relatorio-express/<int:report_id>/pdf/jobs', methods=['POST'])
+@csrf.exempt
+@login_required
+def express_pdf_job_create(report_id):
+    """POST /relatorio-express/<id>/pdf/jobs"""
+    relatorio_express = RelatorioExpress.query.get_or_404(report_id)
+    job = pdf_jobs.enfileirar(pdf_cache.TIPO_EXPRESS, relatorio_express)
+    dados = _job_json(job, 'express_pdf_job_status', 'express_pdf_job_download', report_id)
+    return jsonify(dados), 200 if job['status'] == pdf_jobs.STATUS_CONCLUIDO else 202
+
+
+@app.route('/relatorio-express/<int:report_id>/pdf/jobs/<job_id>', methods=['GET'])
+@login_required
+def express_pdf_job_status(report_id, job_id):
+    """GET /relatorio-express/<id>/pdf/jobs/<job_id>"""
+    job = pdf_jobs.obter_job(job_id, pdf_cache.TIPO_EXPRESS, report_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job de PDF não encontrado'}), 404
+    return jsonify(_job_json(job, 'express_pdf_job_status', 'express_pdf_job_download', report_id))
+
+
+@app.route('/relatorio-express/<int:report_id>/pdf/jobs/<job_id>/download', methods=['GET'])
+@login_required
+def express_pdf_job_download(report_id, job_id):
+    """GET /relatorio-express/<id>/pdf/jobs/<job_id>/download"""
+    job = pdf_jobs.obter_job(job_id, pdf_cache.TIPO_EXPRESS, report_id)
+    if not job or job['status'] != pdf_jobs.STATUS_CONCLUIDO:
+        return jsonify({'success': False, 'error': 'PDF não disponível para este job'}), 404
+    relatorio_express = RelatorioExpress.query.get_or_404(report_id)
+    return _resposta_download(job, _nome_express(relatorio_express))
@@ -30,6 +30,48 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def ler_upload_temporario(temp_id):
+    """
+    Lê o arquivo de um upload temporário (/api/uploads/temp ou sessão em partes concluída)
+
+    Returns:
+        tuple(bytes, str) | None: (bytes da imagem, extensão), ou None se o
+        temp_id for inválido, o arquivo não existir ou estiver vazio
+    """
+    import glob
+    try:
+        uuid.UUID(str(temp_id))
+    except ValueError:
+        return None
+    encontrados = glob.glob(os.path.join(TEMP_UPLOAD_FOLDER, f"{temp_id}.*"))
+    if not encontrados:
+        return None
+    caminho = encontrados[0]
+    with open(caminho, 'rb') as f:
+        dados = f.read()
+    if not dados:
+        return None
+    return dados, caminho.rsplit('.', 1)[1].lower()
+
+def remover_uploads_temporarios(temp_ids):
+    """
+    Remove os arquivos temporários de fotos já gravadas no relatório (após o commit)
+
+    O autosave não usa esta função: mantém o temporário para retry, e a limpeza
+    diária (routes_uploads.limpar_temporarios_expirados) remove o que sobrar.
+    """
+    import glob
+    for temp_id in temp_ids:
+        try:
+            uuid.UUID(str(temp_id))
+        except ValueError:
+            continue
+        for caminho in glob.glob(os.path.join(TEMP_UPLOAD_FOLDER, f"{temp_id}.*")):
+            try:
+                os.remove(caminho)
+            except OSError as e:
+                logger.warning(f"⚠️ Não foi possível remover o temporário {caminho}: {e}")
+
 def save_uploaded_image(file, relatorio_id):
     """
     Salva imagem enviada e retorna informações do arquivo
@@ -1371,10 +1413,7 @@ def api_autosave_relatorio():
                         imagem_hash = hashlib.sha256(image_bytes).hexdigest()
 
                         # 🔧 CORREÇÃO CRÍTICA: Verificar se imagem JÁ EXISTE no banco (prevenir duplicação por temp_id)
-                        foto_existente = FotoRelatorio.query.filter_by(
-                            relatorio_id=relatorio_id,
-                            imagem_hash=imagem_hash
-                        ).first()
+                        foto_existente = FotoRelatorio.buscar_enviada(imagem_hash, relatorio_id=relatorio_id)
 
                         if foto_existente:
                             # Imagem já existe - apenas atualizar metadados
@@ -1476,10 +1515,7 @@ def api_autosave_relatorio():
                         imagem_hash = hashlib.sha256(image_bytes).hexdigest()
 
                         # 🔧 CORREÇÃO: Verificar se imagem já existe no banco (prevenir duplicação)
-                        foto_existente = FotoRelatorio.query.filter_by(
-                            relatorio_id=relatorio_id,
-                            imagem_hash=imagem_hash
-                        ).first()
+                        foto_existente = FotoRelatorio.buscar_enviada(imagem_hash, relatorio_id=relatorio_id)
 
                         if foto_existente:
                             # Imagem já existe - apenas atualizar metadados se necessário
@@ -1593,7 +1629,7 @@ def api_autosave_relatorio():
         total_imagens_db = FotoRelatorio.query.filter_by(relatorio_id=relatorio_id).count()
         imagens_com_bytes = FotoRelatorio.query.filter(
             FotoRelatorio.relatorio_id == relatorio_id,
-            FotoRelatorio.imagem.isnot(None)
+            FotoRelatorio.filtro_com_imagem()
         ).count()
 
         logger.info(f"📊 AutoSave VALIDAÇÃO FINAL:")
@@ -0,0 +1,336 @@
+"""
+Upload de fotos em partes (chunked) com retomada, para clientes móveis
+
+Protocolo:
+    POST   /api/uploads/sessions                 cria a sessão (filename, size, mime_type, sha256 opcional)
+    PUT    /api/uploads/sessions/<id>            envia um pedaço binário; header Upload-Offset obrigatório
+    GET    /api/uploads/sessions/<id>            offset já recebido (para retomar após queda de conexão)
+    POST   /api/uploads/sessions/<id>/complete   valida e monta o arquivo final
+    DELETE /api/uploads/sessions/<id>            cancela a sessão
+
+Os pedaços são gravados direto em disco (uploads/temp/sessions/<id>/data.part)
+em blocos pequenos, então a memória do worker não depende do tamanho da foto.
+O `complete` entrega o arquivo em uploads/temp/<id>.<ext> e responde no mesmo
+formato de /api/uploads/temp: o temp_id segue pelo autosave sem mudanças.
+Binário puro evita os 33% extras do base64 usado nos formulários.
+"""
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+
+from flask import jsonify, request
+from flask_login import login_required, current_user
+
+from app import app, csrf
+from routes_relatorios_api import TEMP_UPLOAD_FOLDER, MAX_FILE_SIZE, ALLOWED_EXTENSIONS, allowed_file
+
+try:
+    import fcntl
+except ImportError:  # Windows (desenvolvimento)
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SESSIONS_FOLDER = os.path.join(TEMP_UPLOAD_FOLDER, 'sessions')
+CHUNK_SIZE = 1024 * 1024  # Tamanho sugerido ao cliente (1MB): pouco a reenviar em caso de queda
+MAX_CHUNK_SIZE = 8 * 1024 * 1024
+STREAM_BLOCK_SIZE = 64 * 1024
+SESSION_TTL_HOURS = 24
+
+os.makedirs(SESSIONS_FOLDER, exist_ok=True)
+
+
+def _session_dir(upload_id):
+    return os.path.join(SESSIONS_FOLDER, upload_id)
+
+
+def _load_session(upload_id):
+    """Metadados da sessão do usuário atual, ou None (id inválido, expirado ou de outro usuário)"""
+    try:
+        uuid.UUID(upload_id)
+    except ValueError:
+        return None
+    meta_path = os.path.join(_session_dir(upload_id), 'meta.json')
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('user_id') != current_user.id:
+        return None
+    return meta
+
+
+def _received_bytes(upload_id):
+    try:
+        return os.path.getsize(os.path.join(_session_dir(upload_id), 'data.part'))
+    except OSError:
+        return 0
+
+
+def _session_status(meta):
+    return {
+        'success': True,
+        'upload_id': meta['upload_id'],
+        'offset': _received_bytes(meta['upload_id']),
+        'size': meta['size'],
+        'chunk_size': CHUNK_SIZE,
+    }
+
+
+@app.route('/api/uploads/sessions', methods=['POST'])
+@csrf.exempt
+@login_required
+def api_upload_session_create():
+    """
+    POST /api/uploads/sessions
+
+    Body JSON: {filename, size, mime_type?, sha256?, category?, local?, caption?}
+
+    Returns:
+        JSON: {upload_id, offset, size, chunk_size}
+    """
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename') or ''
+    size = data.get('size')
+
+    if not filename or not allowed_file(filename):
+        return jsonify({
+            'success': False,
+            'error': f'Tipo de arquivo não permitido. Tipos aceitos: {", ".join(ALLOWED_EXTENSIONS)}'
+        }), 400
+    if not isinstance(size, int) or size <= 0:
+        return jsonify({'success': False, 'error': 'Tamanho do arquivo inválido'}), 400
+    if size > MAX_FILE_SIZE:
+        return jsonify({
+            'success': False,
+            'error': f'Arquivo muito grande: {size / (1024*1024):.2f}MB. Máximo: {MAX_FILE_SIZE / (1024*1024):.0f}MB'
+        }), 413
+
+    upload_id = str(uuid.uuid4())
+    meta = {
+        'upload_id': upload_id,
+        'user_id': current_user.id,
+        'filename': filename,
+        'size': size,
+        'mime_type': data.get('mime_type') or 'image/jpeg',
+        'sha256': (data.get('sha256') or '').lower() or None,
+        'category': data.get('category', ''),
+        'local': data.get('local', ''),
+        'caption': data.get('caption', ''),
+        'created_at': time.time(),
+    }
+
+    session_dir = _session_dir(upload_id)
+    os.makedirs(session_dir)
+    with open(os.path.join(session_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    open(os.path.join(session_dir, 'data.part'), 'wb').close()
+
+    logger.info(f"📦 Sessão de upload criada: {upload_id} ({filename}, {size / 1024:.2f}KB)")
+    return jsonify(_session_status(meta)), 201
+
+
+@app.route('/api/uploads/sessions/<upload_id>', methods=['GET'])
+@login_required
+def api_upload_session_status(upload_id):
+    """GET /api/uploads/sessions/<id> - offset já recebido, para o cliente retomar"""
+    meta = _load_session(upload_id)
+    if not meta:
+        return jsonify({'success': False, 'error': 'Sessão de upload não encontrada'}), 404
+    return jsonify(_session_status(meta))
+
+
+@app.route('/api/uploads/sessions/<upload_id>', methods=['PUT'])
+@csrf.exempt
+@login_required
+def api_upload_session_chunk(upload_id):
+    """
+    PUT /api/uploads/sessions/<id>
+
+    Corpo: bytes do pedaço (application/octet-stream)
+    Header Upload-Offset: posição do pedaço no arquivo
+
+    Um offset diferente do já recebido retorna 409 com o offset correto, para
+    o cliente reenviar a partir dele (pedaço repetido ou perdido).
+    """
+    meta = _load_session(upload_id)
+    if not meta:
+        return jsonify({'success': False, 'error': 'Sessão de upload não encontrada'}), 404
+
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Header Upload-Offset obrigatório'}), 400
+
+    length = request.content_length
+    if length is None or length <= 0:
+        return jsonify({'success': False, 'error': 'Pedaço vazio'}), 400
+    if length > MAX_CHUNK_SIZE:
+        return jsonify({'success': False, 'error': f'Pedaço maior que {MAX_CHUNK_SIZE} bytes'}), 413
+    if offset + length > meta['size']:
+        return jsonify({'success': False, 'error': 'Pedaço ultrapassa o tamanho declarado'}), 400
+
+    part_path = os.path.join(_session_dir(upload_id), 'data.part')
+    with open(part_path, 'r+b') as part:
+        # Duas requisições do mesmo cliente (retry) não escrevem ao mesmo tempo
+        if fcntl is not None:
+            fcntl.flock(part, fcntl.LOCK_EX)
+        received = os.fstat(part.fileno()).st_size
+        if offset != received:
+            return jsonify({
+                'success': False,
+                'error': 'Offset não confere com o recebido',
+                'offset': received
+            }), 409
+
+        part.seek(offset)
+        written = 0
+        while True:
+            block = request.stream.read(min(STREAM_BLOCK_SIZE, length - written))
+            if not block:
+                break
+            part.write(block)
+            written += len(block)
+            if written >= length:
+                break
+
+        if written != length:
+            # Conexão caiu no meio do pedaço: descarta a parte incompleta
+            part.truncate(offset)
+            return jsonify({
+                'success': False,
+                'error': 'Pedaço incompleto',
+                'offset': offset
+            }), 400
+
+    return jsonify(_session_status(meta))
+
+
+@app.route('/api/uploads/sessions/<upload_id>/complete', methods=['POST'])
+@csrf.exempt
+@login_required
+def api_upload_session_complete(upload_id):
+    """
+    POST /api/uploads/sessions/<id>/complete
+
+    Confere tamanho (e sha256, se informado na criação), valida que é uma imagem
+    e move o arquivo para a pasta temporária de uploads.
+
+    Returns:
+        JSON: mesmo formato de /api/uploads/temp ({temp_id, path, filename, ...})
+    """
+    meta = _load_session(upload_id)
+    if not meta:
+        return jsonify({'success': False, 'error': 'Sessão de upload não encontrada'}), 404
+
+    session_dir = _session_dir(upload_id)
+    part_path = os.path.join(session_dir, 'data.part')
+    received = _received_bytes(upload_id)
+    if received != meta['size']:
+        return jsonify({
+            'success': False,
+            'error': f'Upload incompleto: {received} de {meta["size"]} bytes',
+            'offset': received
+        }), 409
+
+    if meta.get('sha256'):
+        digest = hashlib.sha256()
+        with open(part_path, 'rb') as part:
+            for block in iter(lambda: part.read(STREAM_BLOCK_SIZE), b''):
+                digest.update(block)
+        if digest.hexdigest() != meta['sha256']:
+            shutil.rmtree(session_dir, ignore_errors=True)
+            return jsonify({'success': False, 'error': 'Checksum não confere; reenvie o arquivo'}), 422
+
+    try:
+        from PIL import Image
+        with Image.open(part_path) as img:
+            img.verify()
+    except Exception:
+        shutil.rmtree(session_dir, ignore_errors=True)
+        return jsonify({'success': False, 'error': 'Arquivo enviado não é uma imagem válida'}), 400
+
+    extension = meta['filename'].rsplit('.', 1)[1].lower()
+    temp_filename = f"{upload_id}.{extension}"
+    os.replace(part_path, os.path.join(TEMP_UPLOAD_FOLDER, temp_filename))
+    shutil.rmtree(session_dir, ignore_errors=True)
+
+    logger.info(f"✅ Upload em partes concluído: {temp_filename} ({meta['size'] / 1024:.2f}KB) - temp_id: {upload_id}")
+
+    return jsonify({
+        'success': True,
+        'temp_id': upload_id,
+        'path': f"/uploads/temp/{temp_filename}",
+        'filename': temp_filename,
+        'original_filename': meta['filename'],
+        'size': meta['size'],
+        'mime_type': meta['mime_type'],
+        'category': meta['category'],
+        'local': meta['local'],
+        'caption': meta['caption']
+    }), 200
+
+
+@app.route('/api/uploads/sessions/<upload_id>', methods=['DELETE'])
+@csrf.exempt
+@login_required
+def api_upload_session_cancel(upload_id):
+    """DELETE /api/uploads/sessions/<id> - descarta a sessão e os bytes recebidos"""
+    meta = _load_session(upload_id)
+    if not meta:
+        return jsonify({'success': False, 'error': 'Sessão de upload não encontrada'}), 404
+    shutil.rmtree(_session_dir(upload_id), ignore_errors=True)
+    return jsonify({'success': True})
+
+
+def limpar_sessoes_expiradas(max_age_hours=SESSION_TTL_HOURS):
+    """
+    Remove sessões de upload abandonadas há mais de `max_age_hours`.
+
+    Returns:
+        int: Quantidade de sessões removidas
+    """
+    limite = time.time() - max_age_hours * 3600
+    removidas = 0
+    for entry in os.scandir(SESSIONS_FOLDER):
+        if not entry.is_dir():
+            continue
+        try:
+            # mtime do data.part muda a cada pedaço: sessões ativas não expiram
+            ultima_atividade = os.path.getmtime(os.path.join(entry.path, 'data.part'))
+        except OSError:
+            ultima_atividade = entry.stat().st_mtime
+        if ultima_atividade < limite:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removidas += 1
+    return removidas
+
+
+def limpar_temporarios_expirados(max_age_hours=SESSION_TTL_HOURS):
+    """
+    Remove arquivos de uploads/temp (envios concluídos) com mais de `max_age_hours`.
+
+    Sincronização offline e criação de relatório removem o temporário após o
+    commit; o autosave mantém o arquivo para retry, e o que nunca foi usado
+    (ou sobrou do autosave) sai aqui.
+
+    Returns:
+        int: Quantidade de arquivos removidos
+    """
+    limite = time.time() - max_age_hours * 3600
+    removidos = 0
+    for entry in os.scandir(TEMP_UPLOAD_FOLDER):
+        if not entry.is_file() or entry.name.startswith('.'):
+            continue
+        try:
+            if entry.stat().st_mtime < limite:
+                os.remove(entry.path)
+                removidos += 1
+        except OSError:
+            continue
+    return removidos
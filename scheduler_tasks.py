@@ -73,6 +73,60 @@ def verificar_visitas_atrasadas_task():
     except Exception as e:
         logger.error(f"❌ [SCHEDULER] Erro na tarefa de verificação de visitas: {e}")
 
+def coletar_blobs_orfaos_task():
+    """Tarefa diária: reconcilia ref_count e remove blobs de imagem sem nenhuma foto referenciando"""
+    try:
+        with scheduler.app.app_context():
+            from photo_storage import coletar_blobs_orfaos
+            
+            resultado = coletar_blobs_orfaos()
+            
+            if resultado['removidos'] or resultado['corrigidos']:
+                logger.info(
+                    f"🧹 [SCHEDULER] Blob store: {resultado['removidos']} blobs removidos "
+                    f"({resultado['bytes_liberados']} bytes), {resultado['corrigidos']} contagens corrigidas"
+                )
+            else:
+                logger.debug("🧹 [SCHEDULER] Nenhum blob órfão encontrado")
+                
+    except Exception as e:
+        logger.error(f"❌ [SCHEDULER] Erro na coleta de blobs órfãos: {e}")
+
+def limpar_sessoes_upload_task():
+    """Tarefa diária: remove sessões de upload em partes abandonadas e temporários com mais de 24h"""
+    try:
+        with scheduler.app.app_context():
+            from routes_uploads import limpar_sessoes_expiradas, limpar_temporarios_expirados
+            
+            removidas = limpar_sessoes_expiradas()
+            temporarios = limpar_temporarios_expirados()
+            
+            if removidas or temporarios:
+                logger.info(f"🧹 [SCHEDULER] {removidas} sessões de upload abandonadas e {temporarios} temporários removidos")
+            else:
+                logger.debug("🧹 [SCHEDULER] Nenhuma sessão de upload abandonada nem temporário expirado")
+                
+    except Exception as e:
+        logger.error(f"❌ [SCHEDULER] Erro na limpeza de sessões de upload: {e}")
+
+def limpar_cache_pdf_task():
+    """Tarefa diária: remove PDFs em cache não acessados há mais de 30 dias e jobs de PDF antigos"""
+    try:
+        with scheduler.app.app_context():
+            import pdf_cache
+            import pdf_jobs
+            
+            removidos = pdf_cache.limpar()
+            pdf_jobs.limpar_jobs()
+            
+            if removidos:
+                logger.info(f"🧹 [SCHEDULER] {removidos} PDFs antigos removidos do cache")
+            else:
+                logger.debug("🧹 [SCHEDULER] Nenhum PDF antigo no cache")
+                
+    except Exception as e:
+        logger.error(f"❌ [SCHEDULER] Erro na limpeza do cache de PDFs: {e}")
+
 def init_scheduler(app):
     """Inicializar scheduler com as tarefas agendadas"""
     try:
@@ -106,6 +160,33 @@ def init_scheduler(app):
             replace_existing=True
         )
         
+        # Tarefa 4: Coleta de blobs de imagem órfãos às 4h (após a limpeza das 3h)
+        scheduler.add_job(
+            func=coletar_blobs_orfaos_task,
+            trigger=CronTrigger(hour=4, minute=0),
+            id='coletar_blobs_orfaos',
+            name='Coleta de blobs de imagem órfãos',
+            replace_existing=True
+        )
+        
+        # Tarefa 5: Sessões de upload em partes abandonadas, às 3h30
+        scheduler.add_job(
+            func=limpar_sessoes_upload_task,
+            trigger=CronTrigger(hour=3, minute=30),
+            id='limpar_sessoes_upload',
+            name='Limpeza de sessões de upload abandonadas',
+            replace_existing=True
+        )
+        
+        # Tarefa 6: PDFs em cache sem acesso há 30 dias, às 4h15
+        scheduler.add_job(
+            func=limpar_cache_pdf_task,
+            trigger=CronTrigger(hour=4, minute=15),
+            id='limpar_cache_pdf',
+            name='Limpeza do cache de PDFs',
+            replace_existing=True
+        )
+        
         # Iniciar scheduler
         scheduler.start()
         
@@ -114,6 +195,9 @@ def init_scheduler(app):
         logger.info("   - Limpeza de notificações a cada 6 horas")
         logger.info("   - Limpeza diária às 3h da manhã")
         logger.info("   - Alertas de visitas pendentes às 17h")
+        logger.info("   - Coleta de blobs de imagem órfãos às 4h")
+        logger.info("   - Limpeza de sessões de upload abandonadas às 3h30")
+        logger.info("   - Limpeza do cache de PDFs às 4h15")
         
         return scheduler
         
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Benchmark do backup para o Google Drive com o Drive local (drive_fake.py).
+
+Cria um banco SQLite descartável com relatórios aprovados (comuns e Express)
+com fotos sintéticas e executa os backups de google_drive_backup.py contra
+o Drive local, pelo mesmo cliente googleapiclient usado em produção. Fases:
+
+    pdfs                 Backup completo dos PDFs (renderização + envio)
+    pdfs-reenvio         Mesmo backup para um Drive vazio, com os PDFs já em cache: só o envio
+    pdfs-sem-alteracao   Backup de novo sem nada alterado (manifesto)
+    fotos                Backup de todas as fotos (parte das fotos com conteúdo repetido)
+    fotos-sem-alteracao  Backup de fotos de novo sem nada alterado
+
+Reporta, por fase: tempo, relatórios/s, bytes recebidos pelo Drive e
+bytes/s, requisições HTTP e enviados/pulados/falhas. Latência por
+requisição, banda de upload e erros 503 podem ser simulados. Não usa rede
+nem o banco da aplicação: pode rodar no CI. As fases de PDF precisam do
+WeasyPrint.
+
+Uso:
+    python scripts/benchmark_drive_backup.py [--relatorios 20] [--express 10] [--fotos 4]
+                                             [--largura 2560] [--repetidas 0.1]
+                                             [--latencia-ms 0] [--banda-mbps 0] [--taxa-erros 0]
+                                             [--fases pdfs,pdfs-reenvio,...] [--json resultado.json]
+
+Opções:
+    --relatorios / --express: Relatórios aprovados de cada tipo (padrão: 20 / 10)
+    --fotos: Fotos por relatório (padrão: 4)
+    --largura N: Largura das fotos em px, proporção 4:3 (padrão: 2560)
+    --repetidas F: Fração das fotos que repetem o conteúdo de outra (padrão: 0.1)
+    --latencia-ms: Latência simulada por requisição HTTP (padrão: 0)
+    --banda-mbps: Banda de upload simulada em Mbit/s (padrão: 0 = ilimitada)
+    --taxa-erros: Probabilidade de cada envio de mídia responder 503 (padrão: 0)
+    --fases: Fases executadas, na ordem (padrão: todas)
+    --json: Grava os resultados em JSON (comparação entre execuções no CI)
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import contextlib
+from datetime import datetime
+
+# Adicionar diretório raiz ao path
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(RAIZ)
+
+from benchmark_pdf import GeradorFotos, _registrar_jsonb_sqlite  # noqa: E402
+
+FASES = ('pdfs', 'pdfs-reenvio', 'pdfs-sem-alteracao', 'fotos', 'fotos-sem-alteracao')
+TOKEN = {'token': 'benchmark', 'refresh_token': 'benchmark'}
+
+
+# =============================================================================
+# FIXTURES
+# =============================================================================
+
+def criar_fixtures(relatorios, express, fotos_por_relatorio, largura, repetidas):
+    """
+    Cria usuário, obras e os relatórios aprovados com fotos.
+
+    Returns:
+        dict: {'relatorios', 'express', 'fotos', 'bytes_fotos'}
+    """
+    from werkzeug.security import generate_password_hash
+    from app import app, db
+    from models import User, Projeto, Relatorio, FotoRelatorio, RelatorioExpress, FotoRelatorioExpress
+
+    _registrar_jsonb_sqlite()
+    gerador = GeradorFotos(largura)
+    sorteio = random.Random(42)
+    geradas = []
+    bytes_fotos = 0
+
+    def foto():
+        if geradas and sorteio.random() < repetidas:
+            return sorteio.choice(geradas)
+        geradas.append(gerador.foto(len(geradas)))
+        return geradas[-1]
+
+    with app.app_context():
+        db.create_all()
+        autor = User(username='benchmark', email='benchmark@exemplo.com', nome_completo='Benchmark Drive',
+                     password_hash=generate_password_hash('benchmark'))
+        db.session.add(autor)
+        db.session.flush()
+        obras = []
+        for n in range(3):
+            obra = Projeto(numero=f'BENCH-{n}', nome=f'Obra Sintética {n}', tipo_obra='Residencial',
+                           construtora='Construtora Benchmark', nome_funcionario='Benchmark',
+                           responsavel_id=autor.id, email_principal='benchmark@exemplo.com',
+                           endereco=f'Rua do Benchmark, {100 + n}', status='Ativo')
+            db.session.add(obra)
+            obras.append(obra)
+        db.session.commit()
+        autor_id = autor.id
+        obras_ids = [obra.id for obra in obras]
+
+        conteudo = '\n'.join(f"Item observado {n}: verificação de execução conforme projeto." for n in range(12))
+        for indice in range(relatorios + express):
+            if indice < relatorios:
+                relatorio = Relatorio(numero=f"REL-{indice:04d}", titulo='Relatório de visita',
+                                      projeto_id=obras_ids[indice % len(obras_ids)], autor_id=autor_id,
+                                      status='Aprovado', conteudo=conteudo)
+                model, campo = FotoRelatorio, 'relatorio_id'
+            else:
+                relatorio = RelatorioExpress(numero=f"EXP-{indice:04d}", empresa_nome='Construtora Benchmark',
+                                             obra_nome=f'Obra Express {indice % 2}', obra_endereco='Rua do Benchmark, 1',
+                                             autor_id=autor_id, status='Aprovado', observacoes_finais=conteudo)
+                model, campo = FotoRelatorioExpress, 'relatorio_express_id'
+            db.session.add(relatorio)
+            db.session.commit()
+            relatorio_id = relatorio.id
+            for ordem in range(1, fotos_por_relatorio + 1):
+                dados = foto()
+                bytes_fotos += len(dados)
+                db.session.add(model(**{campo: relatorio_id}, filename=f"bench_{indice}_{ordem}.jpg", imagem=dados,
+                                     ordem=ordem, legenda=f"Foto {ordem}", tipo_servico='Estrutura',
+                                     local='Pavimento tipo'))
+                # Commit a cada foto: o blob store recebe os bytes no flush, a sessão não acumula originais
+                db.session.commit()
+                db.session.expunge_all()
+
+    total_fotos = (relatorios + express) * fotos_por_relatorio
+    print(f"  ✅ {relatorios} relatórios + {express} Express, {total_fotos} fotos "
+          f"({len(geradas)} conteúdos distintos, {bytes_fotos / 1024 / 1024:.1f}MB)")
+    return {'relatorios': relatorios, 'express': express, 'fotos': total_fotos, 'bytes_fotos': bytes_fotos}
+
+
+# =============================================================================
+# FASES
+# =============================================================================
+
+def _limpar_manifestos():
+    """Esquece o que já foi enviado (manifestos e cache de pastas): próximo backup vai para um Drive vazio"""
+    from app import db
+    from models import ManifestoBackupDrive, FotoBackupDrive, PastaDrive
+
+    for model in (ManifestoBackupDrive, FotoBackupDrive, PastaDrive):
+        model.query.delete()
+    db.session.commit()
+
+
+def _backup_pdfs():
+    from google_drive_backup import backup_all_reports_to_drive
+
+    resultado = backup_all_reports_to_drive(TOKEN)
+    if not resultado.get('results'):
+        raise RuntimeError(resultado.get('message'))
+    grupos = resultado['results'].values()
+    return {
+        'relatorios': sum(g.get('total', 0) for g in grupos),
+        'enviados': sum(g.get('success', 0) for g in grupos),
+        'pulados': sum(g.get('skipped', 0) for g in grupos),
+        'falhas': sum(g.get('failed', 0) for g in grupos),
+    }
+
+
+def _backup_fotos():
+    from app import app, db
+    from models import Relatorio, FotoRelatorio, RelatorioExpress, FotoRelatorioExpress
+    from google_drive_backup import backup_photos_to_drive
+
+    resultado = backup_photos_to_drive(TOKEN, db.session, Relatorio, FotoRelatorio, RelatorioExpress,
+                                       FotoRelatorioExpress, upload_folder=app.config['UPLOAD_FOLDER'])
+    if not resultado.get('success'):
+        raise RuntimeError(resultado.get('message'))
+    fotos = resultado['results']['photos']
+    relatorios = (db.session.query(FotoRelatorio.relatorio_id).distinct().count()
+                  + db.session.query(FotoRelatorioExpress.relatorio_express_id).distinct().count())
+    return {
+        'relatorios': relatorios,
+        'fotos': fotos['total'],
+        'enviados': fotos['success'],
+        'copiados': fotos.get('deduplicated', 0),
+        'pulados': fotos['skipped'],
+        'falhas': fotos['failed'],
+    }
+
+
+def _weasyprint_disponivel():
+    """WeasyPrint importável (OSError: bibliotecas nativas como Pango ausentes)"""
+    try:
+        import pdf_generator_weasy
+    except (ImportError, OSError):
+        return False
+    return pdf_generator_weasy.WEASYPRINT_AVAILABLE
+
+
+def executar_fase(fase, drive_fake, opcoes_drive, drive):
+    """Executa uma fase e mede; fases "reenvio" começam com um Drive local novo"""
+    from app import app, db
+
+    # Só as fases de PDF dependem do WeasyPrint: "fotos" roda sem ele
+    if fase.startswith('pdfs') and not _weasyprint_disponivel():
+        return {'fase': fase, 'erro': 'WeasyPrint não disponível'}, drive
+
+    with app.app_context():
+        if fase == 'pdfs-reenvio':
+            _limpar_manifestos()
+            drive = drive_fake.instalar(**opcoes_drive)
+        drive.zerar_estatisticas()
+        inicio = time.perf_counter()
+        try:
+            # O backup imprime o progresso de cada arquivo
+            with contextlib.redirect_stdout(io.StringIO()):
+                contagens = _backup_pdfs() if fase.startswith('pdfs') else _backup_fotos()
+        except Exception as e:
+            return {'fase': fase, 'erro': f"{type(e).__name__}: {e}"}, drive
+        finally:
+            db.session.remove()
+        duracao = time.perf_counter() - inicio
+
+    estatisticas = drive.estatisticas()
+    resultado = dict(contagens, fase=fase, segundos=duracao,
+                     relatorios_por_segundo=contagens['relatorios'] / duracao if duracao else 0,
+                     bytes=estatisticas['bytes_recebidos'],
+                     bytes_por_segundo=estatisticas['bytes_recebidos'] / duracao if duracao else 0,
+                     requisicoes=estatisticas['requisicoes'], operacoes=estatisticas['operacoes'],
+                     erros_injetados=estatisticas['erros_injetados'])
+    return resultado, drive
+
+
+def imprimir_linha(r):
+    if 'erro' in r:
+        print(f"  {r['fase']:<20}  ⚠️ {r['erro'][:90]}")
+        return
+    print(f"  {r['fase']:<20} {r['relatorios']:>5} {r['segundos']:>9.2f} {r['relatorios_por_segundo']:>8.1f} "
+          f"{r['bytes'] / 1024 / 1024:>9.1f} {r['bytes_por_segundo'] / 1024 / 1024:>8.1f} {r['requisicoes']:>7} "
+          f"{r['enviados']:>8} {r.get('copiados', 0):>7} {r['pulados']:>7} {r['falhas']:>6}")
+
+
+def main():
+    """Função principal do script"""
+    parser = argparse.ArgumentParser(description='Benchmark do backup para o Google Drive com o Drive local')
+    parser.add_argument('--relatorios', type=int, default=20, help='Relatórios comuns aprovados (padrão: 20)')
+    parser.add_argument('--express', type=int, default=10, help='Relatórios Express aprovados (padrão: 10)')
+    parser.add_argument('--fotos', type=int, default=4, help='Fotos por relatório (padrão: 4)')
+    parser.add_argument('--largura', type=int, default=2560,
+                        help='Largura das fotos em px, proporção 4:3 (padrão: 2560)')
+    parser.add_argument('--repetidas', type=float, default=0.1,
+                        help='Fração das fotos que repetem o conteúdo de outra (padrão: 0.1)')
+    parser.add_argument('--latencia-ms', type=float, default=0, help='Latência por requisição HTTP (padrão: 0)')
+    parser.add_argument('--banda-mbps', type=float, default=0, help='Banda de upload em Mbit/s (padrão: 0 = ilimitada)')
+    parser.add_argument('--taxa-erros', type=float, default=0,
+                        help='Probabilidade de cada envio de mídia responder 503 (padrão: 0)')
+    parser.add_argument('--fases', default=','.join(FASES), help=f"Fases executadas (padrão: {','.join(FASES)})")
+    parser.add_argument('--json', help='Grava os resultados em JSON')
+    args = parser.parse_args()
+
+    if args.json:
+        args.json = os.path.abspath(args.json)  # O script muda para a pasta descartável
+    fases = [f.strip() for f in args.fases.split(',') if f.strip()]
+    desconhecidas = set(fases) - set(FASES)
+    if desconhecidas:
+        parser.error(f"Fases desconhecidas: {', '.join(sorted(desconhecidas))}")
+    opcoes_drive = {
+        'latencia': args.latencia_ms / 1000,
+        'banda': args.banda_mbps * 1000 * 1000 / 8 if args.banda_mbps else None,
+        'taxa_erros': args.taxa_erros,
+        'semente': 42,
+    }
+
+    print("📊 BENCHMARK DO BACKUP PARA O GOOGLE DRIVE (Drive local)")
+    print(f"⏰ Iniciado em: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+    # Banco SQLite e pastas descartáveis
+    pasta = tempfile.mkdtemp(prefix='benchmark_drive_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(pasta, 'benchmark.db')}"
+    os.environ['PDF_CACHE_FOLDER'] = os.path.join(pasta, 'pdf_cache')
+    os.environ['DRIVE_BACKUP_FOLDER'] = os.path.join(pasta, 'drive_backup')
+    os.environ['PHOTO_STORAGE_BACKEND'] = 'database'
+    os.environ['PHOTO_NORMALIZE_ENABLED'] = 'false'
+    os.environ['PDF_WARMUP_ENABLED'] = 'false'
+    # Geradores leem static/ (logo) com caminho relativo
+    os.symlink(os.path.join(RAIZ, 'static'), os.path.join(pasta, 'static'))
+    os.makedirs(os.path.join(pasta, 'uploads'))
+    os.chdir(pasta)
+
+    try:
+        print(f"\n🏗️ Criando relatórios sintéticos em {pasta}...")
+        inicio = time.monotonic()
+        fixtures = criar_fixtures(args.relatorios, args.express, args.fotos, args.largura, args.repetidas)
+        print(f"   Fixtures criadas em {time.monotonic() - inicio:.1f}s")
+
+        import drive_fake
+        drive = drive_fake.instalar(**opcoes_drive)
+        print(f"\n  {'fase':<20} {'rel.':>5} {'tempo(s)':>9} {'rel/s':>8} {'MB env.':>9} {'MB/s':>8} "
+              f"{'req.':>7} {'enviados':>8} {'cópias':>7} {'pulados':>7} {'falhas':>6}")
+        resultados = []
+        for fase in fases:
+            resultado, drive = executar_fase(fase, drive_fake, opcoes_drive, drive)
+            imprimir_linha(resultado)
+            resultados.append(resultado)
+        drive_fake.desinstalar()
+
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump({
+                    'data': datetime.now().isoformat(),
+                    'fixtures': fixtures,
+                    'drive': {k: v for k, v in opcoes_drive.items() if k != 'semente'},
+                    'resultados': resultados,
+                }, f, indent=2)
+            print(f"\n💾 Resultados gravados em {args.json}")
+
+        falhas = [r for r in resultados if 'erro' in r]
+        print(f"\n✅ {len(resultados) - len(falhas)} fases concluídas, {len(falhas)} indisponíveis/falharam")
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
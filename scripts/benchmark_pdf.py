@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Benchmark dos geradores de PDF com relatórios sintéticos.
+
+Cria um banco SQLite descartável com relatórios (Relatorio/FotoRelatorio) e
+Relatórios Express (RelatorioExpress/FotoRelatorioExpress) de 0, 10, 50 e
+200 fotos em tamanho realista (JPEG 2560x1920, como sai da normalização do
+upload) e renderiza cada um em cada gerador:
+
+    weasyprint  pdf_generator_weasy.WeasyPrintReportGenerator (PDF padrão dos relatórios)
+    reportlab   pdf_generator.ReportPDFGenerator
+    artesano    pdf_generator_artesano.ArtesanoPDFGenerator (rota /pdf/legacy)
+    express     pdf_generator_express.gerar_pdf_relatorio_express
+
+As fotos ficam no blob store e também em uploads/ (os geradores ReportLab
+só leem do filesystem). Cada medição roda em um processo novo (spawn), então o pico de RSS é só
+daquela renderização. Reporta tempo, RSS base (app importado), pico de RSS e
+tamanho do PDF. Não usa rede nem o banco da aplicação: pode rodar no CI.
+
+Uso:
+    python scripts/benchmark_pdf.py [--fotos 0,10,50,200] [--motores weasyprint,reportlab,artesano,express]
+                                    [--repeticoes N] [--largura 2560] [--json resultado.json]
+
+Opções:
+    --fotos: Quantidades de fotos dos relatórios sintéticos (padrão: 0,10,50,200)
+    --motores: Geradores medidos (padrão: todos)
+    --repeticoes N: Medições por combinação; reporta a mediana do tempo (padrão: 1)
+    --largura N: Largura das fotos em px, proporção 4:3 (padrão: 2560)
+    --json: Grava os resultados em JSON (comparação entre execuções no CI)
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+# Adicionar diretório raiz ao path
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(RAIZ)
+
+MOTORES = ('weasyprint', 'reportlab', 'artesano', 'express')
+QUALIDADE_JPEG = 85  # Mesma da normalização (PHOTO_JPEG_QUALITY)
+
+
+# =============================================================================
+# FIXTURES
+# =============================================================================
+
+class GeradorFotos:
+    """JPEGs com textura de foto (não comprimem como cor sólida), todos com conteúdo distinto"""
+
+    def __init__(self, largura):
+        from PIL import Image, ImageChops
+
+        altura = largura * 3 // 4
+        canais = [
+            Image.effect_noise((largura // 6, altura // 6), 70).resize((largura, altura), Image.BICUBIC)
+            for _ in range(3)
+        ]
+        base = Image.merge('RGB', canais)
+        detalhe = Image.effect_noise((largura, altura), 6).convert('RGB')
+        self.base = ImageChops.add(base, detalhe, offset=-16)
+
+    def foto(self, indice):
+        from PIL import ImageDraw
+
+        img = self.base.copy()
+        desenho = ImageDraw.Draw(img)
+        x, y = (indice * 211) % (img.width - 400), (indice * 137) % (img.height - 300)
+        desenho.rectangle([x, y, x + 400, y + 300], fill=(indice * 37 % 256, 90, 160))
+        desenho.text((40, 40), f"Foto sintética {indice}", fill=(255, 255, 255))
+        buffer = io.BytesIO()
+        img.save(buffer, 'JPEG', quality=QUALIDADE_JPEG)
+        return buffer.getvalue()
+
+
+def _registrar_jsonb_sqlite():
+    """Colunas JSONB (PostgreSQL) criadas como JSON no SQLite descartável"""
+    from sqlalchemy.dialects.postgresql import JSONB
+    from sqlalchemy.ext.compiler import compiles
+
+    @compiles(JSONB, 'sqlite')
+    def _jsonb_como_json(tipo, compilador, **kw):
+        return 'JSON'
+
+
+def criar_fixtures(quantidades, largura):
+    """
+    Cria usuário, obra e um Relatorio + um RelatorioExpress por quantidade de fotos.
+
+    Returns:
+        dict: {quantidade: {'relatorio': id, 'express': id, 'bytes_fotos': total}}
+    """
+    from werkzeug.security import generate_password_hash
+    from app import app, db
+    from models import User, Projeto, Relatorio, FotoRelatorio, RelatorioExpress, FotoRelatorioExpress
+
+    _registrar_jsonb_sqlite()
+    fotos = GeradorFotos(largura)
+    fixtures = {}
+    with app.app_context():
+        db.create_all()
+        autor = User(username='benchmark', email='benchmark@exemplo.com', nome_completo='Benchmark PDF',
+                     password_hash=generate_password_hash('benchmark'))
+        db.session.add(autor)
+        db.session.flush()
+        projeto = Projeto(numero='BENCH-1', nome='Obra Sintética', tipo_obra='Residencial',
+                          construtora='Construtora Benchmark', nome_funcionario='Benchmark',
+                          responsavel_id=autor.id, email_principal='benchmark@exemplo.com',
+                          endereco='Rua do Benchmark, 100', status='Ativo')
+        db.session.add(projeto)
+        db.session.commit()
+
+        indice = 0
+        for quantidade in quantidades:
+            conteudo = '\n'.join(f"Item observado {n}: verificação de execução conforme projeto." for n in range(12))
+            relatorio = Relatorio(numero=f"REL-{quantidade}", titulo='Relatório de visita', projeto_id=projeto.id,
+                                  autor_id=autor.id, status='Aprovado', conteudo=conteudo)
+            express = RelatorioExpress(numero=f"EXP-{quantidade}", empresa_nome='Construtora Benchmark',
+                                       obra_nome='Obra Sintética', obra_endereco='Rua do Benchmark, 100',
+                                       autor_id=autor.id, status='Aprovado', observacoes_finais=conteudo)
+            db.session.add_all([relatorio, express])
+            db.session.commit()
+            ids = {'relatorio': relatorio.id, 'express': express.id}
+
+            bytes_fotos = 0
+            for ordem in range(1, quantidade + 1):
+                for model, campo, dono_id in ((FotoRelatorio, 'relatorio_id', ids['relatorio']),
+                                              (FotoRelatorioExpress, 'relatorio_express_id', ids['express'])):
+                    dados = fotos.foto(indice)
+                    indice += 1
+                    bytes_fotos += len(dados)
+                    # Geradores ReportLab leem as fotos de uploads/<filename>
+                    with open(os.path.join('uploads', f"bench_{indice}.jpg"), 'wb') as f:
+                        f.write(dados)
+                    db.session.add(model(**{campo: dono_id}, filename=f"bench_{indice}.jpg", imagem=dados,
+                                         ordem=ordem, legenda=f"Foto {ordem}", tipo_servico='Estrutura',
+                                         local='Pavimento tipo'))
+                # Commit a cada foto: o blob store recebe os bytes no flush, a sessão não acumula originais
+                db.session.commit()
+                db.session.expunge_all()
+            fixtures[quantidade] = dict(ids, bytes_fotos=bytes_fotos // 2)
+            print(f"  ✅ {quantidade} fotos: Relatorio {ids['relatorio']}, RelatorioExpress {ids['express']} "
+                  f"({fixtures[quantidade]['bytes_fotos'] / 1024 / 1024:.1f}MB de fotos cada)")
+    return fixtures
+
+
+# =============================================================================
+# MEDIÇÃO (processo novo por medição)
+# =============================================================================
+
+def _rss_mb():
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB no Linux
+
+
+def _renderizar(motor, relatorio_id, express_id):
+    from app import db
+    from models import Relatorio, FotoRelatorio
+
+    if motor in ('weasyprint', 'express'):
+        import pdf_generator_weasy
+        if not pdf_generator_weasy.WEASYPRINT_AVAILABLE:
+            # O gerador cairia no fallback ReportLab: a medição não seria do WeasyPrint
+            raise RuntimeError("WeasyPrint não disponível")
+
+    if motor == 'express':
+        from pdf_generator_express import gerar_pdf_relatorio_express
+        return gerar_pdf_relatorio_express(express_id, salvar_arquivo=False).getvalue()
+
+    relatorio = db.session.get(Relatorio, relatorio_id)
+    consulta = FotoRelatorio.query.filter_by(relatorio_id=relatorio_id).order_by(FotoRelatorio.ordem)
+    if motor == 'weasyprint':
+        from pdf_generator_weasy import WeasyPrintReportGenerator
+        return WeasyPrintReportGenerator().generate_report_pdf(relatorio, consulta.all())
+    fotos = consulta.options(FotoRelatorio.com_imagem()).all()
+    if motor == 'reportlab':
+        from pdf_generator import ReportPDFGenerator
+        return ReportPDFGenerator().generate_report_pdf(relatorio, fotos)
+    from pdf_generator_artesano import ArtesanoPDFGenerator
+    return ArtesanoPDFGenerator().generate_report_pdf(relatorio, fotos)
+
+
+def medir(motor, relatorio_id, express_id):
+    """Executada no processo de medição: importa a aplicação, renderiza uma vez e mede"""
+    import contextlib
+    from app import app, db
+    import models  # noqa: F401
+
+    rss_base = _rss_mb()
+    with app.app_context():
+        inicio = time.perf_counter()
+        try:
+            # Os geradores imprimem o progresso de cada foto
+            with contextlib.redirect_stdout(io.StringIO()):
+                pdf = _renderizar(motor, relatorio_id, express_id)
+        except Exception as e:
+            return {'erro': f"{type(e).__name__}: {e}"}
+        finally:
+            db.session.remove()
+        duracao = time.perf_counter() - inicio
+    if not isinstance(pdf, (bytes, bytearray)) or not pdf.startswith(b'%PDF'):
+        return {'erro': f"Resultado não é um PDF ({type(pdf).__name__})"}
+    return {'segundos': duracao, 'rss_base_mb': rss_base, 'rss_pico_mb': _rss_mb(), 'bytes': len(pdf)}
+
+
+def executar(fixtures, motores, repeticoes):
+    contexto = multiprocessing.get_context('spawn')
+    resultados = []
+    for quantidade, ids in fixtures.items():
+        for motor in motores:
+            medicoes = []
+            for _ in range(repeticoes):
+                with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as executor:
+                    medicoes.append(executor.submit(medir, motor, ids['relatorio'], ids['express']).result())
+                if 'erro' in medicoes[-1]:
+                    break
+            resultado = {'motor': motor, 'fotos': quantidade}
+            if 'erro' in medicoes[-1]:
+                resultado['erro'] = medicoes[-1]['erro']
+            else:
+                resultado.update(
+                    segundos=statistics.median(m['segundos'] for m in medicoes),
+                    rss_base_mb=max(m['rss_base_mb'] for m in medicoes),
+                    rss_pico_mb=max(m['rss_pico_mb'] for m in medicoes),
+                    bytes=medicoes[-1]['bytes'],
+                )
+            imprimir_linha(resultado)
+            resultados.append(resultado)
+    return resultados
+
+
+def imprimir_linha(r):
+    if 'erro' in r:
+        print(f"  {r['motor']:<11} {r['fotos']:>5}  ⚠️ {r['erro'][:90]}")
+        return
+    print(f"  {r['motor']:<11} {r['fotos']:>5} {r['segundos']:>9.2f} {r['rss_base_mb']:>9.0f} "
+          f"{r['rss_pico_mb']:>9.0f} {r['rss_pico_mb'] - r['rss_base_mb']:>9.0f} {r['bytes'] / 1024:>10.0f}")
+
+
+def main():
+    """Função principal do script"""
+    parser = argparse.ArgumentParser(description='Benchmark dos geradores de PDF com relatórios sintéticos')
+    parser.add_argument('--fotos', default='0,10,50,200',
+                        help='Quantidades de fotos dos relatórios sintéticos (padrão: 0,10,50,200)')
+    parser.add_argument('--motores', default=','.join(MOTORES),
+                        help=f"Geradores medidos (padrão: {','.join(MOTORES)})")
+    parser.add_argument('--repeticoes', type=int, default=1,
+                        help='Medições por combinação; reporta a mediana do tempo (padrão: 1)')
+    parser.add_argument('--largura', type=int, default=2560,
+                        help='Largura das fotos em px, proporção 4:3 (padrão: 2560)')
+    parser.add_argument('--json', help='Grava os resultados em JSON')
+    args = parser.parse_args()
+
+    quantidades = [int(q) for q in args.fotos.split(',') if q.strip()]
+    motores = [m.strip() for m in args.motores.split(',') if m.strip()]
+    desconhecidos = set(motores) - set(MOTORES)
+    if desconhecidos:
+        parser.error(f"Motores desconhecidos: {', '.join(sorted(desconhecidos))}")
+
+    print("📊 BENCHMARK DOS GERADORES DE PDF")
+    print(f"⏰ Iniciado em: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+    # Banco SQLite descartável; os processos de medição herdam as variáveis de ambiente
+    pasta = tempfile.mkdtemp(prefix='benchmark_pdf_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(pasta, 'benchmark.db')}"
+    os.environ['PDF_CACHE_FOLDER'] = os.path.join(pasta, 'pdf_cache')
+    os.environ['PHOTO_STORAGE_BACKEND'] = 'database'
+    os.environ['PHOTO_NORMALIZE_ENABLED'] = 'false'
+    os.environ['PDF_WARMUP_ENABLED'] = 'false'
+    os.environ['PDF_SEGMENTS_ENABLED'] = 'false'  # Mede a renderização completa, sem o cache de segmentos
+    # Geradores leem static/ (logo) e uploads/ (fotos, nos ReportLab) com caminho relativo
+    os.symlink(os.path.join(RAIZ, 'static'), os.path.join(pasta, 'static'))
+    os.makedirs(os.path.join(pasta, 'uploads'))
+    os.chdir(pasta)
+
+    try:
+        print(f"\n🏗️ Criando relatórios sintéticos em {pasta}...")
+        inicio = time.monotonic()
+        fixtures = criar_fixtures(quantidades, args.largura)
+        print(f"   Fixtures criadas em {time.monotonic() - inicio:.1f}s")
+
+        print(f"\n  {'motor':<11} {'fotos':>5} {'tempo(s)':>9} {'rss base':>9} {'rss pico':>9} "
+              f"{'rss +MB':>9} {'pdf(KB)':>10}")
+        resultados = executar(fixtures, motores, args.repeticoes)
+
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump({
+                    'data': datetime.now().isoformat(),
+                    'largura_fotos': args.largura,
+                    'repeticoes': args.repeticoes,
+                    'resultados': resultados,
+                }, f, indent=2)
+            print(f"\n💾 Resultados gravados em {args.json}")
+
+        falhas = [r for r in resultados if 'erro' in r]
+        print(f"\n✅ {len(resultados) - len(falhas)} medições concluídas, {len(falhas)} indisponíveis/falharam")
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
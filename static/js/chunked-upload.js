@@ -0,0 +1,124 @@
+/**
+ * Upload de fotos em partes com retomada (/api/uploads/sessions)
+ *
+ * Envia o arquivo em pedaços binários (sem base64). Se a conexão cair, o
+ * pedaço é reenviado a partir do offset confirmado pelo servidor; a sessão
+ * fica salva no localStorage para continuar mesmo após recarregar a página.
+ * O resultado tem o mesmo formato de /api/uploads/temp (temp_id, path, ...).
+ */
+
+class ChunkedUploader {
+    constructor(options = {}) {
+        this.baseUrl = options.baseUrl || '/api/uploads/sessions';
+        this.maxRetries = options.maxRetries || 8;
+        this.storagePrefix = 'chunked-upload:';
+    }
+
+    sessionKey(file) {
+        return `${this.storagePrefix}${file.name}:${file.size}:${file.lastModified || 0}`;
+    }
+
+    async request(url, options = {}) {
+        const csrfToken = document.querySelector('meta[name="csrf-token"]')?.content || '';
+        const headers = Object.assign({}, options.headers || {});
+        if (csrfToken) headers['X-CSRFToken'] = csrfToken;
+        return fetch(url, Object.assign({}, options, { headers, credentials: 'include' }));
+    }
+
+    async createSession(file, meta) {
+        const response = await this.request(this.baseUrl, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                filename: file.name || 'imagem.jpg',
+                size: file.size,
+                mime_type: file.type || 'image/jpeg',
+                category: meta.category || '',
+                local: meta.local || '',
+                caption: meta.caption || ''
+            })
+        });
+        const data = await response.json();
+        if (!response.ok || !data.success) {
+            throw new Error(data.error || `Falha ao criar sessão de upload (${response.status})`);
+        }
+        return data;
+    }
+
+    async resumeSession(key) {
+        const uploadId = localStorage.getItem(key);
+        if (!uploadId) return null;
+        const response = await this.request(`${this.baseUrl}/${uploadId}`);
+        if (!response.ok) {
+            localStorage.removeItem(key);
+            return null;
+        }
+        return response.json();
+    }
+
+    wait(ms) {
+        return new Promise(resolve => setTimeout(resolve, ms));
+    }
+
+    async upload(file, meta = {}, onProgress = null) {
+        const key = this.sessionKey(file);
+        let session = await this.resumeSession(key);
+        if (session) {
+            console.log(`🔁 Upload em partes: retomando ${session.upload_id} a partir de ${session.offset} bytes`);
+        } else {
+            session = await this.createSession(file, meta);
+            localStorage.setItem(key, session.upload_id);
+        }
+
+        let uploadUrl = `${this.baseUrl}/${session.upload_id}`;
+        let offset = session.offset;
+        let retries = 0;
+
+        while (offset < file.size) {
+            const chunk = file.slice(offset, Math.min(offset + session.chunk_size, file.size));
+            try {
+                const response = await this.request(uploadUrl, {
+                    method: 'PUT',
+                    headers: { 'Content-Type': 'application/octet-stream', 'Upload-Offset': String(offset) },
+                    body: chunk
+                });
+                const data = await response.json();
+                if (response.ok || response.status === 409) {
+                    // 409: servidor informa o offset correto (pedaço repetido ou perdido)
+                    offset = data.offset;
+                    retries = 0;
+                    if (onProgress) onProgress(offset, file.size);
+                    continue;
+                }
+                if (response.status === 404) {
+                    // Sessão expirada no servidor: recomeça em uma nova
+                    session = await this.createSession(file, meta);
+                    localStorage.setItem(key, session.upload_id);
+                    uploadUrl = `${this.baseUrl}/${session.upload_id}`;
+                    offset = 0;
+                    continue;
+                }
+                throw new Error(data.error || `Falha no envio (${response.status})`);
+            } catch (error) {
+                retries += 1;
+                if (retries > this.maxRetries) throw error;
+                // Backoff exponencial: conexões instáveis em obra
+                const delay = Math.min(1000 * 2 ** (retries - 1), 30000);
+                console.warn(`⚠️ Upload em partes: tentativa ${retries} em ${delay}ms (${error.message})`);
+                await this.wait(delay);
+                const status = await this.resumeSession(key);
+                if (status) offset = status.offset;
+            }
+        }
+
+        const response = await this.request(`${uploadUrl}/complete`, { method: 'POST' });
+        const data = await response.json();
+        localStorage.removeItem(key);
+        if (!response.ok || !data.success) {
+            throw new Error(data.error || `Falha ao concluir upload (${response.status})`);
+        }
+        return data;
+    }
+}
+
+window.ChunkedUploader = ChunkedUploader;
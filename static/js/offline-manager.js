@@ -291,6 +291,40 @@
         }
     }
 
+    /**
+     * Envia as fotos do relatório offline pelo upload em partes e troca o
+     * base64 pelo temp_id, para o servidor não decodificar o lote inteiro em
+     * memória. Se o envio de uma foto falhar, ela segue em base64 (formato legado).
+     */
+    async function uploadOfflinePhotos(record) {
+        const fotos = record.payload.fotos;
+        if (!window.ChunkedUploader || !Array.isArray(fotos)) return record.payload;
+
+        const uploader = new ChunkedUploader();
+        const enviadas = [];
+        for (const [idx, foto] of fotos.entries()) {
+            if (!foto.base64 || foto.temp_id) {
+                enviadas.push(foto);
+                continue;
+            }
+            try {
+                const blob = await (await fetch(foto.base64)).blob();
+                const file = new File([blob], `${record.offline_id}_${idx}_${foto.filename || 'foto.jpg'}`, {
+                    type: blob.type || 'image/jpeg', lastModified: 0
+                });
+                const data = await uploader.upload(file, {
+                    category: foto.category || '', local: foto.local || '', caption: foto.caption || ''
+                });
+                const { base64, ...semBase64 } = foto;
+                enviadas.push({ ...semBase64, temp_id: data.temp_id });
+            } catch (err) {
+                console.warn(`⚠️ Upload em partes falhou para foto ${idx} de ${record.offline_id}, enviando em base64:`, err);
+                enviadas.push(foto);
+            }
+        }
+        return { ...record.payload, fotos: enviadas };
+    }
+
     async function _executeSyncPendingReports() {
         isSyncing = true;
         let syncToast = null;
@@ -316,6 +350,7 @@
 
             for (const record of pending) {
                 try {
+                    const payload = await uploadOfflinePhotos(record);
                     const response = await fetch('/api/offline/save-report', {
                         method: 'POST',
                         credentials: 'include',
@@ -325,7 +360,7 @@
                         },
                         body: JSON.stringify({
                             offline_id: record.offline_id,
-                            ...record.payload
+                            ...payload
                         })
                     });
 
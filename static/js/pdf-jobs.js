@@ -0,0 +1,157 @@
+/**
+ * Download de PDF gerado em segundo plano (/reports/<id>/pdf/jobs)
+ *
+ * Links com data-pdf-job="<url dos jobs>" enfileiram a geração, consultam o
+ * status até o PDF ficar pronto e então iniciam o download. Só quando a API
+ * de jobs está inacessível (erro de rede, 404 ou resposta que não é JSON) o
+ * href original é seguido (geração síncrona); se o job termina com erro ou o
+ * tempo esgota, a mensagem é mostrada ao usuário sem renderizar no worker.
+ *
+ * Links com data-export-job="<url da preparação>" (dossiê da obra) fazem o
+ * mesmo com todos os PDFs do dossiê: o ZIP só é baixado quando os PDFs
+ * faltantes já foram gerados em segundo plano.
+ */
+
+(function () {
+    const POLL_INTERVAL_MS = 1500;
+    const MAX_WAIT_MS = 10 * 60 * 1000;
+
+    function csrfHeaders() {
+        const token = document.querySelector('meta[name="csrf-token"]')?.content || '';
+        return token ? { 'X-CSRFToken': token } : {};
+    }
+
+    function wait(ms) {
+        return new Promise(resolve => setTimeout(resolve, ms));
+    }
+
+    // API de jobs inacessível: o chamador pode cair para a geração direta
+    class JobsUnavailableError extends Error {}
+
+    async function fetchJson(url, options) {
+        let response;
+        try {
+            response = await fetch(url, { credentials: 'include', ...options });
+        } catch (error) {
+            throw new JobsUnavailableError(error.message);
+        }
+        if (response.status === 404) throw new JobsUnavailableError(`${url} não encontrado`);
+        try {
+            return await response.json();
+        } catch (error) {
+            throw new JobsUnavailableError(`Resposta inválida de ${url} (HTTP ${response.status})`);
+        }
+    }
+
+    async function generate(jobsUrl, onProgress) {
+        let job = await fetchJson(jobsUrl, { method: 'POST', headers: csrfHeaders() });
+        const started = Date.now();
+
+        while (job.status === 'na_fila' || job.status === 'renderizando') {
+            if (Date.now() - started > MAX_WAIT_MS) throw new Error('Tempo esgotado ao gerar o PDF');
+            if (onProgress) onProgress(job);
+            await wait(POLL_INTERVAL_MS);
+            job = await fetchJson(job.status_url);
+        }
+
+        if (job.status !== 'concluido') throw new Error(job.error || 'Erro ao gerar PDF');
+        return job;
+    }
+
+    async function prepareExport(prepareUrl, onProgress) {
+        let state = await fetchJson(prepareUrl, { method: 'POST', headers: csrfHeaders() });
+        const started = Date.now();
+
+        while (state.status === 'preparando') {
+            if (Date.now() - started > MAX_WAIT_MS) throw new Error('Tempo esgotado ao preparar o dossiê');
+            if (onProgress) onProgress(state);
+            await wait(POLL_INTERVAL_MS);
+            state = await fetchJson(state.status_url);
+        }
+
+        if (state.status !== 'pronto') throw new Error(state.error || 'Erro ao preparar o dossiê');
+        return state;
+    }
+
+    function reportError(message) {
+        const text = document.createElement('span');
+        text.textContent = message;
+        if (typeof window.showAlert === 'function') {
+            window.showAlert(text.innerHTML, 'danger');
+        } else {
+            alert(message);
+        }
+    }
+
+    async function handleExportClick(event) {
+        const link = event.currentTarget;
+        event.preventDefault();
+        if (link.dataset.pdfJobRunning) return;
+
+        const originalHtml = link.innerHTML;
+        link.dataset.pdfJobRunning = '1';
+        link.classList.add('disabled');
+        link.innerHTML = '<i class="fas fa-spinner fa-spin me-2"></i>Gerando PDFs...';
+
+        try {
+            const state = await prepareExport(link.dataset.exportJob, progress => {
+                link.innerHTML = `<i class="fas fa-spinner fa-spin me-2"></i>Gerando PDFs (${progress.progresso}%)...`;
+            });
+            window.location.href = state.download_url;
+        } catch (error) {
+            if (error instanceof JobsUnavailableError) {
+                console.warn(`⚠️ Preparação do dossiê indisponível, baixando direto: ${error.message}`);
+                window.location.href = link.href;
+            } else {
+                console.error(`❌ Erro ao preparar o dossiê: ${error.message}`);
+                reportError(error.message);
+            }
+        } finally {
+            link.innerHTML = originalHtml;
+            link.classList.remove('disabled');
+            delete link.dataset.pdfJobRunning;
+        }
+    }
+
+    async function handleClick(event) {
+        const link = event.currentTarget;
+        if (link.dataset.pdfJobRunning) {
+            event.preventDefault();
+            return;
+        }
+        event.preventDefault();
+
+        const originalHtml = link.innerHTML;
+        link.dataset.pdfJobRunning = '1';
+        link.classList.add('disabled');
+        link.innerHTML = '<i class="fas fa-spinner fa-spin me-1"></i>Gerando PDF...';
+
+        try {
+            const job = await generate(link.dataset.pdfJob, () => {});
+            window.location.href = job.download_url;
+        } catch (error) {
+            if (error instanceof JobsUnavailableError) {
+                console.warn(`⚠️ PDF em segundo plano indisponível, usando geração direta: ${error.message}`);
+                window.location.href = link.href;
+            } else {
+                console.error(`❌ Erro ao gerar PDF: ${error.message}`);
+                reportError(error.message);
+            }
+        } finally {
+            link.innerHTML = originalHtml;
+            link.classList.remove('disabled');
+            delete link.dataset.pdfJobRunning;
+        }
+    }
+
+    document.addEventListener('DOMContentLoaded', () => {
+        document.querySelectorAll('a[data-pdf-job]').forEach(link => {
+            link.addEventListener('click', handleClick);
+        });
+        document.querySelectorAll('a[data-export-job]').forEach(link => {
+            link.addEventListener('click', handleExportClick);
+        });
+    });
+
+    window.PdfJobs = { generate, prepareExport };
+})();
@@ -581,6 +581,17 @@ class ReportsAutoSave {
 
             console.log("📤 AutoSave - Preparando upload da imagem:", image.name || image.filename);
 
+            // Upload em partes com retomada (binário, sem base64) quando disponível
+            if (window.ChunkedUploader) {
+                const uploader = new ChunkedUploader();
+                const file = image.blob instanceof File
+                    ? image.blob
+                    : new File([image.blob], image.name || image.filename || "imagem.jpg", { type: image.blob.type || "image/jpeg" });
+                const data = await uploader.upload(file, { category, local, caption });
+                console.log("✅ Upload em partes bem-sucedido:", data);
+                return data.temp_id || null;
+            }
+
             const formData = new FormData();
             formData.append("file", image.blob, image.name || image.filename || "imagem.jpg");
             formData.append("category", category);
@@ -20,7 +20,7 @@ try {
  * ============================================================
  */
 
-const SW_VERSION = 'elp-v3.33'; // Force network-first for edits/params
+const SW_VERSION = 'elp-v3.34'; // chunked-upload.js no sync offline
 const CACHE_CORE = `elp-core-${SW_VERSION}`;      // CSS, JS, fontes, ícones
 const CACHE_OBRAS = `elp-obras-${SW_VERSION}`;     // Páginas HTML de obras/relatórios
 const CACHE_PREFIXES = ['elp-core-', 'elp-obras-'];
@@ -33,6 +33,7 @@ const PRECACHE_ASSETS = [
     '/static/css/desktop-navbar-fix.css',
     '/static/js/main.js',
     '/static/js/mobile-utils.js',
+    '/static/js/chunked-upload.js',
     '/static/js/offline-manager.js',
     '/static/js/offline-form-hydrator.js',
     '/static/js/legendas-selector.js',
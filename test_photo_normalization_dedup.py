@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Teste: reenvio da mesma foto com a normalização ativa não duplica a foto
+
+A normalização recodifica a foto depois do commit e troca o imagem_hash. O
+reenvio do mesmo arquivo (retry do autosave, sincronização offline) precisa
+continuar sendo reconhecido pelo imagem_hash_envio.
+
+Uso: python test_photo_normalization_dedup.py  (ou via pytest)
+Roda em um banco SQLite descartável, sem tocar no banco da aplicação.
+"""
+
+import io
+import os
+import sys
+import time
+import shutil
+import hashlib
+import tempfile
+import contextlib
+
+import pytest
+from PIL import Image
+from werkzeug.security import generate_password_hash
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Configuração lida pelo app na importação (banco SQLite descartável, normalização ativa)
+AMBIENTE = {
+    'PHOTO_STORAGE_BACKEND': 'database',
+    'PHOTO_NORMALIZE_ENABLED': 'true',
+    'PHOTO_MAX_DIMENSION': '1024',
+    'PDF_WARMUP_ENABLED': 'false',
+}
+
+
+def _registrar_jsonb_sqlite():
+    """Colunas JSONB (PostgreSQL) criadas como JSON no SQLite descartável"""
+    from sqlalchemy.dialects.postgresql import JSONB
+    from sqlalchemy.ext.compiler import compiles
+
+    @compiles(JSONB, 'sqlite')
+    def _jsonb_como_json(tipo, compilador, **kw):
+        return 'JSON'
+
+
+@contextlib.contextmanager
+def ambiente_isolado():
+    """Importa o app com o AMBIENTE e desfaz as variáveis e a pasta temporária no fim"""
+    pasta = tempfile.mkdtemp(prefix='teste_normalizacao_')
+    variaveis = dict(AMBIENTE, DATABASE_URL=f"sqlite:///{os.path.join(pasta, 'teste.db')}")
+    anteriores = {nome: os.environ.get(nome) for nome in variaveis}
+    os.environ.update(variaveis)
+    try:
+        _registrar_jsonb_sqlite()
+        import routes  # noqa: F401  # Registra /api/fotos/upload
+        from app import app, db
+        from scheduler_tasks import shutdown_scheduler
+
+        shutdown_scheduler()
+        yield app
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        for nome, valor in anteriores.items():
+            if valor is None:
+                os.environ.pop(nome, None)
+            else:
+                os.environ[nome] = valor
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+@pytest.fixture(scope='module')
+def app():
+    with ambiente_isolado() as aplicacao:
+        yield aplicacao
+
+
+def criar_foto_grande():
+    """JPEG 2400x1800 com ruído (a normalização reduz e recodifica)"""
+    img = Image.effect_noise((2400, 1800), 60).convert('RGB')
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=95)
+    return buffer.getvalue()
+
+
+def criar_relatorios(app, quantidade):
+    from app import db
+    from models import User, Projeto, Relatorio
+
+    with app.app_context():
+        db.create_all()
+        autor = User.query.filter_by(username='teste_normalizacao').first()
+        if not autor:
+            autor = User(username='teste_normalizacao', email='normalizacao@exemplo.com',
+                         nome_completo='Teste Normalização', password_hash=generate_password_hash('teste'))
+            db.session.add(autor)
+            db.session.flush()
+        projeto = Projeto(numero=f'NORM-{time.time_ns()}', nome='Obra Teste', tipo_obra='Residencial',
+                          construtora='Construtora Teste', nome_funcionario='Teste',
+                          responsavel_id=autor.id, email_principal='normalizacao@exemplo.com',
+                          endereco='Rua do Teste, 1', status='Ativo')
+        db.session.add(projeto)
+        db.session.flush()
+        relatorios = []
+        for n in range(quantidade):
+            relatorio = Relatorio(numero=f'NORM-{time.time_ns()}-{n}', titulo='Teste', projeto_id=projeto.id,
+                                  autor_id=autor.id, status='Em preenchimento')
+            db.session.add(relatorio)
+            relatorios.append(relatorio)
+        db.session.commit()
+        return autor.id, [r.id for r in relatorios]
+
+
+def enviar(cliente, relatorio_id, dados):
+    resposta = cliente.post('/api/fotos/upload', data={
+        'relatorio_id': str(relatorio_id),
+        'legenda': 'Foto de teste',
+        'imagem': (io.BytesIO(dados), 'foto.jpg', 'image/jpeg'),
+    }, content_type='multipart/form-data')
+    assert resposta.status_code in (200, 201), resposta.get_data(as_text=True)
+    return resposta.get_json()
+
+
+def aguardar_normalizacao(app, foto_id, hash_envio, limite=60):
+    """A normalização roda em segundo plano: espera o imagem_hash mudar"""
+    from app import db
+    from models import FotoRelatorio
+
+    inicio = time.time()
+    while time.time() - inicio < limite:
+        with app.app_context():
+            foto = db.session.get(FotoRelatorio, foto_id)
+            if foto.imagem_hash != hash_envio:
+                return foto.imagem_hash
+            db.session.remove()
+        time.sleep(0.2)
+    raise AssertionError(f"Foto {foto_id} não foi normalizada em {limite}s")
+
+
+def test_reenvio_da_mesma_foto_normalizada(app):
+    from app import db
+    from models import FotoRelatorio, ImagemVariante
+
+    autor_id, (relatorio_id, outro_relatorio_id) = criar_relatorios(app, 2)
+    dados = criar_foto_grande()
+    hash_envio = hashlib.sha256(dados).hexdigest()
+
+    cliente = app.test_client()
+    with cliente.session_transaction() as sessao:
+        sessao['_user_id'] = str(autor_id)
+        sessao['_fresh'] = True
+
+    primeira = enviar(cliente, relatorio_id, dados)
+    assert not primeira.get('is_duplicate')
+    hash_normalizado = aguardar_normalizacao(app, primeira['foto_id'], hash_envio)
+
+    # Reenvio do mesmo arquivo depois da normalização: reconhecido como duplicata
+    segunda = enviar(cliente, relatorio_id, dados)
+    assert segunda.get('is_duplicate'), segunda
+    assert segunda['foto_id'] == primeira['foto_id']
+
+    with app.app_context():
+        assert FotoRelatorio.query.filter_by(relatorio_id=relatorio_id).count() == 1
+        foto = db.session.get(FotoRelatorio, primeira['foto_id'])
+        assert foto.imagem_hash == hash_normalizado
+        assert foto.imagem_hash_envio == hash_envio
+        # Variantes só da versão final, não dos bytes enviados
+        assert ImagemVariante.query.filter_by(hash=hash_envio).count() == 0
+        assert ImagemVariante.query.filter_by(hash=hash_normalizado).count() > 0
+
+    # Mesmo arquivo em outro relatório: reaproveita a versão normalizada (mesmo blob)
+    terceira = enviar(cliente, outro_relatorio_id, dados)
+    assert not terceira.get('is_duplicate')
+    assert aguardar_normalizacao(app, terceira['foto_id'], hash_envio) == hash_normalizado
+
+
+if __name__ == '__main__':
+    print("🧪 Reenvio da mesma foto com normalização ativa...")
+    with ambiente_isolado() as aplicacao:
+        test_reenvio_da_mesma_foto_normalizada(aplicacao)
+    print("✅ Sem duplicatas: a identidade do envio sobrevive à normalização")
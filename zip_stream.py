@@ -0,0 +1,80 @@
+"""
+Escrita de arquivos ZIP em streaming (gerador de partes para Response)
+
+O zipfile da biblioteca padrão aceita uma saída sem seek: grava cada entrada
+com data descriptor e o diretório central no fim. Aqui a saída só acumula o
+que o zipfile escreveu desde a última parte entregue, então a resposta HTTP
+recebe o ZIP enquanto ele é montado e a memória fica limitada à parte atual,
+seja qual for o tamanho do arquivo final.
+
+Uso:
+    def entradas():
+        yield EntradaZip('relatorio.pdf', partes_do_pdf)
+    Response(zip_em_partes(entradas()), mimetype='application/zip')
+
+As entradas são consumidas uma a uma: quem gera `entradas` pode renderizar ou
+abrir cada arquivo só quando ele for a vez dele.
+"""
+
+import time
+import zipfile
+from collections import namedtuple
+
+# nome: caminho dentro do ZIP; partes: iterável de bytes; tamanho: opcional (ZIP64 só quando preciso);
+# data: datetime opcional (padrão: agora)
+EntradaZip = namedtuple('EntradaZip', 'nome partes tamanho data', defaults=(None, None))
+
+# Fotos e PDFs já são comprimidos: STORED evita gastar CPU sem ganhar espaço
+COMPRESSAO_PADRAO = zipfile.ZIP_STORED
+
+
+class _SaidaZip:
+    """Destino sem seek para o zipfile: guarda os bytes até a próxima parte entregue"""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def esvaziar(self):
+        if self._partes:
+            parte = b''.join(self._partes)
+            self._partes = []
+            yield parte
+
+
+def _info(entrada, compressao):
+    data = entrada.data.timetuple()[:6] if entrada.data else time.localtime()[:6]
+    info = zipfile.ZipInfo(entrada.nome, date_time=max(data, (1980, 1, 1, 0, 0, 0)))
+    info.compress_type = compressao
+    if entrada.tamanho is not None:
+        info.file_size = entrada.tamanho
+    return info
+
+
+def zip_em_partes(entradas, compressao=COMPRESSAO_PADRAO):
+    """
+    Gera o ZIP em partes.
+
+    Args:
+        entradas: Iterável de EntradaZip (consumido sob demanda)
+        compressao: zipfile.ZIP_STORED (padrão) ou ZIP_DEFLATED
+
+    Yields:
+        bytes: Partes do arquivo ZIP
+    """
+    saida = _SaidaZip()
+    with zipfile.ZipFile(saida, 'w', compression=compressao, allowZip64=True) as arquivo:
+        for entrada in entradas:
+            # Sem tamanho conhecido, ZIP64 desde o início (a entrada pode passar de 4GB)
+            with arquivo.open(_info(entrada, compressao), 'w', force_zip64=entrada.tamanho is None) as destino:
+                for parte in entrada.partes:
+                    destino.write(parte)
+                    yield from saida.esvaziar()
+            yield from saida.esvaziar()
+    yield from saida.esvaziar()